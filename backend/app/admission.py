@@ -0,0 +1,144 @@
+# Control de admisión por etapa y rate limit por sesión
+# Cada etapa costosa (embedding, herramientas, LLM) tiene un límite de
+# concurrencia y una cola de espera acotada. Si la cola está llena (o la espera
+# supera ADMISSION_WAIT_S) se lanza Overloaded: /chat responde 503 con
+# Retry-After, o en la etapa LLM se cae a la respuesta de plantilla.
+
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .metrics import metrics
+from .settings import settings
+
+class Overloaded(Exception):
+    def __init__(self, stage: str, retry_after_s: float):
+        super().__init__(f"etapa {stage} saturada")
+        self.stage = stage
+        self.retry_after_s = retry_after_s
+
+
+class StageLimiter:
+    def __init__(self, stage: str, max_concurrent: int, max_queue: int, wait_s: float):
+        self.stage = stage
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.wait_s = wait_s
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+
+    @contextmanager
+    def slot(self):
+        if self.max_concurrent <= 0:  # sin límite
+            yield
+            return
+        t0 = time.perf_counter()
+        with self._cond:
+            if self.in_flight >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    self._shed("queue_full")
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self.in_flight < self.max_concurrent, self.wait_s)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self._shed("timeout")
+            self.in_flight += 1
+        metrics.observe(f"admission.{self.stage}.wait", (time.perf_counter() - t0) * 1000)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def _shed(self, reason: str):
+        metrics.incr(f"admission.{self.stage}.shed")
+        metrics.incr(f"admission.{self.stage}.shed_{reason}")
+        raise Overloaded(self.stage, settings.ADMISSION_RETRY_AFTER_S)
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "shed": metrics.get(f"admission.{self.stage}.shed"),
+            }
+
+
+@dataclass
+class _Bucket:
+    tokens: float
+    updated: float
+
+
+class SessionRateLimiter:
+    """Token bucket por session_id: SESSION_RATE_PER_MIN con ráfagas de SESSION_BURST."""
+
+    def __init__(self, max_sessions: int = 10000):
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+        self._max_sessions = max_sessions
+
+    def check(self, session_id: str) -> Optional[float]:
+        """None si se admite; si no, segundos hasta el próximo token."""
+        rate = settings.SESSION_RATE_PER_MIN / 60.0
+        if rate <= 0:
+            return None
+        burst = max(1, settings.SESSION_BURST)
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(session_id)
+            if b is None:
+                if len(self._buckets) >= self._max_sessions:
+                    self._prune(now, rate, burst)
+                b = self._buckets[session_id] = _Bucket(burst, now)
+            b.tokens = min(burst, b.tokens + (now - b.updated) * rate)
+            b.updated = now
+            if b.tokens >= 1:
+                b.tokens -= 1
+                return None
+        metrics.incr("admission.session.limited")
+        return (1 - b.tokens) / rate
+
+    def _prune(self, now: float, rate: float, burst: int) -> None:
+        # sesiones con el balde lleno no aportan estado: se olvidan
+        full = [s for s, b in self._buckets.items() if b.tokens + (now - b.updated) * rate >= burst]
+        for s in full:
+            del self._buckets[s]
+        # si todas siguen activas (p. ej. muchos ids inventados), se olvidan las de uso más antiguo
+        excess = len(self._buckets) - self._max_sessions + 1
+        if excess > 0:
+            for s in heapq.nsmallest(excess, self._buckets, key=lambda s: self._buckets[s].updated):
+                del self._buckets[s]
+            metrics.incr("admission.session.evicted", excess)
+
+
+class Admission:
+    def __init__(self):
+        self.embedding = StageLimiter("embedding", settings.ADMISSION_EMBED_CONCURRENCY,
+                                      settings.ADMISSION_EMBED_QUEUE, settings.ADMISSION_WAIT_S)
+        self.tools = StageLimiter("tools", settings.ADMISSION_TOOLS_CONCURRENCY,
+                                  settings.ADMISSION_TOOLS_QUEUE, settings.ADMISSION_WAIT_S)
+        self.llm = StageLimiter("llm", settings.ADMISSION_LLM_CONCURRENCY,
+                                settings.ADMISSION_LLM_QUEUE, settings.ADMISSION_WAIT_S)
+        self.sessions = SessionRateLimiter()
+
+    def status(self) -> dict:
+        return {
+            "embedding": self.embedding.status(),
+            "tools": self.tools.status(),
+            "llm": self.llm.status(),
+            "session_limited": metrics.get("admission.session.limited"),
+            "llm_template_fallbacks": metrics.get("admission.llm.template_fallback"),
+        }
+
+
+admission = Admission()
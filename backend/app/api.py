@@ -1,20 +1,47 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 import json
 
 from .db import get_db, Base, engine
 from .models import FunctionDef
-from .router import load_vector_store, build_vector_store_from_db
-from .graph import build_graph, AgentState
+from .admission import Overloaded, admission
+from .coalescing import coalescing_status
+from .profiling import capture_file, list_captures, profile_request, profiling_trigger
+from .responses import FastJSONResponse, add_compression, resolve_profile, shape_chat_response
+from .embedding_service import shutdown_embedding_services
+from .index_manager import index_manager
+from .tenants import UnknownTenantError, tenant_registry
+from .tools import tool_registry
+from .prefetch import prefetcher
+from .orders import order_store
+from .customers import customer_store
+from .recommender import warm_recommender
+from .metrics import metrics
+from .graph import AgentState
+from .settings import settings
 from .function_graph import get_function_graph, FUNCTION_GRAPH
 from .logging_config import setup_logging
 
 logger = setup_logging()
 
-app = FastAPI(title="Agente IA Estocásticos")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Modo watch: recarga versiones publicadas por otros workers / re-siembras
+    if settings.INDEX_WATCH_INTERVAL_S > 0:
+        index_manager.start_watch(settings.INDEX_WATCH_INTERVAL_S)
+    warm_recommender()  # en segundo plano: la primera recomendación no espera al modelo
+    yield
+    index_manager.stop_watch()
+    shutdown_embedding_services()
+    order_store.close()  # vacía las colas write-behind
+    customer_store.close()
+    tenant_registry.close()
+
+app = FastAPI(title="Agente IA Estocásticos", lifespan=lifespan)
 
 # CORS para permitir la app móvil/web
 app.add_middleware(
@@ -24,33 +51,64 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip (o brotli si está instalado) según Accept-Encoding del cliente
+add_compression(app)
 
 # Inicialización BD
 Base.metadata.create_all(bind=engine)
 
-# Cargar o construir índice FAISS
-_vs = load_vector_store()
-_graph = None
+# El índice FAISS + grafo compilado viven en index_manager (se cargan al primer uso)
+
+DEFAULT_SESSION = settings.DEFAULT_SESSION
 
 class ChatIn(BaseModel):
-    session_id: str = "default-session"
+    session_id: str = DEFAULT_SESSION
     query: str
+    tenant_id: str | None = None  # panadería; None = DEFAULT_TENANT
+
+def get_tenant(tenant_id: str | None):
+    try:
+        return tenant_registry.get(tenant_id or settings.DEFAULT_TENANT)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnknownTenantError:
+        raise HTTPException(status_code=404, detail=f"Tenant desconocido: {tenant_id}")
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
+@app.get("/metrics")
+def get_metrics():
+    """Métricas del proceso (contadores y latencias)."""
+    snap = metrics.snapshot()
+    snap["router"] = {
+        "early_exit_fraction": metrics.ratio("router.lexical_exit", "router.lexical_exit", "router.embedding"),
+        "head_fallback_fraction": metrics.ratio("router.head_fallback", "router.head", "router.head_fallback"),
+    }
+    snap["embeddings"] = {
+        "store_hit_rate": metrics.ratio("emb.store_hit", "emb.store_hit", "emb.store_miss"),
+    }
+    snap["admission"] = admission.status()
+    snap["coalescing"] = coalescing_status()
+    snap["tools"] = tool_registry.status()
+    snap["prefetch"] = prefetcher.status()
+    snap["orders"] = order_store.status()
+    snap["customers"] = customer_store.status()
+    snap["tenants"] = tenant_registry.status()
+    return snap
+
 @app.get("/functions")
 def list_functions(db: Session = Depends(get_db)):
     rows = db.query(FunctionDef).all()
     return [{"name": r.name, "business_desc": r.business_desc, "technical_desc": r.technical_desc} for r in rows]
 
 @app.get("/graph/mermaid")
-def graph_mermaid():
-    global _graph
-    if _graph is None:
+def graph_mermaid(tenant_id: str | None = None):
+    snap = get_tenant(tenant_id).index_manager.snapshot
+    if snap is None:
         return {"error": "Graph not initialized yet. Run /chat once or seed DB first."}
-    return {"mermaid": _graph.get_graph().draw_mermaid()}
+    return {"mermaid": snap.graph.get_graph().draw_mermaid()}
 
 @app.get("/graph/functions/mermaid")
 def function_graph_mermaid():
@@ -181,15 +239,10 @@ def function_graph_view():
 @app.get("/graph", response_class=HTMLResponse)
 def graph_view(db: Session = Depends(get_db)):
     """Visualización interactiva del grafo LangGraph."""
-    global _vs, _graph
-    
     # Inicializar grafo si no existe
-    if _vs is None:
-        _vs = build_vector_store_from_db(db)
-    if _graph is None:
-        _graph = build_graph(_vs)
+    snap = index_manager.get(db)
     
-    mermaid_code = _graph.get_graph().draw_mermaid()
+    mermaid_code = snap.graph.get_graph().draw_mermaid()
     
     # Obtener las funciones disponibles
     functions = db.query(FunctionDef).all()
@@ -474,23 +527,91 @@ def graph_view(db: Session = Depends(get_db)):
 '''
     return HTMLResponse(content=html)
 
-@app.post("/chat")
-def chat(payload: ChatIn, db: Session = Depends(get_db)):
-    global _vs, _graph
-    if _vs is None:
-        logger.info("[INIT] building FAISS index from DB")
-        _vs = build_vector_store_from_db(db)
-    if _graph is None:
-        _graph = build_graph(_vs)
+def _retry_after(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, int(seconds + 0.999)))}
+
+def _is_admin(token: str | None) -> bool:
+    return bool(settings.ADMIN_TOKEN) and token == settings.ADMIN_TOKEN
+
+@app.post("/chat", response_class=FastJSONResponse)
+def chat(
+    payload: ChatIn,
+    profile: str | None = Query(default=None, description="lite | full | debug"),
+    x_response_profile: str | None = Header(default=None),
+    x_profile: str | None = Header(default=None),
+    x_admin_token: str | None = Header(default=None),
+):
+    profile = resolve_profile(profile, x_response_profile)
+    if x_profile and not _is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="X-Profile requiere un X-Admin-Token válido")
+    trigger = profiling_trigger(bool(x_profile), _is_admin(x_admin_token))
+    if trigger is None:
+        return _chat(payload, profile)
+    with profile_request("/chat", trigger) as cap:
+        resp = _chat(payload, profile)
+    resp.headers["X-Profile-Id"] = cap.id
+    return resp
+
+def _chat(payload: ChatIn, profile: str) -> FastJSONResponse:
+    # sin session_id real no hay a quién limitar (compartirían el mismo balde)
+    wait_s = admission.sessions.check(payload.session_id) if payload.session_id != DEFAULT_SESSION else None
+    if wait_s is not None:
+        raise HTTPException(status_code=429, detail="Demasiados mensajes; espera un momento",
+                            headers=_retry_after(wait_s))
+    tenant = get_tenant(payload.tenant_id)
+    # Se toma el snapshot vigente: un reindex concurrente no afecta a esta petición
+    with tenant.session_factory() as db:
+        snap = tenant.index_manager.get(db)
 
     state: AgentState = {"session_id": payload.session_id, "user_query": payload.query, "exec_log": []}
-    out = _graph.invoke(state)
+    try:
+        out = snap.graph.invoke(state)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=f"Servicio saturado ({e.stage}); reintenta en breve",
+                            headers=_retry_after(e.retry_after_s))
 
-    return {
-        "session_id": payload.session_id,
-        "query": payload.query,
-        "selected_function": {"name": out["route"].function, "score": out["route"].score},
-        "plan": out["plan"],
-        "exec_log": out["exec_log"],
-        "response": out["final_response"],
-    }
+    body = shape_chat_response(out, payload.session_id, payload.query, profile, snap.version, tenant.tenant_id)
+    return FastJSONResponse(body)
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    if not _is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token inválido o no configurado")
+
+@app.post("/admin/reindex", dependencies=[Depends(require_admin)])
+def admin_reindex(tenant_id: str | None = None):
+    """Reconstruye el índice en segundo plano y lo activa con swap atómico."""
+    manager = get_tenant(tenant_id).index_manager
+    if not manager.reindex_in_background():
+        return JSONResponse(status_code=409, content={"status": "already_running", **manager.status()})
+    return JSONResponse(status_code=202, content={"status": "started", **manager.status()})
+
+@app.get("/admin/index", dependencies=[Depends(require_admin)])
+def admin_index_status(tenant_id: str | None = None):
+    return get_tenant(tenant_id).index_manager.status()
+
+@app.get("/admin/tenants", dependencies=[Depends(require_admin)])
+def admin_tenants():
+    """Tenants en memoria: tamaño estimado, tiempo de carga y hit rate."""
+    return tenant_registry.status()
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def admin_profiles():
+    """Capturas del profiler (más recientes primero)."""
+    return {"captures": list_captures()}
+
+@app.get("/admin/profiles/{capture_id}/collapsed", dependencies=[Depends(require_admin)])
+def admin_profile_collapsed(capture_id: str):
+    """Pilas muestreadas en formato colapsado: flamegraph.pl, speedscope o inferno."""
+    path = capture_file(capture_id, "stacks.folded")
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Captura desconocida: {capture_id}")
+    with open(path, encoding="utf-8") as f:
+        return PlainTextResponse(f.read())
+
+@app.get("/admin/profiles/{capture_id}/{name}", dependencies=[Depends(require_admin)])
+def admin_profile_file(capture_id: str, name: str):
+    """Descarga un archivo de la captura (cprofile.prof, alloc.txt, alloc.tracemalloc, meta.json…)."""
+    path = capture_file(capture_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Archivo no disponible: {capture_id}/{name}")
+    return FileResponse(path, filename=f"{capture_id}-{name}")
@@ -0,0 +1,206 @@
+# Catálogo columnar: precios y stock en arrays de NumPy + índice id → fila
+# Se construye desde Inventory.productos (dict) o importando en bloque un
+# CSV/Parquet con pandas (miles de SKUs, stock por sucursal). Cotizar un
+# carrito completo o verificar su stock son operaciones vectorizadas sobre
+# las filas del carrito, no un bucle de lookups en dicts.
+#
+# Columnas del archivo: id, nombre, precio, stock (obligatorias); categoria y
+# sucursal (opcionales; con sucursal, una fila por producto y sucursal).
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLUMNS = ("id", "nombre", "precio", "stock")
+COLUMN_ALIASES = {"sku": "id", "producto_id": "id", "producto": "nombre", "precio_unitario": "precio"}
+MAX_REPORTED_ERRORS = 100
+
+class CatalogImportError(ValueError):
+    """Archivo de catálogo ilegible o sin las columnas obligatorias."""
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    products: int = 0
+    branches: List[str] = field(default_factory=list)
+    rejected: int = 0
+    errors: List[dict] = field(default_factory=list)  # {"fila", "id", "error"} (las primeras MAX_REPORTED_ERRORS)
+
+    def to_dict(self) -> dict:
+        return {"rows": self.rows, "products": self.products, "branches": self.branches,
+                "rejected": self.rejected, "errors": self.errors}
+
+
+class ColumnarCatalog:
+    def __init__(self, ids: Sequence[str], nombres: Sequence[str], categorias: Sequence[str],
+                 precio: np.ndarray, stock_by_branch: np.ndarray, branches: Sequence[str],
+                 promociones: Optional[Dict[str, dict]] = None, stock: Optional[np.ndarray] = None):
+        self.ids = list(ids)
+        self.index: Dict[str, int] = {pid: i for i, pid in enumerate(self.ids)}
+        self.nombres = list(nombres)
+        self.categorias = list(categorias)
+        self.precio = np.asarray(precio, dtype=np.float64)
+        self.stock_by_branch = np.asarray(stock_by_branch, dtype=np.int64).reshape(len(self.ids), -1)
+        self.branches = list(branches)
+        # total: la suma por sucursal salvo que se indique (filas sin desglose conocido)
+        self.stock = self.stock_by_branch.sum(axis=1) if stock is None else np.asarray(stock, dtype=np.int64)
+        self.set_promotions(promociones or {})
+
+    def set_promotions(self, promociones: Dict[str, dict]) -> None:
+        # promos por volumen ({"productos", "descuento", "cantidad_minima"}): por fila, umbral y factor
+        n = len(self.ids)
+        self.promo_min = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        self.promo_factor = np.ones(n, dtype=np.float64)
+        self.promo_name: List[Optional[str]] = [None] * n
+        for name, promo in promociones.items():
+            if "cantidad_minima" not in promo or "descuento" not in promo:
+                continue
+            for pid in promo["productos"]:
+                row = self.index.get(pid)
+                if row is not None:
+                    self.promo_min[row] = promo["cantidad_minima"]
+                    self.promo_factor[row] = 1 - promo["descuento"]
+                    self.promo_name[row] = name
+
+    @classmethod
+    def from_productos(cls, productos: Dict[str, dict], promociones: Optional[Dict[str, dict]] = None,
+                       base: Optional["ColumnarCatalog"] = None):
+        """Catálogo desde la vista dict. Con `base` (el catálogo anterior, p. ej. uno importado por
+        sucursal) se conserva el desglose por sucursal de los productos cuyo stock total no cambió;
+        los demás no tienen desglose y cada sucursal ve su total."""
+        ids = list(productos)
+        nombres = [productos[k]["nombre"] for k in ids]
+        categorias = [productos[k].get("categoria", "") for k in ids]
+        precio = np.array([productos[k]["precio"] for k in ids], dtype=np.float64)
+        total = np.array([productos[k].get("stock", 0) for k in ids], dtype=np.int64)
+        if base is None or base.branches == ["total"]:
+            return cls(ids, nombres, categorias, precio, total.reshape(len(ids), 1), ["total"], promociones)
+        rows = base.rows(ids)
+        known = rows >= 0
+        same = known.copy()
+        same[known] = base.stock[rows[known]] == total[known]
+        by_branch = np.repeat(total[:, None], len(base.branches), axis=1)
+        by_branch[same] = base.stock_by_branch[rows[same]]
+        return cls(ids, nombres, categorias, precio, by_branch, base.branches, promociones, stock=total)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def to_productos(self) -> Dict[str, dict]:
+        """Vista dict (la que usan búsqueda, entidades y recomendaciones)."""
+        return {pid: {"nombre": self.nombres[i], "precio": float(self.precio[i]), "stock": int(self.stock[i]),
+                      "categoria": self.categorias[i]}
+                for i, pid in enumerate(self.ids)}
+
+    def rows(self, ids: Sequence[str]) -> np.ndarray:
+        """Fila de cada id (-1 si no existe)."""
+        get = self.index.get
+        return np.fromiter((get(pid, -1) for pid in ids), dtype=np.int64, count=len(ids))
+
+    def cart_arrays(self, items: Sequence[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """(filas, cantidades) de items {"producto_id", "cantidad"}; fila -1 si el producto no existe."""
+        get, n = self.index.get, len(items)
+        rows = np.fromiter((get(item.get("producto_id", ""), -1) for item in items), dtype=np.int64, count=n)
+        return rows, np.fromiter((item.get("cantidad", 1) for item in items), dtype=np.int64, count=n)
+
+    def stock_for(self, rows: np.ndarray, sucursal: Optional[str] = None) -> np.ndarray:
+        if sucursal is None or sucursal not in self.branches:
+            return self.stock[rows]
+        return self.stock_by_branch[rows, self.branches.index(sucursal)]
+
+    def quote(self, rows: np.ndarray, cantidades: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(precio unitario, total con promos por volumen, máscara de promo aplicada) de filas válidas."""
+        unit = self.precio[rows]
+        gross = unit * cantidades
+        promo = cantidades >= self.promo_min[rows]
+        return unit, np.where(promo, gross * self.promo_factor[rows], gross), promo
+
+
+# ---- importación ----
+
+def read_catalog_frame(path: str) -> pd.DataFrame:
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == ".csv":
+            df = pd.read_csv(path, dtype=str, keep_default_na=False, skipinitialspace=True)
+        elif ext in (".parquet", ".pq"):
+            df = pd.read_parquet(path)
+        else:
+            raise CatalogImportError(f"Formato no soportado: {ext or path} (usa .csv o .parquet)")
+    except ImportError as e:  # Parquet necesita pyarrow o fastparquet
+        raise CatalogImportError(f"No se puede leer {path}: {e}") from e
+    except (OSError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        raise CatalogImportError(f"No se puede leer {path}: {e}") from e
+    df = df.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip().lower(), str(c).strip().lower()))
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise CatalogImportError(f"Faltan columnas obligatorias: {', '.join(missing)}")
+    return df
+
+def build_catalog(df: pd.DataFrame, promociones: Optional[Dict[str, dict]] = None,
+                  first_row: int = 2) -> Tuple[ColumnarCatalog, ImportReport]:
+    """Valida el DataFrame (vectorizado) y construye el catálogo con las filas válidas.
+
+    `first_row`: número de fila del archivo de la primera fila de datos (2 = CSV con cabecera).
+    """
+    df = df.reset_index(drop=True)
+    text = lambda col, default="": (df[col].fillna("").astype(str).str.strip() if col in df
+                                    else pd.Series(default, index=df.index))
+    ids, nombres, categorias, sucursales = text("id"), text("nombre"), text("categoria"), text("sucursal", "total")
+    precio = pd.to_numeric(df["precio"], errors="coerce")
+    stock = pd.to_numeric(df["stock"], errors="coerce")
+
+    problems = [
+        (ids == "", "id vacío"),
+        (nombres == "", "nombre vacío"),
+        (precio.isna() | (precio < 0), "precio inválido"),
+        (stock.isna() | (stock < 0) | (stock % 1 != 0), "stock inválido"),
+    ]
+    bad = pd.Series(False, index=df.index)
+    error_of = pd.Series("", index=df.index)
+    for mask, message in problems:
+        mask = mask & ~bad
+        error_of[mask] = message
+        bad |= mask
+    dup = ~bad & pd.DataFrame({"id": ids, "s": sucursales}).where(~bad).duplicated(keep="first")
+    error_of[dup] = "fila duplicada (id, sucursal)"
+    bad |= dup
+    # el precio es del producto: todas sus sucursales deben coincidir con la primera
+    first_price = precio.where(~bad).groupby(ids).transform("first")
+    conflict = ~bad & (precio != first_price)
+    error_of[conflict] = "precio distinto entre sucursales"
+    bad |= conflict
+
+    report = ImportReport(rows=len(df), rejected=int(bad.sum()))
+    for i in np.flatnonzero(bad.to_numpy())[:MAX_REPORTED_ERRORS]:
+        report.errors.append({"fila": int(i) + first_row, "id": ids[i], "error": error_of[i]})
+
+    ok = ~bad
+    valid = pd.DataFrame({"id": ids[ok], "nombre": nombres[ok], "categoria": categorias[ok],
+                          "sucursal": sucursales[ok], "precio": precio[ok].astype(np.float64),
+                          "stock": stock[ok].astype(np.int64)})
+    products = valid.drop_duplicates("id")  # orden de primera aparición
+    branches = list(dict.fromkeys(valid["sucursal"]))
+    by_branch = (valid.pivot_table(index="id", columns="sucursal", values="stock", aggfunc="sum", fill_value=0)
+                 .reindex(index=products["id"], columns=branches, fill_value=0)) if len(valid) else None
+    catalog = ColumnarCatalog(
+        products["id"].tolist(), products["nombre"].tolist(), products["categoria"].tolist(),
+        products["precio"].to_numpy(),
+        by_branch.to_numpy(dtype=np.int64) if by_branch is not None else np.zeros((0, 1), dtype=np.int64),
+        branches or ["total"], promociones)
+    report.products, report.branches = len(catalog), catalog.branches
+    return catalog, report
+
+def import_catalog(path: str, promociones: Optional[Dict[str, dict]] = None,
+                   strict: bool = False) -> Tuple[ColumnarCatalog, ImportReport]:
+    """Lee y valida un CSV/Parquet. strict=True rechaza el archivo entero si alguna fila es inválida."""
+    catalog, report = build_catalog(read_catalog_frame(path), promociones,
+                                    first_row=2 if path.lower().endswith(".csv") else 1)
+    if strict and report.rejected:
+        first = report.errors[0]
+        raise CatalogImportError(f"{report.rejected} fila(s) inválida(s); fila {first['fila']}: {first['error']}")
+    return catalog, report
@@ -0,0 +1,112 @@
+# Single-flight: peticiones idénticas concurrentes comparten un solo cómputo
+# Ante ráfagas de la misma pregunta (p.ej. tras publicar una promo) el primero
+# en llegar (líder) ejecuta la etapa y el resto espera su resultado en lugar de
+# repetir el embedding o la llamada al LLM. Los campos de sesión nunca forman
+# parte del resultado compartido: cada petición arma su propia respuesta.
+
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from .metrics import metrics
+from .settings import settings
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    """Minúsculas, sin tildes ni signos y con espacios colapsados."""
+    text = unicodedata.normalize("NFKD", query.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _SPACES.sub(" ", _PUNCT.sub(" ", text)).strip()
+
+def fingerprint(data: Any) -> str:
+    """Huella estable de los resultados de herramientas (orden de claves irrelevante)."""
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "elapsed_ms", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.elapsed_ms = 0.0
+        self.followers = 0
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    Solo se comparte lo que está en vuelo: al terminar, la clave se libera y la
+    siguiente petición vuelve a calcular (no es una caché).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Devuelve (resultado, compartido). Si el líder falla, todos reciben la excepción."""
+        if not settings.COALESCE_ENABLED:
+            return fn(), False
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.followers += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            metrics.incr(f"coalesce.{self.name}.shared")
+            metrics.incr(f"coalesce.{self.name}.saved_ms", call.elapsed_ms)
+            if call.error is not None:
+                raise call.error
+            # copia: el llamador puede anotar su resultado sin tocar el de los demás
+            return copy.deepcopy(call.result), True
+
+        metrics.incr(f"coalesce.{self.name}.leader")
+        t0 = time.perf_counter()
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            call.elapsed_ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+COALESCED_STAGES = ("route", "respond")
+
+def coalescing_status() -> Dict[str, Any]:
+    """Trabajo duplicado evitado por etapa (para GET /metrics)."""
+    out = {}
+    for stage in COALESCED_STAGES:
+        leader = metrics.get(f"coalesce.{stage}.leader")
+        shared = metrics.get(f"coalesce.{stage}.shared")
+        out[stage] = {
+            "executed": int(leader),
+            "shared": int(shared),
+            "shared_fraction": round(shared / (leader + shared), 4) if leader + shared else 0.0,
+            "saved_ms": round(metrics.get(f"coalesce.{stage}.saved_ms"), 1),
+        }
+    return out
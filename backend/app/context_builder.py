@@ -0,0 +1,190 @@
+# Constructor de contexto compacto para el prompt de respuesta
+# Serializa solo los campos que necesita cada función, deduplica entidades
+# repetidas (p. ej. el mismo producto en buscar_producto y en precios) y
+# respeta un presupuesto de tokens recortando primero lo menos prioritario.
+
+import math
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+
+# (prioridad relativa dentro del bloque, clave de entidad para deduplicar, texto)
+Line = Tuple[int, Optional[tuple], str]
+
+@dataclass
+class BuiltContext:
+    text: str
+    tokens: int          # tokens estimados del bloque de contexto
+    lines: int           # líneas incluidas
+    omitted: int         # líneas descartadas por presupuesto
+    duplicates: int      # entidades repetidas eliminadas
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata de tokens (≈ 4 caracteres por token)."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def _norm(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _money(x) -> str:
+    return f"${x:.2f}" if isinstance(x, (int, float)) else str(x)
+
+
+def _producto_line(p: Dict[str, Any], prio: int = 0) -> Line:
+    key = ("producto", p.get("nombre"))
+    return (prio, key, f"{p.get('nombre')} {_money(p.get('precio'))} stock={p.get('stock', '?')}")
+
+
+# ---- Serializadores por función: data -> líneas compactas ----
+
+def _ser_buscar_producto(data, query) -> List[Line]:
+    return [_producto_line(p) for p in data.get("productos", [])]
+
+
+def _ser_precio_promos(data, query) -> List[Line]:
+    lines: List[Line] = []
+    precio = data.get("precio", {})
+    relevantes = set()
+    if "producto" in precio:
+        lines.append((0, ("precio", precio["producto"]),
+                      f"{precio['producto']}: unit {_money(precio['precio_unitario'])}, "
+                      f"{precio['cantidad']}u={_money(precio['precio_total'])}"
+                      + (f", promo={precio['promocion']}" if precio.get("promocion") else "")))
+        relevantes = {precio["producto_id"]} if precio.get("producto_id") else set()
+    elif precio.get("mensaje"):
+        lines.append((1, None, precio["mensaje"]))
+    for promo_id, promo in data.get("promociones", {}).items():
+        # Las promos del producto consultado van primero; el resto se recorta antes
+        prio = 0 if relevantes & set(promo.get("productos", [])) else 1
+        lines.append((prio, ("promo", promo_id), f"promo {promo['descripcion']}"))
+    return lines
+
+
+def _ser_recomendar(data, query) -> List[Line]:
+    return [
+        (0, ("producto", r["nombre"]), f"{r['nombre']} {_money(r['precio'])} ({r.get('razon', '')})")
+        for r in data.get("recomendaciones", [])
+    ]
+
+
+def _ser_pedido(data, query) -> List[Line]:
+    p = data.get("pedido") or {}
+    lines: List[Line] = []
+    if p:
+        lines.append((0, ("pedido", p.get("pedido_id")),
+                      f"pedido {p.get('pedido_id')} estado={p.get('estado')} total={_money(p.get('total', 0))}"))
+    elif data.get("mensaje"):
+        lines.append((0, None, f"pedido no creado: {data['mensaje']}"))
+    for it in p.get("items", []):
+        lines.append((1, None, f"{it.get('cantidad')} x {it.get('producto')} = {_money(it.get('subtotal', 0))}"))
+    for f in data.get("sin_stock", []):
+        lines.append((0, ("producto", f.get("producto_id")),
+                      f"sin stock: {f.get('producto_id')} pidió {f.get('cantidad_solicitada')} hay {f.get('stock_actual')}"))
+    return lines
+
+
+def _ser_envio(data, query) -> List[Line]:
+    return [(0, ("zona", data.get("zona")),
+             f"envío zona={data.get('zona')} costo={_money(data.get('costo'))} eta={data.get('tiempo_min')}min")]
+
+
+def _ser_horarios(data, query) -> List[Line]:
+    q = _norm(query)
+    lines: List[Line] = []
+    hoy = data.get("horario_hoy", {})
+    if hoy:
+        lines.append((0, ("dia", hoy["dia"]), f"hoy {hoy['dia']}: {hoy['apertura']}-{hoy['cierre']}"))
+    # Solo los días mencionados en la consulta, no la semana completa
+    for dia, h in data.get("todos_horarios", {}).items():
+        if dia in q:
+            estado = f"{h['apertura']}-{h['cierre']}" if h.get("abierto", True) else "cerrado"
+            lines.append((0, ("dia", dia), f"{dia}: {estado}"))
+    for s in data.get("sucursales", []):
+        lines.append((1, ("sucursal", s["nombre"]), f"{s['nombre']}: {s['direccion']} tel {s['telefono']}"))
+    return lines
+
+
+def _ser_generico(data, query) -> List[Line]:
+    return [(1, None, ", ".join(f"{k}={v}" for k, v in data.items() if not isinstance(v, (dict, list))))] if data else []
+
+
+SERIALIZERS: Dict[str, Callable[[Dict[str, Any], str], List[Line]]] = {
+    "buscar_producto": _ser_buscar_producto,
+    "consultar_precio_promos": _ser_precio_promos,
+    "recomendar_productos": _ser_recomendar,
+    "crear_pedido": _ser_pedido,
+    "calcular_costo_envio": _ser_envio,
+    "consultar_horarios_ubicaciones": _ser_horarios,
+}
+
+
+def build_context(
+    exec_results: Dict[str, Any],
+    main_function: str,
+    query: str,
+    budget_tokens: int,
+) -> BuiltContext:
+    """Construye el bloque de datos para el prompt dentro de `budget_tokens`.
+
+    La función principal tiene prioridad 0; el resto de pasos se ordena según
+    el plan. Dentro de cada bloque, cada línea suma su prioridad relativa.
+    """
+    tools = sorted(exec_results, key=lambda t: t != main_function)  # estable: orden del plan
+
+    candidates = []  # (prioridad, seq, idx_bloque, clave, texto)
+    seq = 0
+    for idx, tool in enumerate(tools):
+        result = exec_results[tool]
+        if not result.get("success", True):
+            lines = [(0, None, f"error: {result.get('data', {}).get('error', 'desconocido')}")]
+        else:
+            lines = SERIALIZERS.get(tool, _ser_generico)(result.get("data", {}), query)
+        for rel_prio, key, text in lines:
+            candidates.append((idx + rel_prio, seq, idx, key, text))
+            seq += 1
+
+    # Se reserva espacio para la nota de datos omitidos
+    budget = budget_tokens - estimate_tokens("(+99 datos omitidos por longitud)") - 1
+
+    seen_keys = set()
+    duplicates = 0
+    selected = []
+    used = 0
+    omitted = 0
+    headers = set()
+    for prio, s, idx, key, text in sorted(candidates):
+        if key is not None and key in seen_keys:
+            duplicates += 1
+            continue
+        cost = estimate_tokens(text) + 1
+        if idx not in headers:
+            cost += estimate_tokens(f"[{tools[idx]}]") + 1
+        if used + cost > budget:
+            omitted += 1
+            continue
+        used += cost
+        headers.add(idx)
+        if key is not None:  # solo lo aceptado: una copia omitida por presupuesto no tapa a otra que sí entra
+            seen_keys.add(key)
+        selected.append((idx, s, text))
+
+    out: List[str] = []
+    current = None
+    for idx, _, text in sorted(selected):
+        if idx != current:
+            out.append(f"[{tools[idx]}]")
+            current = idx
+        out.append(f"- {text}")
+    if omitted:
+        out.append(f"(+{omitted} datos omitidos por longitud)")
+
+    text = "\n".join(out)
+    return BuiltContext(
+        text=text, tokens=estimate_tokens(text), lines=len(selected),
+        omitted=omitted, duplicates=duplicates,
+    )
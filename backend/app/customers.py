@@ -0,0 +1,335 @@
+# Registro de clientes (tabla customers)
+#   - teléfono y email se guardan normalizados con índice único: reconocer a un
+#     cliente es una lectura por igualdad sobre el índice, o un acierto en la
+#     caché por teléfono, nunca un recorrido de la tabla.
+#   - upsert por teléfono: actualiza la caché y encola la escritura; la cola
+#     (WriteBehindQueue) la aplica en lotes con INSERT ... ON CONFLICT(telefono) DO UPDATE.
+#   - ids hi/lo (CLI-000123), sin colisiones aunque dos altas caigan en el mismo segundo.
+#   - dos workers pueden dar de alta el mismo teléfono con ids hi/lo distintos:
+#     ON CONFLICT conserva el primero y el lote relee el id (RETURNING) para
+#     corregir la caché. Un pedido de un cliente con alta encolada la escribe antes.
+#   - desde el chat (register): escribir un teléfono no prueba ser su dueño. Un
+#     alta nueva vincula la sesión al teléfono; un cliente que vuelve desde otra
+#     sesión se vincula si además da el email con el que se registró. El vínculo
+#     se guarda en customer_sessions (lo ven todos los workers y sobrevive a un
+#     reinicio). Para un teléfono ya registrado y no vinculado a la sesión no se
+#     devuelven sus datos ni se cambian.
+
+import copy
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .db import Base, SessionLocal
+from .logging_config import setup_logging
+from .metrics import metrics
+from .models import Customer, CustomerSession, IdSequence
+from .persistence import HiLoAllocator, WriteBehindQueue
+from .settings import settings
+
+logger = setup_logging()
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}", re.IGNORECASE)
+_PHONE_RE = re.compile(r"(?<![\w-])\+?\d[\d\s().-]{5,}\d(?![\w-])")
+_NOT_A_NAME = r"(?:y|e|mi|con|de|el|la|tel[eé]fono|correo|email|n[uú]mero|celular)\b"
+_NAME_RE = re.compile(
+    rf"(?:me llamo|mi nombre es|a nombre de)\s+((?!{_NOT_A_NAME})[^\W\d_]+(?:\s+(?!{_NOT_A_NAME})[^\W\d_]+)?)",
+    re.IGNORECASE)
+
+def format_customer_id(customer_id: int) -> str:
+    return f"CLI-{customer_id:06d}"
+
+def parse_customer_id(text: str) -> int:
+    return int(text.rsplit("-", 1)[-1])
+
+def normalize_phone(raw: Optional[str]) -> Optional[str]:
+    """Solo dígitos; el prefijo internacional +593 pasa a 0 ('+593 99 123 4567' → '0991234567')."""
+    digits = re.sub(r"\D", "", raw or "")
+    if digits.startswith("593") and len(digits) > 10:
+        digits = "0" + digits[3:]
+    return digits if 7 <= len(digits) <= 15 else None
+
+def normalize_email(raw: Optional[str]) -> Optional[str]:
+    email = (raw or "").strip().lower()
+    return email if _EMAIL_RE.fullmatch(email) else None
+
+def extract_contact(text: str) -> Dict[str, Optional[str]]:
+    """Nombre ("me llamo …"), teléfono y email mencionados en el mensaje."""
+    email = _EMAIL_RE.search(text or "")
+    phone = next((p for p in map(normalize_phone, _PHONE_RE.findall(text or "")) if p), None)
+    name = _NAME_RE.search(text or "")
+    return {
+        "nombre": name.group(1).title() if name else None,
+        "telefono": phone,
+        "email": normalize_email(email.group()) if email else None,
+    }
+
+UPSERT_DIALECTS = ("sqlite", "postgresql")
+
+def _upsert_statement(dialect: str):
+    insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+    stmt = insert(Customer)
+    return stmt.on_conflict_do_update(
+        index_elements=[Customer.telefono],
+        set_={"nombre": stmt.excluded.nombre, "email": stmt.excluded.email, "updated_at": stmt.excluded.updated_at},
+    ).returning(Customer.id, Customer.telefono)  # el id que quedó en la BD (puede ser el de otro worker)
+
+def _bind_statement(dialect: str):
+    insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+    stmt = insert(CustomerSession)
+    return stmt.on_conflict_do_update(index_elements=[CustomerSession.session_id],
+                                      set_={"telefono": stmt.excluded.telefono})
+
+
+class CustomerStore:
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None):
+        # session_factory: None = SessionLocal (BD por defecto)
+        self._session_factory = session_factory
+        self._allocator: Optional[HiLoAllocator] = None
+        self._by_phone: "OrderedDict[str, dict]" = OrderedDict()
+        self._by_session: "OrderedDict[str, str]" = OrderedDict()  # session_id → teléfono (caché de customer_sessions)
+        self._pending: Dict[str, dict] = {}  # encolados sin escribir (no dependen de la LRU)
+        self._lock = threading.Lock()
+        self._writes = WriteBehindQueue("customers", self._write_batch, settings.CUSTOMERS_FLUSH_INTERVAL_MS,
+                                        settings.CUSTOMERS_BATCH_MAX)
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _session(self) -> Session:
+        return (self._session_factory or SessionLocal)()
+
+    def _ensure_ready(self) -> None:
+        if self._ready:
+            return
+        with self._init_lock:
+            if self._ready:
+                return
+            with self._session() as db:
+                dialect = db.get_bind().dialect.name
+                if dialect not in UPSERT_DIALECTS:  # acá y no en el hilo escritor, que perdería el lote
+                    raise NotImplementedError(f"Upsert de clientes no soportado en {dialect}")
+                Base.metadata.create_all(bind=db.get_bind(), tables=[
+                    IdSequence.__table__, Customer.__table__, CustomerSession.__table__])
+            self._allocator = HiLoAllocator(self._session, "customers", settings.CUSTOMERS_ID_BLOCK)
+            if settings.CUSTOMERS_WRITE_BEHIND:
+                self._writes.start()
+            self._ready = True
+
+    # ---- caché ----
+
+    @staticmethod
+    def _lru_put(cache: OrderedDict, key, value) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > settings.CUSTOMERS_CACHE_MAX:
+            cache.popitem(last=False)
+
+    # ---- lecturas ----
+
+    def _load(self, telefono: str) -> Optional[dict]:
+        self._ensure_ready()
+        with self._lock:
+            customer = self._by_phone.get(telefono) or self._pending.get(telefono)
+            if customer is not None:
+                self._lru_put(self._by_phone, telefono, customer)
+        if customer is not None:
+            metrics.incr("customers.cache_hit")
+            return customer
+        metrics.incr("customers.cache_miss")
+        with self._session() as db:
+            row = db.scalar(select(Customer).where(Customer.telefono == telefono))
+            if row is None:
+                return None
+            customer = {"id": row.id, "nombre": row.nombre, "telefono": row.telefono, "email": row.email,
+                        "created_at": row.created_at, "updated_at": row.updated_at}
+        with self._lock:
+            self._lru_put(self._by_phone, telefono, customer)
+        return customer
+
+    def find_by_phone(self, raw_phone: Optional[str]) -> Optional[dict]:
+        telefono = normalize_phone(raw_phone)
+        customer = self._load(telefono) if telefono else None
+        return self._public(customer) if customer is not None else None
+
+    def _session_phone(self, session_id: Optional[str]) -> Optional[str]:
+        if not session_id or session_id == settings.DEFAULT_SESSION:
+            return None
+        with self._lock:
+            telefono = self._by_session.get(session_id)
+        if telefono is not None:
+            return telefono
+        self._ensure_ready()
+        with self._session() as db:  # vinculada en otro worker o antes de un reinicio
+            telefono = db.scalar(select(CustomerSession.telefono).where(CustomerSession.session_id == session_id))
+        if telefono is not None:
+            with self._lock:
+                self._lru_put(self._by_session, session_id, telefono)
+        return telefono
+
+    def for_session(self, session_id: Optional[str]) -> Optional[dict]:
+        """Cliente vinculado a esta sesión (alta o verificación previa, en este u otro worker)."""
+        telefono = self._session_phone(session_id)
+        if telefono is None:
+            return None
+        with self._lock:
+            pending = telefono in self._pending
+        if pending:  # alta encolada: su id definitivo sale del upsert (otro worker pudo ganarle)
+            self._writes.flush()
+        return self.find_by_phone(telefono)
+
+    def _email_owner(self, email: str) -> Optional[int]:
+        with self._lock:
+            owner = next((c["id"] for c in self._pending.values() if c["email"] == email), None)
+        if owner is not None:
+            return owner
+        with self._session() as db:
+            return db.scalar(select(Customer.id).where(Customer.email == email))
+
+    # ---- escrituras ----
+
+    def register(self, telefono: str, nombre: Optional[str] = None, email: Optional[str] = None,
+                 session_id: Optional[str] = None) -> Tuple[dict, bool]:
+        """Alta o actualización pedida desde el chat; devuelve (cliente, es_nuevo).
+
+        Un teléfono ya registrado que no está vinculado a esta sesión no se modifica y solo
+        devuelve {"cliente_id"}: cualquiera puede escribir un número ajeno. Si el mensaje
+        trae también el email registrado, la sesión se vincula al cliente.
+        """
+        phone = normalize_phone(telefono)
+        if phone is None:
+            raise ValueError(f"Teléfono inválido: {telefono!r}")
+        session_id = session_id if session_id != settings.DEFAULT_SESSION else None  # compartida: no vincula
+        current = self._load(phone)
+        bound = self._session_phone(session_id) == phone
+        if current is not None and not bound:
+            verified = bool(session_id and current["email"] and normalize_email(email) == current["email"])
+            if not verified:
+                metrics.incr("customers.unverified_claims")
+                return {"cliente_id": format_customer_id(current["id"])}, False
+            self._bind(session_id, phone)
+            metrics.incr("customers.rebinds")
+        customer, nuevo = self.upsert(phone, nombre, email)
+        if nuevo and session_id is not None:
+            self._bind(session_id, phone)
+        return customer, nuevo
+
+    def _bind(self, session_id: str, telefono: str) -> None:
+        """Vincula la sesión al teléfono en la BD (síncrono: es raro y otro worker puede atender el siguiente turno)."""
+        with self._session() as db:
+            db.execute(_bind_statement(db.get_bind().dialect.name),
+                       [{"session_id": session_id, "telefono": telefono, "created_at": datetime.utcnow()}])
+            db.commit()
+        with self._lock:
+            self._lru_put(self._by_session, session_id, telefono)
+
+    def upsert(self, telefono: str, nombre: Optional[str] = None, email: Optional[str] = None) -> Tuple[dict, bool]:
+        """Alta o actualización por teléfono, sin control de dueño (importaciones, scripts).
+
+        Devuelve (cliente, es_nuevo). ValueError si el teléfono no es válido.
+        """
+        phone = normalize_phone(telefono)
+        if phone is None:
+            raise ValueError(f"Teléfono inválido: {telefono!r}")
+        email = normalize_email(email)
+        current = self._load(phone)
+        if email and (current is None or current["email"] != email):
+            owner = self._email_owner(email)
+            if owner is not None and (current is None or owner != current["id"]):
+                logger.warning(f"[CUSTOMERS] email ya registrado por otro cliente; se ignora para {phone}")
+                metrics.incr("customers.email_conflicts")
+                email = None
+
+        now = datetime.utcnow()
+        with self._lock:
+            current = self._by_phone.get(phone, current)  # otra alta concurrente del mismo teléfono
+            if current is None:
+                customer = {"id": self._allocator.next_id(), "nombre": nombre or "", "telefono": phone,
+                            "email": email, "created_at": now, "updated_at": now}
+                changed = True
+            else:
+                customer = current
+                updates = {k: v for k, v in (("nombre", nombre), ("email", email)) if v and customer[k] != v}
+                changed = bool(updates)
+                if changed:
+                    customer.update(updates, updated_at=now)
+            self._lru_put(self._by_phone, phone, customer)
+            snapshot = copy.deepcopy(customer)
+            if changed:
+                self._pending[phone] = snapshot
+        if changed:
+            self._writes.submit(snapshot)
+            metrics.incr("customers.upserts")
+        return self._public(snapshot), current is None
+
+    def _write_batch(self, ops: List[dict]) -> None:
+        rows = list({c["telefono"]: c for c in ops}.values())  # el último cambio por teléfono gana
+        try:
+            with self._session() as db:
+                stmt = _upsert_statement(db.get_bind().dialect.name)
+                try:
+                    written = db.execute(stmt, rows).all()
+                    db.commit()
+                    self._adopt_ids(written)
+                    return
+                except IntegrityError:
+                    db.rollback()
+                # algún email chocó (alta concurrente en otro proceso): fila por fila, se descartan las que chocan
+                for row in rows:
+                    try:
+                        written = db.execute(stmt, [row]).all()
+                        db.commit()
+                        self._adopt_ids(written)
+                    except IntegrityError as e:
+                        db.rollback()
+                        metrics.incr("customers.write_conflicts")
+                        logger.warning(f"[CUSTOMERS] upsert de {row['telefono']} descartado: {e.orig}")
+        finally:
+            with self._lock:
+                for row in rows:
+                    if self._pending.get(row["telefono"]) is row:
+                        del self._pending[row["telefono"]]
+
+    def _adopt_ids(self, written) -> None:
+        """Corrige la caché con el id que quedó en la BD: otro worker pudo dar de alta el mismo teléfono antes."""
+        with self._lock:
+            for customer_id, telefono in written:
+                cached = [c for c in (self._by_phone.get(telefono), self._pending.get(telefono)) if c is not None]
+                if any(c["id"] != customer_id for c in cached):
+                    metrics.incr("customers.id_conflicts")
+                    logger.info(f"[CUSTOMERS] {telefono} ya tenía id {customer_id} en la BD; se corrige la caché")
+                for c in cached:
+                    c["id"] = customer_id
+
+    def flush(self) -> None:
+        self._writes.flush()
+
+    def close(self) -> None:
+        self._writes.close()
+        self._ready = False
+
+    @staticmethod
+    def _public(customer: dict) -> dict:
+        return {"cliente_id": format_customer_id(customer["id"]), "nombre": customer["nombre"],
+                "telefono": customer["telefono"], "email": customer["email"]}
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self._writes.status(),
+            "cached": len(self._by_phone),
+            "upserts": int(metrics.get("customers.upserts")),
+            "cache_hit_rate": round(metrics.ratio("customers.cache_hit", "customers.cache_hit", "customers.cache_miss"), 4),
+            "email_conflicts": int(metrics.get("customers.email_conflicts")),
+            "unverified_claims": int(metrics.get("customers.unverified_claims")),
+            "rebinds": int(metrics.get("customers.rebinds")),
+            "id_conflicts": int(metrics.get("customers.id_conflicts")),
+        }
+
+
+customer_store = CustomerStore()
@@ -0,0 +1,150 @@
+# Servicio de embeddings en procesos dedicados
+# La inferencia del modelo corre en un pool de procesos hijos (spawn) con hilos
+# de torch fijados, así no compite por el GIL/CPU con el event loop de FastAPI.
+# Los vectores vuelven por memoria compartida: el hijo escribe la matriz en un
+# bloque SharedMemory y solo devuelve (nombre, forma); el padre copia y libera.
+# Se esperan todos los trozos aunque alguno falle, para liberar los bloques de
+# los que sí terminaron. Si un hijo muere (BrokenProcessPool) el pool se
+# recrea y el lote se reintenta una vez.
+
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .logging_config import setup_logging
+from .metrics import metrics
+
+logger = setup_logging()
+
+_worker_embedder: Optional[Embeddings] = None
+
+def _init_worker(factory: Callable[[], Embeddings], threads: int) -> None:
+    global _worker_embedder
+    # antes de importar torch (o de usarlo, si ya estaba importado)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_embedder = factory()
+
+def _embed_task(texts: List[str], query: bool) -> tuple[str, tuple]:
+    vecs = [_worker_embedder.embed_query(texts[0])] if query else _worker_embedder.embed_documents(texts)
+    x = np.asarray(vecs, dtype="float32")
+    shm = shared_memory.SharedMemory(create=True, size=max(x.nbytes, 1))
+    np.ndarray(x.shape, dtype="float32", buffer=shm.buf)[:] = x
+    shm.close()  # el padre lo adjunta y hace unlink
+    return shm.name, x.shape
+
+def _collect(name: str, shape: tuple) -> np.ndarray:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype="float32", buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class EmbeddingService(Embeddings):
+    """Embeddings calculados en `workers` procesos; lotes grandes se reparten en trozos."""
+
+    def __init__(self, factory: Callable[[], Embeddings], workers: int = 2, threads: int = 1, chunk: int = 64):
+        self.workers = workers
+        self.chunk = chunk
+        self._factory, self._threads = factory, threads
+        self._pool_lock = threading.Lock()
+        self._pool = self._make_pool()
+        logger.info(f"[EMB] pool de embeddings: {workers} procesos × {threads} hilos")
+
+    def _make_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=get_context("spawn"),
+            initializer=_init_worker, initargs=(self._factory, self._threads),
+        )
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        with self._pool_lock:
+            if self._pool is broken:  # otro hilo pudo haberlo recreado ya
+                self._pool = self._make_pool()
+                metrics.incr("emb.pool_restarts")
+                logger.warning("[EMB] un proceso del pool murió; pool recreado")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _gather(futures: List[Future]) -> List[np.ndarray]:
+        """Resultado de cada trozo; ante un error espera al resto y libera sus bloques antes de propagarlo."""
+        arrays, error = [], None
+        for f in futures:
+            try:
+                name, shape = f.result()
+            except Exception as e:
+                error = error or e
+                continue
+            arrays.append(_collect(name, shape))
+        if error is not None:
+            raise error
+        return arrays
+
+    def _run(self, tasks: List[tuple]) -> List[np.ndarray]:
+        """Ejecuta (textos, es_consulta) en el pool; si el pool se rompe, lo recrea y reintenta una vez."""
+        for attempt in range(2):
+            pool = self._pool
+            try:
+                futures: List[Future] = []
+                try:
+                    for texts, query in tasks:
+                        futures.append(pool.submit(_embed_task, texts, query))
+                except BrokenProcessPool:
+                    try:  # los trozos ya enviados que terminaron también dejaron un bloque
+                        self._gather(futures)
+                    except Exception:
+                        pass
+                    raise
+                return self._gather(futures)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                self._restart(pool)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        tasks = [(texts[i:i + self.chunk], False) for i in range(0, len(texts), self.chunk)]
+        metrics.incr("emb.pool_tasks", len(tasks))
+        return np.concatenate(self._run(tasks)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        metrics.incr("emb.pool_tasks")
+        return self._run([([text], True)])[0][0].tolist()
+
+    def warmup(self) -> None:
+        """Carga el modelo en todos los procesos (un trozo por worker)."""
+        self._run([(["warmup"], True)] * self.workers)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_embedding_service(key, factory: Callable[[], Embeddings], workers: int, threads: int) -> EmbeddingService:
+    """Un pool por proceso y configuración de modelo."""
+    with _services_lock:
+        if key not in _services:
+            _services[key] = EmbeddingService(factory, workers, threads)
+        return _services[key]
+
+def shutdown_embedding_services() -> None:
+    with _services_lock:
+        for service in _services.values():
+            service.shutdown()
+        _services.clear()
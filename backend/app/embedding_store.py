@@ -0,0 +1,150 @@
+# Almacén persistente de embeddings compartido entre reinicios y workers
+# SQLite en modo WAL: varios procesos leen en paralelo y las escrituras son
+# cortas (INSERT OR IGNORE). Clave = (modelo, sha1 del texto); el vector se
+# guarda como float32 crudo. Un reinicio o despliegue arranca con la capa de
+# embeddings "caliente": solo se calcula lo que nunca se vio.
+# Solo se persisten documentos (perfiles, índice, catálogo): las consultas son
+# texto libre del usuario y harían crecer el archivo sin límite. Para ellas hay
+# una LRU en memoria de EMB_QUERY_CACHE_SIZE entradas por embedder.
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .logging_config import setup_logging
+from .metrics import metrics
+from .settings import settings
+
+logger = setup_logging()
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, path: str, timeout_s: float = 5.0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout_s, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, key TEXT NOT NULL, dim INTEGER NOT NULL, vec BLOB NOT NULL,"
+            " PRIMARY KEY (model, key)) WITHOUT ROWID"
+        )
+
+    def get_many(self, model: str, keys: List[str]) -> Dict[str, np.ndarray]:
+        out: Dict[str, np.ndarray] = {}
+        uniq = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(uniq), 500):  # límite de parámetros de SQLite
+                chunk = uniq[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE model = ? AND key IN ({marks})", [model, *chunk]
+                ).fetchall()
+                for key, blob in rows:
+                    out[key] = np.frombuffer(blob, dtype="float32")
+        return out
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        rows = [(model, k, int(v.size), np.asarray(v, dtype="float32").tobytes()) for k, v in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def count(self, model: Optional[str] = None) -> int:
+        with self._lock:
+            if model is None:
+                return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (model,)).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Envuelve un embedder: consulta el almacén y solo calcula los documentos faltantes.
+
+    Las consultas no se guardan en disco; se recuerdan en una LRU acotada (`query_cache_size`,
+    por defecto EMB_QUERY_CACHE_SIZE; 0 la desactiva).
+    """
+
+    def __init__(self, inner: Embeddings, store: EmbeddingStore, model: str,
+                 query_cache_size: Optional[int] = None):
+        self.inner = inner
+        self.store = store
+        self.model = model
+        self.query_cache_size = settings.EMB_QUERY_CACHE_SIZE if query_cache_size is None else query_cache_size
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._queries_lock = threading.Lock()
+
+    def _lookup(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        try:
+            return self.store.get_many(self.model, [text_key(t) for t in texts])
+        except sqlite3.Error as e:
+            logger.warning(f"[EMB] almacén no disponible para lectura: {e}")
+            return {}
+
+    def _save(self, items: Dict[str, np.ndarray]) -> None:
+        try:
+            self.store.put_many(self.model, items)
+        except sqlite3.Error as e:
+            logger.warning(f"[EMB] no se pudo guardar en el almacén: {e}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        found = self._lookup(texts)
+        missing = list(dict.fromkeys(t for t in texts if text_key(t) not in found))
+        metrics.incr("emb.store_hit", len(texts) - len(missing))
+        metrics.incr("emb.store_miss", len(missing))
+        if missing:
+            fresh = {text_key(t): np.asarray(v, dtype="float32")
+                     for t, v in zip(missing, self.inner.embed_documents(missing))}
+            self._save(fresh)
+            found.update(fresh)
+        return [found[text_key(t)].tolist() for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._queries_lock:
+            vec = self._queries.get(text)
+            if vec is not None:
+                self._queries.move_to_end(text)
+        if vec is not None:
+            metrics.incr("emb.query_cache_hit")
+            return list(vec)
+        metrics.incr("emb.query_cache_miss")
+        vec = self.inner.embed_query(text)
+        if self.query_cache_size > 0:
+            with self._queries_lock:
+                self._queries[text] = list(vec)
+                while len(self._queries) > self.query_cache_size:
+                    self._queries.popitem(last=False)
+        return vec
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+def get_embedding_store(path: str) -> EmbeddingStore:
+    """Una conexión por proceso y ruta (la comparten todos los hilos)."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = EmbeddingStore(path)
+        return store
@@ -1,9 +1,119 @@
+import os
+import threading
+from functools import partial
+
 from langchain_community.embeddings import HuggingFaceEmbeddings
+from .embedding_service import get_embedding_service
+from .embedding_store import CachedEmbeddings, get_embedding_store
 from .settings import settings
+from .tfidf_embedder import STATE_FILE as TFIDF_STATE_FILE, TfidfEmbeddings
 
-def build_embedder():
+# Backends: hf (PyTorch, por defecto) | onnx (onnxruntime) | int8 (PyTorch con Linear cuantizadas)
+# | tfidf (n-gramas de caracteres, sin torch)
+EMB_BACKENDS = ("hf", "onnx", "int8", "tfidf")
+
+def embedding_model_key() -> str:
+    """Clave del modelo en el almacén: backends cuantizados producen vectores algo distintos."""
+    if settings.EMB_BACKEND == "hf":
+        return settings.EMB_MODEL_NAME
+    suffix = f":{settings.EMB_ONNX_FILE}" if settings.EMB_BACKEND == "onnx" and settings.EMB_ONNX_FILE else ""
+    return f"{settings.EMB_MODEL_NAME}#{settings.EMB_BACKEND}{suffix}"
+
+def _onnx_embedder() -> HuggingFaceEmbeddings:
+    # sentence-transformers exporta/carga el ONNX; EMB_ONNX_FILE permite usar una
+    # variante ya cuantizada del repo del modelo (p.ej. onnx/model_qint8_avx2.onnx)
+    model_kwargs = {"backend": "onnx"}
+    if settings.EMB_ONNX_FILE:
+        model_kwargs["model_kwargs"] = {"file_name": settings.EMB_ONNX_FILE}
+    try:
+        return HuggingFaceEmbeddings(
+            model_name=settings.EMB_MODEL_NAME,
+            model_kwargs=model_kwargs,
+            encode_kwargs={"normalize_embeddings": True},
+        )
+    except ImportError as e:
+        raise RuntimeError(
+            "EMB_BACKEND=onnx requiere onnxruntime: pip install 'sentence-transformers[onnx]'"
+        ) from e
+
+def _int8_embedder() -> HuggingFaceEmbeddings:
+    import torch
+
+    embedder = HuggingFaceEmbeddings(
+        model_name=settings.EMB_MODEL_NAME,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True},
+    )
+    # cuantización dinámica: pesos de las capas Linear en int8, activaciones en float
+    torch.ao.quantization.quantize_dynamic(embedder.client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return embedder
+
+def _hf_embedder() -> HuggingFaceEmbeddings:
     # normalize_embeddings=True para que L2 ~ coseno
     return HuggingFaceEmbeddings(
         model_name=settings.EMB_MODEL_NAME,
         encode_kwargs={"normalize_embeddings": True},
     )
+
+_MODEL_FACTORIES = {"hf": _hf_embedder, "onnx": _onnx_embedder, "int8": _int8_embedder}
+_models = {}
+_models_lock = threading.Lock()
+
+def _shared_model(backend: str):
+    """Un modelo por proceso (y backend): todos los índices/tenants lo comparten."""
+    key = (backend, settings.EMB_MODEL_NAME, settings.EMB_ONNX_FILE)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = _MODEL_FACTORIES[backend]()
+        return _models[key]
+
+def _worker_model(backend: str, model_name: str, onnx_file: str):
+    # corre en el proceso hijo: replica la configuración del padre
+    settings.EMB_MODEL_NAME, settings.EMB_ONNX_FILE = model_name, onnx_file
+    return _MODEL_FACTORIES[backend]()
+
+def _shared_service(backend: str):
+    """Pool de procesos de embeddings (EMB_WORKERS > 0), uno por proceso y backend."""
+    key = (backend, settings.EMB_MODEL_NAME, settings.EMB_ONNX_FILE)
+    factory = partial(_worker_model, backend, settings.EMB_MODEL_NAME, settings.EMB_ONNX_FILE)
+    return get_embedding_service(key, factory, settings.EMB_WORKERS, settings.EMB_WORKER_THREADS)
+
+def build_embedder():
+    backend = settings.EMB_BACKEND
+    if backend in _MODEL_FACTORIES:
+        embedder = _shared_service(backend) if settings.EMB_WORKERS > 0 else _shared_model(backend)
+    elif backend == "tfidf":
+        # más barato que consultar el almacén: no se envuelve en CachedEmbeddings
+        return TfidfEmbeddings(
+            ngram_range=(2, settings.EMB_TFIDF_NGRAM_MAX),
+            max_features=settings.EMB_TFIDF_MAX_FEATURES,
+            svd_dim=settings.EMB_TFIDF_SVD_DIM,
+        )
+    else:
+        raise ValueError(f"EMB_BACKEND desconocido: {backend} (opciones: {', '.join(EMB_BACKENDS)})")
+    if settings.EMB_STORE_PATH:
+        # almacén en disco compartido por workers y reinicios (router, índice y siembra)
+        embedder = CachedEmbeddings(embedder, get_embedding_store(settings.EMB_STORE_PATH), embedding_model_key())
+    return embedder
+
+# ---- Embedders que se ajustan sobre el catálogo (tfidf) ----
+# El estado ajustado viaja con cada versión publicada del índice, así todos los
+# workers embeben las consultas con el mismo vocabulario que el índice.
+
+def _unwrap(embedder):
+    return getattr(embedder, "inner", embedder)
+
+def fit_embedder(embedder, texts) -> None:
+    inner = _unwrap(embedder)
+    if hasattr(inner, "fit"):
+        inner.fit(list(texts))
+
+def save_embedder_state(embedder, directory: str) -> None:
+    inner = _unwrap(embedder)
+    if isinstance(inner, TfidfEmbeddings) and inner.fitted:
+        inner.save(os.path.join(directory, TFIDF_STATE_FILE))
+
+def restore_embedder_state(embedder, directory: str) -> None:
+    inner = _unwrap(embedder)
+    if isinstance(inner, TfidfEmbeddings):
+        inner.load(os.path.join(directory, TFIDF_STATE_FILE))
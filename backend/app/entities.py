@@ -0,0 +1,295 @@
+# Extractor de entidades por diccionario (gazetteer) sin LLM
+# Un autómata Aho-Corasick (una pasada sobre el texto normalizado) reconoce:
+#   - productos: nombre, id, sinónimos del inventario y plurales generados;
+#     términos genéricos compartidos ("empanadas", "tortas") quedan como ambiguos
+#   - zonas de delivery, días de la semana
+#   - números en palabras ("dos", "una docena", "media docena") y dígitos
+#   - ids de pedido ("pedido 200", "orden #15", "PED-20260101120000")
+# "quiero 2 cafés y 4 empanadas" → items [{cafe, 2}] + ambiguo [{empanada_pollo|empanada_carne, 4}]
+#
+# Dos autómatas: el fijo (números, días, palabras de pedido) se compila una vez;
+# el del catálogo se recompila solo cuando cambia el vocabulario del inventario
+# (nombres, sinónimos, zonas) y se comparte entre tenants con el mismo catálogo.
+
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+import weakref
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .inventory import DEFAULT_INVENTORY, Inventory
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class AhoCorasick:
+    """Autómata multi-patrón: todas las apariciones de todos los patrones en O(len(texto))."""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+        self.size = 0
+
+    def add(self, pattern: str, value: Any) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), value))
+        self.size += 1
+
+    def build(self) -> "AhoCorasick":
+        queue = list(self._goto[0].values())
+        for node in queue:  # BFS: los enlaces de fallo de los padres ya están listos
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(ch, 0) if self._goto[f].get(ch, 0) != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """(inicio, fin, valor) de cada aparición."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, value in out[node]:
+                yield i - length + 1, i + 1, value
+
+
+def _on_word_boundary(text: str, start: int, end: int) -> bool:
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+def _leftmost_longest(matches) -> List[Tuple[int, int, Any]]:
+    chosen, last_end = [], -1
+    for start, end, value in sorted(matches, key=lambda m: (m[0], -(m[1] - m[0]))):
+        if start >= last_end:
+            chosen.append((start, end, value))
+            last_end = end
+    return chosen
+
+
+# ---- Vocabulario fijo ----
+
+NUMBER_WORDS = {
+    "un": 1, "uno": 1, "una": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6, "siete": 7,
+    "ocho": 8, "nueve": 9, "diez": 10, "once": 11, "doce": 12, "trece": 13, "catorce": 14, "quince": 15,
+    "dieciseis": 16, "diecisiete": 17, "dieciocho": 18, "diecinueve": 19, "veinte": 20, "veinticinco": 25,
+    "treinta": 30, "cuarenta": 40, "cincuenta": 50, "cien": 100,
+    "par": 2, "un par": 2, "media docena": 6,
+}
+MULTIPLIERS = {"docena": 12, "docenas": 12}
+WEEKDAYS = ("lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo")
+ORDER_KEYWORDS = ("pedido", "orden", "ped")
+_ORDER_ID_TAIL = re.compile(r"\s*(?:#|n(?:ro|umero|o)?\.?(?=\s|\d|#)|°|º)?\s*#?\s*-?(\d+)")
+_DIGITS = re.compile(r"\d+")
+# palabras que pueden ir entre la cantidad y el producto ("una docena DE croissants")
+FILLER = {"de", "del", "la", "las", "los", "el", "unos", "unas"}
+
+def _static_automaton() -> AhoCorasick:
+    ac = AhoCorasick()
+    for word, n in NUMBER_WORDS.items():
+        ac.add(word, ("numero", n))
+    for word, n in MULTIPLIERS.items():
+        ac.add(word, ("multiplicador", n))
+    for day in WEEKDAYS:
+        ac.add(day, ("dia", day))
+    for kw in ORDER_KEYWORDS:
+        ac.add(kw, ("pedido", kw))
+    return ac.build()
+
+_STATIC = _static_automaton()
+
+
+# ---- Vocabulario del catálogo ----
+
+CONNECTORS = {"de", "con", "sin", "y", "al", "a"}
+
+def plurals(word: str) -> List[str]:
+    if word.endswith("z"):
+        return [word[:-1] + "ces"]
+    if word[-1] in "aeiou":
+        return [word + "s"]
+    if word.endswith("s"):
+        return [word, word + "es"]  # "galletas" ya es plural; "frances" → "franceses"
+    return [word + "s", word + "es"]  # "croissants", "panes"
+
+def name_variants(name: str) -> List[str]:
+    """Nombre + plural del núcleo + plural de todo lo anterior al primer conector."""
+    toks = name.split()
+    out = [name]
+    out += [" ".join([p] + toks[1:]) for p in plurals(toks[0])]
+    head = next((i for i, t in enumerate(toks) if t in CONNECTORS), len(toks))
+    if head > 1:
+        out.append(" ".join([plurals(t)[-1] for t in toks[:head]] + toks[head:]))
+    return list(dict.fromkeys(out))
+
+def catalog_vocabulary(inv: Inventory) -> Dict[str, Tuple[str, Any]]:
+    """patrón normalizado → ("producto", id) | ("generico", (ids…)) | ("zona", z).
+
+    Prioridad si un patrón sirve para varias cosas: sinónimo/nombre > id > núcleo único > genérico.
+    """
+    best: Dict[str, Tuple[int, set]] = {}
+
+    def offer(pattern: str, prio: int, pid: str):
+        cur = best.get(pattern)
+        if cur is None or prio > cur[0]:
+            best[pattern] = (prio, {pid})
+        elif prio == cur[0]:
+            cur[1].add(pid)
+
+    heads: Dict[str, set] = {}
+    for pid, prod in inv.productos.items():
+        name = normalize_text(prod["nombre"])
+        for v in name_variants(name):
+            offer(v, 3, pid)
+        for v in name_variants(pid.replace("_", " ")):
+            offer(v, 2, pid)
+        heads.setdefault(name.split()[0], set()).add(pid)
+    for pid, words in inv.sinonimos.items():
+        if pid in inv.productos:
+            for w in words:
+                for v in name_variants(normalize_text(w)):
+                    offer(v, 4, pid)
+    for head, pids in heads.items():
+        for v in plurals(head) + [head]:
+            offer(v, 1 if len(pids) == 1 else 0, next(iter(pids)) if len(pids) == 1 else None)
+            if len(pids) > 1 and best[v][0] == 0:
+                best[v] = (0, set(pids))
+
+    vocab: Dict[str, Tuple[str, Any]] = {}
+    for pattern, (_, pids) in best.items():
+        pids.discard(None)
+        if len(pids) == 1:
+            vocab[pattern] = ("producto", next(iter(pids)))
+        elif pids:
+            vocab[pattern] = ("generico", tuple(sorted(pids)))
+    for zona in inv.zonas_delivery:
+        if zona != "otros":
+            vocab[normalize_text(zona)] = ("zona", zona)
+    return vocab
+
+
+@dataclass
+class Entities:
+    items: List[dict] = field(default_factory=list)      # {"producto_id", "producto", "cantidad", "termino"}
+    ambiguous: List[dict] = field(default_factory=list)  # {"termino", "cantidad", "opciones"}
+    zones: List[str] = field(default_factory=list)
+    weekdays: List[str] = field(default_factory=list)
+    order_ids: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class EntityExtractor:
+    def __init__(self, inv: Inventory, catalog: AhoCorasick):
+        # solo los nombres (parte de la huella del vocabulario): no retiene al inventario
+        self.nombres = {pid: p["nombre"] for pid, p in inv.productos.items()}
+        self.catalog = catalog
+
+    def extract(self, text: str) -> Entities:
+        norm = normalize_text(text)
+        matches = [m for m in _STATIC.iter(norm) if _on_word_boundary(norm, m[0], m[1])]
+        matches += [m for m in self.catalog.iter(norm) if _on_word_boundary(norm, m[0], m[1])]
+        spans = _leftmost_longest(matches)
+        ents = Entities()
+
+        consumed = set()  # dígitos que ya son parte de un id de pedido
+        for start, end, (kind, value) in spans:
+            if kind == "pedido":
+                m = _ORDER_ID_TAIL.match(norm, end)
+                if m:
+                    ents.order_ids.append(f"PED-{m.group(1)}" if value == "ped" else m.group(1))
+                    consumed.add(m.start(1))
+        spans += [(m.start(), m.end(), ("numero", int(m.group())))
+                  for m in _DIGITS.finditer(norm) if m.start() not in consumed]
+        spans.sort(key=lambda s: s[0])
+
+        pending, last_end = None, 0
+        merged: "OrderedDict[str, dict]" = OrderedDict()
+        for start, end, (kind, value) in spans:
+            gap = norm[last_end:start].split()
+            if pending is not None and any(w not in FILLER for w in gap):
+                pending = None  # la cantidad no era de este producto
+            if kind == "numero":
+                pending = value
+            elif kind == "multiplicador":
+                pending = (pending or 1) * value
+            elif kind in ("producto", "generico"):
+                cantidad = pending or 1
+                if kind == "producto":
+                    item = merged.get(value)
+                    if item is None:
+                        merged[value] = {"producto_id": value, "producto": self.nombres[value],
+                                         "cantidad": cantidad, "termino": norm[start:end]}
+                    else:
+                        item["cantidad"] += cantidad
+                else:
+                    ents.ambiguous.append({"termino": norm[start:end], "cantidad": cantidad, "opciones": list(value)})
+                pending = None
+            elif kind == "zona" and value not in ents.zones:
+                ents.zones.append(value)
+            elif kind == "dia" and value not in ents.weekdays:
+                ents.weekdays.append(value)
+            last_end = end
+        ents.items = list(merged.values())
+        return ents
+
+
+# ---- Caché: un autómata por vocabulario; se recompila solo si el vocabulario cambió ----
+
+_lock = threading.Lock()
+_automata: "OrderedDict[str, AhoCorasick]" = OrderedDict()   # huella del vocabulario → autómata
+# uid → (versión, huella, extractor); la entrada se borra cuando muere el inventario
+_by_inventory: Dict[int, Tuple[int, str, EntityExtractor]] = {}
+_MAX_AUTOMATA = 32
+
+def _vocab_fingerprint(inv: Inventory) -> str:
+    vocab = {"p": {k: v["nombre"] for k, v in inv.productos.items()}, "s": inv.sinonimos,
+             "z": sorted(inv.zonas_delivery)}
+    return hashlib.blake2b(json.dumps(vocab, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
+
+def get_extractor(inventory: Optional[Inventory] = None) -> EntityExtractor:
+    """Extractor del inventario; un cambio de stock/precio (nueva versión) no recompila nada."""
+    inv = inventory or DEFAULT_INVENTORY
+    cached = _by_inventory.get(inv.uid)
+    if cached is not None and cached[0] == inv.version:
+        return cached[2]
+    fp = _vocab_fingerprint(inv)
+    with _lock:
+        automaton = _automata.get(fp)
+        if automaton is None:
+            automaton = AhoCorasick()
+            for pattern, value in catalog_vocabulary(inv).items():
+                automaton.add(pattern, value)
+            _automata[fp] = automaton.build()
+            while len(_automata) > _MAX_AUTOMATA:
+                _automata.popitem(last=False)
+        _automata.move_to_end(fp)
+        extractor = cached[2] if cached is not None and cached[1] == fp else EntityExtractor(inv, automaton)
+        if inv.uid not in _by_inventory:
+            weakref.finalize(inv, _by_inventory.pop, inv.uid, None)
+        _by_inventory[inv.uid] = (inv.version, fp, extractor)
+    return extractor
+
+def extract_entities(text: str, inventory: Optional[Inventory] = None) -> Entities:
+    return get_extractor(inventory).extract(text)
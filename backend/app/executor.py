@@ -0,0 +1,171 @@
+# Ejecutor concurrente del plan
+# Cada paso declara `depends_on` (números de paso); los pasos independientes
+# corren en paralelo sobre un pool de hilos acotado y compartido. Si la
+# petición se está perfilando, cada paso se une a su perfil en el hilo del pool.
+# Un paso con timeout NO_TIMEOUT se espera hasta que termine: una herramienta que
+# muta no se abandona a medias (el plan no puede saber si se aplicó).
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional
+
+from .logging_config import setup_logging
+from .profiling import ActiveProfile, current_profile, profile_thread
+from .settings import settings
+
+logger = setup_logging()
+
+NO_TIMEOUT = math.inf  # timeout de un paso que se espera siempre
+
+@dataclass
+class StepOutcome:
+    step: int
+    tool: str
+    status: str               # ok | error | timeout | skipped
+    result: Dict[str, Any]
+    elapsed_ms: float = 0.0
+
+    @property
+    def success(self) -> bool:
+        return self.status == "ok"
+
+
+# Pool global (se crea al primer uso)
+_pool: Optional[ThreadPoolExecutor] = None
+
+def get_executor_pool() -> ThreadPoolExecutor:
+    """Obtiene o crea el pool de hilos compartido para los pasos del plan."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=settings.EXEC_MAX_WORKERS,
+            thread_name_prefix="plan-step",
+        )
+    return _pool
+
+
+def _failed_result(tool: str, error: str) -> Dict[str, Any]:
+    return {"function": tool, "success": False, "data": {"error": error}}
+
+
+def _timed(run_step: Callable[[Dict[str, Any]], Dict[str, Any]], step: Dict[str, Any],
+           profile: Optional[ActiveProfile] = None):
+    with profile_thread(profile):
+        t0 = time.perf_counter()
+        result = run_step(step)
+        return result, (time.perf_counter() - t0) * 1000
+
+
+def run_plan(
+    plan: List[Dict[str, Any]],
+    run_step: Callable[[Dict[str, Any]], Dict[str, Any]],
+    timeout_s: Optional[float] = None,
+    pool: Optional[ThreadPoolExecutor] = None,
+    step_timeout: Optional[Callable[[Dict[str, Any]], Optional[float]]] = None,
+) -> Dict[int, StepOutcome]:
+    """Ejecuta el plan como un DAG y devuelve el resultado de cada paso.
+
+    - Un paso arranca cuando todas sus dependencias terminaron con éxito.
+    - Si una dependencia falla (error/timeout/skipped) el paso se omite, pero
+      las ramas independientes siguen ejecutándose.
+    - `timeout_s` se cuenta desde que el paso entra al pool; un paso vencido
+      se marca como `timeout` y el plan continúa sin esperarlo.
+    - `step_timeout(step)` permite un timeout propio por paso (None = `timeout_s`,
+      NO_TIMEOUT = sin plazo).
+    """
+    timeout_s = settings.EXEC_STEP_TIMEOUT_S if timeout_s is None else timeout_s
+    pool = pool or get_executor_pool()
+    profile = current_profile()  # los hilos del pool no heredan el contexto de la petición
+
+    steps = {s["step"]: s for s in plan}
+    deps = {
+        n: [d for d in s.get("depends_on", []) if d in steps and d != n]
+        for n, s in steps.items()
+    }
+    outcomes: Dict[int, StepOutcome] = {}
+    running: Dict[Future, tuple] = {}
+
+    while len(outcomes) < len(steps):
+        # Programar los pasos listos (o propagar fallos de dependencias)
+        progressed = False
+        for n, s in steps.items():
+            if n in outcomes or any(info[0] == n for info in running.values()):
+                continue
+            if not all(d in outcomes for d in deps[n]):
+                continue
+            failed = [d for d in deps[n] if not outcomes[d].success]
+            if failed:
+                failed_tools = ", ".join(steps[d]["tool"] for d in failed)
+                outcomes[n] = StepOutcome(
+                    step=n, tool=s["tool"], status="skipped",
+                    result=_failed_result(s["tool"], f"Dependencia fallida: {failed_tools}"),
+                )
+            else:
+                fut = pool.submit(_timed, run_step, s, profile)
+                limit = step_timeout(s) if step_timeout else None
+                limit = timeout_s if limit is None else limit
+                running[fut] = (n, time.monotonic() + limit, limit)
+            progressed = True
+
+        if not running:
+            if progressed:
+                continue
+            # Dependencias que nunca se resuelven (ciclo): omitir lo que queda
+            for n, s in steps.items():
+                if n not in outcomes:
+                    outcomes[n] = StepOutcome(
+                        step=n, tool=s["tool"], status="skipped",
+                        result=_failed_result(s["tool"], "Dependencia circular en el plan"),
+                    )
+            break
+
+        next_deadline = min(deadline for _, deadline, _ in running.values())
+        done, _ = wait(
+            list(running),
+            timeout=None if next_deadline == NO_TIMEOUT else max(0.0, next_deadline - time.monotonic()),
+            return_when=FIRST_COMPLETED,
+        )
+
+        for fut in done:
+            n, _, _ = running.pop(fut)
+            tool = steps[n]["tool"]
+            try:
+                result, elapsed = fut.result()
+                status = "ok" if result.get("success", True) else "error"
+                outcomes[n] = StepOutcome(step=n, tool=tool, status=status, result=result, elapsed_ms=elapsed)
+            except Exception as e:
+                logger.error(f"[EXECUTOR] Paso {n} ({tool}) lanzó excepción: {e}")
+                outcomes[n] = StepOutcome(step=n, tool=tool, status="error", result=_failed_result(tool, str(e)))
+
+        now = time.monotonic()
+        for fut, (n, deadline, limit) in list(running.items()):
+            if deadline <= now:
+                running.pop(fut)
+                fut.cancel()  # si aún no arrancó, no se ejecuta
+                tool = steps[n]["tool"]
+                logger.warning(f"[EXECUTOR] Paso {n} ({tool}) superó el timeout de {limit}s")
+                outcomes[n] = StepOutcome(
+                    step=n, tool=tool, status="timeout",
+                    result=_failed_result(tool, "Tiempo de espera agotado"),
+                    elapsed_ms=limit * 1000,
+                )
+
+    return outcomes
+
+
+def critical_path_ms(plan: List[Dict[str, Any]], outcomes: Dict[int, StepOutcome]) -> float:
+    """Duración del camino más largo del DAG según los tiempos medidos."""
+    deps = {s["step"]: s.get("depends_on", []) for s in plan}
+    memo: Dict[int, float] = {}
+
+    def finish(n: int, seen: frozenset) -> float:
+        if n in memo:
+            return memo[n]
+        own = outcomes[n].elapsed_ms if n in outcomes else 0.0
+        prev = [finish(d, seen | {n}) for d in deps.get(n, []) if d in deps and d not in seen]
+        memo[n] = own + max(prev, default=0.0)
+        return memo[n]
+
+    return max((finish(n, frozenset()) for n in deps), default=0.0)
@@ -1,20 +1,26 @@
 # Grafo de funciones con Neo4j
 # Muestra cómo se relacionan las funciones entre sí
 
-from typing import Optional
+import threading
+from typing import Dict, Optional
 from .logging_config import setup_logging
+from .plan_compiler import PlanTemplate, compile_plan
 
 logger = setup_logging()
 
 # Definición de las relaciones entre funciones
 # Esto representa cómo el agente puede navegar entre funciones
+# "pasos_previos": herramientas que el plan ejecuta antes de la función
+# (p.ej. identificar el producto antes de cotizarlo o pedirlo)
 FUNCTION_GRAPH = {
     "nodes": [
         {"id": "saludar_cortesia", "label": "Saludar/Cortesía", "tipo": "entrada"},
         {"id": "buscar_producto", "label": "Buscar Producto", "tipo": "consulta"},
-        {"id": "consultar_precio_promos", "label": "Consultar Precio", "tipo": "consulta"},
+        {"id": "consultar_precio_promos", "label": "Consultar Precio", "tipo": "consulta",
+         "pasos_previos": ["buscar_producto"]},
         {"id": "recomendar_productos", "label": "Recomendar", "tipo": "consulta"},
-        {"id": "crear_pedido", "label": "Crear Pedido", "tipo": "transaccion"},
+        {"id": "crear_pedido", "label": "Crear Pedido", "tipo": "transaccion",
+         "pasos_previos": ["buscar_producto"]},
         {"id": "actualizar_pedido", "label": "Actualizar Pedido", "tipo": "transaccion"},
         {"id": "cancelar_pedido", "label": "Cancelar Pedido", "tipo": "transaccion"},
         {"id": "consultar_estado_pedido", "label": "Estado Pedido", "tipo": "consulta"},
@@ -56,9 +62,12 @@ FUNCTION_GRAPH = {
 class FunctionGraphManager:
     """Gestiona el grafo de funciones usando Neo4j o en memoria."""
     
-    def __init__(self, uri: str = None, user: str = None, password: str = None):
+    def __init__(self, uri: str = None, user: str = None, password: str = None, graph: Optional[dict] = None):
         self.driver = None
         self.use_neo4j = False
+        self.graph = graph or FUNCTION_GRAPH  # cada tenant puede traer su propio grafo
+        self._plans: Dict[str, PlanTemplate] = {}
+        self._plans_lock = threading.Lock()
         
         if uri and user and password:
             try:
@@ -79,8 +88,26 @@ class FunctionGraphManager:
         """Inicializa el grafo con las funciones y relaciones."""
         if self.use_neo4j:
             self._init_neo4j_graph()
-        logger.info(f"[GRAPH] Grafo inicializado con {len(FUNCTION_GRAPH['nodes'])} funciones y {len(FUNCTION_GRAPH['edges'])} relaciones")
+        logger.info(f"[GRAPH] Grafo inicializado con {len(self.graph['nodes'])} funciones y {len(self.graph['edges'])} relaciones")
     
+    def set_graph(self, graph: dict) -> None:
+        """Reemplaza el grafo; los planes se recompilan al pedirlos."""
+        with self._plans_lock:
+            self.graph = graph
+            self._plans = {}
+        if self.use_neo4j:
+            self._init_neo4j_graph()
+
+    def get_plan(self, function_id: str) -> PlanTemplate:
+        """Plantilla de plan de la función (compilada una vez por versión del grafo)."""
+        plan = self._plans.get(function_id)
+        if plan is None:
+            with self._plans_lock:
+                plan = self._plans.get(function_id)
+                if plan is None:
+                    plan = self._plans[function_id] = compile_plan(self, function_id)
+        return plan
+
     def _init_neo4j_graph(self):
         """Crea el grafo en Neo4j."""
         with self.driver.session() as session:
@@ -88,14 +115,14 @@ class FunctionGraphManager:
             session.run("MATCH (n:Funcion) DETACH DELETE n")
             
             # Crear nodos
-            for node in FUNCTION_GRAPH["nodes"]:
+            for node in self.graph["nodes"]:
                 session.run(
                     "CREATE (f:Funcion {id: $id, label: $label, tipo: $tipo})",
                     id=node["id"], label=node["label"], tipo=node["tipo"]
                 )
             
             # Crear relaciones
-            for edge in FUNCTION_GRAPH["edges"]:
+            for edge in self.graph["edges"]:
                 session.run(
                     f"MATCH (a:Funcion {{id: $from_id}}), (b:Funcion {{id: $to_id}}) "
                     f"CREATE (a)-[:{edge['rel']}]->(b)",
@@ -105,7 +132,7 @@ class FunctionGraphManager:
     def get_related_functions(self, function_id: str) -> list:
         """Obtiene funciones relacionadas a una función dada."""
         related = []
-        for edge in FUNCTION_GRAPH["edges"]:
+        for edge in self.graph["edges"]:
             if edge["from"] == function_id:
                 related.append({"function": edge["to"], "relation": edge["rel"]})
             elif edge["to"] == function_id:
@@ -115,11 +142,46 @@ class FunctionGraphManager:
     def get_next_steps(self, function_id: str) -> list:
         """Obtiene los posibles siguientes pasos desde una función."""
         next_steps = []
-        for edge in FUNCTION_GRAPH["edges"]:
+        for edge in self.graph["edges"]:
             if edge["from"] == function_id and edge["rel"] in ["SIGUIENTE_PASO", "PUEDE_LLEVAR_A", "REQUIERE"]:
                 next_steps.append(edge["to"])
         return next_steps
     
+    def get_required(self, function_id: str) -> list:
+        """Obtiene las dependencias directas (REQUIERE) de una función."""
+        return [
+            edge["to"] for edge in self.graph["edges"]
+            if edge["from"] == function_id and edge["rel"] == "REQUIERE"
+        ]
+
+    def precedes(self, from_func: str, to_func: str) -> bool:
+        """True si `from_func` llega a `to_func` siguiendo aristas SIGUIENTE_PASO."""
+        visited = set()
+        stack = [from_func]
+        while stack:
+            node = stack.pop()
+            if node in visited:
+                continue
+            visited.add(node)
+            for edge in self.graph["edges"]:
+                if edge["from"] == node and edge["rel"] == "SIGUIENTE_PASO":
+                    if edge["to"] == to_func:
+                        return True
+                    stack.append(edge["to"])
+        return False
+
+    def get_step_dependencies(self, function_id: str, plan_tools: list) -> list:
+        """Herramientas del plan que deben terminar antes de ejecutar `function_id`.
+
+        Una herramienta es dependencia si la función la REQUIERE o si la
+        precede en el flujo SIGUIENTE_PASO (directa o transitivamente).
+        """
+        required = set(self.get_required(function_id))
+        return [
+            tool for tool in plan_tools
+            if tool != function_id and (tool in required or self.precedes(tool, function_id))
+        ]
+
     def get_function_path(self, from_func: str, to_func: str) -> list:
         """Encuentra el camino entre dos funciones (BFS simple)."""
         if from_func == to_func:
@@ -138,7 +200,7 @@ class FunctionGraphManager:
             
             if node not in visited:
                 visited.add(node)
-                for edge in FUNCTION_GRAPH["edges"]:
+                for edge in self.graph["edges"]:
                     if edge["from"] == node:
                         new_path = list(path)
                         new_path.append(edge["to"])
@@ -159,12 +221,12 @@ class FunctionGraphManager:
         }
         
         # Nodos
-        for node in FUNCTION_GRAPH["nodes"]:
+        for node in self.graph["nodes"]:
             style = styles.get(node["tipo"], "")
             lines.append(f"    {node['id']}[{node['label']}]{style}")
         
         # Relaciones
-        for edge in FUNCTION_GRAPH["edges"]:
+        for edge in self.graph["edges"]:
             arrow = "-->" if edge["rel"] == "SIGUIENTE_PASO" else "-..->"
             lines.append(f"    {edge['from']} {arrow}|{edge['rel']}| {edge['to']}")
         
@@ -186,7 +248,7 @@ class FunctionGraphManager:
         
         # Agrupar por tipo
         tipos = {"entrada": [], "consulta": [], "transaccion": [], "fallback": []}
-        for node in FUNCTION_GRAPH["nodes"]:
+        for node in self.graph["nodes"]:
             tipos[node["tipo"]].append(node)
         
         for tipo, nodes in tipos.items():
@@ -1,16 +1,19 @@
 from typing import TypedDict, Optional, List, Dict, Any
 from langgraph.graph import StateGraph, START, END
-from datetime import datetime
+import time
 
 from .logging_config import setup_logging
-from .router import RouteResult, select_function
+from .router import RouteResult, select_function_hybrid
 from .settings import settings
-from .function_graph import get_function_graph, FUNCTION_GRAPH
-from .inventory import (
-    PRODUCTOS, PROMOCIONES, HORARIOS, SUCURSALES, ZONAS_DELIVERY,
-    buscar_producto_por_nombre, obtener_precio, verificar_stock, 
-    calcular_pedido, obtener_horario_hoy
-)
+from .function_graph import get_function_graph
+from .executor import run_plan, critical_path_ms
+from .context_builder import build_context, estimate_tokens
+from .admission import Overloaded, admission
+from .coalescing import SingleFlight, fingerprint, normalize_query
+from .metrics import metrics
+from .inventory import Inventory
+from .tools import tool_registry
+from .prefetch import prefetcher
 
 logger = setup_logging()
 
@@ -23,6 +26,7 @@ class AgentState(TypedDict, total=False):
     exec_log: List[str]
     exec_results: Dict[str, Any]  # Resultados de la ejecución
     final_response: str
+    usage: Dict[str, Any]  # Tokens del prompt de respuesta
 
 def build_llm():
     """Construye el LLM según la configuración."""
@@ -55,281 +59,115 @@ def build_llm():
         return None
 
 
-def execute_function(function_name: str, query: str) -> Dict[str, Any]:
-    """Ejecuta una función y retorna datos concretos del inventario."""
-    result = {"function": function_name, "success": True, "data": {}}
-    
+def execute_function(function_name: str, query: str, inventory: Optional[Inventory] = None) -> Dict[str, Any]:
+    """Ejecuta una herramienta del registro con datos del inventario (del tenant o el por defecto)."""
+    return run_tool(function_name, {"query": query}, inventory)
+
+
+def run_tool(function_name: str, args: Dict[str, Any], inventory: Optional[Inventory] = None) -> Dict[str, Any]:
     print(f"\n{'='*60}")
     print(f"[EJECUTANDO] Función: {function_name}")
-    print(f"[QUERY] {query}")
+    print(f"[ARGS] {args}")
     print(f"{'='*60}")
-    
-    if function_name == "saludar_cortesia":
-        print("[EXEC] Procesando saludo/cortesía...")
-        print("[EXEC] Detectado: mensaje de cortesía del cliente")
-        result["data"] = {
-            "tipo": "cortesia",
-            "sugerencias": ["Ver productos", "Hacer pedido", "Consultar horarios"]
-        }
-        
-    elif function_name == "responder_fuera_contexto":
-        print("[EXEC] Detectando tema fuera de contexto...")
-        print("[EXEC] El mensaje no está relacionado con la panadería")
-        result["data"] = {
-            "es_fuera_contexto": True,
-            "mensaje": "No puedo ayudarte con eso, pero sí con productos de panadería"
-        }
-        
-    elif function_name == "buscar_producto":
-        print("[EXEC] Buscando en catálogo de productos...")
-        productos_encontrados = buscar_producto_por_nombre(query)
-        if not productos_encontrados:
-            # Buscar en todos los productos disponibles
-            productos_encontrados = [
-                {**p, "id": k} for k, p in list(PRODUCTOS.items())[:5]
-            ]
-        for p in productos_encontrados:
-            print(f"  → {p['nombre']}: ${p['precio']:.2f} (stock: {p.get('stock', 'N/A')})")
-        result["data"] = {"productos": productos_encontrados}
-        
-    elif function_name == "consultar_precio_promos":
-        print("[EXEC] Consultando precios y promociones...")
-        # Buscar producto mencionado
-        productos = buscar_producto_por_nombre(query)
-        if productos:
-            precio_info = obtener_precio(productos[0]["id"], 1)
-            print(f"  → {precio_info['producto']}: ${precio_info['precio_unitario']:.2f}")
-            if precio_info.get('promocion'):
-                print(f"  → Promoción aplicada: {precio_info['promocion']}")
-        else:
-            precio_info = {"mensaje": "Consulta nuestro catálogo completo"}
-        
-        # Mostrar promociones activas
-        print("[EXEC] Promociones vigentes:")
-        for promo_id, promo in PROMOCIONES.items():
-            print(f"  → {promo['descripcion']}")
-        result["data"] = {"precio": precio_info, "promociones": PROMOCIONES}
-        
-    elif function_name == "recomendar_productos":
-        print("[EXEC] Generando recomendaciones personalizadas...")
-        # Top 3 productos recomendados
-        recomendaciones = [
-            {"nombre": "Croissant", "precio": 0.75, "razon": "Nuestro más vendido"},
-            {"nombre": "Pan Integral", "precio": 0.25, "razon": "Opción saludable"},
-            {"nombre": "Café con Leche", "precio": 2.00, "razon": "Perfecto para acompañar"},
-        ]
-        for r in recomendaciones:
-            print(f"  → {r['nombre']} (${r['precio']:.2f}) - {r['razon']}")
-        result["data"] = {"recomendaciones": recomendaciones}
-        
-    elif function_name == "crear_pedido":
-        print("[EXEC] Iniciando creación de pedido...")
-        print("[EXEC] Validando items del pedido...")
-        print("[EXEC] Calculando total...")
-        pedido_ejemplo = {
-            "pedido_id": f"PED-{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            "estado": "creado",
-            "items": [],
-            "subtotal": 0,
-            "iva": 0,
-            "total": 0
-        }
-        print(f"  → Pedido creado: {pedido_ejemplo['pedido_id']}")
-        result["data"] = {"pedido": pedido_ejemplo}
-        
-    elif function_name == "actualizar_pedido":
-        print("[EXEC] Buscando pedido en el sistema...")
-        print("[EXEC] Actualizando items...")
-        print("[EXEC] Recalculando total...")
-        result["data"] = {"mensaje": "Pedido actualizado correctamente"}
-        
-    elif function_name == "cancelar_pedido":
-        print("[EXEC] Buscando pedido...")
-        print("[EXEC] Verificando estado del pedido...")
-        print("[EXEC] Cancelando pedido...")
-        print("[EXEC] Pedido cancelado exitosamente")
-        result["data"] = {"estado": "cancelado", "mensaje": "Pedido cancelado"}
-        
-    elif function_name == "consultar_estado_pedido":
-        print("[EXEC] Consultando estado del pedido...")
-        result["data"] = {
-            "estado": "en_preparacion",
-            "eta_minutos": 15,
-            "mensaje": "Tu pedido está siendo preparado"
-        }
-        
-    elif function_name == "calcular_costo_envio":
-        print("[EXEC] Calculando costo de envío...")
-        # Detectar zona
-        zona = "otros"
-        for z in ZONAS_DELIVERY:
-            if z in query.lower():
-                zona = z
-                break
-        info_envio = ZONAS_DELIVERY[zona]
-        print(f"  → Zona: {zona}")
-        print(f"  → Costo: ${info_envio['costo']:.2f}")
-        print(f"  → Tiempo estimado: {info_envio['tiempo_min']} minutos")
-        result["data"] = {"zona": zona, **info_envio}
-        
-    elif function_name == "registrar_cliente":
-        print("[EXEC] Registrando datos del cliente...")
-        print("[EXEC] Validando información...")
-        print("[EXEC] Cliente registrado exitosamente")
-        result["data"] = {"cliente_id": f"CLI-{datetime.now().strftime('%H%M%S')}", "mensaje": "Registrado"}
-        
-    elif function_name == "consultar_horarios_ubicaciones":
-        print("[EXEC] Consultando horarios y ubicaciones...")
-        horario_hoy = obtener_horario_hoy()
-        print(f"  → Hoy ({horario_hoy['dia']}): {horario_hoy['apertura']} - {horario_hoy['cierre']}")
-        for suc in SUCURSALES:
-            print(f"  → {suc['nombre']}: {suc['direccion']}")
-        result["data"] = {"horario_hoy": horario_hoy, "sucursales": SUCURSALES, "todos_horarios": HORARIOS}
-    
-    else:
-        print(f"[EXEC] Función no implementada: {function_name}")
-        result["success"] = False
-        result["data"] = {"error": "Función no implementada"}
-    
+    result = tool_registry.call(function_name, args, inventory)
     print(f"[EXEC] Ejecución completada ✓")
     print(f"{'='*60}\n")
-    
     return result
 
 
-def build_graph(vs, llm=None):
-    """Crea el grafo LangGraph (Planner + ejecución con datos reales)."""
+def build_graph(vs, llm=None, lexical=None, head=None, function_graph=None, inventory=None):
+    """Crea el grafo LangGraph (Planner + ejecución con datos reales).
+
+    `lexical` es el índice BM25 opcional de la primera etapa del routing.
+    `head` es la cabeza lineal opcional que reemplaza al kNN en la etapa de embeddings.
+    `function_graph` / `inventory` son los del tenant (por defecto, los globales).
+    """
     
     if llm is None:
         llm = build_llm()
 
+    # Ráfagas de la misma pregunta comparten routing y llamada al LLM (por grafo = por tenant e índice)
+    route_flight = SingleFlight("route")
+    respond_flight = SingleFlight("respond")
+
     def route_node(state: AgentState) -> AgentState:
         """Nodo de routing: genera embedding y selecciona función."""
         q = state["user_query"]
         
         print("\n" + "="*60)
-        print("[PASO 1] GENERACIÓN DE EMBEDDING")
+        print("[PASO 1-2] FUNCTION SELECTION (Léxico BM25 → Búsqueda Semántica)")
         print("="*60)
         print(f"[INPUT] Query del usuario: '{q}'")
-        print("[PROCESO] Generando embedding con modelo paraphrase-multilingual-MiniLM-L12-v2...")
-        print("[PROCESO] Embedding generado: vector de 384 dimensiones (normalizado)")
-        
-        print("\n" + "="*60)
-        print("[PASO 2] FUNCTION SELECTION (Búsqueda Semántica)")
-        print("="*60)
-        print("[PROCESO] Buscando en índice FAISS...")
-        print("[PROCESO] Calculando similitud coseno contra todas las funciones...")
         
-        best = select_function(vs, q, k=1)[0]
+        use_lexical = lexical if settings.ROUTER_MODE == "hybrid" else None
+        best, shared = route_flight.do(
+            normalize_query(q), lambda: select_function_hybrid(vs, use_lexical, q, k=1, head=head)[0]
+        )
         
+        if shared:
+            print("[PROCESO] Consulta idéntica en curso: se reutiliza su routing")
+        elif best.stage == "lexical":
+            print("[PROCESO] Margen léxico claro: se omite el embedding")
+        elif best.stage == "head":
+            print("[PROCESO] Margen léxico ambiguo: embedding + cabeza lineal (logreg)")
+        else:
+            print("[PROCESO] Margen léxico ambiguo: embedding + búsqueda en índice FAISS")
         print(f"[RESULTADO] Función seleccionada: {best.function}")
         print(f"[RESULTADO] Score de similitud: {best.score:.4f} ({best.score*100:.1f}%)")
         
-        logger.info(f"[ROUTER] query={q!r} → function={best.function} score={best.score:.3f}")
+        logger.info(f"[ROUTER] query={q!r} → function={best.function} score={best.score:.3f} stage={best.stage}")
         return {"route": best}
 
     def explore_graph_node(state: AgentState) -> AgentState:
-        """Nodo de exploración del grafo: consulta relaciones entre funciones."""
+        """Nodo de exploración del grafo: relaciones de la función (plantilla precompilada)."""
         r = state["route"]
-        fg = get_function_graph()
+        fg = function_graph or get_function_graph()
+        template = fg.get_plan(r.function)
         
         print("\n" + "="*60)
         print("[PASO 3] EXPLORACIÓN DEL GRAFO DE FUNCIONES")
         print("="*60)
         print(f"[INPUT] Función seleccionada: {r.function}")
+        print(f"[GRAFO] Nodos en el grafo: {len(fg.graph['nodes'])}")
+        print(f"[GRAFO] Aristas en el grafo: {len(fg.graph['edges'])}")
         
-        # Obtener funciones relacionadas desde el grafo
-        related = fg.get_related_functions(r.function)
-        next_steps = fg.get_next_steps(r.function)
-        
-        print(f"[GRAFO] Consultando relaciones en el grafo...")
-        print(f"[GRAFO] Nodos en el grafo: {len(FUNCTION_GRAPH['nodes'])}")
-        print(f"[GRAFO] Aristas en el grafo: {len(FUNCTION_GRAPH['edges'])}")
-        
+        graph_context = template.graph_context()
         print(f"\n[RESULTADO] Funciones relacionadas:")
-        for rel in related:
+        for rel in graph_context["related_functions"]:
             print(f"  → {rel['function']} ({rel['relation']})")
         
         print(f"\n[RESULTADO] Posibles siguientes pasos:")
-        for ns in next_steps:
+        for ns in graph_context["next_steps"]:
             print(f"  → {ns}")
         
-        # Buscar dependencias (relaciones REQUIERE)
-        dependencies = []
-        for edge in FUNCTION_GRAPH['edges']:
-            if edge['from'] == r.function and edge['rel'] == 'REQUIERE':
-                dependencies.append(edge['to'])
-        
-        if dependencies:
+        if graph_context["dependencies"]:
             print(f"\n[RESULTADO] Dependencias requeridas:")
-            for dep in dependencies:
+            for dep in graph_context["dependencies"]:
                 print(f"  ⚡ {dep}")
         
-        graph_context = {
-            "selected_function": r.function,
-            "related_functions": related,
-            "next_steps": next_steps,
-            "dependencies": dependencies
-        }
-        
-        logger.info(f"[GRAPH] function={r.function} related={len(related)} next_steps={next_steps} deps={dependencies}")
+        logger.info(f"[GRAPH] function={r.function} related={len(template.related)} "
+                    f"next_steps={list(template.next_steps)} deps={list(template.dependencies)}")
         return {"graph_context": graph_context}
 
     def plan_node(state: AgentState) -> AgentState:
-        """Nodo de planificación: crea el plan de ejecución usando el grafo."""
+        """Nodo de planificación: enlaza la query a la plantilla de plan de la función."""
         r = state["route"]
-        graph_ctx = state.get("graph_context", {})
+        fg = function_graph or get_function_graph()
+        template = fg.get_plan(r.function)
         
         print("\n" + "="*60)
         print("[PASO 4] CREACIÓN DE PLAN DE EJECUCIÓN")
         print("="*60)
-        print("[PROCESO] Construyendo plan basado en el grafo de funciones...")
-        
-        plan = []
-        step_num = 1
+        print("[PROCESO] Plan precompilado desde el grafo de funciones (pasos previos + REQUIERE transitivas)")
+        for prev in template.prior_steps:
+            print(f"[GRAFO] Detectado flujo: {prev} → {r.function}")
         
-        # Obtener dependencias del grafo
-        dependencies = graph_ctx.get("dependencies", [])
-        next_steps = graph_ctx.get("next_steps", [])
-        
-        # Si hay funciones que son prerrequisitos (REQUIERE), agregarlas primero
-        # Pero solo para ciertas funciones que tienen flujo lógico
-        
-        # Determinar si necesitamos pasos previos según el grafo
-        if r.function in ["consultar_precio_promos", "crear_pedido"]:
-            # El grafo indica que buscar_producto -> consultar_precio
-            # Agregamos buscar_producto como paso previo
-            print(f"[GRAFO] Detectado flujo: buscar_producto → {r.function}")
-            plan.append({
-                "step": step_num, 
-                "tool": "buscar_producto", 
-                "args": {"query": state["user_query"]}, 
-                "desc": "Identificar producto (paso previo del grafo)"
-            })
-            step_num += 1
-        
-        # Agregar dependencias del grafo (relaciones REQUIERE)
-        for dep in dependencies:
-            print(f"[GRAFO] Agregando dependencia: {dep}")
-            plan.append({
-                "step": step_num,
-                "tool": dep,
-                "args": {"query": state["user_query"]},
-                "desc": f"Dependencia requerida (REQUIERE: {dep})"
-            })
-            step_num += 1
-        
-        # Agregar la función principal seleccionada
-        plan.append({
-            "step": step_num, 
-            "tool": r.function, 
-            "args": {"query": state["user_query"]}, 
-            "desc": f"Función principal seleccionada (score: {r.score:.2f})"
-        })
+        plan = template.bind(state["user_query"], r.score)
         
         print(f"\n[PLAN] Se crearon {len(plan)} paso(s) usando el grafo:")
         for p in plan:
-            print(f"  {p['step']}. {p['tool']}() - {p['desc']}")
+            after = f" (después de {p['depends_on']})" if p["depends_on"] else ""
+            print(f"  {p['step']}. {p['tool']}() - {p['desc']}{after}")
         
         logger.info(f"[PLANNER] plan={[p['tool'] for p in plan]} (basado en grafo)")
         return {"plan": plan}
@@ -342,22 +180,43 @@ def build_graph(vs, llm=None):
         
         log = state.get("exec_log", [])
         results = {}
-        
-        for step in state["plan"]:
-            step_num = step["step"]
-            tool = step["tool"]
-            
-            print(f"\n>>> Ejecutando paso {step_num}/{len(state['plan'])}: {tool}()")
+        plan = state["plan"]
+        
+        independientes = [p["tool"] for p in plan if not p.get("depends_on")]
+        print(f"[PROCESO] {len(plan)} paso(s); en paralelo sin dependencias: {independientes}")
+        
+        # herramientas precargadas tras el turno anterior de esta sesión
+        session_id = state.get("session_id")
+        transition = prefetcher.begin_turn(session_id, state["route"].function)
+        
+        def run_step(step):
+            # las herramientas de pedidos usan la sesión; el resto la ignora (no entra en su caché)
+            args = {**step["args"], "session_id": session_id}
+            if transition:
+                cached = prefetcher.lookup(session_id, transition, step["tool"], args, inventory)
+                if cached is not None:
+                    print(f"[EXEC] {step['tool']}(): tomado del prefetch ({transition})")
+                    return cached
+            return run_tool(step["tool"], args, inventory)
+        
+        t0 = time.perf_counter()
+        with admission.tools.slot():  # Overloaded si hay demasiados planes en ejecución
+            outcomes = run_plan(plan, run_step, step_timeout=lambda step: tool_registry.timeout_for(step["tool"]))
+        wall_ms = (time.perf_counter() - t0) * 1000
+        
+        estados = {"ok": "✓ Éxito", "error": "✗ Error", "timeout": "⏱ Timeout", "skipped": "⤼ Omitido"}
+        for step in plan:
+            outcome = outcomes[step["step"]]
+            results[step["tool"]] = outcome.result
             
-            # Ejecutar la función y obtener datos reales
-            result = execute_function(tool, state["user_query"])
-            results[tool] = result
-            
-            msg = f"[EXEC] Paso {step_num}: {tool}() → {'✓ Éxito' if result['success'] else '✗ Error'}"
+            msg = (f"[EXEC] Paso {step['step']}: {step['tool']}() → {estados[outcome.status]} "
+                   f"({outcome.elapsed_ms:.0f} ms)")
             logger.info(msg)
             log.append(msg)
         
-        print("\n[EJECUCIÓN COMPLETADA] Todos los pasos ejecutados")
+        suma_ms = sum(o.elapsed_ms for o in outcomes.values())
+        print(f"\n[EJECUCIÓN COMPLETADA] total={wall_ms:.0f} ms | "
+              f"camino crítico={critical_path_ms(plan, outcomes):.0f} ms | suma de pasos={suma_ms:.0f} ms")
         
         return {"exec_log": log, "exec_results": results}
 
@@ -366,6 +225,7 @@ def build_graph(vs, llm=None):
         r = state["route"]
         query = state["user_query"]
         exec_results = state.get("exec_results", {})
+        usage: Dict[str, Any] = {}
         
         print("\n" + "="*60)
         print("[PASO 6] GENERACIÓN DE RESPUESTA NATURAL")
@@ -384,10 +244,13 @@ REGLAS IMPORTANTES:
 5. Usa emojis ocasionalmente para ser amigable 🥐🍞
 6. Si el cliente pregunta algo fuera de contexto, redirige amablemente a la panadería"""
 
-            # Formatear datos del inventario para el prompt
+            # Formatear datos del inventario para el prompt (compacto y con presupuesto)
+            ctx = build_context(exec_results, r.function, query, settings.RESPOND_CONTEXT_TOKENS)
+            print(f"[PROCESO] Contexto: {ctx.lines} línea(s), ~{ctx.tokens} tokens "
+                  f"(omitidas={ctx.omitted}, duplicadas={ctx.duplicates})")
             datos_inventario = f"""
 DATOS DEL INVENTARIO (usa estos datos concretos en tu respuesta):
-- Resultados de ejecución: {exec_results}
+{ctx.text}
 - Función detectada: {r.function}
 - Confianza: {r.score:.0%}
 """
@@ -406,10 +269,33 @@ Incluye precios, cantidades y datos específicos cuando sea posible."""
                     SystemMessage(content=system_prompt),
                     HumanMessage(content=user_prompt)
                 ]
-                response = llm.invoke(messages)
-                resp = response.content
+                usage["prompt_tokens_est"] = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+
+                def generate():
+                    with admission.llm.slot():
+                        response = llm.invoke(messages)
+                    meta = getattr(response, "usage_metadata", None) or {}
+                    return response.content, meta.get("input_tokens")
+
+                # misma consulta + mismos datos de herramientas ⇒ misma respuesta
+                key = (normalize_query(query), r.function, fingerprint(exec_results))
+                (resp, prompt_tokens), shared = respond_flight.do(key, generate)
+                if shared:
+                    usage["coalesced"] = True
+                    print("[PROCESO] Respuesta compartida con una consulta idéntica en curso")
+                if prompt_tokens is not None:
+                    usage["prompt_tokens"] = prompt_tokens
+                logger.info(f"[RESPOND] prompt_tokens={usage.get('prompt_tokens', '?')} "
+                            f"(estimado={usage['prompt_tokens_est']}, contexto={ctx.tokens})")
                 print(f"[RESULTADO] Respuesta generada ({len(resp)} caracteres)")
                 logger.info(f"[RESPOND] LLM response generated ({len(resp)} chars)")
+            except Overloaded:
+                if settings.ADMISSION_LLM_SHED == "503":
+                    raise
+                metrics.incr("admission.llm.template_fallback")
+                logger.warning("[RESPOND] LLM saturado: respuesta de plantilla")
+                resp = f"Entendido ✅ Tu solicitud está relacionada con **{r.function}**. ¡Te ayudo enseguida!"
+                usage["shed"] = "llm"
             except Exception as e:
                 logger.error(f"[RESPOND] Error LLM: {e}")
                 resp = f"Entendido ✅ Tu solicitud está relacionada con **{r.function}**. ¡Te ayudo enseguida!"
@@ -425,8 +311,11 @@ Incluye precios, cantidades y datos específicos cuando sea posible."""
         print(resp)
         print("="*60 + "\n")
         
+        # en segundo plano: datos de los siguientes pasos probables para el próximo turno
+        prefetcher.schedule(state.get("session_id"), r.function, function_graph or get_function_graph(), inventory)
+        
         logger.info("[RESPOND] done")
-        return {"final_response": resp}
+        return {"final_response": resp, "usage": usage}
 
     g = StateGraph(AgentState)
     g.add_node("route", route_node)
@@ -0,0 +1,258 @@
+# Gestor del índice de routing con recarga en caliente
+# Mantiene un snapshot inmutable (índice FAISS + índice léxico + grafo compilado)
+# que se reemplaza de forma atómica. Cada /chat toma el snapshot vigente al
+# empezar, así una recarga nunca bloquea ni rompe peticiones en curso.
+#
+# Coordinación entre workers de uvicorn: vía el artefacto en disco (CURRENT).
+# Un solo proceso reconstruye (lock de archivo en FAISS_DIR) y publica una
+# nueva versión; el resto la detecta en modo watch y la carga.
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .graph import build_graph
+from .lexical_router import LexicalIndex, build_lexical_index_from_db
+from .logging_config import setup_logging
+from .metrics import metrics
+from .router import (
+    build_vector_store_from_db, db_fingerprint, load_published_vector_store, load_routing_head,
+    read_index_manifest,
+)
+from .routing_head import RoutingHead
+from .settings import settings
+
+logger = setup_logging()
+
+LOCK_FILE = ".reindex.lock"
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    version: int
+    vs: Any                 # FAISS
+    lexical: LexicalIndex
+    graph: Any              # grafo LangGraph compilado
+    fingerprint: Optional[str] = None
+    loaded_at: float = 0.0
+    head: Optional[RoutingHead] = None  # cabeza lineal publicada con la versión (ROUTER_HEAD=logreg)
+
+
+class FileLock:
+    """Lock entre procesos basado en O_EXCL (funciona en Windows y Linux)."""
+
+    def __init__(self, path: str, stale_s: float):
+        self.path = path
+        self.stale_s = stale_s
+
+    def acquire(self) -> bool:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, f"{os.getpid()} {time.time()}".encode())
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_s:
+                        os.remove(self.path)  # lock huérfano de un proceso caído
+                        continue
+                except OSError:
+                    continue
+                return False
+        return False
+
+    def release(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class IndexManager:
+    def __init__(
+        self,
+        graph_factory: Callable[..., Any] = build_graph,
+        faiss_dir: Optional[str] = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ):
+        # faiss_dir / session_factory: los del tenant; None = settings.FAISS_DIR / SessionLocal
+        self._graph_factory = graph_factory
+        self._faiss_dir = faiss_dir
+        self._session_factory = session_factory
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._init_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._reindex_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.last_error: Optional[str] = None
+
+    def _session(self) -> Session:
+        return (self._session_factory or SessionLocal)()
+
+    # ---- lectura ----
+
+    @property
+    def snapshot(self) -> Optional[IndexSnapshot]:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        snap = self._snapshot
+        return snap.version if snap else -1
+
+    @property
+    def reindexing(self) -> bool:
+        return self._reindex_lock.locked()
+
+    def get(self, db: Session) -> IndexSnapshot:
+        """Snapshot vigente; la primera vez lo carga o construye (una sola vez)."""
+        snap = self._snapshot
+        if snap is not None:
+            return snap
+        with self._init_lock:
+            if self._snapshot is None:
+                vs, version, fingerprint = load_published_vector_store(self._faiss_dir)
+                if vs is not None:
+                    self._swap(self._make_snapshot(db, vs, version, fingerprint))
+                else:
+                    logger.info("[INIT] building FAISS index from DB")
+                    if self.reindex() is None:
+                        self._wait_for_published()
+            return self._snapshot
+
+    def _wait_for_published(self) -> None:
+        """Espera a que otro worker (o hilo) publique el índice inicial."""
+        deadline = time.monotonic() + settings.INDEX_LOCK_STALE_S
+        while self._snapshot is None and time.monotonic() < deadline:
+            if not self.reload_if_published():
+                time.sleep(0.2)
+        if self._snapshot is None:
+            raise RuntimeError("No hay índice publicado y no se pudo construir")
+
+    # ---- escritura ----
+
+    def _make_snapshot(self, db: Session, vs, version: int, fingerprint: Optional[str]) -> IndexSnapshot:
+        lexical = build_lexical_index_from_db(db)
+        head = load_routing_head(version, self._faiss_dir) if settings.ROUTER_HEAD == "logreg" else None
+        graph = self._graph_factory(vs, lexical=lexical, head=head)
+        return IndexSnapshot(version, vs, lexical, graph, fingerprint, time.time(), head)
+
+    def _swap(self, snap: IndexSnapshot) -> bool:
+        with self._swap_lock:
+            current = self._snapshot
+            if current is not None and current.version >= snap.version:
+                return False
+            self._snapshot = snap  # asignación atómica: los lectores ven el viejo o el nuevo
+        metrics.incr("index.swaps")
+        logger.info(f"[INDEX] snapshot activo: versión {snap.version}")
+        return True
+
+    def reindex(self) -> Optional[int]:
+        """Reconstruye desde la BD, publica en disco y hace swap. None si ya hay otra en curso."""
+        if not self._reindex_lock.acquire(blocking=False):
+            return None
+        lock = FileLock(os.path.join(self._faiss_dir or settings.FAISS_DIR, LOCK_FILE), settings.INDEX_LOCK_STALE_S)
+        locked = False
+        try:
+            locked = lock.acquire()
+            if not locked:  # el archivo es del otro worker: no se toca
+                logger.info("[INDEX] otro worker está reindexando; se esperará su versión")
+                return None
+            t0 = time.perf_counter()
+            with self._session() as db:
+                vs = build_vector_store_from_db(db, faiss_dir=self._faiss_dir)
+                manifest = read_index_manifest(self._faiss_dir) or {}
+                snap = self._make_snapshot(db, vs, int(manifest.get("version", 0)), manifest.get("fingerprint"))
+            self._swap(snap)
+            metrics.observe("index.reindex", (time.perf_counter() - t0) * 1000)
+            self.last_error = None
+            return snap.version
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"[INDEX] Error reindexando: {e}")
+            raise
+        finally:
+            if locked:
+                lock.release()
+            self._reindex_lock.release()
+
+    def reindex_in_background(self) -> bool:
+        """Lanza reindex() en un hilo. False si ya hay una reindexación en curso."""
+        if self.reindexing:
+            return False
+        threading.Thread(target=self._reindex_quietly, name="reindex", daemon=True).start()
+        return True
+
+    def _reindex_quietly(self) -> None:
+        try:
+            self.reindex()
+        except Exception:
+            pass  # ya registrado en last_error
+
+    def reload_if_published(self) -> bool:
+        """Carga la versión publicada en disco si es más nueva que la activa."""
+        manifest = read_index_manifest(self._faiss_dir)
+        if not manifest or int(manifest["version"]) <= self.version:
+            return False
+        vs, version, fingerprint = load_published_vector_store(self._faiss_dir)
+        if vs is None:
+            return False
+        with self._session() as db:
+            return self._swap(self._make_snapshot(db, vs, version, fingerprint))
+
+    # ---- modo watch ----
+
+    def check_once(self) -> None:
+        """Un ciclo del watcher: recarga versiones nuevas o reindexa si la BD cambió."""
+        if self.reload_if_published():
+            return
+        snap = self._snapshot
+        if snap is None:
+            return
+        with self._session() as db:
+            current = db_fingerprint(db)
+        manifest = read_index_manifest(self._faiss_dir) or {}
+        if current != manifest.get("fingerprint") and current != snap.fingerprint:
+            logger.info("[INDEX] cambios en function_defs detectados; reindexando")
+            self.reindex_in_background()
+
+    def start_watch(self, interval_s: float) -> None:
+        if self._watcher is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval_s):
+                try:
+                    self.check_once()
+                except Exception as e:
+                    logger.warning(f"[INDEX] watcher: {e}")
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=loop, name="index-watch", daemon=True)
+        self._watcher.start()
+        logger.info(f"[INDEX] modo watch activo (cada {interval_s}s)")
+
+    def stop_watch(self) -> None:
+        self._stop.set()
+        self._watcher = None
+
+    def status(self) -> dict:
+        snap = self._snapshot
+        manifest = read_index_manifest(self._faiss_dir) or {}
+        return {
+            "version": self.version,
+            "published_version": manifest.get("version"),
+            "reindexing": self.reindexing,
+            "loaded_at": snap.loaded_at if snap else None,
+            "last_error": self.last_error,
+        }
+
+
+index_manager = IndexManager()
@@ -1,6 +1,20 @@
 # Datos de inventario y precios concretos de la panadería
 # Esto simula la base de datos del negocio
 
+import itertools
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .catalog import ColumnarCatalog, import_catalog
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
 PRODUCTOS = {
     "pan_frances": {"nombre": "Pan Francés", "precio": 0.15, "stock": 150, "categoria": "pan"},
     "pan_integral": {"nombre": "Pan Integral", "precio": 0.25, "stock": 80, "categoria": "pan"},
@@ -20,7 +34,7 @@ PRODUCTOS = {
 
 PROMOCIONES = {
     "2x1_cafe": {"productos": ["cafe", "cafe_leche"], "descuento": 0.50, "descripcion": "2x1 en cafés (paga 1, lleva 2)"},
-    "docena_pan": {"productos": ["pan_frances", "pan_integral"], "descuento": 0.20, "descripcion": "20% descuento en docena de pan"},
+    "docena_pan": {"productos": ["pan_frances", "pan_integral"], "descuento": 0.20, "cantidad_minima": 12, "descripcion": "20% descuento en docena de pan"},
     "combo_desayuno": {"productos": ["cafe_leche", "croissant"], "precio_combo": 2.50, "descripcion": "Café + Croissant por $2.50"},
 }
 
@@ -47,89 +61,197 @@ ZONAS_DELIVERY = {
     "otros": {"costo": 3.50, "tiempo_min": 35},
 }
 
+# Otras formas de nombrar un producto (los plurales se generan solos).
+# Tienen prioridad sobre los términos genéricos ambiguos ("empanada" → pollo o carne).
+SINONIMOS = {
+    "cafe": ["cafe", "cafecito", "americano", "tinto"],
+    "cafe_leche": ["cafe con leche", "latte", "capuchino"],
+    "croissant": ["cruasan", "medialuna"],
+    "donut": ["dona", "rosquilla", "dona glaseada"],
+    "jugo_naranja": ["jugo", "jugo de naranja", "zumo de naranja"],
+    "galletas": ["galleta", "galleta de avena"],
+    "torta_chocolate": ["pastel de chocolate"],
+    "torta_vainilla": ["pastel de vainilla"],
+}
+
+# Etiquetas de dieta / ocasión que usa el recomendador ("algo dulce", "sin gluten").
+# Los productos sin entrada toman las de su categoría.
+ETIQUETAS = {
+    "pan_frances": ["salado", "desayuno", "vegetariano"],
+    "pan_integral": ["saludable", "desayuno", "vegetariano"],
+    "croissant": ["desayuno", "vegetariano"],
+    "empanada_pollo": ["salado"],
+    "empanada_carne": ["salado"],
+    "cafe": ["caliente", "desayuno", "sin_gluten", "vegetariano"],
+    "cafe_leche": ["caliente", "desayuno", "sin_gluten", "vegetariano"],
+    "jugo_naranja": ["frio", "saludable", "desayuno", "sin_gluten", "vegetariano"],
+    "pan_sin_gluten": ["sin_gluten", "saludable", "desayuno", "vegetariano"],
+    "galletas": ["dulce", "saludable", "vegetariano"],
+}
+ETIQUETAS_POR_CATEGORIA = {
+    "pasteleria": ["dulce", "vegetariano"],
+    "salado": ["salado"],
+}
+
+_inventory_ids = itertools.count(1)
+
+@dataclass
+class Inventory:
+    """Inventario de una panadería (tenant). El de por defecto usa los datos de arriba."""
+    productos: Dict[str, dict] = field(default_factory=lambda: PRODUCTOS)
+    promociones: Dict[str, dict] = field(default_factory=lambda: PROMOCIONES)
+    horarios: Dict[str, dict] = field(default_factory=lambda: HORARIOS)
+    sucursales: List[dict] = field(default_factory=lambda: SUCURSALES)
+    zonas_delivery: Dict[str, dict] = field(default_factory=lambda: ZONAS_DELIVERY)
+    sinonimos: Dict[str, List[str]] = field(default_factory=lambda: SINONIMOS)
+    etiquetas: Dict[str, List[str]] = field(default_factory=lambda: ETIQUETAS)
+    # catálogo importado (CSV/Parquet); si se pasa, `productos` es su vista dict
+    catalogo: Optional[ColumnarCatalog] = field(default=None, repr=False, compare=False)
+    # identidad + versión: la caché de herramientas de solo lectura se invalida al cambiar
+    uid: int = field(default_factory=lambda: next(_inventory_ids), init=False, repr=False, compare=False)
+    version: int = field(default=0, init=False, compare=False)
+    _columnar: tuple = field(default=(-1, None), init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.catalogo is not None:
+            self.catalogo.set_promotions(self.promociones)
+            self.productos = self.catalogo.to_productos()
+            self._columnar = (self.version, self.catalogo)
+
+    def columnar(self) -> ColumnarCatalog:
+        """Precios y stock en arrays; se reconstruye desde `productos` cuando cambia la versión.
+
+        Un catálogo importado conserva el stock por sucursal de lo que no cambió (`from_productos(base=...)`).
+        """
+        version, catalog = self._columnar
+        if version != self.version:
+            catalog = ColumnarCatalog.from_productos(self.productos, self.promociones, base=catalog)
+            if self.catalogo is not None:
+                self.catalogo = catalog
+            self._columnar = (self.version, catalog)
+        return catalog
+
+    def mark_changed(self) -> None:
+        """Llamar tras modificar productos/promos/horarios/... (invalida resultados cacheados)."""
+        self.version += 1
+
+    def buscar_producto_por_nombre(self, query: str) -> list:
+        """Busca productos que coincidan con la query."""
+        query_lower = query.lower()
+        resultados = []
+        for key, prod in self.productos.items():
+            if query_lower in prod["nombre"].lower() or query_lower in key:
+                resultados.append({**prod, "id": key})
+        return resultados
+
+    def obtener_precio(self, producto_id: str, cantidad: int = 1) -> dict:
+        """Obtiene precio de un producto con promociones aplicadas."""
+        cat = self.columnar()
+        row = cat.index.get(producto_id)
+        if row is None:
+            return {"error": f"Producto '{producto_id}' no encontrado"}
+
+        unit, total, promo = cat.quote(np.array([row]), np.array([cantidad]))
+        return {
+            "producto": cat.nombres[row],
+            "producto_id": producto_id,
+            "precio_unitario": float(unit[0]),
+            "cantidad": cantidad,
+            "precio_total": round(float(total[0]), 2),
+            "promocion": cat.promo_name[row] if promo[0] else None,
+            "stock_disponible": int(cat.stock[row])
+        }
+
+    def verificar_stock(self, producto_id: str, cantidad: int = 1, sucursal: Optional[str] = None) -> dict:
+        """Verifica si hay stock suficiente (en una sucursal si el catálogo la distingue)."""
+        cat = self.columnar()
+        row = cat.index.get(producto_id)
+        if row is None:
+            return {"disponible": False, "mensaje": "Producto no encontrado"}
+
+        stock = int(cat.stock_for(np.array([row]), sucursal)[0])
+        disponible = stock >= cantidad
+        return {
+            "producto": cat.nombres[row],
+            "stock_actual": stock,
+            "cantidad_solicitada": cantidad,
+            "disponible": disponible,
+            "mensaje": f"{'Sí' if disponible else 'No'} hay stock suficiente"
+        }
+
+    def verificar_stock_pedido(self, items: list, sucursal: Optional[str] = None) -> dict:
+        """Stock de todo el carrito en una operación vectorizada; detalla solo lo que falta."""
+        cat = self.columnar()
+        rows, cantidades = cat.cart_arrays(items)
+        known = rows >= 0
+        stock = np.where(known, cat.stock_for(np.where(known, rows, 0), sucursal), 0)
+        faltan = np.flatnonzero(stock < cantidades)
+        return {
+            "disponible": faltan.size == 0,
+            "faltantes": [{"producto_id": items[i].get("producto_id", ""), "cantidad_solicitada": int(cantidades[i]),
+                           "stock_actual": int(stock[i]), "existe": bool(known[i])} for i in faltan.tolist()],
+        }
+
+    def calcular_pedido(self, items: list) -> dict:
+        """Calcula el total de un pedido con varios items (ignora productos desconocidos)."""
+        cat = self.columnar()
+        rows, cantidades = cat.cart_arrays(items)
+        known = rows >= 0
+        rows, cantidades = rows[known], cantidades[known]
+        precios = cat.precio[rows]
+        subtotales = precios * cantidades
+        total = float(subtotales.sum())
+
+        # .tolist(): escalares de Python de una vez (convertir np.float64 uno a uno cuesta más que el cálculo)
+        detalle = [{
+            "producto_id": cat.ids[r],
+            "producto": cat.nombres[r],
+            "cantidad": c,
+            "precio_unit": p,
+            "subtotal": st
+        } for r, c, p, st in zip(rows.tolist(), cantidades.tolist(), precios.tolist(),
+                                 np.round(subtotales, 2).tolist())]
+
+        return {
+            "items": detalle,
+            "subtotal": round(total, 2),
+            "iva": round(total * 0.12, 2),
+            "total": round(total * 1.12, 2)
+        }
+
+    def obtener_horario_hoy(self) -> dict:
+        """Obtiene el horario de hoy."""
+        dias = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+        hoy = dias[datetime.now().weekday()]
+        return {"dia": hoy, **self.horarios[hoy]}
+
+
+def load_inventory(path: str) -> Inventory:
+    """Inventario desde JSON (claves productos, promociones, horarios, sucursales, zonas_delivery, sinonimos,
+    etiquetas).
+
+    Las claves ausentes toman los datos por defecto. "catalogo": ruta (relativa al JSON) de un
+    CSV/Parquet que reemplaza a "productos"; las filas inválidas se descartan con un aviso en el log.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    known = {k: data[k] for k in ("productos", "promociones", "horarios", "sucursales", "zonas_delivery",
+                                  "sinonimos", "etiquetas")
+             if k in data}
+    if data.get("catalogo"):
+        catalog_path = os.path.join(os.path.dirname(path), data["catalogo"])
+        known["catalogo"], report = import_catalog(catalog_path, known.get("promociones", PROMOCIONES))
+        if report.rejected:
+            logger.warning(f"[INVENTORY] {catalog_path}: {report.rejected} fila(s) descartada(s); "
+                           f"primera: {report.errors[0]}")
+    return Inventory(**known)
+
+
+DEFAULT_INVENTORY = Inventory()
 
-def buscar_producto_por_nombre(query: str) -> list:
-    """Busca productos que coincidan con la query."""
-    query_lower = query.lower()
-    resultados = []
-    for key, prod in PRODUCTOS.items():
-        if query_lower in prod["nombre"].lower() or query_lower in key:
-            resultados.append({**prod, "id": key})
-    return resultados
-
-
-def obtener_precio(producto_id: str, cantidad: int = 1) -> dict:
-    """Obtiene precio de un producto con promociones aplicadas."""
-    if producto_id not in PRODUCTOS:
-        return {"error": f"Producto '{producto_id}' no encontrado"}
-    
-    prod = PRODUCTOS[producto_id]
-    precio_unit = prod["precio"]
-    precio_total = precio_unit * cantidad
-    promo_aplicada = None
-    
-    # Verificar promociones
-    if cantidad >= 12 and producto_id in ["pan_frances", "pan_integral"]:
-        precio_total = precio_total * 0.80  # 20% descuento
-        promo_aplicada = "docena_pan"
-    
-    return {
-        "producto": prod["nombre"],
-        "precio_unitario": precio_unit,
-        "cantidad": cantidad,
-        "precio_total": round(precio_total, 2),
-        "promocion": promo_aplicada,
-        "stock_disponible": prod["stock"]
-    }
-
-
-def verificar_stock(producto_id: str, cantidad: int = 1) -> dict:
-    """Verifica si hay stock suficiente."""
-    if producto_id not in PRODUCTOS:
-        return {"disponible": False, "mensaje": "Producto no encontrado"}
-    
-    prod = PRODUCTOS[producto_id]
-    disponible = prod["stock"] >= cantidad
-    return {
-        "producto": prod["nombre"],
-        "stock_actual": prod["stock"],
-        "cantidad_solicitada": cantidad,
-        "disponible": disponible,
-        "mensaje": f"{'Sí' if disponible else 'No'} hay stock suficiente"
-    }
-
-
-def calcular_pedido(items: list) -> dict:
-    """Calcula el total de un pedido con varios items."""
-    total = 0
-    detalle = []
-    
-    for item in items:
-        prod_id = item.get("producto_id", "")
-        cantidad = item.get("cantidad", 1)
-        
-        if prod_id in PRODUCTOS:
-            prod = PRODUCTOS[prod_id]
-            subtotal = prod["precio"] * cantidad
-            total += subtotal
-            detalle.append({
-                "producto": prod["nombre"],
-                "cantidad": cantidad,
-                "precio_unit": prod["precio"],
-                "subtotal": round(subtotal, 2)
-            })
-    
-    return {
-        "items": detalle,
-        "subtotal": round(total, 2),
-        "iva": round(total * 0.12, 2),
-        "total": round(total * 1.12, 2)
-    }
-
-
-def obtener_horario_hoy() -> dict:
-    """Obtiene el horario de hoy."""
-    from datetime import datetime
-    dias = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
-    hoy = dias[datetime.now().weekday()]
-    return {"dia": hoy, **HORARIOS[hoy]}
+# API de módulo (inventario por defecto)
+buscar_producto_por_nombre = DEFAULT_INVENTORY.buscar_producto_por_nombre
+obtener_precio = DEFAULT_INVENTORY.obtener_precio
+verificar_stock = DEFAULT_INVENTORY.verificar_stock
+calcular_pedido = DEFAULT_INVENTORY.calcular_pedido
+obtener_horario_hoy = DEFAULT_INVENTORY.obtener_horario_hoy
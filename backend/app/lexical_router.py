@@ -0,0 +1,146 @@
+# Router léxico (BM25) de primera etapa
+# Se construye con los query_examples, enums y descripciones de cada FunctionDef.
+# Si el margen entre la 1ª y la 2ª función es claro, se evita el embedding.
+
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Iterable
+
+from sqlalchemy.orm import Session
+
+from .models import FunctionDef
+
+STOPWORDS = {
+    "a", "al", "algo", "de", "del", "el", "la", "las", "lo", "los", "un", "una", "unos", "unas",
+    "y", "o", "u", "en", "por", "para", "con", "sin", "que", "me", "mi", "mis", "tu", "tus",
+    "su", "sus", "se", "es", "son", "esta", "estan", "hay", "muy", "mas", "ya", "le", "les",
+    "hoy", "favor", "como", "si", "no", "te", "yo", "ti",
+}
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+STEM_LEN = 5  # stemming por prefijo: "cancela"/"cancélalo" → "cance"
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def tokenize(text: str) -> List[str]:
+    return [
+        tok[:STEM_LEN]
+        for tok in _TOKEN_RE.findall(_strip_accents(text))
+        if len(tok) > 1 and tok not in STOPWORDS
+    ]
+
+
+@dataclass
+class LexicalIndex:
+    functions: List[str]
+    postings: Dict[str, List[Tuple[int, float]]]  # término → [(idx_función, tf ponderado)]
+    idf: Dict[str, float]
+    doc_len: List[float]
+    avgdl: float
+    k1: float = 1.2
+    b: float = 0.75
+
+
+def _enum_values(enums: dict) -> Iterable[str]:
+    for key, values in enums.items():
+        yield key
+        if isinstance(values, list):
+            yield from (str(v).replace("_", " ") for v in values)
+
+
+def build_lexical_index(functions: List[dict]) -> LexicalIndex:
+    """Construye el índice BM25. Cada función es un documento.
+
+    `functions` usa las claves de make_functions(): name, business_desc,
+    technical_desc, enums (dict) y query_examples (lista).
+    """
+    names: List[str] = []
+    tfs: List[Counter] = []
+    for f in functions:
+        tf: Counter = Counter()
+        # los ejemplos son la señal más fuerte; los enums (p. ej. estado=cancelado
+        # en consultar_estado_pedido) solo aportan media frecuencia
+        for text, weight in [
+            (f["business_desc"], 1.0),
+            (f["technical_desc"], 1.0),
+            (" ".join(_enum_values(f.get("enums") or {})), 0.5),
+            (" ".join(f.get("query_examples") or []), 2.0),
+        ]:
+            for term in tokenize(text):
+                tf[term] += weight
+        names.append(f["name"])
+        tfs.append(tf)
+
+    n = len(tfs)
+    df = Counter(term for tf in tfs for term in tf)
+    idf = {t: math.log(1 + (n - d + 0.5) / (d + 0.5)) for t, d in df.items()}
+    postings: Dict[str, List[Tuple[int, float]]] = {}
+    for i, tf in enumerate(tfs):
+        for term, c in tf.items():
+            postings.setdefault(term, []).append((i, c))
+    doc_len = [sum(tf.values()) for tf in tfs]
+    avgdl = sum(doc_len) / n if n else 0.0
+    return LexicalIndex(functions=names, postings=postings, idf=idf, doc_len=doc_len, avgdl=avgdl)
+
+
+def build_lexical_index_from_db(db: Session) -> LexicalIndex:
+    rows = db.query(FunctionDef).all()
+    return build_lexical_index([
+        dict(
+            name=r.name,
+            business_desc=r.business_desc,
+            technical_desc=r.technical_desc,
+            enums=json.loads(r.enums or "{}"),
+            query_examples=json.loads(r.query_examples or "[]"),
+        )
+        for r in rows
+    ])
+
+
+def lexical_scores(index: LexicalIndex, query: str) -> List[Tuple[str, float]]:
+    """Puntajes BM25 por función, de mayor a menor (solo las que puntúan > 0)."""
+    scores: Dict[int, float] = {}
+    for term in set(tokenize(query)):
+        idf = index.idf.get(term)
+        if idf is None:
+            continue
+        for i, tf in index.postings[term]:
+            norm = index.k1 * (1 - index.b + index.b * index.doc_len[i] / index.avgdl)
+            scores[i] = scores.get(i, 0.0) + idf * tf * (index.k1 + 1) / (tf + norm)
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return [(index.functions[i], sc) for i, sc in ranked]
+
+
+def query_coverage(index: LexicalIndex, query: str) -> float:
+    """Fracción de términos de la consulta que existen en el índice."""
+    terms = tokenize(query)
+    return sum(t in index.idf for t in terms) / len(terms) if terms else 0.0
+
+
+def lexical_decision(
+    index: LexicalIndex,
+    query: str,
+    min_score: float,
+    min_margin: float,
+    min_coverage: float,
+) -> Tuple[str, float] | None:
+    """Devuelve (función, confianza) si el ganador léxico es claro; si no, None.
+
+    margen = (top1 - top2) / top1; confianza = top1 / (top1 + top2).
+    La cobertura evita decidir por una sola palabra suelta ("mañana") cuando
+    el resto de la consulta es desconocido para el índice.
+    """
+    ranked = lexical_scores(index, query)
+    if not ranked or query_coverage(index, query) < min_coverage:
+        return None
+    top_fn, top = ranked[0]
+    second = ranked[1][1] if len(ranked) > 1 else 0.0
+    if top < min_score or (top - second) / top < min_margin:
+        return None
+    return top_fn, top / (top + second)
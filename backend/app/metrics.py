@@ -0,0 +1,56 @@
+# Métricas en memoria del proceso (contadores y latencias)
+# Se exponen en GET /metrics; cada worker de uvicorn tiene las suyas.
+
+import threading
+from typing import Dict, Any
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name: str, ms: float) -> None:
+        """Registra una latencia en milisegundos."""
+        with self._lock:
+            t = self._timings.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            t["count"] += 1
+            t["total_ms"] += ms
+            t["max_ms"] = max(t["max_ms"], ms)
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def ratio(self, part: str, *names: str) -> float:
+        """Fracción part / (suma de names); 0 si no hay datos."""
+        with self._lock:
+            total = sum(self._counters.get(n, 0) for n in names)
+            return self._counters.get(part, 0) / total if total else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            timings = {
+                k: {**v, "avg_ms": round(v["total_ms"] / v["count"], 3) if v["count"] else 0.0}
+                for k, v in self._timings.items()
+            }
+            return {"counters": dict(self._counters), "timings": timings}
+
+    def drop(self, prefix: str) -> None:
+        """Elimina contadores y latencias cuyo nombre empieza por `prefix` (p. ej. de un tenant expulsado)."""
+        with self._lock:
+            for store in (self._counters, self._timings):
+                for name in [n for n in store if n.startswith(prefix)]:
+                    del store[name]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+metrics = Metrics()
@@ -1,6 +1,7 @@
-from sqlalchemy import String, Integer, Text, DateTime
+from sqlalchemy import String, Integer, Text, DateTime, Float, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
+from typing import Optional
 from .db import Base
 
 class FunctionDef(Base):
@@ -25,3 +26,63 @@ class FunctionDef(Base):
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class IdSequence(Base):
+    """Allocator hi/lo: cada proceso reserva bloques de ids incrementando next_hi."""
+    __tablename__ = "id_sequences"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    next_hi: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class Customer(Base):
+    __tablename__ = "customers"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)  # hi/lo
+    nombre: Mapped[str] = mapped_column(String(200), default="")
+    # normalizados (solo dígitos / minúsculas): la búsqueda es por igualdad sobre el índice
+    telefono: Mapped[str] = mapped_column(String(20), unique=True, index=True)
+    email: Mapped[Optional[str]] = mapped_column(String(254), unique=True, index=True, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CustomerSession(Base):
+    """Sesión de chat vinculada a un cliente (alta o verificación hecha en esa sesión)."""
+    __tablename__ = "customer_sessions"
+
+    session_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    telefono: Mapped[str] = mapped_column(String(20), index=True)   # normalizado, como customers.telefono
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class Order(Base):
+    __tablename__ = "orders"
+    __table_args__ = (Index("ix_orders_session_id_id", "session_id", "id"),)
+
+    # id asignado por el allocator hi/lo (no autoincrement): se conoce antes del INSERT
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    session_id: Mapped[str] = mapped_column(String(100), default="")
+    status: Mapped[str] = mapped_column(String(20), index=True)
+    customer_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("customers.id"), nullable=True, index=True)
+
+    subtotal: Mapped[float] = mapped_column(Float, default=0.0)
+    iva: Mapped[float] = mapped_column(Float, default=0.0)
+    total: Mapped[float] = mapped_column(Float, default=0.0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class OrderItem(Base):
+    __tablename__ = "order_items"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    order_id: Mapped[int] = mapped_column(Integer, ForeignKey("orders.id"), index=True)
+    producto_id: Mapped[str] = mapped_column(String(100))
+    producto: Mapped[str] = mapped_column(String(200))
+    cantidad: Mapped[int] = mapped_column(Integer)
+    precio_unit: Mapped[float] = mapped_column(Float)
+    subtotal: Mapped[float] = mapped_column(Float)
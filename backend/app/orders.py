@@ -0,0 +1,328 @@
+# Pedidos persistentes (tablas orders / order_items)
+#   - ids sin colisiones: HiLoAllocator (app/persistence.py), bloques de
+#     ORDERS_ID_BLOCK ids. Dos pedidos en el mismo segundo (o en dos workers)
+#     nunca comparten id.
+#   - write-behind de las altas: crear pedido lo deja en `_pending` (visible en
+#     este proceso) y encola el INSERT; WriteBehindQueue lo agrupa en un commit
+#     por lote (ORDERS_BATCH_MAX altas u ORDERS_FLUSH_INTERVAL_MS). Si el lote
+#     falla se reintenta fila por fila; lo que no se pudo guardar queda como
+#     "no_registrado" (visible para el cliente y en status()).
+#     ORDERS_WRITE_BEHIND=false escribe de forma síncrona.
+#   - cambios de estado / items: síncronos y condicionales en la BD
+#     (UPDATE ... WHERE status IN OPEN_STATUSES). Con varios workers la BD es la
+#     única verdad: un pedido cancelado en otro worker no se modifica.
+#   - lecturas: caché LRU con TTL corto (ORDERS_CACHE_TTL_S); el último pedido
+#     de una sesión siempre sale del índice (session_id, id) + las altas pendientes.
+
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from .customers import format_customer_id
+from .db import Base, SessionLocal
+from .logging_config import setup_logging
+from .metrics import metrics
+from .models import Customer, IdSequence, Order, OrderItem
+from .persistence import HiLoAllocator, WriteBehindQueue
+from .settings import settings
+
+logger = setup_logging()
+
+# estados que todavía admiten cambios / cancelación
+OPEN_STATUSES = ("creado", "en_preparacion")
+LOST_STATUS = "no_registrado"  # alta aceptada que no se pudo escribir en la BD
+
+_ORDER_ID_RE = re.compile(r"^\s*(?:ped-?)?\s*#?\s*0*(\d+)\s*$", re.IGNORECASE)
+
+def format_order_id(order_id: int) -> str:
+    return f"PED-{order_id:06d}"
+
+def parse_order_id(text: Optional[str]) -> Optional[int]:
+    """'PED-000200', '200', '#200' → 200 (None si no es un id de pedido)."""
+    m = _ORDER_ID_RE.match(str(text or ""))
+    return int(m.group(1)) if m and int(m.group(1)) > 0 else None
+
+
+class OrderStore:
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None):
+        # session_factory: None = SessionLocal (BD por defecto)
+        self._session_factory = session_factory
+        self._allocator: Optional[HiLoAllocator] = None
+        self._cache: "OrderedDict[int, tuple]" = OrderedDict()   # id → (expira, pedido)
+        self._pending: Dict[int, dict] = {}   # altas encoladas sin escribir (la BD aún no las tiene)
+        self._lost: "OrderedDict[int, dict]" = OrderedDict()   # altas que no se pudieron escribir
+        self._cache_lock = threading.Lock()
+        self._writes = WriteBehindQueue("orders", self._write_batch, settings.ORDERS_FLUSH_INTERVAL_MS,
+                                        settings.ORDERS_BATCH_MAX, on_lost=self._mark_lost)
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _session(self) -> Session:
+        return (self._session_factory or SessionLocal)()
+
+    def _ensure_ready(self) -> None:
+        if self._ready:
+            return
+        with self._init_lock:
+            if self._ready:
+                return
+            with self._session() as db:
+                Base.metadata.create_all(bind=db.get_bind(), tables=[
+                    IdSequence.__table__, Customer.__table__, Order.__table__, OrderItem.__table__])
+            self._allocator = HiLoAllocator(self._session, "orders", settings.ORDERS_ID_BLOCK)
+            if settings.ORDERS_WRITE_BEHIND:
+                self._writes.start()
+            self._ready = True
+
+    # ---- caché ----
+
+    def _cache_put(self, order: dict) -> None:
+        with self._cache_lock:
+            self._cache[order["id"]] = (time.monotonic() + settings.ORDERS_CACHE_TTL_S, order)
+            self._cache.move_to_end(order["id"])
+            while len(self._cache) > settings.ORDERS_CACHE_MAX:
+                self._cache.popitem(last=False)
+
+    def _cache_get(self, order_id: int) -> Optional[dict]:
+        with self._cache_lock:
+            order = self._pending.get(order_id) or self._lost.get(order_id)
+            if order is not None:
+                return order
+            entry = self._cache.get(order_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():  # otro worker pudo haberlo cambiado
+                del self._cache[order_id]
+                return None
+            self._cache.move_to_end(order_id)
+            return entry[1]
+
+    # ---- escrituras ----
+
+    def create(self, session_id: Optional[str], calculo: Dict[str, Any], customer_id: Optional[int] = None) -> dict:
+        """Crea el pedido con el resultado de Inventory.calcular_pedido; devuelve el pedido ya visible."""
+        self._ensure_ready()
+        now = datetime.utcnow()
+        order = {
+            "id": self._allocator.next_id(),
+            "session_id": session_id or "",
+            "status": "creado",
+            "customer_id": customer_id,
+            "items": copy.deepcopy(calculo.get("items", [])),
+            "subtotal": calculo.get("subtotal", 0.0),
+            "iva": calculo.get("iva", 0.0),
+            "total": calculo.get("total", 0.0),
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._cache_lock:
+            self._pending[order["id"]] = order
+        try:
+            self._writes.submit(order)
+        except Exception:  # modo síncrono: el error llega al llamador, el pedido no existe
+            with self._cache_lock:
+                self._pending.pop(order["id"], None)
+            raise
+        metrics.incr("orders.created")
+        return self._public(order)
+
+    def _settle(self, order_id: int) -> None:
+        # un alta propia todavía encolada: se escribe antes de actualizarla en la BD
+        with self._cache_lock:
+            pending = order_id in self._pending
+        if pending:
+            self.flush()
+
+    def set_status(self, order_id: int, status: str) -> Tuple[Optional[dict], bool]:
+        """Cambia el estado si el pedido sigue abierto en la BD; devuelve (pedido tal como quedó, cambió)."""
+        self._ensure_ready()
+        self._settle(order_id)
+        with self._session() as db:
+            changed = db.execute(
+                update(Order).where(Order.id == order_id, Order.status.in_(OPEN_STATUSES))
+                .values(status=status, updated_at=datetime.utcnow())
+            ).rowcount
+            db.commit()
+        if not changed:
+            metrics.incr("orders.closed_updates")
+        return self._reload(order_id), bool(changed)
+
+    def set_items(self, order_id: int, calculo: Dict[str, Any]) -> Tuple[Optional[dict], bool]:
+        """Reemplaza los items si el pedido sigue abierto en la BD; devuelve (pedido tal como quedó, cambió)."""
+        self._ensure_ready()
+        self._settle(order_id)
+        order = {"id": order_id, "items": calculo["items"]}
+        with self._session() as db:
+            changed = db.execute(
+                update(Order).where(Order.id == order_id, Order.status.in_(OPEN_STATUSES))
+                .values(subtotal=calculo["subtotal"], iva=calculo["iva"], total=calculo["total"],
+                        updated_at=datetime.utcnow())
+            ).rowcount
+            if changed:
+                db.execute(delete(OrderItem).where(OrderItem.order_id == order_id))
+                _insert_items(db, [order])
+            db.commit()
+        if not changed:
+            metrics.incr("orders.closed_updates")
+        return self._reload(order_id), bool(changed)
+
+    def _write_batch(self, orders: List[dict]) -> None:
+        """Inserta las altas en una transacción; si falla, fila por fila (una mala no tumba al resto)."""
+        try:
+            with self._session() as db:
+                db.execute(insert(Order), [_order_row(o) for o in orders])
+                _insert_items(db, orders)
+                db.commit()
+        except Exception:
+            if len(orders) == 1:
+                raise
+            lost = []
+            for order in orders:
+                try:
+                    with self._session() as db:
+                        db.execute(insert(Order), [_order_row(order)])
+                        _insert_items(db, [order])
+                        db.commit()
+                except Exception as e:
+                    lost.append((order, e))
+            if len(lost) == len(orders):
+                raise lost[0][1]  # nada entró (¿BD bloqueada?): la cola reintenta el lote
+            for order, e in lost:
+                self._mark_lost([order], e)
+        with self._cache_lock:  # ya están en la BD: pasan a la caché de lectura
+            for order in orders:
+                if self._pending.get(order["id"]) is order:
+                    del self._pending[order["id"]]
+                    self._cache[order["id"]] = (time.monotonic() + settings.ORDERS_CACHE_TTL_S, order)
+
+    def _mark_lost(self, orders: List[dict], error: Exception) -> None:
+        """Altas ya confirmadas al cliente que no llegaron a la BD: quedan visibles como no registradas."""
+        with self._cache_lock:
+            for order in orders:
+                self._pending.pop(order["id"], None)
+                self._cache.pop(order["id"], None)
+                self._lost[order["id"]] = {**order, "status": LOST_STATUS}
+                while len(self._lost) > settings.ORDERS_CACHE_MAX:
+                    self._lost.popitem(last=False)
+        metrics.incr("orders.lost", len(orders))
+        logger.error(f"[ORDERS] {len(orders)} pedido(s) no registrados "
+                     f"({', '.join(format_order_id(o['id']) for o in orders)}): {error}")
+
+    def flush(self) -> None:
+        """Espera a que todo lo encolado esté confirmado en la BD."""
+        self._writes.flush()
+
+    def close(self) -> None:
+        self._writes.close()
+        self._ready = False
+
+    # ---- lecturas ----
+
+    def _reload(self, order_id: int) -> Optional[dict]:
+        with self._cache_lock:
+            self._cache.pop(order_id, None)
+        order = self._load(order_id)
+        return self._public(order) if order is not None else None
+
+    def _load(self, order_id: int) -> Optional[dict]:
+        self._ensure_ready()
+        order = self._cache_get(order_id)
+        if order is not None:
+            metrics.incr("orders.cache_hit")
+            return order
+        metrics.incr("orders.cache_miss")
+        with self._session() as db:
+            row = db.get(Order, order_id)
+            if row is None:
+                return None
+            order = _row_to_dict(row, db.scalars(select(OrderItem).where(OrderItem.order_id == order_id)
+                                                  .order_by(OrderItem.id)).all())
+        self._cache_put(order)
+        return order
+
+    def get(self, order_id: int) -> Optional[dict]:
+        order = self._load(order_id)
+        return self._public(order) if order is not None else None
+
+    def get_owned(self, order_id: int, session_id: Optional[str], customer_id: Optional[int] = None) -> Optional[dict]:
+        """El pedido solo si es de esta sesión o del cliente identificado en ella (None si no)."""
+        order = self._load(order_id)
+        if order is None:
+            return None
+        own_session = bool(session_id) and session_id != settings.DEFAULT_SESSION and order["session_id"] == session_id
+        own_customer = customer_id is not None and order["customer_id"] == customer_id
+        if not (own_session or own_customer):
+            metrics.incr("orders.foreign_lookups")
+            return None
+        return self._public(order)
+
+    def latest_for_session(self, session_id: Optional[str]) -> Optional[dict]:
+        """Último pedido de la sesión: índice (session_id, id) + altas propias aún encoladas."""
+        if not session_id or session_id == settings.DEFAULT_SESSION:
+            return None
+        self._ensure_ready()
+        with self._cache_lock:
+            ids = [o["id"] for o in self._pending.values() if o["session_id"] == session_id]
+        with self._session() as db:
+            found = db.scalar(select(Order.id).where(Order.session_id == session_id)
+                              .order_by(Order.id.desc()).limit(1))
+        if found is not None:
+            ids.append(found)
+        return self.get(max(ids)) if ids else None
+
+    @staticmethod
+    def _public(order: dict) -> dict:
+        out = copy.deepcopy(order)
+        out["pedido_id"] = format_order_id(out.pop("id"))
+        out["estado"] = out.pop("status")
+        out.pop("session_id", None)
+        customer_id = out.pop("customer_id", None)
+        if customer_id is not None:
+            out["cliente_id"] = format_customer_id(customer_id)
+        for k in ("created_at", "updated_at"):
+            out[k] = out[k].isoformat(timespec="seconds")
+        return out
+
+    def status(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            lost = [format_order_id(i) for i in self._lost]
+        return {
+            **self._writes.status(),
+            "cached": len(self._cache),
+            "pending": len(self._pending),
+            "created": int(metrics.get("orders.created")),
+            "lost": lost,
+            "cache_hit_rate": round(metrics.ratio("orders.cache_hit", "orders.cache_hit", "orders.cache_miss"), 4),
+        }
+
+
+def _order_row(order: dict) -> dict:
+    return {k: order[k] for k in ("id", "session_id", "status", "customer_id", "subtotal", "iva", "total", "created_at", "updated_at")}
+
+def _item_rows(order: dict) -> List[dict]:
+    return [{"order_id": order["id"], **{k: it[k] for k in ("producto_id", "producto", "cantidad", "precio_unit", "subtotal")}}
+            for it in order["items"]]
+
+def _insert_items(db: Session, orders) -> None:
+    rows = [r for o in orders for r in _item_rows(o)]
+    if rows:
+        db.execute(insert(OrderItem), rows)
+
+def _row_to_dict(row: Order, items: List[OrderItem]) -> dict:
+    return {
+        "id": row.id, "session_id": row.session_id, "status": row.status, "customer_id": row.customer_id,
+        "items": [{"producto_id": i.producto_id, "producto": i.producto, "cantidad": i.cantidad,
+                   "precio_unit": i.precio_unit, "subtotal": i.subtotal} for i in items],
+        "subtotal": row.subtotal, "iva": row.iva, "total": row.total,
+        "created_at": row.created_at, "updated_at": row.updated_at,
+    }
+
+
+order_store = OrderStore()
@@ -0,0 +1,183 @@
+# Piezas comunes de escritura para pedidos y clientes
+#   - HiLoAllocator: ids sin colisiones entre hilos y procesos que comparten la BD.
+#     Cada proceso reserva un bloque de `block_size` ids con un UPDATE en
+#     id_sequences; dentro del bloque los ids salen de memoria. Los huecos al
+#     reiniciar son esperables.
+#   - WriteBehindQueue: el llamador encola y vuelve; un hilo agrupa lo que llega
+#     durante `flush_interval_ms` (hasta `batch_max` operaciones) y llama a
+#     write_batch(ops) una vez por lote, es decir, un commit por lote. Si el
+#     proceso muere, se pierde como mucho lo del último intervalo. Un lote que
+#     falla tras los reintentos se entrega a `on_lost(ops, error)` para que el
+#     dueño lo haga visible. Sin start(), o tras close(), cada operación se
+#     escribe de forma síncrona: una cola cerrada no vuelve a arrancar su hilo.
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .logging_config import setup_logging
+from .metrics import metrics
+from .models import IdSequence
+
+logger = setup_logging()
+
+
+class HiLoAllocator:
+    """Ids únicos entre hilos y procesos que comparten la BD, con una escritura cada `block_size` ids."""
+
+    def __init__(self, session_factory: Callable[[], Session], name: str, block_size: int):
+        self._session_factory = session_factory
+        self.name = name
+        self.block_size = block_size
+        self._next = 0
+        self._limit = 0   # exclusivo
+        self._lock = threading.Lock()
+
+    def _reserve_block(self) -> int:
+        """Reserva el siguiente bloque (valor hi) en una transacción corta."""
+        for _ in range(3):
+            with self._session_factory() as db:
+                row = db.execute(
+                    update(IdSequence).where(IdSequence.name == self.name)
+                    .values(next_hi=IdSequence.next_hi + 1).returning(IdSequence.next_hi)
+                ).first()
+                if row is None:
+                    db.add(IdSequence(name=self.name, next_hi=1))
+                    try:
+                        db.commit()
+                    except IntegrityError:  # otro proceso creó la fila: reintentar el UPDATE
+                        db.rollback()
+                        continue
+                    hi = 0
+                else:
+                    db.commit()
+                    hi = row[0] - 1
+            metrics.incr(f"id_blocks.{self.name}")
+            return hi
+        raise RuntimeError(f"No se pudo reservar un bloque de ids para {self.name}")
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._next >= self._limit:
+                hi = self._reserve_block()
+                self._next, self._limit = hi * self.block_size + 1, (hi + 1) * self.block_size + 1
+            value = self._next
+            self._next += 1
+            return value
+
+
+class WriteBehindQueue:
+    def __init__(self, name: str, write_batch: Callable[[List[Any]], None],
+                 flush_interval_ms: float, batch_max: int,
+                 on_lost: Optional[Callable[[List[Any], Exception], None]] = None):
+        self.name = name
+        self._write_batch = write_batch
+        self._on_lost = on_lost
+        self.flush_interval_ms = flush_interval_ms
+        self.batch_max = batch_max
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._state_lock = threading.Lock()
+        self._closed = False  # cerrada no vuelve a arrancar: lo que llegue se escribe en el acto
+
+    @property
+    def active(self) -> bool:
+        return self._writer is not None
+
+    def start(self) -> None:
+        with self._state_lock:
+            if self._writer is None and not self._closed:
+                self._writer = threading.Thread(target=self._loop, name=f"{self.name}-writer", daemon=True)
+                self._writer.start()
+
+    def submit(self, op: Any) -> None:
+        with self._state_lock:  # nada entra en la cola detrás del None de close()
+            if self._writer is not None:
+                self._queue.put(op)
+                return
+        self._write([op])
+
+    def _loop(self) -> None:
+        while True:
+            ops = [self._queue.get()]
+            if ops[0] is None:
+                self._queue.task_done()
+                return
+            # group commit: lo que llegue durante el intervalo va en la misma transacción
+            deadline = time.monotonic() + self.flush_interval_ms / 1000
+            stop = False
+            while len(ops) < self.batch_max:
+                remaining = deadline - time.monotonic()
+                try:
+                    op = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is None:
+                    self._queue.task_done()
+                    stop = True
+                    break
+                ops.append(op)
+            try:
+                self._write(ops)
+            except Exception as e:
+                metrics.incr(f"{self.name}.write_errors", len(ops))
+                logger.error(f"[{self.name.upper()}] lote de {len(ops)} operaciones perdido: {e}")
+                if self._on_lost is not None:
+                    try:
+                        self._on_lost(ops, e)
+                    except Exception as cb_error:
+                        logger.error(f"[{self.name.upper()}] on_lost falló: {cb_error}")
+            finally:
+                for _ in ops:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, ops: List[Any]) -> None:
+        """write_batch con reintentos (BD bloqueada por otro proceso)."""
+        t0 = time.perf_counter()
+        for attempt in range(3):
+            try:
+                self._write_batch(ops)
+                break
+            except Exception:
+                if attempt == 2:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+        metrics.observe(f"{self.name}.commit", (time.perf_counter() - t0) * 1000)
+        metrics.incr(f"{self.name}.ops_written", len(ops))
+        metrics.incr(f"{self.name}.commits")
+
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def flush(self) -> None:
+        """Espera a que todo lo encolado esté confirmado en la BD."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """Vacía la cola y para el hilo; las operaciones posteriores son síncronas."""
+        with self._state_lock:
+            self._closed = True
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                self._queue.put(None)
+        if writer is not None:
+            writer.join(timeout=10)
+
+    def status(self) -> Dict[str, Any]:
+        commits = metrics.get(f"{self.name}.commits")
+        return {
+            "write_behind": self.active,
+            "queued": self._queue.qsize(),
+            "commits": int(commits),
+            "avg_batch": round(metrics.get(f"{self.name}.ops_written") / commits, 2) if commits else 0.0,
+            "commit_avg_ms": metrics.snapshot()["timings"].get(f"{self.name}.commit", {}).get("avg_ms", 0.0),
+            "write_errors": int(metrics.get(f"{self.name}.write_errors")),
+        }
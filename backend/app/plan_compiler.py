@@ -0,0 +1,98 @@
+# Planes precompilados por función
+# Relacionadas, siguientes pasos, dependencias REQUIERE (transitivas) y el orden
+# de los pasos solo dependen del grafo de funciones: se compilan una vez por
+# función en plantillas inmutables y en cada petición solo se enlaza la query.
+#
+# Orden de un plan: pasos previos declarados en el nodo ("pasos_previos"),
+# luego las dependencias REQUIERE de cada paso (primero las más profundas) y al
+# final la función seleccionada; sin herramientas repetidas.
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+@dataclass(frozen=True)
+class StepTemplate:
+    step: int
+    tool: str
+    role: str                    # previo | dependencia | principal
+    depends_on: Tuple[int, ...]
+
+    def describe(self, score: float) -> str:
+        if self.role == "previo":
+            return f"Paso previo del grafo ({self.tool})"
+        if self.role == "dependencia":
+            return f"Dependencia requerida (REQUIERE: {self.tool})"
+        return f"Función principal seleccionada (score: {score:.2f})"
+
+
+@dataclass(frozen=True)
+class PlanTemplate:
+    function: str
+    steps: Tuple[StepTemplate, ...]
+    related: Tuple[Tuple[str, str], ...]   # (función, relación)
+    next_steps: Tuple[str, ...]
+    dependencies: Tuple[str, ...]          # REQUIERE directas de la función
+    prior_steps: Tuple[str, ...]
+
+    def graph_context(self) -> Dict[str, Any]:
+        return {
+            "selected_function": self.function,
+            "related_functions": [{"function": f, "relation": rel} for f, rel in self.related],
+            "next_steps": list(self.next_steps),
+            "dependencies": list(self.dependencies),
+        }
+
+    def bind(self, query: str, score: float) -> List[Dict[str, Any]]:
+        """Plan ejecutable de esta petición (dicts nuevos: la plantilla no se toca)."""
+        return [
+            {
+                "step": s.step,
+                "tool": s.tool,
+                "args": {"query": query},
+                "desc": s.describe(score),
+                "depends_on": list(s.depends_on),
+            }
+            for s in self.steps
+        ]
+
+
+def _node(graph: dict, function_id: str) -> Optional[dict]:
+    return next((n for n in graph["nodes"] if n["id"] == function_id), None)
+
+def _with_requirements(fg, tool: str, out: List[str], visiting: set) -> None:
+    """Agrega `tool` después de sus dependencias REQUIERE (transitivas); tolera ciclos."""
+    if tool in out or tool in visiting:
+        return
+    visiting.add(tool)
+    for dep in fg.get_required(tool):
+        _with_requirements(fg, dep, out, visiting)
+    visiting.discard(tool)
+    out.append(tool)
+
+def compile_plan(fg, function_id: str) -> PlanTemplate:
+    """Compila la plantilla de plan de `function_id` a partir del grafo de `fg`."""
+    node = _node(fg.graph, function_id) or {}
+    prior = tuple(t for t in node.get("pasos_previos", []) if t != function_id)
+
+    tools: List[str] = []
+    for tool in prior:
+        # la principal nunca se expande como dependencia: siempre va al final
+        _with_requirements(fg, tool, tools, {function_id})
+    _with_requirements(fg, function_id, tools, set())
+
+    step_by_tool = {tool: i for i, tool in enumerate(tools, start=1)}
+    steps = []
+    for tool in tools:
+        # solo pasos anteriores: con ciclos en el grafo el plan sigue siendo un DAG
+        deps = [d for d in fg.get_step_dependencies(tool, tools) if step_by_tool[d] < step_by_tool[tool]]
+        role = "principal" if tool == function_id else ("previo" if tool in prior else "dependencia")
+        steps.append(StepTemplate(step_by_tool[tool], tool, role, tuple(step_by_tool[d] for d in deps)))
+
+    return PlanTemplate(
+        function=function_id,
+        steps=tuple(steps),
+        related=tuple((r["function"], r["relation"]) for r in fg.get_related_functions(function_id)),
+        next_steps=tuple(fg.get_next_steps(function_id)),
+        dependencies=tuple(fg.get_required(function_id)),
+        prior_steps=prior,
+    )
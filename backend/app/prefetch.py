@@ -0,0 +1,185 @@
+# Prefetch especulativo de herramientas del siguiente paso probable
+# Tras responder un turno, en segundo plano se precalcula lo que no depende de
+# la consulta en las herramientas de solo lectura de los planes de los
+# siguientes pasos más probables del grafo (SIGUIENTE_PASO > REQUIERE >
+# PUEDE_LLEVAR_A), y se guarda en una caché por sesión con TTL corto:
+#   - herramientas sin argumento `query` (horarios...): el resultado completo
+#   - herramientas con `prefetch` (promociones, zonas...): solo esa parte; en el
+#     turno siguiente la herramienta corre con la consulta nueva sobre ella
+# El resto depende de la consulta del turno siguiente, que todavía no existe:
+# no se precarga ni cuenta como fallo. Las claves no llevan la consulta.
+# Aciertos, fallos y ms ahorrados se miden por transición (función anterior →
+# función actual). El prefetch no pasa por la caché compartida de herramientas:
+# ni la llena ni cuenta como ahorro un resultado que ya estaba ahí.
+# DEFAULT_SESSION no es una sesión real (la comparten todos los clientes sin id):
+# no se le precarga nada.
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .inventory import DEFAULT_INVENTORY, Inventory
+from .logging_config import setup_logging
+from .metrics import metrics
+from .settings import settings
+from .tools import tool_registry
+
+logger = setup_logging()
+
+# prioridad de cada relación como "siguiente paso probable"
+NEXT_STEP_PRIORITY = {"SIGUIENTE_PASO": 0, "REQUIERE": 1, "PUEDE_LLEVAR_A": 2}
+
+def likely_next_functions(fg, function_id: str, limit: int) -> List[str]:
+    edges = [e for e in fg.graph["edges"] if e["from"] == function_id and e["rel"] in NEXT_STEP_PRIORITY]
+    ordered = sorted(edges, key=lambda e: NEXT_STEP_PRIORITY[e["rel"]])  # estable: respeta el orden del grafo
+    return list(dict.fromkeys(e["to"] for e in ordered))[:limit]
+
+def prefetchable(spec) -> bool:
+    """Solo lectura, cacheable y con algo que no depende de la consulta."""
+    return (spec is not None and spec.read_only and spec.ttl_s != 0
+            and (spec.prefetch is not None or "query" not in spec.arg_names()))
+
+def prefetch_tools(fg, function_id: str, limit: int) -> List[str]:
+    """Herramientas precargables de los planes de los siguientes pasos probables."""
+    tools = []
+    for nxt in likely_next_functions(fg, function_id, limit):
+        for step in fg.get_plan(nxt).steps:
+            if prefetchable(tool_registry.get(step.tool)) and step.tool not in tools:
+                tools.append(step.tool)
+    return tools
+
+def _key(name: str, args: Dict[str, Any], inv: Inventory) -> Optional[tuple]:
+    # la parte de la herramienta o, si no tiene, su resultado (sin `query` en los argumentos)
+    return tool_registry.part_key(name, inv) or tool_registry.result_key(name, args, inv)
+
+
+@dataclass
+class _Session:
+    last_function: Optional[str] = None
+    results: Dict[tuple, tuple] = field(default_factory=dict)  # clave → (expira, resultado, ms)
+
+
+class Prefetcher:
+    def __init__(self):
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._transitions: Dict[str, Dict[str, float]] = {}
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=settings.PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return self._pool
+
+    def _session(self, session_id: str) -> _Session:
+        # llamar con el lock tomado; LRU acotado por PREFETCH_MAX_SESSIONS
+        sess = self._sessions.get(session_id)
+        if sess is None:
+            sess = self._sessions[session_id] = _Session()
+            while len(self._sessions) > settings.PREFETCH_MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return sess
+
+    # ---- después de responder ----
+
+    def schedule(self, session_id: Optional[str], function_id: str, fg,
+                 inventory: Optional[Inventory] = None) -> Optional[Future]:
+        """Registra la función del turno y lanza el prefetch en segundo plano."""
+        if not settings.PREFETCH_ENABLED or not session_id or session_id == settings.DEFAULT_SESSION:
+            return None
+        with self._lock:
+            self._session(session_id).last_function = function_id
+        tools = prefetch_tools(fg, function_id, settings.PREFETCH_MAX_NEXT)
+        if not tools:
+            return None
+        return self._get_pool().submit(self._prefetch, session_id, tools, inventory or DEFAULT_INVENTORY)
+
+    def _prefetch(self, session_id: str, tools: List[str], inv: Inventory) -> None:
+        for name in tools:
+            spec = tool_registry.get(name)
+            args = {"session_id": session_id}
+            key = _key(name, args, inv)
+            if key is None:
+                continue
+            t0 = time.perf_counter()
+            try:
+                if spec.prefetch is not None:
+                    result = spec.prefetch(inv)
+                else:
+                    result = tool_registry.call(name, args, inv, use_cache=False)
+            except Exception as e:  # especulativo: nunca rompe nada
+                logger.warning(f"[PREFETCH] {name} falló: {e}")
+                continue
+            elapsed = (time.perf_counter() - t0) * 1000
+            if not result.get("success", True):
+                continue
+            result = copy.deepcopy(result)  # la parte puede apuntar a datos vivos del inventario
+            with self._lock:
+                sess = self._session(session_id)
+                sess.results[key] = (time.monotonic() + settings.PREFETCH_TTL_S, result, elapsed)
+            metrics.incr("prefetch.fetched")
+        logger.info(f"[PREFETCH] session={session_id} herramientas={tools}")
+
+    # ---- en el turno siguiente ----
+
+    def begin_turn(self, session_id: Optional[str], function_id: str) -> Optional[str]:
+        """Transición 'anterior→actual' si esta sesión tiene un turno previo (None si no)."""
+        if not settings.PREFETCH_ENABLED or not session_id or session_id == settings.DEFAULT_SESSION:
+            return None
+        with self._lock:
+            sess = self._sessions.get(session_id)
+            if sess is None or sess.last_function is None:
+                return None
+            now = time.monotonic()
+            sess.results = {k: v for k, v in sess.results.items() if v[0] > now}
+            return f"{sess.last_function}→{function_id}"
+
+    def lookup(self, session_id: str, transition: str, name: str, args: Dict[str, Any],
+               inventory: Optional[Inventory] = None) -> Optional[Dict[str, Any]]:
+        """Resultado con lo precargado (se consume) o None; cuenta acierto/fallo de la transición.
+
+        Las herramientas que no se precargan devuelven None sin contar nada.
+        """
+        inv = inventory or DEFAULT_INVENTORY
+        spec = tool_registry.get(name)
+        if not prefetchable(spec):
+            return None
+        key = _key(name, args, inv)
+        if key is None:
+            return None
+        with self._lock:
+            sess = self._sessions.get(session_id)
+            entry = sess.results.pop(key, None) if sess else None
+            stats = self._transitions.setdefault(transition, {"hits": 0, "misses": 0, "saved_ms": 0.0})
+            if entry is None or entry[0] <= time.monotonic():
+                stats["misses"] += 1
+                return None
+            stats["hits"] += 1
+            stats["saved_ms"] += entry[2]
+        metrics.incr("prefetch.hit")
+        if spec.prefetch is not None:  # la consulta de este turno sobre la parte precargada
+            return tool_registry.call(name, args, inv, parte=entry[1])
+        return copy.deepcopy(entry[1])
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            transitions = {
+                t: {**s, "saved_ms": round(s["saved_ms"], 2),
+                    "hit_rate": round(s["hits"] / (s["hits"] + s["misses"]), 4) if s["hits"] + s["misses"] else 0.0}
+                for t, s in self._transitions.items()
+            }
+            return {"sessions": len(self._sessions), "fetched": metrics.get("prefetch.fetched"),
+                    "transitions": transitions}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._transitions.clear()
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,280 @@
+# Profiler por petición (opt-in) para /chat
+# Se activa con el header X-Profile + X-Admin-Token, o para una fracción
+# PROFILE_SAMPLE_RATE del tráfico. Cada captura queda en PROFILE_DIR/<id>/:
+#   cprofile.prof  → pstats (snakeviz, python -m pstats)
+#   stacks.folded  → muestras de pila en formato colapsado (flamegraph.pl, speedscope)
+#   alloc.txt      → top de asignaciones de tracemalloc (+ alloc.tracemalloc binario)
+#   meta.json      → ruta, duración, disparador, muestras
+# Solo se conservan las últimas PROFILE_MAX_CAPTURES capturas.
+# Los pasos del plan corren en los hilos del ejecutor: run_plan toma el perfil
+# activo de la petición (contextvar) y cada paso se une a él mientras dura
+# (`profile_thread`): el muestreo cubre ese hilo y, hasta Python 3.11, un
+# cProfile propio del hilo se suma a cprofile.prof.
+
+import cProfile
+import contextvars
+import json
+import os
+import pstats
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .logging_config import setup_logging
+from .metrics import metrics
+from .settings import settings
+
+logger = setup_logging()
+
+CAPTURE_FILES = ("cprofile.prof", "stacks.folded", "alloc.txt", "alloc.tracemalloc", "meta.json")
+_CAPTURE_ID = re.compile(r"^\d{8}T\d{9}-[0-9a-f]{8}$")  # el orden lexicográfico es cronológico
+
+def is_capture_id(capture_id: str) -> bool:
+    return bool(_CAPTURE_ID.match(capture_id))
+
+def profiling_trigger(requested: bool, authorized: bool) -> Optional[str]:
+    """'header' si se pidió con credenciales, 'sample' si cae en el muestreo, None si no se perfila."""
+    if requested and authorized:
+        return "header"
+    if settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def _frame_label(code) -> str:
+    # "función (archivo:línea)"; ';' separa frames en el formato colapsado
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+class StackSampler(threading.Thread):
+    """Muestrea cada `interval_s` la pila de un hilo y de los que se le unan (`attach`) y acumula pilas colapsadas."""
+
+    def __init__(self, thread_id: int, interval_s: float):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.sampled_threads = set()
+        self._threads = {thread_id: 1}   # hilo → pasos activos en él
+        self._threads_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def attach(self, thread_id: int) -> None:
+        with self._threads_lock:
+            self._threads[thread_id] = self._threads.get(thread_id, 0) + 1
+
+    def detach(self, thread_id: int) -> None:
+        with self._threads_lock:
+            self._threads[thread_id] -= 1
+            if not self._threads[thread_id]:
+                del self._threads[thread_id]
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            with self._threads_lock:
+                thread_ids = list(self._threads)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if labels:
+                    self.stacks[";".join(reversed(labels))] += 1
+                    self.sampled_threads.add(thread_id)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+# tracemalloc es global al proceso: se enciende con la primera captura activa
+# y se apaga con la última (salvo que ya estuviera activo antes).
+_trace_lock = threading.Lock()
+_trace_users = 0
+_trace_owned = False
+
+def _trace_start() -> None:
+    global _trace_users, _trace_owned
+    with _trace_lock:
+        if _trace_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+            _trace_owned = True
+        _trace_users += 1
+
+def _trace_stop() -> None:
+    global _trace_users, _trace_owned
+    with _trace_lock:
+        _trace_users -= 1
+        if _trace_users == 0 and _trace_owned:
+            tracemalloc.stop()
+            _trace_owned = False
+
+
+# Desde Python 3.12 cProfile usa sys.monitoring (un solo profiler activo por
+# proceso): las capturas concurrentes se quedan solo con el muestreo de pila.
+_cprofile_lock = threading.Lock()
+
+
+# Hasta 3.11 cada hilo puede tener su propio cProfile; desde 3.12 no (sys.monitoring)
+_PER_THREAD_CPROFILE = sys.version_info < (3, 12)
+
+
+@dataclass
+class Capture:
+    id: str
+    directory: str
+    meta: Dict = field(default_factory=dict)
+
+
+@dataclass
+class ActiveProfile:
+    """Perfil en curso de una petición; los hilos del ejecutor se unen a él por paso."""
+    sampler: StackSampler
+    cprofile: bool
+    thread_profiles: List[cProfile.Profile] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+_active: contextvars.ContextVar[Optional[ActiveProfile]] = contextvars.ContextVar("active_profile", default=None)
+
+def current_profile() -> Optional[ActiveProfile]:
+    """Perfil activo en este contexto (None si la petición no se perfila)."""
+    return _active.get()
+
+@contextmanager
+def profile_thread(active: Optional[ActiveProfile]):
+    """Une el hilo actual al perfil `active` mientras dura el bloque (no hace nada con None)."""
+    if active is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    active.sampler.attach(thread_id)
+    profiler = cProfile.Profile() if active.cprofile and _PER_THREAD_CPROFILE else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            with active.lock:
+                active.thread_profiles.append(profiler)
+        active.sampler.detach(thread_id)
+
+
+def _new_capture(label: str, trigger: str) -> Capture:
+    now = time.time()
+    capture_id = f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+    directory = os.path.join(settings.PROFILE_DIR, capture_id)
+    os.makedirs(directory, exist_ok=True)
+    return Capture(capture_id, directory, {"id": capture_id, "label": label, "trigger": trigger,
+                                           "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+
+@contextmanager
+def profile_request(label: str, trigger: str):
+    """Perfila el bloque: cProfile + muestreo de pila + tracemalloc.
+
+    Cubre el hilo actual y los pasos del plan que se ejecuten en el bloque (`profile_thread`).
+    """
+    cap = _new_capture(label, trigger)
+    use_trace = settings.PROFILE_TRACEMALLOC
+    if use_trace:
+        _trace_start()
+        before = tracemalloc.take_snapshot()
+    sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+    profiler = cProfile.Profile() if _cprofile_lock.acquire(blocking=False) else None
+    cap.meta["cprofile"] = profiler is not None
+    active = ActiveProfile(sampler, profiler is not None)
+    token = _active.set(active)
+    t0 = time.perf_counter()
+    sampler.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield cap
+    except BaseException as e:
+        cap.meta["error"] = repr(e)
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _cprofile_lock.release()
+        _active.reset(token)
+        sampler.stop()
+        cap.meta["duration_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        cap.meta["samples"] = sum(sampler.stacks.values())
+        cap.meta["threads"] = len(sampler.sampled_threads)
+        try:
+            if profiler is not None:
+                with active.lock:
+                    thread_profiles, active.cprofile = list(active.thread_profiles), False
+                stats = pstats.Stats(profiler)
+                for p in thread_profiles:  # pasos del plan en los hilos del ejecutor
+                    stats.add(p)
+                stats.dump_stats(os.path.join(cap.directory, "cprofile.prof"))
+            with open(os.path.join(cap.directory, "stacks.folded"), "w", encoding="utf-8") as f:
+                f.write(sampler.folded())
+            if use_trace:
+                _write_allocations(cap, before)
+            with open(os.path.join(cap.directory, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(cap.meta, f, ensure_ascii=False, indent=2)
+            metrics.incr(f"profile.captures.{trigger}")
+            logger.info(f"[PROFILE] captura {cap.id} ({label}, {trigger}) {cap.meta['duration_ms']:.0f} ms")
+        finally:
+            if use_trace:
+                _trace_stop()
+        _rotate()
+
+def _write_allocations(cap: Capture, before) -> None:
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    after.dump(os.path.join(cap.directory, "alloc.tracemalloc"))
+    top = after.compare_to(before, "lineno")[:settings.PROFILE_TRACEMALLOC_TOP]
+    cap.meta["alloc_net_kb"] = round(sum(s.size_diff for s in top) / 1024, 1)
+    cap.meta["traced_peak_kb"] = round(peak / 1024, 1)
+    with open(os.path.join(cap.directory, "alloc.txt"), "w", encoding="utf-8") as f:
+        f.write(f"# top {len(top)} por línea (diferencia durante la petición)\n")
+        for stat in top:
+            f.write(f"{stat}\n")
+
+
+def _capture_dirs() -> List[str]:
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    return sorted(d for d in os.listdir(settings.PROFILE_DIR) if is_capture_id(d))
+
+def _rotate() -> None:
+    dirs = _capture_dirs()
+    for d in dirs[:max(0, len(dirs) - settings.PROFILE_MAX_CAPTURES)]:
+        shutil.rmtree(os.path.join(settings.PROFILE_DIR, d), ignore_errors=True)
+
+def list_captures() -> List[Dict]:
+    """Capturas disponibles, de la más reciente a la más antigua."""
+    out = []
+    for d in reversed(_capture_dirs()):
+        try:
+            with open(os.path.join(settings.PROFILE_DIR, d, "meta.json"), encoding="utf-8") as f:
+                out.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # captura en escritura o incompleta
+    return out
+
+def capture_file(capture_id: str, name: str) -> Optional[str]:
+    """Ruta de un archivo de la captura, o None si no existe (ids y nombres validados)."""
+    if not is_capture_id(capture_id) or name not in CAPTURE_FILES:
+        return None
+    path = os.path.join(settings.PROFILE_DIR, capture_id, name)
+    return path if os.path.isfile(path) else None
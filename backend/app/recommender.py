@@ -0,0 +1,356 @@
+# Recomendador de productos por embeddings
+# Cada producto se describe con nombre + categoría + etiquetas y se embebe una
+# sola vez (TF-IDF de caracteres + SVD ajustado sobre el propio catálogo). Al
+# construir se precalculan, por bloques, los RECO_NEIGHBORS vecinos más
+# parecidos de cada producto (N×K, no la matriz N×N: con decenas de miles de
+# productos esa matriz ocupa gigas). En cada consulta:
+#   - filtros de la consulta: categoría, etiquetas ("algo dulce", "sin gluten")
+#     y presupuesto ("10 dólares", "hasta $5"), más stock > 0, como máscaras
+#   - puntaje: una multiplicación matriz·vector (similitud con la consulta), o
+#     los vecinos precalculados si pide algo "parecido a" un producto
+#   - top-k con argpartition
+# El modelo (embeddings + vecinos) se comparte entre versiones del inventario
+# mientras no cambien los textos; precio y stock se releen en cada versión.
+
+import hashlib
+import json
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .entities import NUMBER_WORDS, extract_entities, normalize_text, plurals
+from .inventory import DEFAULT_INVENTORY, ETIQUETAS_POR_CATEGORIA, Inventory
+from .logging_config import setup_logging
+from .metrics import metrics
+from .settings import settings
+from .tfidf_embedder import TfidfEmbeddings
+
+logger = setup_logging()
+
+# etiqueta → formas de pedirla (texto normalizado, sin tildes)
+TAG_KEYWORDS = {
+    "dulce": ["dulce", "dulces", "postre", "postres", "antojo"],
+    "salado": ["salado", "salada", "salados", "saladas"],
+    "sin_gluten": ["sin gluten", "celiaco", "celiaca", "celiacos", "gluten free"],
+    "vegetariano": ["vegetariano", "vegetariana", "vegetarianos", "sin carne"],
+    "saludable": ["saludable", "saludables", "sano", "sana", "light"],
+    "desayuno": ["desayuno", "desayunar"],
+    "caliente": ["caliente", "calientito"],
+    "frio": ["frio", "fria", "refrescante", "helado"],
+}
+TAG_LABELS = {"sin_gluten": "Sin gluten", "frio": "Frío", "desayuno": "Para el desayuno"}
+
+# palabras que nombran una categoría del catálogo por defecto
+CATEGORY_KEYWORDS = {
+    "bebidas": ["bebida", "bebidas", "tomar", "beber", "algo de tomar"],
+    "pasteleria": ["pastel", "pasteles", "pasteleria", "torta", "tortas"],
+    "pan": ["pan", "panes"],
+}
+
+# "parecido a X", "en vez de X": los productos mencionados son el ancla
+_SIMILAR_CUES = re.compile(r"\b(?:parecid[oa]s?|similar(?:es)?|en vez de|en lugar de|alternativa|otro tipo de|como el|como la)\b")
+_NUM = r"\d+(?:[.,]\d+)?"
+_NUM_WORDS = "|".join(sorted((w for w in NUMBER_WORDS if " " not in w and w != "par"), key=len, reverse=True))
+_BUDGET_RE = re.compile(
+    rf"\$\s*({_NUM})"
+    rf"|\b({_NUM}|{_NUM_WORDS})\s*(?:dolares|dolar|usd|\$)"
+    rf"|\b(?:hasta|menos de|maximo|presupuesto de|no mas de)\s+({_NUM})\b")
+
+
+@dataclass
+class Preferences:
+    categorias: List[str] = field(default_factory=list)
+    etiquetas: List[str] = field(default_factory=list)
+    presupuesto: Optional[float] = None
+    similares_a: List[str] = field(default_factory=list)  # ids de producto ancla
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _contains(text: str, phrase: str) -> bool:
+    return re.search(rf"\b{re.escape(phrase)}\b", text) is not None
+
+def parse_budget(norm: str) -> Optional[float]:
+    m = _BUDGET_RE.search(norm)
+    if m is None:
+        return None
+    raw = next(g for g in m.groups() if g)
+    value = NUMBER_WORDS.get(raw)
+    return float(value) if value is not None else float(raw.replace(",", "."))
+
+def parse_preferences(query: str, inv: Optional[Inventory] = None,
+                      categorias: Optional[List[str]] = None) -> Preferences:
+    """Categoría, etiquetas, presupuesto y productos ancla mencionados en la consulta.
+
+    `categorias`: las del catálogo (el recomendador las pasa ya calculadas; si no, se leen de `inv`).
+    """
+    inv = inv or DEFAULT_INVENTORY
+    norm = normalize_text(query or "")
+    prefs = Preferences(presupuesto=parse_budget(norm))
+    prefs.etiquetas = [tag for tag, words in TAG_KEYWORDS.items() if any(_contains(norm, w) for w in words)]
+    if categorias is None:
+        categorias = sorted({p.get("categoria", "") for p in inv.productos.values()})
+    for cat in (c for c in categorias if c):
+        words = CATEGORY_KEYWORDS.get(cat, []) + plurals(normalize_text(cat))
+        if any(_contains(norm, w) for w in words):
+            prefs.categorias.append(cat)
+    if _SIMILAR_CUES.search(norm):
+        prefs.similares_a = [i["producto_id"] for i in extract_entities(query, inv).items]
+    return prefs
+
+
+def product_text(producto: dict, etiquetas: List[str]) -> str:
+    return " ".join([producto["nombre"], producto.get("categoria", ""), *(t.replace("_", " ") for t in etiquetas)])
+
+def product_tags(inv: Inventory) -> Dict[str, List[str]]:
+    """Etiquetas de cada producto: las del inventario o, si no tiene, las de su categoría."""
+    return {pid: inv.etiquetas.get(pid, ETIQUETAS_POR_CATEGORIA.get(p.get("categoria", ""), []))
+            for pid, p in inv.productos.items()}
+
+
+class _Model:
+    """Embeddings, etiquetas y categorías de los productos y sus vecinos precalculados (depende solo de los textos)."""
+
+    def __init__(self, ids: List[str], texts: List[str], tags: Dict[str, List[str]], categorias: List[str]):
+        self.ids = ids
+        self.index = {pid: i for i, pid in enumerate(ids)}
+        self.embedder = TfidfEmbeddings(ngram_range=(2, settings.EMB_TFIDF_NGRAM_MAX),
+                                        max_features=settings.RECO_MAX_FEATURES, svd_dim=settings.RECO_SVD_DIM)
+        self.matrix = self.embedder.fit(texts)._embed(texts) if ids else np.zeros((0, 1), dtype=np.float32)
+        self.neighbors, self.neighbor_sims = self._neighbors(settings.RECO_NEIGHBORS)
+        # etiquetas como matriz booleana N×T y categorías como códigos: los filtros son máscaras
+        self.tag_names = sorted({t for pid in ids for t in tags[pid]})
+        self.tag_col = {t: j for j, t in enumerate(self.tag_names)}
+        self.tags = np.zeros((len(ids), len(self.tag_names)), dtype=bool)
+        for i, pid in enumerate(ids):
+            self.tags[i, [self.tag_col[t] for t in tags[pid]]] = True
+        names, codes = np.unique(np.array(categorias, dtype=str), return_inverse=True)
+        self.category_names = names.tolist()
+        self.category_code = {c: j for j, c in enumerate(self.category_names)}
+        self.category_codes = codes.astype(np.int32)
+
+    def _neighbors(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(self.ids)
+        k = min(k, n - 1)
+        if k <= 0:
+            return np.zeros((n, 0), dtype=np.int32), np.zeros((n, 0), dtype=np.float32)
+        idx = np.empty((n, k), dtype=np.int32)
+        sims = np.empty((n, k), dtype=np.float32)
+        block = settings.RECO_BLOCK_ROWS
+        for start in range(0, n, block):
+            s = self.matrix[start:start + block] @ self.matrix.T   # (bloque × N), nunca N × N
+            rows = np.arange(s.shape[0])
+            s[rows, rows + start] = -np.inf                       # uno mismo no es vecino
+            top = np.argpartition(-s, k - 1, axis=1)[:, :k]
+            top_sims = np.take_along_axis(s, top, axis=1)
+            order = np.argsort(-top_sims, axis=1)
+            idx[start:start + block] = np.take_along_axis(top, order, axis=1)
+            sims[start:start + block] = np.take_along_axis(top_sims, order, axis=1)
+        return idx, sims
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embedder._embed([query])[0]
+
+
+class Recommender:
+    """Modelo compartido + precio y stock de una versión del inventario."""
+
+    def __init__(self, inv: Inventory, model: _Model):
+        cat = inv.columnar()
+        rows = cat.rows(model.ids)
+        self.model = model
+        self.ids = model.ids
+        self.nombres = [cat.nombres[r] for r in rows.tolist()]
+        self.precio = cat.precio[rows]
+        self.in_stock = cat.stock[rows] > 0
+
+    def _mask(self, prefs: Preferences, categorias: bool = True) -> np.ndarray:
+        mask = self.in_stock.copy()
+        if categorias and prefs.categorias:
+            mask &= np.isin(self.model.category_codes, [self.model.category_code.get(c, -1) for c in prefs.categorias])
+        for tag in prefs.etiquetas:
+            j = self.model.tag_col.get(tag)
+            if j is None:  # nadie en el catálogo tiene esa etiqueta: no hay nada que la cumpla
+                return np.zeros_like(mask)
+            mask &= self.model.tags[:, j]
+        if prefs.presupuesto is not None:
+            mask &= self.precio <= prefs.presupuesto
+        return mask
+
+    def recommend(self, query: str, prefs: Preferences, k: int) -> List[dict]:
+        if not self.ids:
+            return []
+        mask = self._mask(prefs)
+        if not mask.any() and prefs.categorias:
+            mask = self._mask(prefs, categorias=False)  # la categoría se relaja; dieta y presupuesto no
+        anchors = [self.model.index[a] for a in prefs.similares_a if a in self.model.index]
+        scores = None
+        if anchors:
+            mask[anchors] = False
+            scores = np.full(len(self.ids), -np.inf, dtype=np.float32)
+            for a in anchors:
+                nbr = self.model.neighbors[a]
+                scores[nbr] = np.maximum(scores[nbr], self.model.neighbor_sims[a])
+            if not np.isfinite(scores[mask]).any():
+                scores = None  # ningún vecino pasa los filtros: se ordena por la consulta
+        if scores is None:
+            anchors = []
+            scores = self.model.matrix @ self.model.embed_query(query)
+        candidates = np.flatnonzero(mask & np.isfinite(scores))
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        reason = self._reason(prefs, [self.nombres[a] for a in anchors])
+        return [{"id": self.ids[i], "nombre": self.nombres[i], "precio": float(self.precio[i]),
+                 "categoria": self.model.category_names[self.model.category_codes[i]], "razon": reason, "score": round(float(scores[i]), 4)}
+                for i in candidates.tolist()]
+
+    @staticmethod
+    def _reason(prefs: Preferences, anchors: List[str]) -> str:
+        parts = [f"Parecido a {anchors[0]}"] if anchors else []
+        parts += [TAG_LABELS.get(t, t.capitalize()) for t in prefs.etiquetas]
+        if prefs.presupuesto is not None:
+            parts.append(f"Dentro de tu presupuesto (${prefs.presupuesto:.2f})")
+        return ", ".join(parts) or "Coincide con lo que buscas"
+
+
+# ---- Caché: un modelo por textos del catálogo; precio/stock se releen por versión ----
+# Construir el modelo tarda segundos con catálogos grandes (~7 s con 20k
+# productos): se construye en segundo plano (al cargar el inventario o en la
+# primera consulta) y la consulta espera como mucho RECO_BUILD_WAIT_S. Si no
+# está listo, responde con el recomendador de reserva (solo filtros). Cada
+# huella tiene su propia construcción: un catálogo grande no bloquea a otro.
+
+_lock = threading.Lock()                                          # solo protege los dicts; no se toma al construir
+_models: "OrderedDict[str, _Model]" = OrderedDict()               # huella de los textos → modelo
+_builds: Dict[str, Future] = {}                                   # huella → construcción en curso
+# uid → (versión, huella, recomendador): la entrada se borra cuando muere el
+# inventario o cuando su modelo sale de _models, así el tope vale para los dos
+_by_inventory: Dict[int, Tuple[int, str, Recommender]] = {}
+_MAX_MODELS = 8
+_pool: Optional[ThreadPoolExecutor] = None
+
+def _texts_fingerprint(ids: List[str], texts: List[str]) -> str:
+    payload = json.dumps([ids, texts, settings.RECO_SVD_DIM, settings.RECO_NEIGHBORS]).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def _build(fp: str, ids: List[str], texts: List[str], tags: Dict[str, List[str]], categorias: List[str]) -> _Model:
+    t0 = time.perf_counter()
+    try:
+        model = _Model(ids, texts, tags, categorias)
+    except Exception:
+        with _lock:
+            _builds.pop(fp, None)  # la próxima consulta lo reintenta
+        metrics.incr("recommender.build_errors")
+        raise
+    elapsed = (time.perf_counter() - t0) * 1000
+    with _lock:
+        _models[fp] = model
+        while len(_models) > _MAX_MODELS:
+            evicted, _ = _models.popitem(last=False)
+            for uid, entry in _by_inventory.copy().items():  # copia: un finalizer puede borrar entradas
+                if entry[1] == evicted:
+                    _by_inventory.pop(uid, None)
+        _builds.pop(fp, None)
+    metrics.observe("recommender.build", elapsed)
+    logger.info(f"[RECO] modelo de {len(ids)} productos construido en {elapsed:.0f} ms")
+    return model
+
+def _model_for(inv: Inventory) -> Tuple[Optional[_Model], Optional[Future], str]:
+    """(modelo listo, None, huella) o (None, construcción en curso, huella), lanzándola si hace falta."""
+    global _pool
+    tags = product_tags(inv)
+    ids = list(inv.productos)
+    categorias = [inv.productos[pid].get("categoria", "") for pid in ids]
+    texts = [product_text(inv.productos[pid], tags[pid]) for pid in ids]
+    fp = _texts_fingerprint(ids, texts)
+    with _lock:
+        model = _models.get(fp)
+        if model is not None:
+            _models.move_to_end(fp)
+            return model, None, fp
+        future = _builds.get(fp)
+        if future is None:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=settings.RECO_BUILD_WORKERS, thread_name_prefix="reco-build")
+            future = _builds[fp] = _pool.submit(_build, fp, ids, texts, tags, categorias)
+        return None, future, fp
+
+def warm_recommender(inventory: Optional[Inventory] = None) -> Optional[Future]:
+    """Lanza la construcción del modelo sin esperarla (al cargar un inventario)."""
+    return _model_for(inventory or DEFAULT_INVENTORY)[1]
+
+def get_recommender(inventory: Optional[Inventory] = None, wait_s: Optional[float] = None) -> Optional[Recommender]:
+    """Recomendador de la versión actual; None si el modelo no termina en `wait_s` (def. RECO_BUILD_WAIT_S)."""
+    inv = inventory or DEFAULT_INVENTORY
+    cached = _by_inventory.get(inv.uid)
+    if cached is not None and cached[0] == inv.version:
+        with _lock:
+            if cached[1] in _models:  # un modelo en uso no es el menos usado
+                _models.move_to_end(cached[1])
+        return cached[2]
+    model, future, fp = _model_for(inv)
+    if model is None:
+        try:
+            model = future.result(timeout=settings.RECO_BUILD_WAIT_S if wait_s is None else wait_s)
+        except FutureTimeout:
+            metrics.incr("recommender.not_ready")
+            return None
+        except Exception as e:
+            logger.warning(f"[RECO] no se pudo construir el modelo: {e}")
+            return None
+    recommender = Recommender(inv, model)
+    with _lock:
+        if fp in _models:  # si ya se expulsó, no se cachea: el tope de modelos manda
+            if inv.uid not in _by_inventory:
+                weakref.finalize(inv, _by_inventory.pop, inv.uid, None)
+            _by_inventory[inv.uid] = (inv.version, fp, recommender)
+    return recommender
+
+def _fallback(inv: Inventory, prefs: Preferences, k: int) -> List[dict]:
+    """Sin modelo: mismos filtros (stock, categoría, etiquetas, presupuesto), por orden del catálogo."""
+    tags = product_tags(inv)
+    anchors = set(prefs.similares_a)
+
+    def matches(pid: str, p: dict, categorias: bool) -> bool:
+        return (p.get("stock", 0) > 0 and pid not in anchors
+                and (not categorias or not prefs.categorias or p.get("categoria", "") in prefs.categorias)
+                and set(prefs.etiquetas) <= set(tags[pid])
+                and (prefs.presupuesto is None or p["precio"] <= prefs.presupuesto))
+
+    reason = Recommender._reason(prefs, [])
+    for categorias in (True, False) if prefs.categorias else (True,):
+        out = []
+        for pid, p in inv.productos.items():
+            if matches(pid, p, categorias):
+                out.append({"id": pid, "nombre": p["nombre"], "precio": float(p["precio"]),
+                            "categoria": p.get("categoria", ""), "razon": reason, "score": None})
+                if len(out) == k:
+                    break
+        if out:
+            return out
+    return []
+
+def recommend(query: str, inventory: Optional[Inventory] = None, k: Optional[int] = None) -> Tuple[List[dict], Preferences]:
+    """(recomendaciones, preferencias leídas de la consulta)."""
+    inv = inventory or DEFAULT_INVENTORY
+    recommender = get_recommender(inv)
+    t0 = time.perf_counter()
+    if recommender is None:  # modelo aún construyéndose
+        prefs = parse_preferences(query, inv)
+        result = _fallback(inv, prefs, k or settings.RECO_TOP_K)
+        metrics.incr("recommender.fallback")
+    else:
+        prefs = parse_preferences(query, inv, recommender.model.category_names)
+        result = recommender.recommend(query, prefs, k or settings.RECO_TOP_K)
+    metrics.observe("recommender.query", (time.perf_counter() - t0) * 1000)
+    return result, prefs
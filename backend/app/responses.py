@@ -0,0 +1,80 @@
+# Perfiles de respuesta de /chat y serialización/compresión de payloads
+# lite  → lo que muestra la app móvil (respuesta + función elegida)
+# full  → contrato original (plan, exec_log, query, uso, versión del índice)
+# debug → full + contexto del grafo y resultados crudos de las herramientas
+
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from .settings import settings
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa json con separadores compactos
+    orjson = None
+
+RESPONSE_PROFILES = ("lite", "full", "debug")
+
+def resolve_profile(query_param: Optional[str], header: Optional[str]) -> str:
+    """Parámetro ?profile= > header X-Response-Profile > RESPONSE_PROFILE_DEFAULT."""
+    profile = (query_param or header or settings.RESPONSE_PROFILE_DEFAULT).strip().lower()
+    if profile not in RESPONSE_PROFILES:
+        raise HTTPException(status_code=400,
+                            detail=f"Perfil de respuesta desconocido: {profile} (opciones: {', '.join(RESPONSE_PROFILES)})")
+    return profile
+
+def shape_chat_response(out: Dict[str, Any], session_id: str, query: str, profile: str,
+                        index_version: Optional[int], tenant_id: str) -> Dict[str, Any]:
+    route = out["route"]
+    if profile == "lite":
+        return {
+            "session_id": session_id,
+            "response": out["final_response"],
+            "selected_function": {"name": route.function, "score": round(route.score, 4)},
+        }
+    body = {
+        "session_id": session_id,
+        "query": query,
+        "selected_function": {"name": route.function, "score": route.score, "stage": route.stage},
+        "plan": out["plan"],
+        "exec_log": out["exec_log"],
+        "response": out["final_response"],
+        "usage": out.get("usage", {}),
+        "index_version": index_version,
+        "tenant_id": tenant_id,
+    }
+    if profile == "debug":
+        body["graph_context"] = out.get("graph_context", {})
+        body["exec_results"] = out.get("exec_results", {})
+    return body
+
+
+def _default(obj):
+    # valores que json no conoce (datetime, Decimal, numpy…) se serializan como texto
+    return str(obj)
+
+class FastJSONResponse(JSONResponse):
+    """JSON compacto: orjson si está instalado (varias veces más rápido en payloads grandes)."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def add_compression(app) -> str:
+    """Negocia brotli (si brotli-asgi está instalado, con fallback a gzip) o gzip según Accept-Encoding."""
+    if settings.RESPONSE_COMPRESS_MIN_BYTES <= 0:
+        return "none"
+    try:
+        from brotli_asgi import BrotliMiddleware
+    except ImportError:
+        from starlette.middleware.gzip import GZipMiddleware
+        app.add_middleware(GZipMiddleware, minimum_size=settings.RESPONSE_COMPRESS_MIN_BYTES)
+        return "gzip"
+    app.add_middleware(BrotliMiddleware, quality=settings.RESPONSE_BROTLI_QUALITY,
+                       minimum_size=settings.RESPONSE_COMPRESS_MIN_BYTES, gzip_fallback=True)
+    return "br"
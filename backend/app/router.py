@@ -1,19 +1,38 @@
 import json
+import math
+import os
+import shutil
 from dataclasses import dataclass
 from typing import List, Dict, Any, Optional
 
+import faiss
+import numpy as np
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 
 from .models import FunctionDef
-from .embeddings import build_embedder
+from .embeddings import build_embedder, fit_embedder, restore_embedder_state, save_embedder_state
 from .settings import settings
+from .lexical_router import LexicalIndex, lexical_decision
+from .admission import admission
+from .metrics import metrics
+from .routing_corpus import ROUTING_CASES
+from .routing_head import RoutingHead, train_routing_head
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+class IndexAccuracyError(ValueError):
+    """La configuración de almacenamiento del índice pierde demasiada accuracy."""
 
 @dataclass
 class RouteResult:
     function: str
     score: float
+    stage: str = "embedding"  # embedding | lexical | head
 
 def _split_examples(examples: list[str]) -> list[str]:
     out = []
@@ -26,10 +45,123 @@ def _split_examples(examples: list[str]) -> list[str]:
         out.extend(parts)
     return out
 
-def build_vector_store_from_db(db: Session) -> FAISS:
-    embedder = build_embedder()
-    rows = db.query(FunctionDef).all()
+def resolve_index_mode(n_docs: int) -> str:
+    """Traduce INDEX_MODE a flat | hnsw | ivf según el tamaño del corpus."""
+    mode = settings.INDEX_MODE
+    if mode == "auto":
+        return settings.INDEX_ANN_KIND if n_docs >= settings.INDEX_ANN_MIN_DOCS else "flat"
+    if mode not in ("flat", "hnsw", "ivf"):
+        raise ValueError(f"INDEX_MODE desconocido: {mode}")
+    return mode
+
+def _ivf_nlist(n_docs: int) -> int:
+    if settings.IVF_NLIST > 0:
+        return min(settings.IVF_NLIST, n_docs)
+    # ~4·sqrt(n), con al menos ~39 puntos de entrenamiento por centroide
+    return max(1, min(int(4 * math.sqrt(n_docs)), n_docs // 39))
+
+STORAGE_CODES = {"f32": "Flat", "f16": "SQfp16", "sq8": "SQ8"}
+
+def _storage_code() -> str:
+    if settings.INDEX_STORAGE not in STORAGE_CODES:
+        raise ValueError(f"INDEX_STORAGE desconocido: {settings.INDEX_STORAGE}")
+    return STORAGE_CODES[settings.INDEX_STORAGE]
+
+def _pca_dim(dim: int, n_docs: int) -> int:
+    """Dimensión PCA efectiva (0 = sin PCA): debe reducir y tener datos para entrenar."""
+    d = settings.INDEX_PCA_DIM
+    return d if 0 < d < dim and n_docs > d else 0
+
+def index_factory_string(mode: str, n_docs: int, dim: int = 0) -> str:
+    code = _storage_code()
+    if mode == "hnsw":
+        base = f"HNSW{settings.HNSW_M}" + ("" if code == "Flat" else f"_{code}")
+    elif mode == "ivf":
+        base = f"IVF{_ivf_nlist(n_docs)},{code}"
+    else:
+        base = code
+    pca = _pca_dim(dim, n_docs) if dim else 0
+    # L2norm tras el PCA: los vectores reducidos vuelven a norma 1 (L2 ~ coseno)
+    return f"PCA{pca},L2norm,{base}" if pca else base
+
+def tune_index(index) -> None:
+    """Aplica los parámetros de búsqueda (efSearch / nprobe) de settings."""
+    params = faiss.ParameterSpace()
+    if "HNSW" in _index_kinds(index):
+        params.set_index_parameter(index, "efSearch", settings.HNSW_EF_SEARCH)
+    if "IVF" in _index_kinds(index):
+        params.set_index_parameter(index, "nprobe", settings.IVF_NPROBE)
+
+def _base_index(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def _index_kinds(index) -> str:
+    return type(_base_index(index)).__name__
+
+def make_faiss_index(dim: int, n_docs: int, mode: Optional[str] = None):
+    """Crea un índice FAISS (L2) vacío del tipo indicado (o resuelto por settings)."""
+    mode = mode or resolve_index_mode(n_docs)
+    index = faiss.index_factory(dim, index_factory_string(mode, n_docs, dim), faiss.METRIC_L2)
+    if mode == "hnsw":
+        _base_index(index).hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+    return index
+
+def build_vector_store(docs: list[Document], embedder, vectors: Optional[np.ndarray] = None) -> FAISS:
+    """Construye el vector store con el tipo de índice configurado.
+
+    `vectors` permite pasar embeddings ya calculados (mismo orden que `docs`).
+    """
+    texts = [d.page_content for d in docs]
+    if vectors is None:
+        vectors = embedder.embed_documents(texts)
+    x = np.asarray(vectors, dtype="float32")
+
+    mode = resolve_index_mode(len(docs))
+    index = make_faiss_index(x.shape[1], len(docs), mode)
+    if not index.is_trained:
+        index.train(x)
+    tune_index(index)
+    logger.info(f"[INDEX] tipo={mode} ({index_factory_string(mode, len(docs), x.shape[1])}) docs={len(docs)} dim={x.shape[1]}")
+
+    vs = FAISS(embedder, index, InMemoryDocstore(), {})
+    vs.add_embeddings(zip(texts, x.tolist()), metadatas=[d.metadata for d in docs])
+    return vs
 
+def _top1_accuracy(index, names: list[str], qvecs: np.ndarray, expected: list[str]) -> float:
+    # top-1 de select_function == función del documento más cercano
+    _, ids = index.search(qvecs, 1)
+    return float(np.mean([i >= 0 and names[i] == e for i, e in zip(ids[:, 0], expected)]))
+
+def check_index_accuracy(vs: FAISS, docs: list[Document], vectors, embedder) -> Optional[tuple[float, float]]:
+    """Compara el top-1 del índice construido contra un Flat float32 exacto sobre ROUTING_CASES.
+
+    Devuelve (accuracy exacta, accuracy del índice) o None si no aplica; lanza
+    IndexAccuracyError si la caída supera INDEX_GUARD_MAX_DROP.
+    """
+    names = [d.metadata["name"] for d in docs]
+    cases = [(q, e) for q, e in ROUTING_CASES if e in set(names)]
+    if not cases:
+        return None
+    x = np.asarray(vectors, dtype="float32")
+    exact = faiss.IndexFlatL2(x.shape[1])
+    exact.add(x)
+    qvecs = np.asarray(embedder.embed_documents([q for q, _ in cases]), dtype="float32")
+    expected = [e for _, e in cases]
+    ref_acc = _top1_accuracy(exact, names, qvecs, expected)
+    acc = _top1_accuracy(vs.index, names, qvecs, expected)
+    logger.info(f"[INDEX] guard: accuracy float32={ref_acc:.1%} configurada={acc:.1%} ({len(cases)} casos)")
+    if ref_acc - acc > settings.INDEX_GUARD_MAX_DROP:
+        raise IndexAccuracyError(
+            f"INDEX_STORAGE={settings.INDEX_STORAGE} INDEX_PCA_DIM={settings.INDEX_PCA_DIM}: "
+            f"accuracy {acc:.1%} vs {ref_acc:.1%} en float32 (máx. caída {settings.INDEX_GUARD_MAX_DROP:.1%})"
+        )
+    return ref_acc, acc
+
+def function_documents(rows: list[FunctionDef]) -> list[Document]:
+    """Documentos del índice: una descripción + un doc por ejemplo de cada función."""
     docs: list[Document] = []
     for r in rows:
         fn = r.name
@@ -43,25 +175,141 @@ def build_vector_store_from_db(db: Session) -> FAISS:
                 page_content=f"Ejemplo de uso de {fn}: {ex}",
                 metadata={"name": fn, "kind": "example"},
             ))
+    return docs
+
+def catalog_texts(rows: list[FunctionDef], docs: list[Document]) -> list[str]:
+    """Corpus de ajuste para embedders entrenables: documentos del índice + perfiles."""
+    return [d.page_content for d in docs] + [r.profile_text for r in rows if r.profile_text]
+
+def build_vector_store_from_db(
+    db: Session, embedder=None, vectors: Optional[np.ndarray] = None, faiss_dir: Optional[str] = None
+) -> FAISS:
+    """Construye y publica el índice. `vectors` (opcional) deben seguir el orden de function_documents().
+
+    `faiss_dir` es el directorio de artefactos (por defecto settings.FAISS_DIR; cada tenant tiene el suyo).
+    """
+    embedder = embedder or build_embedder()
+    rows = db.query(FunctionDef).order_by(FunctionDef.id).all()
 
-    vs = FAISS.from_documents(docs, embedder)
-    # persistimos para arrancar rápido después
-    vs.save_local(settings.FAISS_DIR)
+    docs = function_documents(rows)
+    fit_embedder(embedder, catalog_texts(rows, docs))
+    if vectors is None:
+        vectors = embedder.embed_documents([d.page_content for d in docs])
+    vs = build_vector_store(docs, embedder, vectors)
+    if settings.INDEX_ACCURACY_GUARD and (settings.INDEX_STORAGE != "f32" or settings.INDEX_PCA_DIM > 0):
+        check_index_accuracy(vs, docs, vectors, embedder)  # no se publica si pierde demasiado
+    head = None
+    if settings.ROUTER_HEAD == "logreg":
+        head = train_routing_head(
+            np.asarray(vectors, dtype="float32"),
+            [d.metadata["name"] for d in docs], [d.metadata["kind"] for d in docs],
+            min_examples=settings.ROUTER_HEAD_MIN_EXAMPLES, C=settings.ROUTER_HEAD_C,
+        )
+    # persistimos para arrancar rápido después (y para que otros workers lo recarguen)
+    publish_vector_store(vs, db_fingerprint(db), head, faiss_dir)
     return vs
 
-def load_vector_store() -> Optional[FAISS]:
+# ---- Artefacto en disco versionado ----
+# FAISS_DIR/
+#   CURRENT        → {"version": 3, "path": "v000003", "fingerprint": "..."}
+#   v000003/       → index.faiss + index.pkl (+ tfidf.pkl, routing_head.npz)
+# CURRENT se reemplaza con os.replace (atómico), así un lector nunca ve un
+# índice a medio escribir.
+
+MANIFEST_FILE = "CURRENT"
+KEEP_VERSIONS = 2
+
+def db_fingerprint(db: Session) -> str:
+    """Huella barata del catálogo de funciones para detectar re-siembras."""
+    count, max_id, max_upd = db.query(
+        func.count(FunctionDef.id), func.max(FunctionDef.id), func.max(FunctionDef.updated_at)
+    ).one()
+    return f"{count}:{max_id}:{max_upd}"
+
+def read_index_manifest(faiss_dir: Optional[str] = None) -> Optional[dict]:
+    try:
+        with open(os.path.join(faiss_dir or settings.FAISS_DIR, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def publish_vector_store(
+    vs: FAISS, fingerprint: Optional[str] = None, head: Optional[RoutingHead] = None, faiss_dir: Optional[str] = None
+) -> int:
+    """Guarda el índice como nueva versión y actualiza CURRENT. Devuelve la versión."""
+    faiss_dir = faiss_dir or settings.FAISS_DIR
+    os.makedirs(faiss_dir, exist_ok=True)
+    manifest = read_index_manifest(faiss_dir) or {}
+    version = int(manifest.get("version", 0)) + 1
+    name = f"v{version:06d}"
+    final_dir = os.path.join(faiss_dir, name)
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+
+    vs.save_local(tmp_dir)
+    save_embedder_state(vs.embedding_function, tmp_dir)
+    if head is not None:
+        head.save(tmp_dir)
+    if os.path.exists(final_dir):
+        shutil.rmtree(final_dir)
+    os.replace(tmp_dir, final_dir)
+
+    tmp_manifest = os.path.join(faiss_dir, f"{MANIFEST_FILE}.tmp-{os.getpid()}")
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "path": name, "fingerprint": fingerprint}, f)
+    os.replace(tmp_manifest, os.path.join(faiss_dir, MANIFEST_FILE))
+
+    # limpiar versiones viejas (se conservan las últimas KEEP_VERSIONS)
+    old = sorted(d for d in os.listdir(faiss_dir) if d.startswith("v") and d[1:].isdigit())
+    for d in old[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(faiss_dir, d), ignore_errors=True)
+
+    logger.info(f"[INDEX] publicada versión {version} en {final_dir}")
+    return version
+
+def load_published_vector_store(faiss_dir: Optional[str] = None) -> tuple[Optional[FAISS], int, Optional[str]]:
+    """Carga la versión apuntada por CURRENT → (vs, versión, fingerprint).
+
+    Sin CURRENT se intenta el formato anterior (índice directo en FAISS_DIR) como versión 0.
+    """
+    faiss_dir = faiss_dir or settings.FAISS_DIR
+    manifest = read_index_manifest(faiss_dir)
+    path = os.path.join(faiss_dir, manifest["path"]) if manifest else faiss_dir
     try:
         embedder = build_embedder()
-        return FAISS.load_local(settings.FAISS_DIR, embedder, allow_dangerous_deserialization=True)
+        restore_embedder_state(embedder, path)
+        vs = FAISS.load_local(path, embedder, allow_dangerous_deserialization=True)
+        tune_index(vs.index)
     except Exception:
+        return None, 0, None
+    if manifest:
+        return vs, int(manifest["version"]), manifest.get("fingerprint")
+    return vs, 0, None
+
+def load_routing_head(version: int, faiss_dir: Optional[str] = None) -> Optional[RoutingHead]:
+    """Cabeza lineal publicada con esa versión del índice (None si no se entrenó)."""
+    if version <= 0:
+        return None
+    try:
+        return RoutingHead.load(os.path.join(faiss_dir or settings.FAISS_DIR, f"v{version:06d}"))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"[HEAD] no se pudo cargar la cabeza de la versión {version}: {e}")
         return None
 
-def select_function(vs: FAISS, query: str, k: int = 1, k_docs: int = 12) -> List[RouteResult]:
+def load_vector_store() -> Optional[FAISS]:
+    return load_published_vector_store()[0]
+
+def select_function(
+    vs: FAISS, query: str, k: int = 1, k_docs: int = 12, embedding: Optional[List[float]] = None
+) -> List[RouteResult]:
     """Devuelve Top-k funciones por routing semántico.
     k: número de funciones a devolver (en tu práctica, k=1).
     k_docs: cuantos docs recuperar para luego agregar por función.
+    embedding: vector de la consulta si ya se calculó.
     """
-    results = vs.similarity_search_with_score(query, k=k_docs)
+    if embedding is not None:
+        results = vs.similarity_search_with_score_by_vector(embedding, k=k_docs)
+    else:
+        results = vs.similarity_search_with_score(query, k=k_docs)
 
     by_fn: dict[str, float] = {}
     for doc, score in results:
@@ -72,3 +320,53 @@ def select_function(vs: FAISS, query: str, k: int = 1, k_docs: int = 12) -> List
 
     ranked = sorted(by_fn.items(), key=lambda x: x[1], reverse=True)
     return [RouteResult(function=fn, score=sc) for fn, sc in ranked[:k]]
+
+def select_function_head(
+    vs: FAISS, head: RoutingHead, query: str, k: int = 1, k_docs: int = 12
+) -> List[RouteResult]:
+    """Cabeza lineal; kNN si la probabilidad es baja.
+
+    Las funciones excluidas del entrenamiento (pocos ejemplos) no son clases de la
+    cabeza: si las hay, el kNN corre siempre al lado (mismo vector) y gana una
+    excluida cuando su documento más cercano supera al de la función de la cabeza.
+    """
+    q = vs.embedding_function.embed_query(query)
+    fn, prob = head.predict(q)
+    if k == 1 and prob >= settings.ROUTER_HEAD_MIN_PROB:
+        if head.excluded:
+            ranked = select_function(vs, query, k=k_docs, k_docs=k_docs, embedding=q)
+            knn = {r.function: r.score for r in ranked}
+            best = next((r for r in ranked if r.function in head.excluded), None)
+            if best is not None and best.score > knn.get(fn, -1.0):
+                metrics.incr("router.head_excluded")
+                return [best]
+        metrics.incr("router.head")
+        return [RouteResult(function=fn, score=prob, stage="head")]
+    metrics.incr("router.head_fallback")
+    return select_function(vs, query, k=k, k_docs=k_docs, embedding=q)
+
+def select_function_hybrid(
+    vs: FAISS, lexical: Optional[LexicalIndex], query: str, k: int = 1, k_docs: int = 12,
+    head: Optional[RoutingHead] = None,
+) -> List[RouteResult]:
+    """Routing en dos etapas: BM25 y, solo si el margen es ambiguo, embeddings.
+
+    Con k > 1 siempre se usa la búsqueda semántica (el léxico solo decide top-1).
+    Con `head` la etapa de embeddings usa la cabeza lineal en lugar del kNN.
+    """
+    if lexical is not None and k == 1:
+        decision = lexical_decision(
+            lexical, query,
+            min_score=settings.LEXICAL_MIN_SCORE,
+            min_margin=settings.LEXICAL_MIN_MARGIN,
+            min_coverage=settings.LEXICAL_MIN_COVERAGE,
+        )
+        if decision is not None:
+            metrics.incr("router.lexical_exit")
+            fn, conf = decision
+            return [RouteResult(function=fn, score=conf, stage="lexical")]
+    metrics.incr("router.embedding")
+    with admission.embedding.slot():  # Overloaded si la etapa está saturada
+        if head is not None:
+            return select_function_head(vs, head, query, k=k, k_docs=k_docs)
+        return select_function(vs, query, k=k, k_docs=k_docs)
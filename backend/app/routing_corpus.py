@@ -0,0 +1,60 @@
+# Corpus de evaluación del routing (consultas que NO están en query_examples)
+# Se usa en los benchmarks de scripts/ y en las validaciones de construcción del índice.
+
+ROUTING_CASES = [
+    # saludar_cortesia
+    ("hola", "saludar_cortesia"),
+    ("buenas noches", "saludar_cortesia"),
+    ("muchas gracias, muy amable", "saludar_cortesia"),
+    ("hola, qué tal todo?", "saludar_cortesia"),
+    # responder_fuera_contexto
+    ("quién es el presidente de Ecuador?", "responder_fuera_contexto"),
+    ("cuéntame algo de fútbol", "responder_fuera_contexto"),
+    ("resuelve esta ecuación de matemáticas", "responder_fuera_contexto"),
+    ("va a llover mañana?", "responder_fuera_contexto"),
+    # buscar_producto
+    ("tienes pan integral?", "buscar_producto"),
+    ("hay croissants disponibles?", "buscar_producto"),
+    ("tienen algo sin gluten?", "buscar_producto"),
+    ("qué panes tienen hoy?", "buscar_producto"),
+    # consultar_precio_promos
+    ("cuánto cuesta la empanada?", "consultar_precio_promos"),
+    ("precio del croissant", "consultar_precio_promos"),
+    ("qué promociones tienen?", "consultar_precio_promos"),
+    ("cuánto vale la torta de chocolate?", "consultar_precio_promos"),
+    # recomendar_productos
+    ("recomiéndame algo dulce", "recomendar_productos"),
+    ("qué me sugieres para el desayuno?", "recomendar_productos"),
+    ("qué me recomiendas para una fiesta?", "recomendar_productos"),
+    ("sugiéreme un postre", "recomendar_productos"),
+    # crear_pedido
+    ("quiero 2 cafés y 4 empanadas para retirar a las 6", "crear_pedido"),
+    ("quiero pedir 3 donuts", "crear_pedido"),
+    ("hazme un pedido de una torta de vainilla", "crear_pedido"),
+    ("mándame 6 panes a mi casa", "crear_pedido"),
+    # actualizar_pedido
+    ("agrega un café a mi pedido 40", "actualizar_pedido"),
+    ("cambia las empanadas por croissants en mi pedido", "actualizar_pedido"),
+    ("quita el brownie del pedido 12", "actualizar_pedido"),
+    # cancelar_pedido
+    ("anula mi pedido 200 por favor", "cancelar_pedido"),
+    ("cancela el pedido 55", "cancelar_pedido"),
+    ("ya no quiero mi orden, cancélala", "cancelar_pedido"),
+    # consultar_estado_pedido
+    ("mi pedido 90 ya está listo?", "consultar_estado_pedido"),
+    ("en qué estado va mi orden?", "consultar_estado_pedido"),
+    ("cuánto falta para que llegue mi pedido?", "consultar_estado_pedido"),
+    # calcular_costo_envio
+    ("envían al centro?", "calcular_costo_envio"),
+    ("cuánto cuesta el envío al norte?", "calcular_costo_envio"),
+    ("hacen delivery a Totoracocha?", "calcular_costo_envio"),
+    # registrar_cliente
+    ("regístrame, me llamo Pedro y mi teléfono es 0991234567", "registrar_cliente"),
+    ("guarda mi correo pedro@mail.com", "registrar_cliente"),
+    ("quiero crear mi perfil de cliente", "registrar_cliente"),
+    # consultar_horarios_ubicaciones
+    ("a qué hora abren?", "consultar_horarios_ubicaciones"),
+    ("a qué hora cierran el domingo?", "consultar_horarios_ubicaciones"),
+    ("dónde queda la sucursal norte?", "consultar_horarios_ubicaciones"),
+    ("abren los sábados?", "consultar_horarios_ubicaciones"),
+]
@@ -0,0 +1,77 @@
+# Cabeza de routing lineal entrenada sobre los embeddings de los ejemplos
+# Regresión logística multinomial ajustada al construir el índice; en la consulta
+# es un solo matmul (q·W + b) + softmax sobre ~12 funciones, sin importar
+# cuántos ejemplos haya. Las funciones con pocos ejemplos no entran al
+# entrenamiento y se resuelven con el kNN de siempre (fallback).
+
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+HEAD_FILE = "routing_head.npz"
+
+@dataclass(frozen=True)
+class RoutingHead:
+    classes: Tuple[str, ...]
+    W: np.ndarray   # (dim, n_clases)
+    b: np.ndarray   # (n_clases,)
+    excluded: Tuple[str, ...] = ()  # funciones con pocos ejemplos → siempre kNN
+
+    def predict_proba(self, q) -> np.ndarray:
+        logits = np.asarray(q, dtype="float32") @ self.W + self.b
+        logits -= logits.max()
+        p = np.exp(logits)
+        return p / p.sum()
+
+    def predict(self, q) -> Tuple[str, float]:
+        p = self.predict_proba(q)
+        i = int(p.argmax())
+        return self.classes[i], float(p[i])
+
+    def save(self, directory: str) -> None:
+        np.savez(os.path.join(directory, HEAD_FILE), classes=np.array(self.classes),
+                 W=self.W, b=self.b, excluded=np.array(self.excluded, dtype=str))
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["RoutingHead"]:
+        path = os.path.join(directory, HEAD_FILE)
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(tuple(data["classes"].tolist()), data["W"], data["b"], tuple(data["excluded"].tolist()))
+
+
+def train_routing_head(
+    vectors: np.ndarray, labels: List[str], kinds: List[str], min_examples: int = 3, C: float = 10.0
+) -> Optional[RoutingHead]:
+    """Entrena sobre los documentos del índice (descripción + ejemplos) de cada función.
+
+    Solo entran las funciones con al menos `min_examples` ejemplos (kind == "example").
+    None si quedan menos de 2 funciones.
+    """
+    n_examples = Counter(y for y, kind in zip(labels, kinds) if kind == "example")
+    keep = [i for i, y in enumerate(labels) if n_examples[y] >= min_examples]
+    excluded = tuple(sorted(y for y in set(labels) if n_examples[y] < min_examples))
+    classes = sorted({labels[i] for i in keep})
+    if len(classes) < 2:
+        logger.warning("[HEAD] menos de 2 funciones con ejemplos suficientes: se usa solo kNN")
+        return None
+
+    x = np.asarray(vectors, dtype="float32")[keep]
+    y = [labels[i] for i in keep]
+    clf = LogisticRegression(C=C, max_iter=2000).fit(x, y)
+    W, b = clf.coef_.T.astype("float32"), clf.intercept_.astype("float32")
+    if len(clf.classes_) == 2:
+        # binario: sigmoid(w·x + b) == softmax([0, w·x + b])
+        W = np.hstack([np.zeros_like(W), W])
+        b = np.array([0.0, b[0]], dtype="float32")
+    logger.info(f"[HEAD] entrenada: {len(classes)} funciones, {len(y)} ejemplos, excluidas={list(excluded)}")
+    return RoutingHead(tuple(clf.classes_.tolist()), W, b, excluded)
@@ -0,0 +1,208 @@
+# Pipeline de siembra del catálogo de funciones
+# carga (JSON/YAML) → diff contra la BD → embeddings en lote → upsert en una
+# transacción → índice publicado (los workers lo recargan sin downtime).
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .embeddings import build_embedder, fit_embedder
+from .logging_config import setup_logging
+from .models import FunctionDef
+from .router import (
+    build_vector_store_from_db, catalog_texts, db_fingerprint, function_documents, read_index_manifest,
+)
+from .settings import settings
+from .vector_codec import encode_vector, vector_format
+
+logger = setup_logging()
+
+JSON_FIELDS = ("input_schema", "output_schema", "enums", "query_examples")
+REQUIRED_KEYS = ("name", "business_desc", "technical_desc", "query_examples")
+
+@dataclass
+class SeedReport:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    removed: List[str] = field(default_factory=list)
+    embedded_texts: int = 0
+    index_version: Optional[int] = None
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        stages = " | ".join(f"{k}={v:.0f}ms" for k, v in self.timings_ms.items())
+        return (f"nuevas={len(self.added)} cambiadas={len(self.changed)} sin_cambios={self.unchanged} "
+                f"eliminadas={len(self.removed)} textos_embebidos={self.embedded_texts} | {stages}")
+
+
+class _Stage:
+    def __init__(self, report: SeedReport, name: str):
+        self.report, self.name = report, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        ms = (time.perf_counter() - self.t0) * 1000
+        self.report.timings_ms[self.name] = ms
+        logger.info(f"[SEED] etapa {self.name}: {ms:.0f} ms")
+
+
+def make_profile(f: dict) -> str:
+    # Perfil para embeddings: poco ruido, mucha intención + ejemplos.
+    examples = " | ".join(f["query_examples"][:6])
+    return (
+        f"FUNCION: {f['name']}\n"
+        f"INTENCION_NEGOCIO: {f['business_desc']}\n"
+        f"DESCRIPCION_TECNICA: {f['technical_desc']}\n"
+        f"EJEMPLOS: {examples}\n"
+        f"KEYWORDS: pedido, precio, promo, horario, sucursal, delivery, cancelar, estado, registrar, recomendacion"
+    )
+
+
+def load_catalog(path: str) -> List[dict]:
+    """Lee un catálogo de funciones (.json, .yaml o .yml): lista o {"functions": [...]}."""
+    with open(path, encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError as e:
+                raise RuntimeError("Para catálogos YAML instala PyYAML (pip install pyyaml)") from e
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    funcs = data.get("functions", []) if isinstance(data, dict) else data
+    for i, fn in enumerate(funcs):
+        missing = [k for k in REQUIRED_KEYS if not fn.get(k)]
+        if missing:
+            raise ValueError(f"{path}: la función #{i} ({fn.get('name', '?')}) no tiene {missing}")
+    names = [fn["name"] for fn in funcs]
+    if len(names) != len(set(names)):
+        raise ValueError(f"{path}: nombres de función duplicados")
+    return funcs
+
+
+def row_values(f: dict) -> dict:
+    """Columnas de FunctionDef (sin embedding) para una función del catálogo."""
+    values = {
+        "name": f["name"],
+        "business_desc": f["business_desc"],
+        "technical_desc": f["technical_desc"],
+        "profile_text": make_profile(f),
+    }
+    for key in JSON_FIELDS:
+        values[key] = json.dumps(f.get(key) or ({} if key != "query_examples" else []), ensure_ascii=False)
+    return values
+
+
+def _needs_update(row: FunctionDef, values: dict) -> bool:
+    # también se re-embebe si cambió el formato de almacenamiento (EMB_DB_STORAGE)
+    return (vector_format(row.embedding_json) != settings.EMB_DB_STORAGE
+            or any(getattr(row, k) != v for k, v in values.items()))
+
+
+def embed_in_batches(embedder, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+    batch_size = batch_size or settings.EMB_BATCH_SIZE
+    out = []
+    for i in range(0, len(texts), batch_size):
+        out.extend(embedder.embed_documents(texts[i:i + batch_size]))
+    return np.asarray(out, dtype="float32")
+
+
+def seed_catalog(
+    db: Session,
+    funcs: List[dict],
+    embedder=None,
+    prune: bool = False,
+    build_index: bool = True,
+    faiss_dir: Optional[str] = None,
+    force_index: bool = False,
+) -> SeedReport:
+    """Sincroniza la tabla function_defs con `funcs` y (opcional) publica el índice.
+
+    - Solo se reescriben las filas nuevas o cambiadas, en una sola transacción.
+    - `prune=True` elimina las funciones que ya no están en el catálogo.
+    - Perfiles e índice se embeben juntos en llamadas batch a embed_documents.
+    - `faiss_dir` permite publicar el índice de otro tenant (por defecto settings.FAISS_DIR).
+    - Sin cambios y con el índice publicado al día (misma huella) no se re-embebe ni se publica
+      otra versión; `force_index=True` lo reconstruye igual (p. ej. tras cambiar EMB_BACKEND).
+    """
+    report = SeedReport()
+    embedder = embedder or build_embedder()
+
+    with _Stage(report, "diff"):
+        existing = {r.name: r for r in db.query(FunctionDef).all()}
+        wanted = {f["name"]: row_values(f) for f in funcs}
+        to_write = []
+        for name, values in wanted.items():
+            row = existing.get(name)
+            if row is None:
+                report.added.append(name)
+                to_write.append(values)
+            elif _needs_update(row, values):
+                report.changed.append(name)
+                to_write.append(values)
+            else:
+                report.unchanged += 1
+        if prune:
+            report.removed = [n for n in existing if n not in wanted]
+
+    if not to_write and not report.removed:
+        if not build_index:
+            return report
+        if not force_index and (read_index_manifest(faiss_dir) or {}).get("fingerprint") == db_fingerprint(db):
+            logger.info(f"[SEED] sin cambios; el índice publicado ya está al día | {report.summary()}")
+            return report
+
+    # Documentos del índice con el estado final: filas existentes + cambios − eliminadas
+    final_rows = {n: r for n, r in existing.items() if n not in report.removed}
+    for values in to_write:
+        final_rows[values["name"]] = FunctionDef(**values)
+    final_docs = function_documents(list(final_rows.values()))
+    index_texts = [d.page_content for d in final_docs] if build_index else []
+
+    with _Stage(report, "embed"):
+        # embedders entrenables (tfidf) se ajustan sobre el catálogo final
+        fit_embedder(embedder, catalog_texts(list(final_rows.values()), final_docs))
+        profiles = [v["profile_text"] for v in to_write]
+        unique_docs = list(dict.fromkeys(index_texts))
+        texts = profiles + unique_docs
+        vectors = embed_in_batches(embedder, texts) if texts else np.zeros((0, 0), dtype="float32")
+        report.embedded_texts = len(texts)
+        profile_vecs = vectors[:len(profiles)]
+        vec_by_text = dict(zip(unique_docs, vectors[len(profiles):]))
+
+    with _Stage(report, "upsert"):
+        try:
+            for values, vec in zip(to_write, profile_vecs):
+                values = {**values, "embedding_json": encode_vector(vec, settings.EMB_DB_STORAGE)}
+                row = existing.get(values["name"])
+                if row is None:
+                    db.add(FunctionDef(**values))
+                else:
+                    for k, v in values.items():
+                        setattr(row, k, v)
+            for name in report.removed:
+                db.delete(existing[name])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    if build_index:
+        with _Stage(report, "index"):
+            # se reutilizan los vectores ya calculados, en el orden de function_documents()
+            rows = db.query(FunctionDef).order_by(FunctionDef.id).all()
+            docs = function_documents(rows)
+            vectors = np.stack([vec_by_text[d.page_content] for d in docs])
+            build_vector_store_from_db(db, embedder=embedder, vectors=vectors, faiss_dir=faiss_dir)
+            report.index_version = (read_index_manifest(faiss_dir) or {}).get("version")
+
+    logger.info(f"[SEED] {report.summary()}")
+    return report
@@ -8,10 +8,61 @@ class Settings(BaseSettings):
 
     # Embeddings
     EMB_MODEL_NAME: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    EMB_BACKEND: str = "hf"    # hf (PyTorch) | onnx (onnxruntime) | int8 (cuantización dinámica) | tfidf
+    EMB_ONNX_FILE: str = ""    # con onnx: archivo dentro del repo del modelo, p.ej. onnx/model_qint8_avx2.onnx
+    EMB_TFIDF_NGRAM_MAX: int = 4        # tfidf: n-gramas de caracteres de 2 a N
+    EMB_TFIDF_MAX_FEATURES: int = 8192
+    EMB_TFIDF_SVD_DIM: int = 0          # >0 reduce con TruncatedSVD a esa dimensión
+    EMB_BATCH_SIZE: int = 256  # textos por llamada a embed_documents en la siembra
+    EMB_WORKERS: int = 0         # >0: el modelo corre en N procesos dedicados (fuera del GIL de la API)
+    EMB_WORKER_THREADS: int = 1  # hilos de torch por proceso de embeddings
+    EMB_DB_STORAGE: str = "f32"  # FunctionDef.embedding_json: f32 (lista JSON) | f16 | sq8
+    EMB_STORE_PATH: str = "./data/embeddings.sqlite"  # almacén persistente (SQLite WAL); "" lo desactiva
+    EMB_QUERY_CACHE_SIZE: int = 1024  # consultas recordadas en memoria (LRU); no van al almacén; 0 = sin caché
+
+    # Routing: embedding | hybrid (BM25 primero, embedding solo si es ambiguo)
+    ROUTER_MODE: str = "hybrid"
+    LEXICAL_MIN_SCORE: float = 2.5     # puntaje BM25 mínimo del ganador
+    LEXICAL_MIN_MARGIN: float = 0.35   # (top1 - top2) / top1
+    LEXICAL_MIN_COVERAGE: float = 0.6  # fracción de términos conocidos en la consulta
+    # Etapa de embeddings: knn (voto de vecinos) | logreg (cabeza lineal entrenada al indexar)
+    ROUTER_HEAD: str = "knn"
+    ROUTER_HEAD_MIN_EXAMPLES: int = 3  # funciones con menos ejemplos quedan en kNN
+    ROUTER_HEAD_MIN_PROB: float = 0.2  # por debajo se consulta el kNN (uniforme ≈ 1/12)
+    ROUTER_HEAD_C: float = 10.0        # inversa de la regularización L2
 
     # Vector index path (FAISS)
     FAISS_DIR: str = "./data/faiss_index"
 
+    # Tipo de índice: flat (exacto) | hnsw | ivf | auto (ANN solo con corpus grande)
+    INDEX_MODE: str = "auto"
+    INDEX_ANN_MIN_DOCS: int = 5000    # en modo auto, desde cuántos documentos usar ANN
+    INDEX_ANN_KIND: str = "hnsw"      # ANN usado por el modo auto: hnsw | ivf
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 80
+    HNSW_EF_SEARCH: int = 64
+    IVF_NLIST: int = 0                # 0 = automático (~4·sqrt(n))
+    IVF_NPROBE: int = 8
+
+    # Almacenamiento del índice: f32 | f16 (SQfp16) | sq8 (SQ8), con PCA opcional
+    INDEX_STORAGE: str = "f32"
+    INDEX_PCA_DIM: int = 0               # >0 reduce los vectores con PCA a esa dimensión
+    INDEX_ACCURACY_GUARD: bool = True    # valida el top-1 contra el corpus antes de publicar
+    INDEX_GUARD_MAX_DROP: float = 0.02   # caída máxima de accuracy vs float32 exacto
+
+    # Recarga en caliente del índice
+    INDEX_WATCH_INTERVAL_S: float = 0   # >0 activa el modo watch (segundos entre chequeos)
+    INDEX_LOCK_STALE_S: float = 300     # lock de reindexación huérfano tras N segundos
+
+    # Multi-tenant: cada panadería en TENANTS_DIR/<tenant_id>/ (agent.db, faiss_index/, ...)
+    DEFAULT_TENANT: str = "default"        # usa DB_URL / FAISS_DIR de arriba
+    DEFAULT_SESSION: str = "default-session"  # session_id de /chat sin sesión: compartido, nunca identifica a nadie
+    TENANTS_DIR: str = "./data/tenants"
+    TENANT_MEMORY_BUDGET_MB: float = 512   # presupuesto de tenants en memoria (LRU)
+
+    # Endpoints /admin (deshabilitados si no hay token)
+    ADMIN_TOKEN: str | None = None
+
     # LLM provider: none | openai | ollama | groq
     LLM_PROVIDER: str = "none"
     
@@ -32,4 +83,76 @@ class Settings(BaseSettings):
     NEO4J_USER: str | None = None
     NEO4J_PASSWORD: str | None = None
 
+    # Ejecución del plan (DAG de pasos)
+    EXEC_MAX_WORKERS: int = 4        # hilos del pool compartido
+    EXEC_STEP_TIMEOUT_S: float = 5.0 # timeout por paso (incluye espera en el pool)
+
+    # Control de admisión por etapa: concurrencia máxima y cola de espera (0 = sin límite)
+    ADMISSION_EMBED_CONCURRENCY: int = 4
+    ADMISSION_EMBED_QUEUE: int = 16
+    ADMISSION_TOOLS_CONCURRENCY: int = 8   # planes ejecutándose a la vez
+    ADMISSION_TOOLS_QUEUE: int = 32
+    ADMISSION_LLM_CONCURRENCY: int = 4
+    ADMISSION_LLM_QUEUE: int = 8
+    ADMISSION_WAIT_S: float = 2.0          # espera máxima en cola antes de descartar
+    ADMISSION_RETRY_AFTER_S: int = 2       # header Retry-After de los 503
+    ADMISSION_LLM_SHED: str = "template"   # LLM saturado: template (respuesta de plantilla) | 503
+    SESSION_RATE_PER_MIN: float = 30       # /chat por sesión y minuto (0 = sin límite)
+    SESSION_BURST: int = 5
+
+    # Single-flight: consultas idénticas concurrentes comparten routing y respuesta del LLM
+    COALESCE_ENABLED: bool = True
+
+    # Caché de herramientas de solo lectura (por inventario y versión del inventario)
+    TOOL_CACHE_TTL_S: float = 300      # 0 = sin caché
+    TOOL_CACHE_MAX_ENTRIES: int = 2048
+
+    # Prefetch de herramientas de solo lectura de los siguientes pasos probables (por sesión)
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_TTL_S: float = 30
+    PREFETCH_MAX_NEXT: int = 2          # siguientes pasos del grafo a precargar
+    PREFETCH_WORKERS: int = 2
+    PREFETCH_MAX_SESSIONS: int = 5000
+
+    # Pedidos: ids hi/lo y escritura write-behind en lotes (group commit)
+    ORDERS_WRITE_BEHIND: bool = True    # false = cada escritura en su propia transacción
+    ORDERS_FLUSH_INTERVAL_MS: float = 50
+    ORDERS_BATCH_MAX: int = 200         # operaciones por commit
+    ORDERS_ID_BLOCK: int = 100          # ids reservados por cada UPDATE de id_sequences
+    ORDERS_CACHE_MAX: int = 10000       # pedidos en la caché de lectura
+    ORDERS_CACHE_TTL_S: float = 2.0     # vida de un pedido en la caché (otro worker puede cambiarlo)
+
+    # Clientes: upserts por teléfono en lotes y caché de búsqueda por teléfono
+    CUSTOMERS_WRITE_BEHIND: bool = True
+    CUSTOMERS_FLUSH_INTERVAL_MS: float = 50
+    CUSTOMERS_BATCH_MAX: int = 500
+    CUSTOMERS_ID_BLOCK: int = 100
+    CUSTOMERS_CACHE_MAX: int = 50000
+
+    # Recomendador: embeddings de productos (TF-IDF + SVD sobre el catálogo) y vecinos precalculados
+    RECO_TOP_K: int = 3              # recomendaciones por consulta
+    RECO_SVD_DIM: int = 64           # dimensión de los embeddings de producto
+    RECO_MAX_FEATURES: int = 8192    # n-gramas de caracteres del vocabulario TF-IDF
+    RECO_NEIGHBORS: int = 20         # vecinos precalculados por producto (N×K en vez de N×N)
+    RECO_BLOCK_ROWS: int = 1024      # filas por bloque al calcular los vecinos (memoria ≈ bloque×N float32)
+    RECO_BUILD_WAIT_S: float = 1.0   # espera máxima de una consulta por el modelo; luego responde sin él
+    RECO_BUILD_WORKERS: int = 2      # construcciones de modelo en paralelo (una por huella de catálogo)
+
+    # Respuestas de /chat: perfil por defecto (lite | full | debug) y compresión (gzip / brotli)
+    RESPONSE_PROFILE_DEFAULT: str = "full"
+    RESPONSE_COMPRESS_MIN_BYTES: int = 512   # payloads más chicos no se comprimen (0 = sin compresión)
+    RESPONSE_BROTLI_QUALITY: int = 4         # 0-11; 4 comprime casi como 11 con una fracción del CPU
+
+    # Profiler por petición: header X-Profile (con X-Admin-Token) o muestreo del tráfico
+    PROFILE_DIR: str = "./data/profiles"
+    PROFILE_SAMPLE_RATE: float = 0.0        # fracción de /chat perfilados sin pedirlo (0 = solo por header)
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5   # período del muestreo de pila
+    PROFILE_MAX_CAPTURES: int = 50          # rotación: se borran las más antiguas
+    PROFILE_TRACEMALLOC: bool = True
+    PROFILE_TRACEMALLOC_FRAMES: int = 1
+    PROFILE_TRACEMALLOC_TOP: int = 30
+
+    # Prompt de respuesta: presupuesto (tokens estimados) para los datos del inventario
+    RESPOND_CONTEXT_TOKENS: int = 600
+
 settings = Settings()
@@ -0,0 +1,243 @@
+# Registro multi-tenant: índice de routing, grafo de funciones e inventario por panadería
+# Layout en disco (TENANTS_DIR/<tenant_id>/):
+#   agent.db             catálogo de funciones (function_defs) del tenant
+#   faiss_index/         artefacto versionado del índice (CURRENT + vNNNNNN/)
+#   function_graph.json  opcional; si falta se usa FUNCTION_GRAPH
+#   inventory.json       opcional; si falta se usan los datos del inventario por defecto
+# Los pedidos y clientes de cada tenant van a su agent.db (sus propios OrderStore
+# / CustomerStore, registrados en app/tools.py para su inventario).
+# DEFAULT_TENANT es el despliegue original (DB_URL, FAISS_DIR, index_manager
+# global) y nunca se expulsa. El resto se carga en su primer request y se
+# expulsa por LRU cuando la memoria estimada supera TENANT_MEMORY_BUDGET_MB.
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, Optional
+
+import faiss
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from .db import Base, SessionLocal
+from .function_graph import FunctionGraphManager, get_function_graph
+from .graph import build_graph
+from .index_manager import IndexManager, index_manager
+from .customers import CustomerStore
+from .inventory import DEFAULT_INVENTORY, Inventory, load_inventory
+from .logging_config import setup_logging
+from .metrics import metrics
+from .orders import OrderStore
+from .recommender import warm_recommender
+from .settings import settings
+from .tools import register_tenant_stores
+
+logger = setup_logging()
+
+TENANT_ID_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+class UnknownTenantError(KeyError):
+    """No existe el directorio del tenant."""
+
+
+@dataclass
+class Tenant:
+    tenant_id: str
+    index_manager: IndexManager
+    session_factory: Callable[[], Session]
+    function_graph: FunctionGraphManager
+    inventory: Inventory
+    orders: Optional[OrderStore] = None       # None = los globales (tenant por defecto)
+    customers: Optional[CustomerStore] = None
+    pinned: bool = False
+    load_ms: float = 0.0
+    size_bytes: int = 0
+    size_version: int = -1   # versión del índice con la que se estimó size_bytes
+
+
+def validate_tenant_id(tenant_id: str) -> str:
+    if not TENANT_ID_RE.match(tenant_id or ""):
+        raise ValueError(f"tenant_id inválido: {tenant_id!r}")
+    return tenant_id
+
+def tenant_paths(tenant_id: str) -> tuple[str, str, str]:
+    """(directorio, DB_URL, faiss_dir) de un tenant."""
+    root = os.path.join(settings.TENANTS_DIR, validate_tenant_id(tenant_id))
+    return root, f"sqlite:///{os.path.join(root, 'agent.db')}", os.path.join(root, "faiss_index")
+
+def make_session_factory(db_url: str) -> Callable[[], Session]:
+    engine = create_engine(db_url, echo=False, future=True)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+def estimate_tenant_bytes(tenant: Tenant) -> int:
+    """Memoria aproximada del snapshot: índice FAISS serializado + textos del docstore."""
+    snap = tenant.index_manager.snapshot
+    if snap is None:
+        return 0
+    index_bytes = faiss.serialize_index(snap.vs.index).size
+    docs = getattr(snap.vs.docstore, "_dict", {})
+    text_bytes = sum(len(d.page_content.encode("utf-8")) for d in docs.values())
+    return int(index_bytes + 2 * text_bytes)  # ×2: metadatos, mapeos e índice léxico
+
+
+class TenantRegistry:
+    def __init__(self, budget_mb: Optional[float] = None):
+        self._budget_mb = budget_mb
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    @property
+    def budget_bytes(self) -> float:
+        mb = self._budget_mb if self._budget_mb is not None else settings.TENANT_MEMORY_BUDGET_MB
+        return mb * 1024 * 1024
+
+    def get(self, tenant_id: str) -> Tenant:
+        """Tenant cargado (LRU); la primera vez lo carga (un solo hilo por tenant)."""
+        validate_tenant_id(tenant_id)
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None:
+                self._tenants.move_to_end(tenant_id)
+                metrics.incr(f"tenant.{tenant_id}.hit")
+                return tenant
+        # ids desconocidos no dejan ni lock ni métricas: se valida el directorio antes
+        if tenant_id != settings.DEFAULT_TENANT and not os.path.isdir(tenant_paths(tenant_id)[0]):
+            raise UnknownTenantError(tenant_id)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(tenant_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                tenant = self._tenants.get(tenant_id)
+            if tenant is not None:  # lo cargó otro hilo mientras esperábamos
+                metrics.incr(f"tenant.{tenant_id}.hit")
+                return tenant
+            metrics.incr(f"tenant.{tenant_id}.miss")
+            t0 = time.perf_counter()
+            tenant = self._load(tenant_id)
+            tenant.load_ms = (time.perf_counter() - t0) * 1000
+            metrics.observe(f"tenant.{tenant_id}.load", tenant.load_ms)
+            logger.info(f"[TENANT] {tenant_id} cargado en {tenant.load_ms:.0f} ms "
+                        f"(~{tenant.size_bytes / 1e6:.1f} MB)")
+            with self._lock:
+                self._tenants[tenant_id] = tenant
+                evicted = self._evict()
+            for old in evicted:  # fuera de _lock: vaciar colas y cerrar conexiones no frena al resto
+                self._release(old)
+            return tenant
+
+    def _load(self, tenant_id: str) -> Tenant:
+        if tenant_id == settings.DEFAULT_TENANT:
+            tenant = Tenant(tenant_id, index_manager, SessionLocal, get_function_graph(), DEFAULT_INVENTORY, pinned=True)
+        else:
+            root, db_url, faiss_dir = tenant_paths(tenant_id)
+            if not os.path.isdir(root):
+                raise UnknownTenantError(tenant_id)
+            graph_path = os.path.join(root, "function_graph.json")
+            graph_data = None
+            if os.path.exists(graph_path):
+                with open(graph_path, encoding="utf-8") as f:
+                    graph_data = json.load(f)
+            fg = FunctionGraphManager(graph=graph_data)  # en memoria: Neo4j queda para el tenant por defecto
+            inv_path = os.path.join(root, "inventory.json")
+            # instancia propia aunque use los datos por defecto: el inventario identifica al tenant
+            inventory = load_inventory(inv_path) if os.path.exists(inv_path) else Inventory()
+            session_factory = make_session_factory(db_url)
+            manager = IndexManager(
+                graph_factory=partial(build_graph, function_graph=fg, inventory=inventory),
+                faiss_dir=faiss_dir, session_factory=session_factory,
+            )
+            tenant = Tenant(tenant_id, manager, session_factory, fg, inventory,
+                            OrderStore(session_factory), CustomerStore(session_factory))
+            register_tenant_stores(inventory, tenant.orders, tenant.customers)
+            warm_recommender(inventory)  # el modelo se construye fuera de la primera consulta
+
+        with tenant.session_factory() as db:
+            tenant.index_manager.get(db)
+        self._refresh_size(tenant)
+        return tenant
+
+    def _refresh_size(self, tenant: Tenant) -> None:
+        version = tenant.index_manager.version
+        if version != tenant.size_version:
+            tenant.size_bytes = estimate_tenant_bytes(tenant)
+            tenant.size_version = version
+
+    def _evict(self) -> list[Tenant]:
+        """Saca del registro los tenants menos usados hasta entrar en el presupuesto
+        (con _lock tomado). Devuelve los expulsados para liberarlos fuera del lock."""
+        evicted = []
+        for t in self._tenants.values():
+            self._refresh_size(t)
+        total = sum(t.size_bytes for t in self._tenants.values())
+        newest = next(reversed(self._tenants))
+        for tenant_id in list(self._tenants):
+            if total <= self.budget_bytes:
+                break
+            tenant = self._tenants[tenant_id]
+            if tenant.pinned or tenant_id == newest:
+                continue
+            # las peticiones en curso conservan su snapshot y sus stores (que tras
+            # close() escriben de forma síncrona); solo se suelta la referencia
+            del self._tenants[tenant_id]
+            lock = self._load_locks.get(tenant_id)
+            if lock is not None and not lock.locked():  # si alguien lo está recargando, el lock sigue
+                del self._load_locks[tenant_id]
+            metrics.drop(f"tenant.{tenant_id}.")
+            evicted.append(tenant)
+            total -= tenant.size_bytes
+            metrics.incr("tenant.evictions")
+            logger.info(f"[TENANT] {tenant_id} expulsado (LRU); en memoria ~{total / 1e6:.1f} MB")
+        return evicted
+
+    @staticmethod
+    def _release(tenant: Tenant) -> None:
+        tenant.index_manager.stop_watch()
+        if tenant.orders is not None:
+            tenant.orders.close()  # vacía la cola write-behind
+            tenant.customers.close()
+        if not tenant.pinned:  # conexiones de la BD del tenant (el por defecto usa el engine global)
+            engine = getattr(tenant.session_factory, "kw", {}).get("bind")
+            if engine is not None:
+                engine.dispose()
+
+    def close(self) -> None:
+        """Al apagar: vacía las colas de pedidos/clientes de los tenants cargados."""
+        with self._lock:
+            tenants, self._tenants = list(self._tenants.values()), OrderedDict()
+        for tenant in tenants:
+            self._release(tenant)
+
+    def loaded(self) -> list[str]:
+        with self._lock:
+            return list(self._tenants)
+
+    def status(self) -> dict:
+        with self._lock:
+            tenants = list(self._tenants.values())
+        out = {}
+        for t in tenants:
+            hits, misses = metrics.get(f"tenant.{t.tenant_id}.hit"), metrics.get(f"tenant.{t.tenant_id}.miss")
+            out[t.tenant_id] = {
+                "index_version": t.index_manager.version,
+                "size_mb": round(t.size_bytes / 1e6, 3),
+                "load_ms": round(t.load_ms, 1),
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                "pinned": t.pinned,
+            }
+        return {
+            "budget_mb": self.budget_bytes / (1024 * 1024),
+            "used_mb": round(sum(t.size_bytes for t in tenants) / 1e6, 3),
+            "evictions": metrics.get("tenant.evictions"),
+            "tenants": out,
+        }
+
+
+tenant_registry = TenantRegistry()
@@ -0,0 +1,83 @@
+# Embedder liviano: TF-IDF de n-gramas de caracteres (+ SVD opcional)
+# Pensado para equipos chicos (kioscos ARM) donde torch/sentence-transformers no
+# entran, y como embedder determinista y rápido en los tests. Se ajusta sobre
+# los textos del catálogo (perfiles + documentos del índice) y el estado ajustado
+# se publica junto con cada versión del índice FAISS.
+
+import hashlib
+import pickle
+import threading
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+STATE_FILE = "tfidf.pkl"
+
+def corpus_fingerprint(texts: List[str]) -> str:
+    h = hashlib.sha1()
+    for t in sorted(set(texts)):
+        h.update(t.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class TfidfEmbeddings(Embeddings):
+    def __init__(self, ngram_range=(2, 4), max_features: int = 8192, svd_dim: int = 0):
+        self.ngram_range = tuple(ngram_range)
+        self.max_features = max_features
+        self.svd_dim = svd_dim
+        self.vectorizer: Optional[TfidfVectorizer] = None
+        self.svd: Optional[TruncatedSVD] = None
+        self.fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def fitted(self) -> bool:
+        return self.vectorizer is not None
+
+    def fit(self, texts: List[str]) -> "TfidfEmbeddings":
+        """Ajusta sobre `texts`; no hace nada si ya está ajustado con el mismo corpus."""
+        fingerprint = corpus_fingerprint(texts)
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return self
+            corpus = sorted(set(texts))  # independiente del orden de las filas
+            vectorizer = TfidfVectorizer(
+                analyzer="char_wb", ngram_range=self.ngram_range, lowercase=True,
+                strip_accents="unicode", sublinear_tf=True, max_features=self.max_features,
+            )
+            x = vectorizer.fit_transform(corpus)
+            svd = None
+            n_components = min(self.svd_dim, x.shape[0] - 1, x.shape[1] - 1)
+            if self.svd_dim and n_components > 0:
+                svd = TruncatedSVD(n_components=n_components, random_state=0).fit(x)
+            self.vectorizer, self.svd, self.fingerprint = vectorizer, svd, fingerprint
+        return self
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if not self.fitted:
+            raise RuntimeError("TfidfEmbeddings sin ajustar: llama a fit() o restaura el estado del índice")
+        x = self.vectorizer.transform(texts)
+        x = self.svd.transform(x) if self.svd is not None else x.toarray()
+        return normalize(x).astype("float32")  # L2 normalizado: L2 ~ coseno, como MiniLM
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump({"vectorizer": self.vectorizer, "svd": self.svd, "fingerprint": self.fingerprint}, f)
+
+    def load(self, path: str) -> "TfidfEmbeddings":
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        with self._lock:
+            self.vectorizer, self.svd, self.fingerprint = state["vectorizer"], state["svd"], state["fingerprint"]
+        return self
@@ -0,0 +1,436 @@
+# Registro de herramientas del agente
+# Cada herramienta se registra con @tool_registry.tool(...) y declara:
+#   - sus argumentos (la firma de la función, validados con pydantic)
+#   - su timeout (None = EXEC_STEP_TIMEOUT_S). Las que mutan usan NO_TIMEOUT: el
+#     ejecutor las espera en vez de abandonarlas con la escritura a medias.
+#   - si es de solo lectura: su resultado se cachea con TTL por (inventario,
+#     versión del inventario, argumentos); Inventory.mark_changed() lo invalida.
+#   - opcionalmente `prefetch`: la parte de su respuesta que no depende de la
+#     consulta (promociones, zonas...). La herramienta la recibe en el parámetro
+#     keyword-only `parte`; el prefetch la precalcula para el turno siguiente.
+# El despacho es un lookup en un dict: agregar herramientas no alarga ninguna cadena if/elif.
+
+import copy
+import inspect
+import json
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel, ConfigDict, ValidationError, create_model
+
+from .customers import CustomerStore, customer_store, extract_contact, parse_customer_id
+from .entities import extract_entities
+from .executor import NO_TIMEOUT
+from .inventory import DEFAULT_INVENTORY, Inventory
+from .logging_config import setup_logging
+from .metrics import metrics
+from .orders import OPEN_STATUSES, OrderStore, order_store, parse_order_id
+from .recommender import recommend
+from .settings import settings
+
+logger = setup_logging()
+
+@dataclass(frozen=True)
+class ToolSpec:
+    name: str
+    fn: Callable[..., Dict[str, Any]]
+    args_model: Type[BaseModel]
+    read_only: bool
+    timeout_s: Optional[float]
+    ttl_s: Optional[float]
+    prefetch: Optional[Callable[[Inventory], Dict[str, Any]]] = None
+
+    def arg_names(self):
+        return list(self.args_model.model_fields)
+
+
+def _args_model(name: str, fn: Callable) -> Type[BaseModel]:
+    # el primer parámetro es el inventario; el resto son los argumentos de la herramienta
+    # (menos los keyword-only, como `parte`, que los llena el registro)
+    params = [p for p in list(inspect.signature(fn).parameters.values())[1:] if p.kind is not p.KEYWORD_ONLY]
+    fields = {
+        p.name: (p.annotation if p.annotation is not inspect.Parameter.empty else Any,
+                 ... if p.default is inspect.Parameter.empty else p.default)
+        for p in params
+    }
+    # los pasos del plan llevan {"query": ...} aunque la herramienta no la use
+    return create_model(f"{name}_args", __config__=ConfigDict(extra="ignore"), **fields)
+
+
+class ToolRegistry:
+    def __init__(self):
+        self._tools: Dict[str, ToolSpec] = {}
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # clave → (expira, resultado)
+        self._lock = threading.Lock()
+
+    def tool(self, name: str, read_only: bool = False, timeout_s: Optional[float] = None,
+             ttl_s: Optional[float] = None, prefetch: Optional[Callable[[Inventory], Dict[str, Any]]] = None):
+        """Decorador de registro. `ttl_s` solo aplica a herramientas de solo lectura."""
+        def register(fn):
+            if name in self._tools:
+                raise ValueError(f"Herramienta duplicada: {name}")
+            self._tools[name] = ToolSpec(name, fn, _args_model(name, fn), read_only, timeout_s, ttl_s, prefetch)
+            return fn
+        return register
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._tools.get(name)
+
+    def names(self):
+        return list(self._tools)
+
+    def timeout_for(self, name: str) -> Optional[float]:
+        spec = self._tools.get(name)
+        return spec.timeout_s if spec else None
+
+    def call(self, name: str, args: Dict[str, Any], inventory: Optional[Inventory] = None,
+             use_cache: bool = True, parte: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Ejecuta la herramienta y devuelve {"function", "success", "data"}.
+
+        `use_cache=False`: ni lee ni llena la caché compartida (el prefetch guarda lo suyo aparte).
+        `parte`: la parte independiente de la consulta ya calculada (si no, se calcula acá).
+        """
+        inv = inventory or DEFAULT_INVENTORY
+        spec = self._tools.get(name)
+        if spec is None:
+            print(f"[EXEC] Función no implementada: {name}")
+            metrics.incr("tools.unknown")
+            return {"function": name, "success": False, "data": {"error": "Función no implementada"}}
+        try:
+            parsed = spec.args_model(**args)
+        except ValidationError as e:
+            metrics.incr(f"tools.{name}.invalid_args")
+            return {"function": name, "success": False, "data": {"error": f"Argumentos inválidos: {e.errors()}"}}
+
+        metrics.incr(f"tools.{name}.calls")
+        key = self._result_key(spec, parsed, inv) if use_cache else None
+        if key is not None:
+            cached = self._cache_get(key)
+            if cached is not None:
+                metrics.incr(f"tools.{name}.cache_hit")
+                print(f"[EXEC] {name}: resultado en caché (inventario v{inv.version})")
+                return copy.deepcopy(cached)
+
+        t0 = time.perf_counter()
+        extra = {}
+        if spec.prefetch is not None:
+            extra["parte"] = parte if parte is not None else spec.prefetch(inv)
+        data = spec.fn(inv, **parsed.model_dump(), **extra)
+        metrics.observe(f"tools.{name}", (time.perf_counter() - t0) * 1000)
+        result = {"function": name, "success": True, "data": data}
+        if key is not None:
+            # se guarda una copia: el llamador puede tocar su resultado sin ensuciar la caché
+            ttl_s = settings.TOOL_CACHE_TTL_S if spec.ttl_s is None else spec.ttl_s
+            self._cache_put(key, copy.deepcopy(result), ttl_s)
+        return result
+
+    @staticmethod
+    def _result_key(spec: ToolSpec, parsed: BaseModel, inv: Inventory) -> Optional[tuple]:
+        if not spec.read_only or spec.ttl_s == 0:  # ttl_s=0: lectura con caché propia (p. ej. pedidos)
+            return None
+        return (spec.name, inv.uid, inv.version, json.dumps(parsed.model_dump(), sort_keys=True, default=str))
+
+    def result_key(self, name: str, args: Dict[str, Any], inventory: Optional[Inventory] = None) -> Optional[tuple]:
+        """Clave del resultado de una herramienta cacheable (None si muta, tiene ttl_s=0 o los args no validan)."""
+        spec = self._tools.get(name)
+        if spec is None or not spec.read_only:
+            return None
+        try:
+            parsed = spec.args_model(**args)
+        except ValidationError:
+            return None
+        return self._result_key(spec, parsed, inventory or DEFAULT_INVENTORY)
+
+    def part_key(self, name: str, inventory: Optional[Inventory] = None) -> Optional[tuple]:
+        """Clave de la parte independiente de la consulta (None si la herramienta no declara `prefetch`)."""
+        spec = self._tools.get(name)
+        if spec is None or spec.prefetch is None:
+            return None
+        inv = inventory or DEFAULT_INVENTORY
+        return (name, "parte", inv.uid, inv.version)
+
+    def _cache_get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires, result = entry
+            if expires <= time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return result
+
+    def _cache_put(self, key, result, ttl_s: float) -> None:
+        if ttl_s <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (time.monotonic() + ttl_s, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > settings.TOOL_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def status(self) -> Dict[str, Any]:
+        """Llamadas, aciertos de caché y latencia por herramienta (para GET /metrics)."""
+        timings = metrics.snapshot()["timings"]
+        out = {}
+        for name, spec in self._tools.items():
+            calls = metrics.get(f"tools.{name}.calls")
+            hits = metrics.get(f"tools.{name}.cache_hit")
+            t = timings.get(f"tools.{name}", {})
+            out[name] = {
+                "read_only": spec.read_only,
+                "calls": int(calls),
+                "cache_hit_rate": round(hits / calls, 4) if calls else 0.0,
+                "executed": t.get("count", 0),
+                "avg_ms": t.get("avg_ms", 0.0),
+                "max_ms": round(t.get("max_ms", 0.0), 3),
+            }
+        with self._lock:
+            out["_cache_entries"] = len(self._cache)
+        return out
+
+
+tool_registry = ToolRegistry()
+tool = tool_registry.tool
+
+
+# ---- Herramientas de la panadería ----
+
+@tool("saludar_cortesia", read_only=True, timeout_s=2.0)
+def saludar_cortesia(inv: Inventory) -> dict:
+    print("[EXEC] Procesando saludo/cortesía...")
+    print("[EXEC] Detectado: mensaje de cortesía del cliente")
+    return {"tipo": "cortesia", "sugerencias": ["Ver productos", "Hacer pedido", "Consultar horarios"]}
+
+
+@tool("responder_fuera_contexto", read_only=True, timeout_s=2.0)
+def responder_fuera_contexto(inv: Inventory) -> dict:
+    print("[EXEC] Detectando tema fuera de contexto...")
+    print("[EXEC] El mensaje no está relacionado con la panadería")
+    return {"es_fuera_contexto": True, "mensaje": "No puedo ayudarte con eso, pero sí con productos de panadería"}
+
+
+@tool("buscar_producto", read_only=True, timeout_s=2.0)
+def buscar_producto(inv: Inventory, query: str) -> dict:
+    print("[EXEC] Buscando en catálogo de productos...")
+    ents = extract_entities(query, inv)
+    ids = [i["producto_id"] for i in ents.items] + [o for a in ents.ambiguous for o in a["opciones"]]
+    productos_encontrados = [{**inv.productos[k], "id": k} for k in dict.fromkeys(ids)]
+    if not productos_encontrados:
+        productos_encontrados = inv.buscar_producto_por_nombre(query)
+    if not productos_encontrados:
+        # Buscar en todos los productos disponibles
+        productos_encontrados = [{**p, "id": k} for k, p in list(inv.productos.items())[:5]]
+    for p in productos_encontrados:
+        print(f"  → {p['nombre']}: ${p['precio']:.2f} (stock: {p.get('stock', 'N/A')})")
+    return {"productos": productos_encontrados}
+
+
+def _promociones(inv: Inventory) -> dict:
+    inv.columnar()  # deja armada la tabla de precios de esta versión
+    return {"promociones": inv.promociones}
+
+@tool("consultar_precio_promos", read_only=True, timeout_s=2.0, prefetch=_promociones)
+def consultar_precio_promos(inv: Inventory, query: str, *, parte: dict) -> dict:
+    print("[EXEC] Consultando precios y promociones...")
+    # Buscar producto mencionado (y la cantidad, para que apliquen las promos por volumen)
+    ents = extract_entities(query, inv)
+    if ents.items:
+        productos = [{"id": ents.items[0]["producto_id"], "cantidad": ents.items[0]["cantidad"]}]
+    else:
+        productos = inv.buscar_producto_por_nombre(query)
+    if productos:
+        precio_info = inv.obtener_precio(productos[0]["id"], productos[0].get("cantidad", 1))
+        print(f"  → {precio_info['producto']}: ${precio_info['precio_unitario']:.2f}")
+        if precio_info.get("promocion"):
+            print(f"  → Promoción aplicada: {precio_info['promocion']}")
+    else:
+        precio_info = {"mensaje": "Consulta nuestro catálogo completo"}
+
+    # Mostrar promociones activas
+    print("[EXEC] Promociones vigentes:")
+    for promo in parte["promociones"].values():
+        print(f"  → {promo['descripcion']}")
+    return {"precio": precio_info, "promociones": parte["promociones"]}
+
+
+# incluye la espera por el modelo (RECO_BUILD_WAIT_S); si no está, responde con filtros
+@tool("recomendar_productos", read_only=True, timeout_s=3.0)
+def recomendar_productos(inv: Inventory, query: str = "") -> dict:
+    print("[EXEC] Generando recomendaciones personalizadas...")
+    # Filtros (categoría, etiquetas, presupuesto) de la consulta + similitud de embeddings
+    recomendaciones, prefs = recommend(query, inv)
+    for r in recomendaciones:
+        print(f"  → {r['nombre']} (${r['precio']:.2f}) - {r['razon']}")
+    out = {"recomendaciones": recomendaciones, "filtros": prefs.to_dict()}
+    if not recomendaciones:
+        out["mensaje"] = "No tenemos productos que cumplan todo lo que pides"
+    return out
+
+
+# Pedidos y clientes de cada tenant en su propia BD (Tenant.session_factory); el
+# inventario identifica al tenant. Sin registrar: los stores globales (BD por defecto).
+# La entrada vive lo que vive el inventario: una petición en curso de un tenant
+# recién expulsado sigue escribiendo en la BD de ese tenant.
+_tenant_stores: Dict[int, Tuple[OrderStore, CustomerStore]] = {}
+
+def register_tenant_stores(inv: Inventory, orders: OrderStore, customers: CustomerStore) -> None:
+    _tenant_stores[inv.uid] = (orders, customers)
+    weakref.finalize(inv, _tenant_stores.pop, inv.uid, None)
+
+def _stores(inv: Inventory) -> Tuple[OrderStore, CustomerStore]:
+    return _tenant_stores.get(inv.uid) or (order_store, customer_store)
+
+
+@tool("crear_pedido", timeout_s=NO_TIMEOUT)
+def crear_pedido(inv: Inventory, query: str = "", session_id: Optional[str] = None) -> dict:
+    print("[EXEC] Iniciando creación de pedido...")
+    print("[EXEC] Validando items del pedido...")
+    ents = extract_entities(query, inv)
+    # términos genéricos ("4 empanadas"): hay que preguntar cuál
+    if not ents.items:
+        print("[EXEC] Sin productos concretos: no se crea el pedido")
+        return {"pedido": None, "por_confirmar": ents.ambiguous, "mensaje": "¿Qué productos quieres pedir?"}
+    # todo el carrito contra el stock de una vez, antes de crear nada: lo que falta queda fuera del pedido
+    sin_stock = inv.verificar_stock_pedido(ents.items)["faltantes"]
+    faltan = {f["producto_id"] for f in sin_stock}
+    items = [i for i in ents.items if i["producto_id"] not in faltan]
+    if not items:
+        print("[EXEC] Sin stock para ningún producto: no se crea el pedido")
+        return {"pedido": None, "por_confirmar": ents.ambiguous, "sin_stock": sin_stock,
+                "mensaje": "No tenemos stock suficiente de lo que pides"}
+    print("[EXEC] Calculando total...")
+    # solo el cliente vinculado a la sesión: un teléfono escrito en el mensaje puede ser ajeno
+    orders, customers = _stores(inv)
+    cliente = customers.for_session(session_id)
+    customer_id = parse_customer_id(cliente["cliente_id"]) if cliente else None
+    pedido = orders.create(session_id, inv.calcular_pedido(items), customer_id)
+    for item in pedido["items"]:
+        print(f"  → {item['cantidad']} x {item['producto']}: ${item['subtotal']:.2f}")
+    print(f"  → Pedido creado: {pedido['pedido_id']}")
+    return {"pedido": pedido, "por_confirmar": ents.ambiguous, "sin_stock": sin_stock}
+
+
+def _buscar_pedido(query: str, inv: Inventory, session_id: Optional[str]) -> Optional[dict]:
+    """Pedido mencionado en la consulta ("pedido 200") o, si no hay, el último de la sesión.
+
+    Solo pedidos de esta sesión o del cliente identificado en ella: los ids son correlativos.
+    """
+    orders, customers = _stores(inv)
+    ids = [i for i in map(parse_order_id, extract_entities(query, inv).order_ids) if i is not None]
+    if ids:
+        cliente = customers.for_session(session_id)
+        return orders.get_owned(ids[0], session_id, parse_customer_id(cliente["cliente_id"]) if cliente else None)
+    return orders.latest_for_session(session_id)
+
+_NO_ENCONTRADO = {"error": "Pedido no encontrado", "mensaje": "No encontré ese pedido; ¿me das el número?"}
+
+
+@tool("actualizar_pedido", timeout_s=NO_TIMEOUT)
+def actualizar_pedido(inv: Inventory, query: str = "", session_id: Optional[str] = None) -> dict:
+    print("[EXEC] Buscando pedido en el sistema...")
+    pedido = _buscar_pedido(query, inv, session_id)
+    if pedido is None:
+        return _NO_ENCONTRADO
+    if pedido["estado"] not in OPEN_STATUSES:
+        return {"pedido": pedido, "mensaje": f"El pedido está {pedido['estado']} y ya no se puede modificar"}
+    print("[EXEC] Actualizando items...")
+    cantidades: Dict[str, int] = {}
+    for item in pedido["items"] + extract_entities(query, inv).items:
+        cantidades[item["producto_id"]] = cantidades.get(item["producto_id"], 0) + item["cantidad"]
+    print("[EXEC] Recalculando total...")
+    calculo = inv.calcular_pedido([{"producto_id": k, "cantidad": v} for k, v in cantidades.items()])
+    # el estado de arriba puede venir de la caché: la BD decide (otro worker pudo cancelarlo)
+    pedido, cambiado = _stores(inv)[0].set_items(parse_order_id(pedido["pedido_id"]), calculo)
+    if pedido is None:
+        return _NO_ENCONTRADO
+    if not cambiado:
+        return {"pedido": pedido, "mensaje": f"El pedido está {pedido['estado']} y ya no se puede modificar"}
+    return {"pedido": pedido, "mensaje": "Pedido actualizado correctamente"}
+
+
+@tool("cancelar_pedido", timeout_s=NO_TIMEOUT)
+def cancelar_pedido(inv: Inventory, query: str = "", session_id: Optional[str] = None) -> dict:
+    print("[EXEC] Buscando pedido...")
+    pedido = _buscar_pedido(query, inv, session_id)
+    if pedido is None:
+        return _NO_ENCONTRADO
+    print("[EXEC] Verificando estado del pedido...")
+    if pedido["estado"] not in OPEN_STATUSES:
+        return {"pedido_id": pedido["pedido_id"], "estado": pedido["estado"],
+                "mensaje": f"El pedido ya está {pedido['estado']}"}
+    print("[EXEC] Cancelando pedido...")
+    actual, cambiado = _stores(inv)[0].set_status(parse_order_id(pedido["pedido_id"]), "cancelado")
+    if actual is None:
+        return _NO_ENCONTRADO
+    if not cambiado:  # la BD ya lo tenía cerrado (otro worker)
+        return {"pedido_id": actual["pedido_id"], "estado": actual["estado"],
+                "mensaje": f"El pedido ya está {actual['estado']}"}
+    print("[EXEC] Pedido cancelado exitosamente")
+    return {"pedido_id": pedido["pedido_id"], "estado": "cancelado", "mensaje": "Pedido cancelado"}
+
+
+# ttl_s=0: el estado cambia sin que cambie el inventario; lo sirve la caché de OrderStore
+@tool("consultar_estado_pedido", read_only=True, timeout_s=3.0, ttl_s=0)
+def consultar_estado_pedido(inv: Inventory, query: str = "", session_id: Optional[str] = None) -> dict:
+    print("[EXEC] Consultando estado del pedido...")
+    pedido = _buscar_pedido(query, inv, session_id)
+    if pedido is None:
+        return _NO_ENCONTRADO
+    abierto = pedido["estado"] in OPEN_STATUSES
+    return {"pedido_id": pedido["pedido_id"], "estado": pedido["estado"], "total": pedido["total"],
+            "eta_minutos": 15 if abierto else None,
+            "mensaje": "Tu pedido está siendo preparado" if abierto else f"Tu pedido está {pedido['estado']}"}
+
+
+@tool("calcular_costo_envio", read_only=True, timeout_s=2.0, prefetch=lambda inv: {"zonas": inv.zonas_delivery})
+def calcular_costo_envio(inv: Inventory, query: str, *, parte: dict) -> dict:
+    print("[EXEC] Calculando costo de envío...")
+    # Detectar zona
+    zonas = extract_entities(query, inv).zones
+    zona = zonas[0] if zonas else "otros"
+    info_envio = parte["zonas"][zona]
+    print(f"  → Zona: {zona}")
+    print(f"  → Costo: ${info_envio['costo']:.2f}")
+    print(f"  → Tiempo estimado: {info_envio['tiempo_min']} minutos")
+    return {"zona": zona, **info_envio}
+
+
+@tool("registrar_cliente", timeout_s=NO_TIMEOUT)
+def registrar_cliente(inv: Inventory, query: str = "", session_id: Optional[str] = None) -> dict:
+    print("[EXEC] Registrando datos del cliente...")
+    contacto = extract_contact(query)
+    if contacto["telefono"] is None:
+        cliente = _stores(inv)[1].for_session(session_id)
+        if cliente is not None:
+            return {"cliente": cliente, "nuevo": False, "mensaje": "Cliente ya identificado"}
+        return {"cliente": None, "mensaje": "¿Me das tu número de teléfono para registrarte?"}
+    print("[EXEC] Validando información...")
+    cliente, nuevo = _stores(inv)[1].register(contacto["telefono"], contacto["nombre"], contacto["email"], session_id)
+    print(f"[EXEC] Cliente {'registrado' if nuevo else 'existente'}: {cliente['cliente_id']}")
+    if nuevo:
+        return {"cliente": cliente, "nuevo": True, "mensaje": "Registrado"}
+    if "telefono" not in cliente:  # teléfono de otra sesión: ni sus datos ni cambios
+        return {"cliente": cliente, "nuevo": False,
+                "mensaje": "Ese teléfono ya está registrado. Si es tuyo, escribe también el email con el que te registraste"}
+    return {"cliente": cliente, "nuevo": False, "mensaje": "Datos actualizados"}
+
+
+# el horario del día cambia a medianoche: TTL corto
+@tool("consultar_horarios_ubicaciones", read_only=True, timeout_s=2.0, ttl_s=60)
+def consultar_horarios_ubicaciones(inv: Inventory) -> dict:
+    print("[EXEC] Consultando horarios y ubicaciones...")
+    horario_hoy = inv.obtener_horario_hoy()
+    print(f"  → Hoy ({horario_hoy['dia']}): {horario_hoy['apertura']} - {horario_hoy['cierre']}")
+    for suc in inv.sucursales:
+        print(f"  → {suc['nombre']}: {suc['direccion']}")
+    return {"horario_hoy": horario_hoy, "sucursales": inv.sucursales, "todos_horarios": inv.horarios}
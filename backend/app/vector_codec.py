@@ -0,0 +1,42 @@
+# Serialización compacta de vectores para columnas de texto (FunctionDef.embedding_json)
+#   f32 → lista JSON (formato original)
+#   f16 → {"dtype": "f16", "data": base64}                       (~2 bytes/dim)
+#   sq8 → {"dtype": "sq8", "min": m, "scale": s, "data": base64}  (~1 byte/dim)
+# decode_vector acepta los tres, así filas viejas y nuevas conviven.
+
+import base64
+import json
+from typing import Optional
+
+import numpy as np
+
+VECTOR_FORMATS = ("f32", "f16", "sq8")
+
+def encode_vector(vec, fmt: str = "f32") -> str:
+    v = np.asarray(vec, dtype="float32")
+    if fmt == "f32":
+        return json.dumps(v.tolist())
+    if fmt == "f16":
+        return json.dumps({"dtype": "f16", "data": base64.b64encode(v.astype("<f2").tobytes()).decode()})
+    if fmt == "sq8":
+        lo, hi = float(v.min()), float(v.max())
+        scale = (hi - lo) / 255 or 1.0
+        codes = np.round((v - lo) / scale).astype("uint8")
+        return json.dumps({"dtype": "sq8", "min": lo, "scale": scale, "data": base64.b64encode(codes.tobytes()).decode()})
+    raise ValueError(f"Formato de vector desconocido: {fmt} (opciones: {', '.join(VECTOR_FORMATS)})")
+
+def vector_format(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    return "f32" if text.lstrip().startswith("[") else json.loads(text).get("dtype")
+
+def decode_vector(text: str) -> np.ndarray:
+    data = json.loads(text)
+    if isinstance(data, list):
+        return np.asarray(data, dtype="float32")
+    raw = base64.b64decode(data["data"])
+    if data["dtype"] == "f16":
+        return np.frombuffer(raw, dtype="<f2").astype("float32")
+    if data["dtype"] == "sq8":
+        return np.frombuffer(raw, dtype="uint8").astype("float32") * data["scale"] + data["min"]
+    raise ValueError(f"Formato de vector desconocido: {data['dtype']}")
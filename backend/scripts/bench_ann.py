@@ -0,0 +1,72 @@
+# Benchmark recall vs latencia de los índices ANN (HNSW / IVF) contra el exacto (Flat)
+# Uso: python -m scripts.bench_ann --docs 50000 --queries 500
+#
+# Usa vectores sintéticos normalizados agrupados en "funciones" (clusters), que
+# imitan la distribución de ejemplos de uso alrededor de cada intención.
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from app.router import make_faiss_index
+from app.settings import settings
+
+def synthetic_corpus(n_docs: int, n_queries: int, dim: int, n_functions: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_functions, dim)).astype("float32")
+    labels = rng.integers(0, n_functions, size=n_docs + n_queries)
+    x = centers[labels] + 0.6 * rng.normal(size=(n_docs + n_queries, dim)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x[:n_docs], x[n_docs:]
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def timed_search(index, q: np.ndarray, k: int):
+    t0 = time.perf_counter()
+    for row in q:  # una consulta a la vez, como en /chat
+        index.search(row[None, :], k)
+    per_query_ms = (time.perf_counter() - t0) * 1000 / len(q)
+    _, ids = index.search(q, k)
+    return ids, per_query_ms
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=50000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--functions", type=int, default=300)
+    ap.add_argument("--k", type=int, default=12)
+    args = ap.parse_args()
+
+    xb, xq = synthetic_corpus(args.docs, args.queries, args.dim, args.functions)
+
+    rows = []
+    for mode, param, values in [
+        ("flat", None, [None]),
+        ("hnsw", "efSearch", [16, 32, 64, 128]),
+        ("ivf", "nprobe", [1, 4, 8, 16, 32]),
+    ]:
+        t0 = time.perf_counter()
+        index = make_faiss_index(args.dim, args.docs, mode)
+        if not index.is_trained:
+            index.train(xb)
+        index.add(xb)
+        build_s = time.perf_counter() - t0
+        for v in values:
+            if param:
+                faiss.ParameterSpace().set_index_parameter(index, param, v)
+            ids, ms = timed_search(index, xq, args.k)
+            rows.append((mode, f"{param}={v}" if param else "-", build_s, ids, ms))
+
+    truth = rows[0][3]
+    print(f"docs={args.docs} dim={args.dim} queries={args.queries} k={args.k} "
+          f"(HNSW M={settings.HNSW_M}, efConstruction={settings.HNSW_EF_CONSTRUCTION})")
+    print(f"{'modo':6s} {'parámetro':14s} {'build s':>8s} {'recall@k':>9s} {'ms/query':>9s}")
+    for mode, label, build_s, ids, ms in rows:
+        print(f"{mode:6s} {label:14s} {build_s:8.2f} {recall_at_k(ids, truth):9.3f} {ms:9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Cotización de carritos: catálogo columnar (NumPy) vs bucle sobre el dict de productos
+# Uso: python -m scripts.bench_catalog [--skus 10000] [--branches 5] [--cart 50] [--repeat 2000]
+#
+# Genera un catálogo sintético (una fila por SKU y sucursal), mide la
+# importación con pandas y luego calcular_pedido / verificar_stock_pedido
+# frente a la implementación anterior basada en dicts.
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.catalog import import_catalog
+from app.inventory import PROMOCIONES, Inventory
+
+def dict_quote(productos, items):
+    # implementación anterior de calcular_pedido
+    total, detalle = 0, []
+    for item in items:
+        prod = productos.get(item["producto_id"])
+        if prod is not None:
+            subtotal = prod["precio"] * item["cantidad"]
+            total += subtotal
+            detalle.append({"producto_id": item["producto_id"], "producto": prod["nombre"],
+                            "cantidad": item["cantidad"], "precio_unit": prod["precio"], "subtotal": round(subtotal, 2)})
+    return {"items": detalle, "subtotal": round(total, 2), "iva": round(total * 0.12, 2), "total": round(total * 1.12, 2)}
+
+def dict_stock(productos, items):
+    faltantes = []
+    for item in items:
+        prod = productos.get(item["producto_id"])
+        stock = prod["stock"] if prod else 0
+        if stock < item["cantidad"]:
+            faltantes.append({"producto_id": item["producto_id"], "cantidad_solicitada": item["cantidad"],
+                              "stock_actual": stock, "existe": prod is not None})
+    return {"disponible": not faltantes, "faltantes": faltantes}
+
+def bench(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--skus", type=int, default=10_000)
+    ap.add_argument("--branches", type=int, default=5)
+    ap.add_argument("--cart", type=int, nargs="+", default=[10, 50, 1000])
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.skus * args.branches
+    df = pd.DataFrame({
+        "id": np.repeat([f"sku_{i}" for i in range(args.skus)], args.branches),
+        "nombre": np.repeat([f"Producto {i}" for i in range(args.skus)], args.branches),
+        "precio": np.repeat(rng.uniform(0.1, 20, args.skus).round(2), args.branches),
+        "stock": rng.integers(0, 200, n),
+        "sucursal": np.tile([f"suc_{b}" for b in range(args.branches)], args.skus),
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "catalogo.csv")
+        df.to_csv(path, index=False)
+        t0 = time.perf_counter()
+        catalog, report = import_catalog(path, PROMOCIONES)
+        print(f"importación: {report.rows} filas → {report.products} productos en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    inv = Inventory(catalogo=catalog)
+    productos = inv.productos
+    for size in args.cart:
+        items = [{"producto_id": f"sku_{random.randrange(args.skus)}", "cantidad": random.randint(1, 5)}
+                 for _ in range(size)]
+        assert inv.calcular_pedido(items)["total"] == dict_quote(productos, items)["total"]
+        assert inv.verificar_stock_pedido(items) == dict_stock(productos, items)
+        rows = catalog.rows([i["producto_id"] for i in items])
+        q = np.array([i["cantidad"] for i in items])
+        print(f"carrito de {size} items (mediana, µs):")
+        print(f"  calcular_pedido        columnar {bench(lambda: inv.calcular_pedido(items), args.repeat):8.1f}"
+              f"   dict {bench(lambda: dict_quote(productos, items), args.repeat):8.1f}")
+        print(f"  verificar_stock_pedido columnar {bench(lambda: inv.verificar_stock_pedido(items), args.repeat):8.1f}"
+              f"   dict {bench(lambda: dict_stock(productos, items), args.repeat):8.1f}")
+        print(f"  solo el cálculo (quote sobre arrays) {bench(lambda: catalog.quote(rows, q), args.repeat):8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Reconocer a un cliente por teléfono: caché vs lectura por índice vs recorrido de la tabla
+# Uso: python -m scripts.bench_customers [--customers 200000] [--lookups 2000]
+#
+# Da de alta N clientes con upserts en lotes sobre una BD SQLite temporal y
+# mide la búsqueda por teléfono en sus tres caminos. El "recorrido" compara
+# contra una expresión sobre la columna, que SQLite no puede resolver con el índice.
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.customers import CustomerStore
+from app.settings import settings
+
+def timed(fn, phones):
+    samples = []
+    for p in phones:
+        t0 = time.perf_counter()
+        fn(p)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples), sorted(samples)[int(len(samples) * 0.99) - 1]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--customers", type=int, default=200_000)
+    ap.add_argument("--lookups", type=int, default=2000)
+    args = ap.parse_args()
+
+    settings.CUSTOMERS_CACHE_MAX = args.customers
+    with tempfile.TemporaryDirectory() as tmp:
+        factory = sessionmaker(bind=create_engine(f"sqlite:///{os.path.join(tmp, 'customers.db')}"))
+        store = CustomerStore(factory)
+        t0 = time.perf_counter()
+        for i in range(args.customers):
+            store.upsert(f"09{i:08d}", f"Cliente {i}")
+        store.flush()
+        elapsed = time.perf_counter() - t0
+        status = store.status()
+        print(f"altas: {args.customers / elapsed:.0f} upserts/s, {status['commits']} commits (lote medio {status['avg_batch']})")
+
+        phones = [f"09{random.randrange(args.customers):08d}" for _ in range(args.lookups)]
+        cold = CustomerStore(factory)
+        cold._ensure_ready()
+        scan_sql = text("SELECT id FROM customers WHERE trim(telefono) = :t")
+        with factory() as db:
+            scan = lambda p: db.execute(scan_sql, {"t": p}).first()
+            rows = [
+                ("índice (caché fría)", timed(cold.find_by_phone, phones)),
+                ("caché por teléfono", timed(cold.find_by_phone, phones)),
+                ("recorrido de tabla", timed(scan, phones[:50])),
+            ]
+        for name, (p50, p99) in rows:
+            print(f"{name:22} p50 {p50:10.1f} µs   p99 {p99:10.1f} µs")
+        store.close()
+        cold.close()
+
+if __name__ == "__main__":
+    main()
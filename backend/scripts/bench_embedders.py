@@ -0,0 +1,99 @@
+# Compara los backends de embeddings: paridad de routing, latencia, throughput y memoria
+# Uso: python -m scripts.bench_embedders --backends hf int8 onnx tfidf
+#
+# Cada backend corre en un proceso aparte (la RSS máxima es la del proceso) y
+# sin el almacén persistente, para medir el costo real del modelo.
+import argparse
+import multiprocessing as mp
+import resource
+import sys
+import time
+
+import numpy as np
+
+from app.models import FunctionDef
+from app.routing_corpus import ROUTING_CASES
+from app.settings import settings
+from scripts.seed_functions import make_functions
+
+def _rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def _run_backend(backend: str, batch: int, out) -> None:
+    from app import embeddings
+    from app.router import build_vector_store, catalog_texts, function_documents, select_function
+    from app.seeding import row_values
+
+    settings.EMB_BACKEND = backend
+    settings.EMB_STORE_PATH = ""
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    try:
+        embedder = embeddings.build_embedder()
+    except Exception as e:
+        out.put({"backend": backend, "error": str(e)})
+        return
+    load_s = time.perf_counter() - t0
+
+    rows = [FunctionDef(**row_values(f)) for f in make_functions()]
+    docs = function_documents(rows)
+    texts = [d.page_content for d in docs]
+    t0 = time.perf_counter()
+    embeddings.fit_embedder(embedder, catalog_texts(rows, docs))  # solo tfidf
+    load_s += time.perf_counter() - t0
+    embedder.embed_documents(texts[:8])  # calentamiento
+
+    t0 = time.perf_counter()
+    vectors = []
+    for i in range(0, len(texts), batch):
+        vectors.extend(embedder.embed_documents(texts[i:i + batch]))
+    docs_per_s = len(texts) / (time.perf_counter() - t0)
+    vs = build_vector_store(docs, embedder, np.asarray(vectors, dtype="float32"))
+
+    lat, preds = [], []
+    for q, _ in ROUTING_CASES:
+        t0 = time.perf_counter()
+        preds.append(select_function(vs, q, k=1)[0].function)
+        lat.append((time.perf_counter() - t0) * 1000)
+    qvecs = np.asarray([embedder.embed_query(q) for q, _ in ROUTING_CASES], dtype="float32")
+
+    out.put({
+        "backend": backend, "load_s": load_s, "docs_per_s": docs_per_s,
+        "p50_ms": float(np.percentile(lat, 50)), "p95_ms": float(np.percentile(lat, 95)),
+        "rss_mb": _rss_mb() - rss0, "preds": preds, "qvecs": qvecs,
+    })
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=["hf", "int8", "onnx", "tfidf"])
+    ap.add_argument("--batch", type=int, default=32)
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for backend in args.backends:
+        q = ctx.Queue()
+        p = ctx.Process(target=_run_backend, args=(backend, args.batch, q))
+        p.start()
+        results.append(q.get())
+        p.join()
+
+    expected = [e for _, e in ROUTING_CASES]
+    ok = [r for r in results if "error" not in r]
+    ref = ok[0] if ok else None
+    print(f"modelo={settings.EMB_MODEL_NAME} casos={len(expected)} (referencia de paridad: {ref and ref['backend']})")
+    print(f"{'backend':8s} {'carga s':>8s} {'docs/s':>8s} {'p50 ms':>7s} {'p95 ms':>7s} {'RSS MB':>7s} "
+          f"{'accuracy':>9s} {'=top1 ref':>9s} {'cos ref':>8s}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:8s} ERROR: {r['error']}")
+            continue
+        acc = np.mean([p == e for p, e in zip(r["preds"], expected)])
+        agree = np.mean([p == e for p, e in zip(r["preds"], ref["preds"])])
+        cos = float(np.min(np.sum(r["qvecs"] * ref["qvecs"], axis=1)))  # vectores normalizados
+        print(f"{r['backend']:8s} {r['load_s']:8.2f} {r['docs_per_s']:8.1f} {r['p50_ms']:7.2f} {r['p95_ms']:7.2f} "
+              f"{r['rss_mb']:7.0f} {acc:9.1%} {agree:9.1%} {cos:8.4f}")
+
+if __name__ == "__main__":
+    main()
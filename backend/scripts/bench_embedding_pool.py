@@ -0,0 +1,136 @@
+# Latencia de endpoints baratos mientras /chat embebe: modelo en proceso vs pool de procesos
+# Uso: python -m scripts.bench_embedding_pool [--synthetic] [--workers 2] [--seconds 10]
+#
+# Levanta una app FastAPI mínima con uvicorn: /embed (como la etapa de embeddings
+# de /chat), /health (async) y /functions-like (sync, threadpool). Mientras N
+# clientes golpean /embed, se mide la latencia de /health y del endpoint sync.
+# --synthetic usa un embedder en Python puro que retiene el GIL (sin descargar
+# el modelo); sin él se usa el backend configurado (EMB_BACKEND).
+import argparse
+import hashlib
+import socket
+import threading
+import time
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from langchain_core.embeddings import Embeddings
+
+from app.embedding_service import EmbeddingService
+from app.embeddings import _MODEL_FACTORIES, _worker_model
+from app.settings import settings
+
+class SyntheticEmbeddings(Embeddings):
+    """~20 ms de CPU por texto con el GIL tomado (peor caso de contención)."""
+
+    def _vec(self, text):
+        h = text.encode()
+        for _ in range(20000):
+            h = hashlib.md5(h).digest()
+        return np.frombuffer(h * 24, dtype="uint8")[:384].astype("float32").tolist()
+
+    def embed_documents(self, texts):
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vec(text)
+
+def make_app(embedder) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    @app.get("/cheap")
+    def cheap():
+        return {"n": sum(range(1000))}
+
+    @app.post("/embed")
+    def embed(texts: list[str]):
+        return {"dim": len(embedder.embed_documents(texts)[0])}
+
+    return app
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run_scenario(embedder, seconds: float, clients: int, batch: int) -> dict:
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(make_app(embedder), port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    base = f"http://127.0.0.1:{port}"
+
+    stop = threading.Event()
+    embeds = []
+
+    def load():
+        with httpx.Client(base_url=base, timeout=60) as c:
+            i = 0
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                c.post("/embed", json=[f"consulta {i} {j}" for j in range(batch)])
+                embeds.append((time.perf_counter() - t0) * 1000)
+                i += 1
+
+    threads = [threading.Thread(target=load) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    lat = {"/health": [], "/cheap": []}
+    deadline = time.perf_counter() + seconds
+    with httpx.Client(base_url=base, timeout=60) as c:
+        while time.perf_counter() < deadline:
+            for path in lat:
+                t0 = time.perf_counter()
+                c.get(path)
+                lat[path].append((time.perf_counter() - t0) * 1000)
+            time.sleep(0.02)
+    stop.set()
+    for t in threads:
+        t.join()
+    server.should_exit = True
+
+    out = {path: (np.percentile(v, 50), np.percentile(v, 99)) for path, v in lat.items()}
+    out["/embed"] = (np.percentile(embeds, 50), np.percentile(embeds, 99))
+    out["embeds"] = len(embeds)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--synthetic", action="store_true")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=1)
+    ap.add_argument("--clients", type=int, default=4)
+    ap.add_argument("--batch", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=10)
+    args = ap.parse_args()
+
+    if args.synthetic:
+        factory = SyntheticEmbeddings
+    else:
+        if settings.EMB_BACKEND not in _MODEL_FACTORIES:
+            raise SystemExit(f"EMB_BACKEND={settings.EMB_BACKEND} no usa modelo; prueba --synthetic")
+        from functools import partial
+        factory = partial(_worker_model, settings.EMB_BACKEND, settings.EMB_MODEL_NAME, settings.EMB_ONNX_FILE)
+
+    service = EmbeddingService(factory, workers=args.workers, threads=args.threads)
+    service.warmup()
+    scenarios = [("en proceso", factory()), (f"pool {args.workers}×{args.threads}", service)]
+
+    print(f"embedder={'sintético' if args.synthetic else settings.EMB_BACKEND} clientes /embed={args.clients} "
+          f"lote={args.batch} duración={args.seconds}s")
+    print(f"{'modo':14s} {'/health p50/p99 ms':>20s} {'/cheap p50/p99 ms':>20s} {'/embed p50/p99 ms':>20s} {'embeds':>7s}")
+    for name, embedder in scenarios:
+        r = run_scenario(embedder, args.seconds, args.clients, args.batch)
+        cols = " ".join(f"{r[p][0]:9.1f}/{r[p][1]:<9.1f}" for p in ("/health", "/cheap", "/embed"))
+        print(f"{name:14s} {cols} {r['embeds']:7d}")
+    service.shutdown()
+
+if __name__ == "__main__":
+    main()
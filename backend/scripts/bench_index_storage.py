@@ -0,0 +1,54 @@
+# Tamaño vs accuracy de las opciones de almacenamiento del índice (f32 / f16 / sq8 / PCA)
+# Uso: python -m scripts.bench_index_storage --pca 0 128 64 32
+#
+# Usa el catálogo de seed_functions y ROUTING_CASES; la accuracy es el top-1 de
+# select_function (documento más cercano), la misma que valida INDEX_ACCURACY_GUARD.
+import argparse
+
+import faiss
+import numpy as np
+
+from app.embeddings import build_embedder, fit_embedder
+from app.models import FunctionDef
+from app.router import _top1_accuracy, catalog_texts, function_documents, make_faiss_index
+from app.routing_corpus import ROUTING_CASES
+from app.seeding import row_values
+from app.settings import settings
+from app.vector_codec import VECTOR_FORMATS, encode_vector
+from scripts.seed_functions import make_functions
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pca", type=int, nargs="+", default=[0, 128, 64, 32])
+    args = ap.parse_args()
+
+    embedder = build_embedder()
+    rows = [FunctionDef(**row_values(f)) for f in make_functions()]
+    docs = function_documents(rows)
+    fit_embedder(embedder, catalog_texts(rows, docs))
+    x = np.asarray(embedder.embed_documents([d.page_content for d in docs]), dtype="float32")
+    names = [d.metadata["name"] for d in docs]
+    qvecs = np.asarray(embedder.embed_documents([q for q, _ in ROUTING_CASES]), dtype="float32")
+    expected = [e for _, e in ROUTING_CASES]
+
+    print(f"backend={settings.EMB_BACKEND} docs={len(docs)} dim={x.shape[1]} casos={len(expected)}")
+    print(f"{'almacenamiento':14s} {'PCA':>5s} {'bytes/vector':>13s} {'accuracy':>9s}")
+    for storage in VECTOR_FORMATS:
+        for pca in args.pca:
+            if pca and pca >= x.shape[1]:
+                continue
+            settings.INDEX_STORAGE, settings.INDEX_PCA_DIM = storage, pca
+            index = make_faiss_index(x.shape[1], len(docs), "flat")
+            if not index.is_trained:
+                index.train(x)
+            index.add(x)
+            size = faiss.serialize_index(index).size / len(docs)
+            acc = _top1_accuracy(index, names, qvecs, expected)
+            print(f"{storage:14s} {pca or '-':>5} {size:13.0f} {acc:9.1%}")
+
+    print("\nFunctionDef.embedding_json (bytes por fila):")
+    for fmt in VECTOR_FORMATS:
+        print(f"  {fmt}: {np.mean([len(encode_vector(v, fmt)) for v in x]):.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Escritura de pedidos: write-behind (group commit) vs una transacción por pedido
+# Uso: python -m scripts.bench_orders [--orders 2000] [--threads 8]
+#
+# Simula la hora pico: varios hilos crean pedidos y cambian estados sobre una
+# BD SQLite temporal. Mide pedidos/s vistos por el llamador y commits hechos.
+# Los cambios de estado son síncronos y condicionales en la BD: uno sobre un
+# alta todavía encolada la escribe antes.
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.inventory import Inventory
+from app.metrics import metrics
+from app.orders import OrderStore, parse_order_id
+from app.settings import settings
+
+def run(write_behind: bool, n_orders: int, n_threads: int) -> None:
+    settings.ORDERS_WRITE_BEHIND = write_behind
+    metrics.reset()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = OrderStore(sessionmaker(bind=create_engine(f"sqlite:///{os.path.join(tmp, 'orders.db')}")))
+        inv = Inventory()
+        calculo = inv.calcular_pedido([{"producto_id": "cafe", "cantidad": 2}, {"producto_id": "croissant", "cantidad": 1}])
+        store.create("warmup", calculo)
+        store.flush()
+
+        def worker(k):
+            for i in range(n_orders // n_threads):
+                pedido = store.create(f"s{k}-{i % 20}", calculo)
+                if i % 4 == 0:
+                    store.set_status(parse_order_id(pedido["pedido_id"]), "en_preparacion")
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(n_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        accepted = time.perf_counter() - t0
+        store.flush()
+        durable = time.perf_counter() - t0
+        status = store.status()
+        store.close()
+
+    mode = "write-behind" if write_behind else "síncrono"
+    print(f"{mode:13} aceptados {n_orders / accepted:9.0f} pedidos/s | en BD {n_orders / durable:9.0f} pedidos/s "
+          f"| commits {status['commits']:5d} (lote medio {status['avg_batch']})")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orders", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=8)
+    args = ap.parse_args()
+    for write_behind in (False, True):
+        run(write_behind, args.orders, args.threads)
+
+if __name__ == "__main__":
+    main()
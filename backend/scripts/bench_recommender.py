@@ -0,0 +1,72 @@
+# Latencia del recomendador con catálogos grandes
+# Uso: python -m scripts.bench_recommender [--products 20000 50000] [--repeat 500]
+#
+# Genera un catálogo sintético, mide la construcción del modelo (embeddings +
+# vecinos precalculados) y la latencia por consulta: filtros + una
+# multiplicación matriz·vector + top-k, y la variante "parecido a" que usa los
+# vecinos precalculados. Mientras el modelo se construye, las consultas usan
+# el recomendador de reserva (solo filtros).
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.inventory import Inventory
+from app.recommender import get_recommender, recommend, warm_recommender
+
+BASES = ["pan", "torta", "galleta", "empanada", "jugo", "cafe", "brownie", "donut", "queque", "alfajor",
+         "rosca", "bizcocho", "tamal", "humita", "pastel", "muffin"]
+SABORES = ["chocolate", "vainilla", "fresa", "naranja", "queso", "pollo", "carne", "avena", "coco", "maracuya",
+           "manjar", "canela", "integral", "mora", "limon", "higo"]
+CATEGORIAS = ["pan", "pasteleria", "salado", "bebidas"]
+TAGS = ["dulce", "salado", "sin_gluten", "vegetariano", "saludable", "desayuno", "caliente", "frio"]
+QUERIES = ["recomiéndame algo dulce", "algo sin gluten", "algo de tomar por menos de 3 dólares",
+           "qué me sugieres para el desayuno?", "algo salado vegetariano hasta $2", "sugiéreme un postre"]
+
+def synthetic_inventory(n: int, seed: int = 0) -> Inventory:
+    rng = np.random.default_rng(seed)
+    productos, etiquetas = {}, {}
+    for i in range(n):
+        pid = f"sku{i:06d}"
+        nombre = f"{rng.choice(BASES).capitalize()} de {rng.choice(SABORES)} {i % 97}"
+        productos[pid] = {"nombre": nombre, "precio": round(float(rng.uniform(0.2, 20)), 2),
+                          "stock": int(rng.integers(0, 50)), "categoria": str(rng.choice(CATEGORIAS))}
+        etiquetas[pid] = list(rng.choice(TAGS, size=int(rng.integers(1, 4)), replace=False))
+    return Inventory(productos=productos, etiquetas=etiquetas, sinonimos={})
+
+def bench(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--products", type=int, nargs="+", default=[1_000, 20_000, 50_000])
+    ap.add_argument("--repeat", type=int, default=500)
+    args = ap.parse_args()
+
+    for n in args.products:
+        inv = synthetic_inventory(n)
+        t0 = time.perf_counter()
+        warm_recommender(inv).result()  # en el servidor esto corre en segundo plano
+        model = get_recommender(inv).model
+        build_s = time.perf_counter() - t0
+        mb = (model.matrix.nbytes + model.neighbors.nbytes + model.neighbor_sims.nbytes) / 2**20
+        print(f"\n{n} productos: modelo en {build_s:.2f} s, {mb:.1f} MB "
+              f"(matriz N×N float32 serían {n * n * 4 / 2**30:.1f} GB)")
+        for q in QUERIES:
+            recs = recommend(q, inv)[0]
+            p50, p99 = bench(lambda: recommend(q, inv), args.repeat)
+            print(f"  {q!r:45} p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  → {[r['nombre'] for r in recs][:2]}")
+        anchor = inv.productos[model.ids[0]]["nombre"]
+        q = f"algo parecido al {anchor}"
+        p50, p99 = bench(lambda: recommend(q, inv), args.repeat)
+        print(f"  {q!r:45} p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  (vecinos precalculados)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Tamaño de /chat por perfil (crudo / gzip / brotli) y tiempo de serialización json vs orjson
+# Uso: EMB_BACKEND=tfidf python -m scripts.bench_responses [--repeat 2000]
+#
+# Corre el grafo real (sin LLM) sobre ROUTING_CASES y mide cada payload con
+# shape_chat_response, que es lo que devuelve /chat en cada perfil.
+import argparse
+import gzip
+import json
+import statistics
+import time
+
+from app.embeddings import build_embedder, fit_embedder
+from app.graph import build_graph
+from app.models import FunctionDef
+from app.responses import RESPONSE_PROFILES, FastJSONResponse, orjson, shape_chat_response
+from app.router import build_vector_store, catalog_texts, function_documents
+from app.routing_corpus import ROUTING_CASES
+from app.seeding import row_values
+from app.settings import settings
+from scripts.seed_functions import make_functions
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+
+    settings.EMB_STORE_PATH = ""
+    embedder = build_embedder()
+    rows = [FunctionDef(**row_values(f)) for f in make_functions()]
+    docs = function_documents(rows)
+    fit_embedder(embedder, catalog_texts(rows, docs))
+    graph = build_graph(build_vector_store(docs, embedder), llm=None)
+    outs = [(q, graph.invoke({"session_id": "bench", "user_query": q, "exec_log": []})) for q, _ in ROUTING_CASES]
+
+    print(f"{'perfil':8} {'crudo':>8} {'gzip':>8} {'brotli':>8}   (bytes, mediana por respuesta)")
+    for profile in RESPONSE_PROFILES:
+        raw, gz, br = [], [], []
+        for q, out in outs:
+            body = FastJSONResponse(shape_chat_response(out, "bench", q, profile, 1, "default")).body
+            raw.append(len(body))
+            gz.append(len(gzip.compress(body, 6)))
+            if brotli is not None:
+                br.append(len(brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)))
+        br_s = f"{statistics.median(br):8.0f}" if br else f"{'n/d':>8}"
+        print(f"{profile:8} {statistics.median(raw):8.0f} {statistics.median(gz):8.0f} {br_s}")
+
+    payload = shape_chat_response(outs[0][1], "bench", outs[0][0], "debug", 1, "default")
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+                   default=str).encode("utf-8")
+    json_us = (time.perf_counter() - t0) / args.repeat * 1e6
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        FastJSONResponse(payload)
+    fast_us = (time.perf_counter() - t0) / args.repeat * 1e6
+    print(f"\nserialización (debug): json={json_us:.1f} µs | FastJSONResponse"
+          f"({'orjson' if orjson else 'json'})={fast_us:.1f} µs")
+
+if __name__ == "__main__":
+    main()
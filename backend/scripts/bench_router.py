@@ -0,0 +1,68 @@
+# Benchmark del router híbrido (BM25 + embeddings) contra select_function
+# Uso: python -m scripts.bench_router
+import time
+
+from app.db import Base, engine, SessionLocal
+from app.models import FunctionDef
+from app.router import load_vector_store, build_vector_store_from_db, select_function
+from app.lexical_router import build_lexical_index, build_lexical_index_from_db, lexical_decision
+from app.routing_corpus import ROUTING_CASES
+from app.settings import settings
+from app.logging_config import setup_logging
+from scripts.seed_functions import make_functions
+
+logger = setup_logging()
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if db.query(FunctionDef).count():
+            lex = build_lexical_index_from_db(db)
+            try:
+                vs = load_vector_store() or build_vector_store_from_db(db)
+            except Exception as e:
+                logger.warning(f"No se pudo cargar el modelo de embeddings: {e}")
+                vs = None
+        else:
+            logger.warning("BD vacía: se usa el catálogo de seed_functions solo para la etapa léxica")
+            lex = build_lexical_index(make_functions())
+            vs = None
+
+    n = len(ROUTING_CASES)
+    exits = exit_ok = base_ok = hybrid_ok = 0
+    lex_ms = emb_ms = 0.0
+    for q, expected in ROUTING_CASES:
+        t0 = time.perf_counter()
+        decision = lexical_decision(
+            lex, q, settings.LEXICAL_MIN_SCORE, settings.LEXICAL_MIN_MARGIN, settings.LEXICAL_MIN_COVERAGE
+        )
+        lex_ms += (time.perf_counter() - t0) * 1000
+
+        base = None
+        if vs is not None:
+            t0 = time.perf_counter()
+            base = select_function(vs, q, k=1)[0].function
+            emb_ms += (time.perf_counter() - t0) * 1000
+            base_ok += base == expected
+
+        if decision is not None:
+            exits += 1
+            exit_ok += decision[0] == expected
+            hybrid_ok += decision[0] == expected
+        elif base is not None:
+            hybrid_ok += base == expected
+
+    print(f"Casos: {n}")
+    print(f"Salidas tempranas (léxico): {exits}/{n} = {exits / n:.1%}  "
+          f"(precisión {exit_ok}/{exits or 1} = {exit_ok / (exits or 1):.1%})")
+    print(f"Latencia media etapa léxica: {lex_ms / n:.3f} ms")
+    if vs is not None:
+        avg_emb = emb_ms / n
+        # el híbrido paga el léxico siempre y el embedding solo en las escaladas
+        avg_hybrid = lex_ms / n + avg_emb * (n - exits) / n
+        print(f"Accuracy select_function: {base_ok / n:.1%} | híbrido: {hybrid_ok / n:.1%} "
+              f"| delta: {(hybrid_ok - base_ok) / n:+.1%}")
+        print(f"Latencia media embedding: {avg_emb:.3f} ms | híbrido estimada: {avg_hybrid:.3f} ms")
+
+if __name__ == "__main__":
+    main()
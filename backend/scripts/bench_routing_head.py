@@ -0,0 +1,72 @@
+# Compara la etapa de embeddings: kNN (select_function, varios k_docs) vs cabeza lineal
+# Uso: EMB_BACKEND=tfidf python -m scripts.bench_routing_head
+#
+# Los ejemplos del catálogo (seed_functions) entrenan la cabeza; las consultas de
+# ROUTING_CASES son independientes. La latencia es solo la decisión (el vector de
+# la consulta ya está calculado), que es lo que cambia entre modos.
+import argparse
+import time
+
+import numpy as np
+
+from app.embeddings import build_embedder, fit_embedder
+from app.models import FunctionDef
+from app.router import build_vector_store, catalog_texts, function_documents, select_function
+from app.routing_corpus import ROUTING_CASES
+from app.routing_head import train_routing_head
+from app.seeding import row_values
+from app.settings import settings
+from scripts.seed_functions import make_functions
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    settings.EMB_STORE_PATH = ""
+    embedder = build_embedder()
+    rows = [FunctionDef(**row_values(f)) for f in make_functions()]
+    docs = function_documents(rows)
+    fit_embedder(embedder, catalog_texts(rows, docs))
+    vectors = np.asarray(embedder.embed_documents([d.page_content for d in docs]), dtype="float32")
+    vs = build_vector_store(docs, embedder, vectors)
+
+    t0 = time.perf_counter()
+    head = train_routing_head(
+        vectors, [d.metadata["name"] for d in docs], [d.metadata["kind"] for d in docs],
+        min_examples=settings.ROUTER_HEAD_MIN_EXAMPLES, C=settings.ROUTER_HEAD_C,
+    )
+    train_ms = (time.perf_counter() - t0) * 1000
+
+    queries = [q for q, _ in ROUTING_CASES]
+    expected = [e for _, e in ROUTING_CASES]
+    qvecs = [embedder.embed_query(q) for q in queries]
+
+    def knn(k_docs):
+        return lambda q, v: select_function(vs, q, k=1, k_docs=k_docs, embedding=v)[0].function
+
+    def head_only(q, v):
+        return head.predict(v)[0]
+
+    def head_fallback(q, v):
+        fn, prob = head.predict(v)
+        return fn if prob >= settings.ROUTER_HEAD_MIN_PROB else knn(12)(q, v)
+
+    modes = [(f"knn k_docs={k}", knn(k)) for k in (4, 12, 24)]
+    modes += [("logreg", head_only), (f"logreg+knn (p<{settings.ROUTER_HEAD_MIN_PROB})", head_fallback)]
+
+    print(f"backend={settings.EMB_BACKEND} docs={len(docs)} consultas={len(queries)} "
+          f"entrenamiento cabeza={train_ms:.0f} ms excluidas={list(head.excluded)}")
+    print(f"{'modo':28s} {'accuracy':>9s} {'µs/consulta':>12s}")
+    for name, fn in modes:
+        preds = [fn(q, v) for q, v in zip(queries, qvecs)]
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            for q, v in zip(queries, qvecs):
+                fn(q, v)
+        us = (time.perf_counter() - t0) * 1e6 / (args.repeat * len(queries))
+        acc = np.mean([p == e for p, e in zip(preds, expected)])
+        print(f"{name:28s} {acc:9.1%} {us:12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Importa el maestro de productos (CSV/Parquet) de una panadería
+# Uso: python -m scripts.import_catalog productos.csv [--tenant ID] [--strict]
+#
+# Valida el archivo y muestra el reporte. Con --tenant lo copia a
+# TENANTS_DIR/<id>/ y lo referencia desde inventory.json ("catalogo"); el
+# tenant lo carga la próxima vez que se cargue (reinicio o expulsión LRU).
+import argparse
+import json
+import os
+import shutil
+import sys
+
+from app.catalog import CatalogImportError, import_catalog
+from app.inventory import PROMOCIONES
+from app.logging_config import setup_logging
+from app.tenants import tenant_paths
+
+logger = setup_logging()
+
+def main():
+    ap = argparse.ArgumentParser(description="Valida e importa un catálogo de productos CSV/Parquet")
+    ap.add_argument("path", help="archivo .csv / .parquet con columnas id, nombre, precio, stock [, categoria, sucursal]")
+    ap.add_argument("--tenant", help="panadería destino (TENANTS_DIR/<id>)")
+    ap.add_argument("--strict", action="store_true", help="rechazar el archivo si alguna fila es inválida")
+    args = ap.parse_args()
+
+    try:
+        catalog, report = import_catalog(args.path, PROMOCIONES, strict=args.strict)
+    except CatalogImportError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
+    for err in report.errors:
+        logger.warning(f"fila {err['fila']} ({err['id'] or '-'}): {err['error']}")
+    logger.info(f"✅ {report.rows} filas, {report.products} productos, sucursales {report.branches}, "
+                f"{report.rejected} descartadas")
+
+    if args.tenant:
+        root, _, _ = tenant_paths(args.tenant)
+        os.makedirs(root, exist_ok=True)
+        name = "catalogo" + os.path.splitext(args.path)[1].lower()
+        shutil.copyfile(args.path, os.path.join(root, name))
+        inv_path = os.path.join(root, "inventory.json")
+        data = {}
+        if os.path.exists(inv_path):
+            with open(inv_path, encoding="utf-8") as f:
+                data = json.load(f)
+        data.pop("productos", None)
+        data["catalogo"] = name
+        with open(inv_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        logger.info(f"✅ Catálogo instalado en {root}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Siembra incremental desde archivos de catálogo (JSON/YAML)
+# Uso: python -m scripts.seed_catalog catalogo.json [otro.yaml ...] [--prune] [--no-index] [--force-index] [--tenant ID]
+import argparse
+import os
+
+from app.db import Base, engine, SessionLocal
+from app.seeding import load_catalog, seed_catalog
+from app.settings import settings
+from app.tenants import make_session_factory, tenant_paths
+from app.logging_config import setup_logging
+
+logger = setup_logging()
+
+def main():
+    ap = argparse.ArgumentParser(description="Sincroniza function_defs con catálogos JSON/YAML")
+    ap.add_argument("paths", nargs="+", help="archivos .json / .yaml con la lista de funciones")
+    ap.add_argument("--prune", action="store_true", help="eliminar funciones que no estén en los catálogos")
+    ap.add_argument("--no-index", action="store_true", help="no reconstruir ni publicar el índice")
+    ap.add_argument("--force-index", action="store_true",
+                    help="reconstruir el índice aunque el catálogo no haya cambiado (p. ej. tras cambiar EMB_BACKEND)")
+    ap.add_argument("--tenant", default=settings.DEFAULT_TENANT, help="panadería destino (TENANTS_DIR/<id>)")
+    args = ap.parse_args()
+
+    funcs = []
+    for path in args.paths:
+        funcs.extend(load_catalog(path))
+
+    if args.tenant == settings.DEFAULT_TENANT:
+        os.makedirs("./data", exist_ok=True)
+        Base.metadata.create_all(bind=engine)
+        session_factory, faiss_dir = SessionLocal, None
+    else:
+        root, db_url, faiss_dir = tenant_paths(args.tenant)
+        os.makedirs(root, exist_ok=True)
+        session_factory = make_session_factory(db_url)
+    with session_factory() as db:
+        report = seed_catalog(db, funcs, prune=args.prune, build_index=not args.no_index,
+                              faiss_dir=faiss_dir, force_index=args.force_index)
+    logger.info(f"✅ {report.summary()}")
+    if report.index_version is not None:
+        logger.info(f"✅ Índice publicado: versión {report.index_version}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
-import os, json
-from sqlalchemy.orm import Session
+import os
 
 from app.db import Base, engine, SessionLocal
-from app.models import FunctionDef
 from app.embeddings import build_embedder
-from app.router import build_vector_store_from_db
+from app.seeding import seed_catalog, make_profile  # make_profile re-exportado por compatibilidad
+from app.settings import settings
 from app.logging_config import setup_logging
 
 logger = setup_logging()
@@ -216,17 +215,6 @@ def make_functions():
         ),
     ]
 
-def make_profile(f):
-    # Perfil para embeddings: poco ruido, mucha intención + ejemplos.
-    examples = " | ".join(f["query_examples"][:6])
-    return (
-        f"FUNCION: {f['name']}\n"
-        f"INTENCION_NEGOCIO: {f['business_desc']}\n"
-        f"DESCRIPCION_TECNICA: {f['technical_desc']}\n"
-        f"EJEMPLOS: {examples}\n"
-        f"KEYWORDS: pedido, precio, promo, horario, sucursal, delivery, cancelar, estado, registrar, recomendacion"
-    )
-
 def main():
     ensure_dirs()
     Base.metadata.create_all(bind=engine)
@@ -234,34 +222,14 @@ def main():
     embedder = build_embedder()
 
     with SessionLocal() as db:
-        # limpiar y volver a sembrar
-        db.query(FunctionDef).delete()
-        db.commit()
-
+        # sincroniza (diff + upsert) y elimina las funciones que ya no existen
         funcs = make_functions()
-        for f in funcs:
-            profile = make_profile(f)
-            emb = embedder.embed_query(profile)
-
-            row = FunctionDef(
-                name=f["name"],
-                business_desc=f["business_desc"],
-                technical_desc=f["technical_desc"],
-                input_schema=json.dumps(f["input_schema"], ensure_ascii=False),
-                output_schema=json.dumps(f["output_schema"], ensure_ascii=False),
-                enums=json.dumps(f["enums"], ensure_ascii=False),
-                query_examples=json.dumps(f["query_examples"], ensure_ascii=False),
-                profile_text=profile,
-                embedding_json=json.dumps(emb),
-            )
-            db.add(row)
-
-        db.commit()
+        report = seed_catalog(db, funcs, embedder=embedder, prune=True)
         logger.info(f"✅ BD sembrada con {len(funcs)} funciones (incluye embeddings).")
-
-        # construir y guardar índice
-        build_vector_store_from_db(db)
-        logger.info("✅ Índice FAISS guardado en ./data/faiss_index")
+        if report.index_version is None:
+            logger.info(f"✅ Sin cambios: el índice FAISS publicado en {settings.FAISS_DIR} ya está al día")
+        else:
+            logger.info(f"✅ Índice FAISS publicado (versión {report.index_version}) en {settings.FAISS_DIR}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,73 @@
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.settings import settings
+
+
+class HashEmbeddings(Embeddings):
+    """Embeddings deterministas (aleatorios por texto) para probar índices."""
+
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+        self.batches = []
+
+    def _vec(self, text):
+        rng = np.random.default_rng(int(hashlib.md5(text.encode()).hexdigest()[:8], 16))
+        v = rng.normal(size=self.dim)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vec(text)
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    """BD SQLite temporal + FAISS_DIR temporal."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'agent.db'}")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(settings, "FAISS_DIR", str(tmp_path / "faiss"))
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture(autouse=True)
+def order_store(tmp_path, monkeypatch):
+    """Pedidos y clientes en una BD temporal (las herramientas nunca escriben en data/agent.db)."""
+    from app import tools
+    from app.customers import CustomerStore
+    from app.orders import OrderStore
+
+    factory = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'orders.db'}"))
+    store, customers = OrderStore(factory), CustomerStore(factory)
+    monkeypatch.setattr(tools, "order_store", store)
+    monkeypatch.setattr(tools, "customer_store", customers)
+    yield store
+    store.close()
+    customers.close()
+
+
+@pytest.fixture(scope="session")
+def catalog_rows():
+    from app.models import FunctionDef
+    from app.seeding import row_values
+    from scripts.seed_functions import make_functions
+
+    return [FunctionDef(**row_values(f)) for f in make_functions()]
+
+
+@pytest.fixture(scope="session")
+def tfidf_embedder(catalog_rows):
+    """Embedder real pero rápido y determinista, ajustado sobre el catálogo de seed_functions."""
+    from app.router import catalog_texts, function_documents
+    from app.tfidf_embedder import TfidfEmbeddings
+
+    return TfidfEmbeddings().fit(catalog_texts(catalog_rows, function_documents(catalog_rows)))
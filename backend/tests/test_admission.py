@@ -0,0 +1,111 @@
+import threading
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import api
+from app.admission import Overloaded, SessionRateLimiter, StageLimiter, admission
+from app.graph import build_graph
+from app.metrics import metrics
+from app.router import build_vector_store, function_documents
+from app.settings import settings
+
+
+def _hold(limiter):
+    """Ocupa un slot del limiter en otro hilo hasta que se libere el evento."""
+    entered, release = threading.Event(), threading.Event()
+
+    def run():
+        with limiter.slot():
+            entered.set()
+            release.wait()
+
+    t = threading.Thread(target=run)
+    t.start()
+    entered.wait()
+    return release, t
+
+
+def test_full_queue_sheds_immediately():
+    metrics.reset()
+    limiter = StageLimiter("test", max_concurrent=1, max_queue=0, wait_s=5)
+    release, t = _hold(limiter)
+    with pytest.raises(Overloaded):
+        with limiter.slot():
+            pass
+    release.set()
+    t.join()
+    assert metrics.get("admission.test.shed_queue_full") == 1
+    with limiter.slot():  # libre otra vez
+        assert limiter.status()["in_flight"] == 1
+
+
+def test_waiter_is_admitted_or_times_out():
+    limiter = StageLimiter("test", max_concurrent=1, max_queue=1, wait_s=0.05)
+    release, t = _hold(limiter)
+    with pytest.raises(Overloaded):
+        with limiter.slot():
+            pass
+    threading.Timer(0.02, release.set).start()
+    limiter.wait_s = 2
+    with limiter.slot():
+        pass
+    t.join()
+
+
+def test_session_rate_limit(monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_RATE_PER_MIN", 60)
+    monkeypatch.setattr(settings, "SESSION_BURST", 2)
+    limiter = SessionRateLimiter()
+    assert limiter.check("s1") is None and limiter.check("s1") is None
+    assert 0 < limiter.check("s1") <= 1.0
+    assert limiter.check("s2") is None
+
+
+def test_session_buckets_stay_under_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_RATE_PER_MIN", 1)
+    monkeypatch.setattr(settings, "SESSION_BURST", 5)
+    limiter = SessionRateLimiter(max_sessions=3)
+    for s in ("a", "b", "c", "d"):  # ningún balde se llena a tiempo: pruning no libera nada
+        limiter.check(s)
+    assert sorted(limiter._buckets) == ["b", "c", "d"]  # se olvidó la de uso más antiguo
+    limiter.check("b")
+    limiter.check("e")
+    assert sorted(limiter._buckets) == ["b", "d", "e"]
+
+
+def test_saturated_stage_fails_graph_fast(tfidf_embedder, catalog_rows, monkeypatch):
+    vs = build_vector_store(function_documents(catalog_rows), tfidf_embedder)
+    graph = build_graph(vs, llm=None)
+    busy = StageLimiter("tools", max_concurrent=1, max_queue=0, wait_s=5)
+    busy.in_flight = 1
+    monkeypatch.setattr(admission, "tools", busy)
+    with pytest.raises(Overloaded):
+        graph.invoke({"session_id": "s", "user_query": "hola", "exec_log": []})
+
+
+def _overloaded(state):
+    raise Overloaded("llm", 3)
+
+
+def _fake_tenant(tenant_id):
+    snap = SimpleNamespace(version=1, graph=SimpleNamespace(invoke=_overloaded))
+    return SimpleNamespace(
+        tenant_id="default",
+        session_factory=nullcontext,
+        index_manager=SimpleNamespace(get=lambda db: snap),
+    )
+
+
+def test_chat_returns_503_and_429(monkeypatch):
+    monkeypatch.setattr(api.tenant_registry, "get", _fake_tenant)
+    monkeypatch.setattr(settings, "SESSION_BURST", 1)
+    monkeypatch.setattr(admission, "sessions", SessionRateLimiter())
+    client = TestClient(api.app)
+
+    r = client.post("/chat", json={"query": "hola", "session_id": "a"})
+    assert r.status_code == 503 and r.headers["Retry-After"] == "3"
+    r = client.post("/chat", json={"query": "hola", "session_id": "a"})
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
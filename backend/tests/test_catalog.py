@@ -0,0 +1,91 @@
+import json
+
+import pandas as pd
+import pytest
+
+from app.catalog import CatalogImportError, ColumnarCatalog, build_catalog, import_catalog
+from app.inventory import PRODUCTOS, PROMOCIONES, Inventory, load_inventory
+
+
+CSV = """id,nombre,precio,stock,categoria,sucursal
+pan_frances,Pan Francés,0.15,100,pan,centro
+pan_frances,Pan Francés,0.15,50,pan,norte
+bagel,Bagel,1.10,8,pan,centro
+bagel,Bagel,1.10,abc,pan,norte
+,Sin id,1,1,pan,centro
+muffin,Muffin,-2,5,pasteleria,centro
+bagel,Bagel,1.20,3,pan,sur
+pan_frances,Pan Francés,0.15,7,pan,centro
+"""
+
+
+def test_import_validates_and_builds_branch_stock(tmp_path):
+    path = tmp_path / "catalogo.csv"
+    path.write_text(CSV, encoding="utf-8")
+    catalog, report = import_catalog(str(path), PROMOCIONES)
+
+    assert catalog.ids == ["pan_frances", "bagel"] and catalog.branches == ["centro", "norte"]
+    assert catalog.stock.tolist() == [150, 8]
+    assert report.rows == 8 and report.rejected == 5
+    assert [(e["fila"], e["error"]) for e in report.errors] == [
+        (5, "stock inválido"), (6, "id vacío"), (7, "precio inválido"),
+        (8, "precio distinto entre sucursales"), (9, "fila duplicada (id, sucursal)")]
+
+    with pytest.raises(CatalogImportError, match="5 fila"):
+        import_catalog(str(path), strict=True)
+    (tmp_path / "malo.csv").write_text("id,nombre\nx,y\n", encoding="utf-8")
+    with pytest.raises(CatalogImportError, match="precio, stock"):
+        import_catalog(str(tmp_path / "malo.csv"))
+
+
+def test_inventory_from_catalog(tmp_path):
+    (tmp_path / "catalogo.csv").write_text(CSV, encoding="utf-8")
+    (tmp_path / "inventory.json").write_text(json.dumps({"catalogo": "catalogo.csv"}), encoding="utf-8")
+    inv = load_inventory(str(tmp_path / "inventory.json"))
+
+    assert inv.productos["bagel"] == {"nombre": "Bagel", "precio": 1.1, "stock": 8, "categoria": "pan"}
+    assert inv.verificar_stock("pan_frances", 60)["disponible"]
+    assert not inv.verificar_stock("pan_frances", 60, sucursal="norte")["disponible"]
+    assert inv.obtener_precio("pan_frances", 12)["promocion"] == "docena_pan"
+
+    # un cambio de precio/stock en la vista dict no borra el desglose por sucursal
+    inv.productos["pan_frances"]["precio"] = 0.2
+    inv.productos["bagel"]["stock"] = 20
+    inv.mark_changed()
+    assert inv.columnar().branches == ["centro", "norte"] and inv.catalogo is inv.columnar()
+    assert not inv.verificar_stock("pan_frances", 60, sucursal="norte")["disponible"]
+    assert inv.obtener_precio("pan_frances")["precio_unitario"] == 0.2
+    assert inv.verificar_stock("bagel", 20, sucursal="norte")["disponible"]  # sin desglose: el total
+
+
+def test_vectorized_paths_match_dict_semantics():
+    inv = Inventory()
+    assert inv.obtener_precio("pan_frances", 12) == {
+        "producto": "Pan Francés", "producto_id": "pan_frances", "precio_unitario": 0.15, "cantidad": 12,
+        "precio_total": round(0.15 * 12 * 0.8, 2), "promocion": "docena_pan", "stock_disponible": 150}
+    assert inv.obtener_precio("pan_frances", 11)["promocion"] is None
+    assert "error" in inv.obtener_precio("no_existe")
+
+    items = [{"producto_id": "cafe", "cantidad": 2}, {"producto_id": "no_existe", "cantidad": 1},
+             {"producto_id": "torta_vainilla", "cantidad": 3}]
+    pedido = inv.calcular_pedido(items)
+    assert [i["producto_id"] for i in pedido["items"]] == ["cafe", "torta_vainilla"]
+    subtotal = 2 * PRODUCTOS["cafe"]["precio"] + 3 * PRODUCTOS["torta_vainilla"]["precio"]
+    assert pedido["subtotal"] == round(subtotal, 2) and pedido["total"] == round(subtotal * 1.12, 2)
+    assert inv.calcular_pedido([]) == {"items": [], "subtotal": 0.0, "iva": 0.0, "total": 0.0}
+
+    stock = inv.verificar_stock_pedido(items)
+    assert not stock["disponible"]
+    assert [(f["producto_id"], f["existe"]) for f in stock["faltantes"]] == [("no_existe", False), ("torta_vainilla", True)]
+
+
+def test_columnar_view_follows_inventory_changes():
+    inv = Inventory(productos={k: dict(v) for k, v in PRODUCTOS.items()})
+    first = inv.columnar()
+    assert inv.columnar() is first
+    inv.productos["cafe"]["precio"] = 9.0
+    inv.mark_changed()
+    assert inv.obtener_precio("cafe")["precio_unitario"] == 9.0
+
+    catalog, report = build_catalog(pd.DataFrame({"id": ["a"], "nombre": ["A"], "precio": [1.0], "stock": [2]}))
+    assert isinstance(catalog, ColumnarCatalog) and report.products == 1 and catalog.branches == ["total"]
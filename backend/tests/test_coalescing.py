@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from app.coalescing import SingleFlight, coalescing_status, fingerprint, normalize_query
+from app.graph import build_graph
+from app.metrics import metrics
+from app.router import build_vector_store, function_documents
+
+
+def test_normalize_and_fingerprint():
+    assert normalize_query("¿Cuánto cuesta el  CROISSANT?") == normalize_query("cuanto cuesta el croissant")
+    assert fingerprint({"a": 1, "b": [1, 2]}) == fingerprint({"b": [1, 2], "a": 1})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+
+
+def test_concurrent_calls_share_one_execution():
+    metrics.reset()
+    flight = SingleFlight("test")
+    calls, release = [], threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait()
+        return {"valor": 42}
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(flight.do, "k", work) for _ in range(5)]
+        while flight.in_flight() == 0 or len(calls) == 0:
+            time.sleep(0.01)
+        time.sleep(0.1)  # que los demás lleguen a esperar al líder
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert all(r == {"valor": 42} for r, _ in results)
+    assert sum(shared for _, shared in results) == 4
+    assert metrics.get("coalesce.test.shared") == 4 and flight.in_flight() == 0
+
+    # terminado el vuelo no se reutiliza nada (no es una caché)
+    flight.do("k", work)
+    assert len(calls) == 2
+
+
+def test_leader_error_reaches_followers():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def boom():
+        release.wait()
+        raise RuntimeError("falló")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(flight.do, "k", boom) for _ in range(3)]
+        time.sleep(0.1)
+        release.set()
+        for f in futures:
+            with pytest.raises(RuntimeError):
+                f.result()
+
+
+class SlowLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        time.sleep(0.5)
+        return SimpleNamespace(content="El croissant cuesta $0.75", usage_metadata={"input_tokens": 100})
+
+
+def test_identical_chats_share_llm_call(tfidf_embedder, catalog_rows):
+    metrics.reset()
+    vs = build_vector_store(function_documents(catalog_rows), tfidf_embedder)
+    llm = SlowLLM()
+    graph = build_graph(vs, llm=llm)
+    queries = ["¿Cuánto cuesta el croissant?", "cuanto cuesta el croissant", "Cuánto cuesta el croissant"]
+
+    def chat(i):
+        return graph.invoke({"session_id": f"s{i}", "user_query": queries[i % 3], "exec_log": []})
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        outs = list(pool.map(chat, range(6)))
+
+    assert llm.calls == 1
+    assert {o["final_response"] for o in outs} == {"El croissant cuesta $0.75"}
+    assert sum(bool(o["usage"].get("coalesced")) for o in outs) == 5
+    assert coalescing_status()["respond"]["shared"] == 5
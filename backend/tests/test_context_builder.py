@@ -0,0 +1,63 @@
+from app.context_builder import build_context, estimate_tokens
+from app.graph import execute_function
+
+
+def _results(query, *tools):
+    return {t: execute_function(t, query) for t in tools}
+
+
+def test_context_is_compact_and_dedupes_products():
+    q = "croissant"
+    results = _results(q, "buscar_producto", "consultar_precio_promos")
+
+    ctx = build_context(results, "consultar_precio_promos", q, budget_tokens=1000)
+
+    assert ctx.tokens < estimate_tokens(str(results)) / 2
+    assert "Croissant" in ctx.text
+    assert "Café + Croissant" in ctx.text  # promo relevante del producto
+    assert ctx.omitted == 0
+
+
+def test_repeated_products_are_serialized_once():
+    q = "croissant"
+    results = _results(q, "buscar_producto", "recomendar_productos")
+
+    ctx = build_context(results, "recomendar_productos", q, budget_tokens=1000)
+
+    assert ctx.duplicates == 1
+    assert ctx.text.count("Croissant $0.75") == 1
+
+
+def test_horarios_only_today_and_mentioned_days():
+    q = "horario del sábado?"
+    ctx = build_context(_results(q, "consultar_horarios_ubicaciones"), "consultar_horarios_ubicaciones", q, 1000)
+
+    assert "sabado: 08:00-18:00" in ctx.text
+    assert "Sucursal Centro" in ctx.text
+
+
+def test_budget_drops_lowest_priority_first():
+    q = "croissant"
+    results = _results(q, "buscar_producto", "consultar_precio_promos")
+
+    ctx = build_context(results, "consultar_precio_promos", q, budget_tokens=40)
+
+    assert ctx.omitted > 0
+    assert ctx.tokens <= 40
+    assert "Croissant: unit $0.75" in ctx.text  # la función principal se conserva
+
+
+def test_duplicate_dropped_by_budget_does_not_hide_a_copy_that_fits():
+    largo = "parecido a lo que pediste la última vez, ideal para acompañar un café por la mañana con mantequilla"
+    results = {
+        "recomendar_productos": {"success": True, "data": {"recomendaciones": [
+            {"nombre": "Croissant", "precio": 0.75, "razon": largo}]}},
+        "buscar_producto": {"success": True, "data": {"productos": [
+            {"nombre": "Croissant", "precio": 0.75, "stock": 30}]}},
+    }
+
+    ctx = build_context(results, "recomendar_productos", "croissant", budget_tokens=25)
+
+    # la línea larga no entra; la corta del mismo producto sí
+    assert "Croissant $0.75 stock=30" in ctx.text
+    assert ctx.omitted == 1 and ctx.duplicates == 0
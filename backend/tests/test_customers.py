@@ -0,0 +1,129 @@
+import pytest
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app import tools
+from app.customers import CustomerStore, extract_contact, normalize_email, normalize_phone
+from app.inventory import Inventory
+from app.metrics import metrics
+from app.models import Customer
+from app.settings import settings
+from app.tools import tool_registry
+
+
+@pytest.fixture
+def factory(tmp_path):
+    return sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'customers.db'}"))
+
+
+def test_normalization_and_contact_extraction():
+    assert normalize_phone("+593 99 123 4567") == normalize_phone("099-123-4567") == "0991234567"
+    assert normalize_phone("12") is None
+    assert normalize_email(" Ana@Mail.COM ") == "ana@mail.com" and normalize_email("ana@") is None
+    assert extract_contact("Me llamo ana pérez, mi teléfono es 099 123 4567 y mi correo ANA@mail.com") == {
+        "nombre": "Ana Pérez", "telefono": "0991234567", "email": "ana@mail.com"}
+    assert extract_contact("quiero 2 cafés")["telefono"] is None
+
+
+def test_upserts_are_batched_and_keyed_by_phone(factory, monkeypatch):
+    monkeypatch.setattr(settings, "CUSTOMERS_FLUSH_INTERVAL_MS", 100)
+    metrics.reset()
+    store = CustomerStore(factory)
+    for i in range(50):
+        store.upsert(f"09900000{i:02d}", f"Cliente {i}")
+    ana, nuevo = store.upsert("099 123 4567", "Ana", "ana@mail.com")
+    again, nuevo_again = store.upsert("+593991234567", email="ANA@mail.com")  # mismo cliente
+    assert nuevo and not nuevo_again and again["cliente_id"] == ana["cliente_id"] and again["nombre"] == "Ana"
+    store.flush()
+
+    with factory() as db:
+        assert db.scalar(select(func.count()).select_from(Customer)) == 51
+        plan = " ".join(str(r) for r in db.execute(
+            text("EXPLAIN QUERY PLAN SELECT * FROM customers WHERE telefono = '0991234567'")))
+        assert "USING INDEX" in plan  # lectura por índice, no SCAN
+    assert store.status()["commits"] < 10
+
+    # email de otro cliente: se ignora en vez de romper el lote
+    other, _ = store.upsert("0987654321", "Luis", "ana@mail.com")
+    assert other["email"] is None
+    store.close()
+
+    metrics.reset()
+    fresh = CustomerStore(factory)  # otro proceso: caché vacía, lee por índice
+    assert fresh.find_by_phone("0991234567")["email"] == "ana@mail.com"
+    assert fresh.find_by_phone("0991234567") and fresh.status()["cache_hit_rate"] == 0.5
+    assert fresh.find_by_phone("0900000000") is None
+    fresh.close()
+
+
+def test_returning_customer_is_linked_to_orders():
+    inv = Inventory()
+    call = lambda name, query, sid: tool_registry.call(name, {"query": query, "session_id": sid}, inv)["data"]
+
+    assert call("registrar_cliente", "quiero registrarme", "a")["cliente"] is None
+    alta = call("registrar_cliente", "me llamo Rosa, mi número es 0991112233", "a")
+    assert alta["nuevo"] and alta["cliente"]["nombre"] == "Rosa"
+
+    # misma sesión: el pedido queda a su nombre
+    assert call("crear_pedido", "2 croissants", "a")["pedido"]["cliente_id"] == alta["cliente"]["cliente_id"]
+    # misma sesión: puede corregir sus datos
+    assert call("registrar_cliente", "mi correo es rosa@mail.com, teléfono 0991112233", "a")["cliente"]["email"] == "rosa@mail.com"
+    tools.customer_store.flush()
+
+
+def test_phone_of_another_session_reveals_and_changes_nothing():
+    metrics.reset()
+    inv = Inventory()
+    call = lambda name, query, sid: tool_registry.call(name, {"query": query, "session_id": sid}, inv)["data"]
+    alta = call("registrar_cliente", "me llamo Ana Perez, mi número es 0991112233, correo ana@mail.com", "alice")
+
+    # otra sesión escribe el mismo teléfono: ni nombre ni email de vuelta, y no los sobrescribe
+    intento = call("registrar_cliente", "me llamo Mallory, teléfono 0991112233, correo m@evil.com", "mallory")
+    assert intento["cliente"] == {"cliente_id": alta["cliente"]["cliente_id"]} and not intento["nuevo"]
+    assert "Ana" not in str(intento)
+    assert tools.customer_store.find_by_phone("0991112233")["nombre"] == "Ana Perez"
+    assert tools.customer_store.find_by_phone("0991112233")["email"] == "ana@mail.com"
+    # tampoco queda vinculada: sus pedidos no van a nombre de Ana
+    assert call("registrar_cliente", "¿ya estoy registrado?", "mallory")["cliente"] is None
+    assert "cliente_id" not in call("crear_pedido", "un brownie, mi teléfono 0991112233", "mallory")["pedido"]
+    assert tools.customer_store.status()["unverified_claims"] == 1
+    tools.customer_store.flush()
+
+
+def test_binding_survives_workers_and_returning_customers_verify_by_email(factory):
+    a = CustomerStore(factory)
+    ana, nuevo = a.register("0991112233", "Ana", "ana@mail.com", session_id="s1")
+    a.flush()
+    # otro worker (o el mismo tras reiniciar) reconoce la sesión
+    b = CustomerStore(factory)
+    assert nuevo and b.for_session("s1")["cliente_id"] == ana["cliente_id"]
+    # sesión nueva: el teléfono solo no alcanza; con el email registrado se vincula
+    assert b.register("0991112233", session_id="s2")[0] == {"cliente_id": ana["cliente_id"]}
+    assert b.for_session("s2") is None
+    vuelve, nuevo = b.register("0991112233", email="ANA@mail.com", session_id="s2")
+    assert not nuevo and vuelve["nombre"] == "Ana" and a.for_session("s2")["cliente_id"] == ana["cliente_id"]
+    a.close()
+    b.close()
+
+
+def test_concurrent_signups_adopt_the_id_in_the_db(factory):
+    a, b = CustomerStore(factory), CustomerStore(factory)
+    first, _ = a.upsert("0991112233", "Ana")
+    second, _ = b.upsert("0991112233", "Ana María")  # otro worker, otro bloque hi/lo
+    assert first["cliente_id"] != second["cliente_id"]
+    a.flush()
+    b.flush()
+    # ON CONFLICT conserva la primera fila escrita; el otro corrige su caché con el id que devolvió el upsert
+    with factory() as db:
+        kept = f"CLI-{db.scalar(select(Customer.id)):06d}"
+    assert a.find_by_phone("0991112233")["cliente_id"] == b.find_by_phone("0991112233")["cliente_id"] == kept
+    assert a.status()["id_conflicts"] + b.status()["id_conflicts"] >= 1
+    a.close()
+    b.close()
+
+
+def test_unsupported_dialect_fails_before_queueing(monkeypatch):
+    store = CustomerStore(sessionmaker(bind=create_engine("sqlite://")))
+    monkeypatch.setattr("app.customers.UPSERT_DIALECTS", ("postgresql",))
+    with pytest.raises(NotImplementedError):
+        store.upsert("0991112233", "Ana")
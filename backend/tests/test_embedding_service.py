@@ -0,0 +1,64 @@
+import os
+from functools import partial
+
+import numpy as np
+import pytest
+
+from app import embedding_service
+from app.embedding_service import EmbeddingService
+from tests.conftest import HashEmbeddings
+
+
+def test_pool_matches_in_process_embeddings():
+    service = EmbeddingService(HashEmbeddings, workers=2, chunk=3)
+    try:
+        texts = [f"producto {i}" for i in range(10)]  # 4 trozos repartidos entre 2 procesos
+        local = HashEmbeddings()
+        assert np.allclose(service.embed_documents(texts), local.embed_documents(texts))
+        assert np.allclose(service.embed_query("croissant"), local.embed_query("croissant"))
+        assert service.embed_documents([]) == []
+    finally:
+        service.shutdown()
+
+
+class FailingEmbeddings(HashEmbeddings):
+    def embed_documents(self, texts):
+        if "boom" in texts:
+            raise ValueError("boom")
+        return super().embed_documents(texts)
+
+
+class CrashOnceEmbeddings(HashEmbeddings):
+    """Mata a su proceso la primera vez (marca en disco); el reintento ya funciona."""
+
+    def __init__(self, marker: str):
+        super().__init__()
+        self.marker = marker
+
+    def embed_documents(self, texts):
+        if not os.path.exists(self.marker):
+            open(self.marker, "w").close()
+            os._exit(1)
+        return super().embed_documents(texts)
+
+
+def test_failed_chunk_still_releases_the_others(monkeypatch):
+    collected = []
+    real_collect = embedding_service._collect
+    monkeypatch.setattr(embedding_service, "_collect", lambda name, shape: collected.append(name) or real_collect(name, shape))
+    service = EmbeddingService(FailingEmbeddings, workers=2, chunk=1)
+    try:
+        with pytest.raises(ValueError, match="boom"):
+            service.embed_documents(["a", "boom", "c", "d"])
+        assert len(collected) == 3  # los trozos que terminaron se liberan igual
+    finally:
+        service.shutdown()
+
+
+def test_crashed_worker_recreates_the_pool(tmp_path):
+    service = EmbeddingService(partial(CrashOnceEmbeddings, str(tmp_path / "crashed")), workers=1)
+    try:
+        assert np.allclose(service.embed_documents(["pan"]), HashEmbeddings().embed_documents(["pan"]))
+        assert (tmp_path / "crashed").exists()
+    finally:
+        service.shutdown()
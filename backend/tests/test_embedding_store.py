@@ -0,0 +1,47 @@
+import numpy as np
+
+from app.embedding_store import CachedEmbeddings, EmbeddingStore
+from tests.conftest import HashEmbeddings
+
+
+def test_store_serves_repeated_texts_without_recomputing(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    inner = HashEmbeddings()
+    emb = CachedEmbeddings(inner, EmbeddingStore(path), "hash-32")
+
+    first = emb.embed_documents(["pan", "torta", "pan"])
+    assert inner.batches == [2]  # duplicados se calculan una vez
+    assert emb.embed_documents(["torta", "pan"]) == [first[1], first[0]]
+    assert inner.batches == [2]
+    assert np.allclose(emb.embed_query("pan"), first[0], atol=1e-6)
+
+
+def test_store_survives_restart_and_is_keyed_by_model(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    CachedEmbeddings(HashEmbeddings(), EmbeddingStore(path), "hash-32").embed_documents(["croissant"])
+
+    # "reinicio": nueva conexión, mismo archivo
+    inner = HashEmbeddings()
+    CachedEmbeddings(inner, EmbeddingStore(path), "hash-32").embed_documents(["croissant"])
+    assert inner.batches == []
+
+    other = HashEmbeddings()
+    CachedEmbeddings(other, EmbeddingStore(path), "otro-modelo").embed_documents(["croissant"])
+    assert other.batches == [1]
+    assert EmbeddingStore(path).count() == 2
+
+
+def test_queries_stay_in_a_bounded_memory_cache(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "emb.sqlite"))
+    inner = HashEmbeddings()
+    calls = []
+    embed_query = inner.embed_query
+    inner.embed_query = lambda text: calls.append(text) or embed_query(text)
+    emb = CachedEmbeddings(inner, store, "hash-32", query_cache_size=2)
+
+    assert emb.embed_query("pan") == emb.embed_query("pan") and calls == ["pan"]
+    emb.embed_query("torta")
+    emb.embed_query("queque")  # expulsa "pan", la menos reciente
+    emb.embed_query("pan")
+    assert calls == ["pan", "torta", "queque", "pan"]
+    assert store.count() == 0  # ninguna consulta llega al disco
@@ -0,0 +1,18 @@
+import pytest
+
+from app import embeddings
+from app.settings import settings
+
+
+def test_unknown_backend_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "EMB_BACKEND", "gpu-magic")
+    with pytest.raises(ValueError, match="EMB_BACKEND"):
+        embeddings.build_embedder()
+
+
+def test_store_key_depends_on_backend(monkeypatch):
+    keys = set()
+    for backend in ("hf", "int8", "onnx"):
+        monkeypatch.setattr(settings, "EMB_BACKEND", backend)
+        keys.add(embeddings.embedding_model_key())
+    assert len(keys) == 3
@@ -0,0 +1,88 @@
+import gc
+import time
+import weakref
+
+from app import entities
+from app.entities import AhoCorasick, extract_entities, get_extractor, plurals
+from app.inventory import Inventory
+from app.tools import tool_registry
+
+
+def test_automaton_finds_overlapping_patterns():
+    ac = AhoCorasick()
+    for p in ("he", "she", "hers", "his"):
+        ac.add(p, p)
+    ac.build()
+    assert sorted(v for _, _, v in ac.iter("ushers")) == ["he", "hers", "she"]
+
+
+def test_plurals():
+    assert plurals("empanada") == ["empanadas"]
+    assert plurals("pan") == ["pans", "panes"]
+    assert plurals("luz") == ["luces"]
+
+
+def test_items_quantities_and_ambiguity():
+    ents = extract_entities("Quiero 2 cafés y 4 empanadas")
+    assert ents.items == [{"producto_id": "cafe", "producto": "Café Americano", "cantidad": 2, "termino": "cafes"}]
+    assert ents.ambiguous == [{"termino": "empanadas", "cantidad": 4,
+                               "opciones": ["empanada_carne", "empanada_pollo"]}]
+
+    ents = extract_entities("una docena de panes franceses y media docena de croissants, tres empanadas de pollo")
+    assert [(i["producto_id"], i["cantidad"]) for i in ents.items] == [
+        ("pan_frances", 12), ("croissant", 6), ("empanada_pollo", 3)]
+    assert not ents.ambiguous
+
+    # la cantidad solo se asocia si lo que hay en medio es relleno
+    ents = extract_entities("somos 3 en casa, un latte por favor")
+    assert [(i["producto_id"], i["cantidad"]) for i in ents.items] == [("cafe_leche", 1)]
+
+
+def test_zones_weekdays_and_order_ids():
+    ents = extract_entities("envío al Centro el sábado, pedido #200")
+    assert ents.zones == ["centro"] and ents.weekdays == ["sabado"] and ents.order_ids == ["200"]
+    assert extract_entities("cancelar PED-20260101120000").order_ids == ["PED-20260101120000"]
+    assert extract_entities("el pedido 15, dos cafés").items[0]["cantidad"] == 2  # el 15 es el id
+
+
+def test_rebuilds_only_when_vocabulary_changes():
+    inv = Inventory(productos={"pan": {"nombre": "Pan", "precio": 0.2, "stock": 5, "categoria": "pan"}})
+    first = get_extractor(inv)
+    inv.mark_changed()  # cambio de stock/precio: mismo autómata
+    assert get_extractor(inv) is first
+
+    inv.productos = {**inv.productos, "bagel": {"nombre": "Bagel", "precio": 1.0, "stock": 5, "categoria": "pan"}}
+    inv.mark_changed()
+    assert get_extractor(inv) is not first
+    assert [i["producto_id"] for i in extract_entities("dos bagels y un pan", inv).items] == ["bagel", "pan"]
+
+
+def test_cache_does_not_keep_inventories_alive():
+    inv = Inventory()
+    uid, ref = inv.uid, weakref.ref(inv)
+    assert extract_entities("dos cafés", inv).items[0]["producto"] == "Café Americano"
+    del inv
+    gc.collect()
+    assert ref() is None and uid not in entities._by_inventory
+
+
+def test_extraction_is_fast():
+    ex = get_extractor()
+    q = "quiero 2 cafés y 4 empanadas de pollo para el centro el viernes"
+    ex.extract(q)
+    t0 = time.perf_counter()
+    for _ in range(200):
+        ex.extract(q)
+    assert (time.perf_counter() - t0) / 200 < 0.002  # microsegundos, no una llamada al LLM
+
+
+def test_tools_use_entities():
+    inv = Inventory()
+    data = tool_registry.call("crear_pedido", {"query": "quiero 2 cafés y 4 empanadas", "session_id": "s1"}, inv)["data"]
+    pedido = data["pedido"]
+    assert pedido["items"] == [{"producto_id": "cafe", "producto": "Café Americano", "cantidad": 2, "precio_unit": 1.5, "subtotal": 3.0}]
+    assert data["por_confirmar"][0]["cantidad"] == 4
+    assert tool_registry.call("calcular_costo_envio", {"query": "envío a Totoracocha"}, inv)["data"]["zona"] == "totoracocha"
+    estado = tool_registry.call("consultar_estado_pedido", {"query": f"¿y mi pedido {pedido['pedido_id']}?", "session_id": "s1"},
+                                inv)
+    assert estado["data"]["pedido_id"] == pedido["pedido_id"]
@@ -0,0 +1,53 @@
+import time
+
+from app.executor import run_plan, critical_path_ms
+from app.function_graph import get_function_graph
+
+
+def _plan(*steps):
+    return [{"step": n, "tool": tool, "depends_on": deps} for n, tool, deps in steps]
+
+
+def test_step_dependencies_from_graph():
+    fg = get_function_graph()
+    tools = ["buscar_producto", "calcular_costo_envio", "registrar_cliente", "crear_pedido"]
+
+    assert sorted(fg.get_step_dependencies("crear_pedido", tools)) == sorted(tools[:3])
+    assert fg.get_step_dependencies("buscar_producto", tools) == []
+    assert fg.get_step_dependencies("calcular_costo_envio", tools) == []
+
+
+def test_independent_steps_run_concurrently():
+    plan = _plan((1, "a", []), (2, "b", []), (3, "c", []), (4, "main", [1, 2, 3]))
+
+    def run(step):
+        time.sleep(0.1)
+        return {"function": step["tool"], "success": True, "data": {}}
+
+    t0 = time.perf_counter()
+    outcomes = run_plan(plan, run)
+    wall = time.perf_counter() - t0
+
+    assert all(o.status == "ok" for o in outcomes.values())
+    assert wall < 0.35  # camino crítico ~0.2s, no la suma (~0.4s)
+    assert critical_path_ms(plan, outcomes) < sum(o.elapsed_ms for o in outcomes.values())
+
+
+def test_timeout_and_failure_skip_only_dependents():
+    plan = _plan((1, "lento", []), (2, "roto", []), (3, "ok", []), (4, "main", [1, 2]), (5, "after_ok", [3]))
+
+    def run(step):
+        if step["tool"] == "lento":
+            time.sleep(0.5)
+        if step["tool"] == "roto":
+            raise RuntimeError("boom")
+        return {"function": step["tool"], "success": True, "data": {}}
+
+    outcomes = run_plan(plan, run, timeout_s=0.1)
+
+    assert outcomes[1].status == "timeout"
+    assert outcomes[2].status == "error"
+    assert outcomes[3].status == "ok"
+    assert outcomes[4].status == "skipped"
+    assert outcomes[5].status == "ok"
+    assert outcomes[4].result["success"] is False
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from app import index_manager as im
+from app import router
+from app.seeding import seed_catalog
+from app.settings import settings
+from scripts.seed_functions import make_functions
+from tests.conftest import HashEmbeddings
+
+
+@pytest.fixture
+def env(session_factory, monkeypatch):
+    with session_factory() as db:
+        seed_catalog(db, make_functions()[:4], embedder=HashEmbeddings(), build_index=False)
+    monkeypatch.setattr(router, "build_embedder", HashEmbeddings)
+    monkeypatch.setattr(im, "SessionLocal", session_factory)
+    return session_factory
+
+
+def _manager():
+    return im.IndexManager(graph_factory=lambda vs, **kw: ("graph", id(vs)))
+
+
+def test_first_get_builds_and_publishes_once(env):
+    mgr = _manager()
+    with env() as db:
+        snap = mgr.get(db)
+        assert snap.version == 1
+        assert mgr.get(db) is snap
+    assert router.read_index_manifest()["version"] == 1
+
+
+def test_reindex_swaps_without_touching_held_snapshot(env):
+    mgr = _manager()
+    with env() as db:
+        old = mgr.get(db)
+    assert mgr.reindex() == 2
+    assert mgr.snapshot.version == 2
+    assert old.version == 1 and old.vs is not mgr.snapshot.vs
+
+
+def test_other_worker_picks_up_published_version(env):
+    a, b = _manager(), _manager()
+    with env() as db:
+        a.get(db)
+        b.get(db)
+    a.reindex()
+    assert b.version == 1
+    b.check_once()
+    assert b.version == 2
+
+
+def test_reindex_skipped_while_another_worker_holds_lock(env):
+    mgr = _manager()
+    lock = im.FileLock(f"{settings.FAISS_DIR}/{im.LOCK_FILE}", stale_s=60)
+    assert lock.acquire()
+    try:
+        assert mgr.reindex() is None
+        assert os.path.exists(lock.path)  # el que pierde la carrera no borra el lock ajeno
+    finally:
+        lock.release()
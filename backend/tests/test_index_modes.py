@@ -0,0 +1,26 @@
+from langchain_core.documents import Document
+
+from app import router
+from app.settings import settings
+from tests.conftest import HashEmbeddings
+
+
+def test_auto_mode_switches_to_ann_above_threshold(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_MODE", "auto")
+    monkeypatch.setattr(settings, "INDEX_ANN_MIN_DOCS", 1000)
+    monkeypatch.setattr(settings, "INDEX_ANN_KIND", "hnsw")
+
+    assert router.resolve_index_mode(999) == "flat"
+    assert router.resolve_index_mode(1000) == "hnsw"
+
+
+def test_ann_modes_find_same_top1_as_exact(monkeypatch):
+    docs = [Document(page_content=f"ejemplo {i}", metadata={"name": f"f{i % 7}"}) for i in range(500)]
+    emb = HashEmbeddings()
+
+    for mode in ("flat", "hnsw", "ivf"):
+        monkeypatch.setattr(settings, "INDEX_MODE", mode)
+        vs = router.build_vector_store(docs, emb)
+        for i in (3, 250, 499):
+            doc, _ = vs.similarity_search_with_score(f"ejemplo {i}", k=1)[0]
+            assert doc.page_content == f"ejemplo {i}", mode
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from app import router
+from app.models import FunctionDef
+from app.seeding import seed_catalog
+from app.settings import settings
+from app.vector_codec import decode_vector, encode_vector, vector_format
+from scripts.seed_functions import make_functions
+
+
+def test_factory_string_combines_pca_and_storage(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_STORAGE", "sq8")
+    monkeypatch.setattr(settings, "INDEX_PCA_DIM", 64)
+    assert router.index_factory_string("flat", 1000, 384) == "PCA64,L2norm,SQ8"
+    assert router.index_factory_string("hnsw", 1000, 384) == f"PCA64,L2norm,HNSW{settings.HNSW_M}_SQ8"
+    assert router.index_factory_string("flat", 50, 384) == "SQ8"  # pocos datos para entrenar el PCA
+
+
+@pytest.mark.parametrize("fmt,tol", [("f32", 0), ("f16", 1e-3), ("sq8", 1e-2)])
+def test_vector_codec_roundtrip(fmt, tol):
+    v = np.random.default_rng(0).normal(size=384).astype("float32")
+    v /= np.linalg.norm(v)
+    text = encode_vector(v, fmt)
+    assert vector_format(text) == fmt
+    assert np.allclose(decode_vector(text), v, atol=tol)
+
+
+def test_quantized_index_passes_guard_and_reencodes_rows(session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "EMB_BACKEND", "tfidf")
+    with session_factory() as db:
+        seed_catalog(db, make_functions())
+        monkeypatch.setattr(settings, "INDEX_STORAGE", "sq8")
+        monkeypatch.setattr(settings, "EMB_DB_STORAGE", "f16")
+        report = seed_catalog(db, make_functions())
+        assert len(report.changed) == len(make_functions())  # cambió el formato de embedding_json
+        assert all(vector_format(r.embedding_json) == "f16" for r in db.query(FunctionDef))
+        assert report.index_version == 2
+
+
+def test_guard_refuses_lossy_configuration(session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "EMB_BACKEND", "tfidf")
+    monkeypatch.setattr(settings, "INDEX_STORAGE", "f16")
+    monkeypatch.setattr(settings, "INDEX_GUARD_MAX_DROP", -1.0)  # ninguna configuración la cumple
+    with session_factory() as db:
+        with pytest.raises(router.IndexAccuracyError):
+            seed_catalog(db, make_functions())
+    assert router.read_index_manifest() is None  # no se publicó nada
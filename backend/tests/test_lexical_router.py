@@ -0,0 +1,44 @@
+from langchain_core.documents import Document
+
+from app.lexical_router import build_lexical_index, lexical_decision
+from app.router import select_function_hybrid
+from app.routing_corpus import ROUTING_CASES
+from app.settings import settings
+from scripts.seed_functions import make_functions
+
+LEX = build_lexical_index(make_functions())
+
+
+def _decide(q):
+    return lexical_decision(LEX, q, settings.LEXICAL_MIN_SCORE, settings.LEXICAL_MIN_MARGIN, settings.LEXICAL_MIN_COVERAGE)
+
+
+class _FakeVS:
+    def __init__(self):
+        self.calls = 0
+
+    def similarity_search_with_score(self, query, k=12):
+        self.calls += 1
+        return [(Document(page_content="x", metadata={"name": "responder_fuera_contexto"}), 0.4)]
+
+
+def test_trivial_queries_exit_early():
+    assert _decide("hola")[0] == "saludar_cortesia"
+    assert _decide("cancela el pedido 55")[0] == "cancelar_pedido"
+    assert _decide("envían al centro?")[0] == "calcular_costo_envio"
+
+
+def test_early_exits_are_precise_on_corpus():
+    decided = [(_decide(q), expected) for q, expected in ROUTING_CASES]
+    exits = [(d[0], e) for d, e in decided if d is not None]
+    assert len(exits) >= len(ROUTING_CASES) // 2
+    assert all(fn == e for fn, e in exits)
+
+
+def test_ambiguous_query_escalates_to_embeddings():
+    vs = _FakeVS()
+    best = select_function_hybrid(vs, LEX, "va a llover mañana?")[0]
+    assert best.stage == "embedding" and vs.calls == 1
+
+    best = select_function_hybrid(vs, LEX, "hola")[0]
+    assert best.stage == "lexical" and vs.calls == 1
@@ -0,0 +1,168 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.inventory import Inventory
+from app.models import Order, OrderItem
+from app.orders import OrderStore, format_order_id, parse_order_id
+from app.persistence import HiLoAllocator
+from app.settings import settings
+from app.tools import tool_registry
+
+
+@pytest.fixture
+def factory(tmp_path):
+    return sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'orders.db'}"))
+
+
+def test_order_id_format():
+    assert format_order_id(200) == "PED-000200"
+    assert parse_order_id("PED-000200") == parse_order_id("200") == parse_order_id("#200") == 200
+    assert parse_order_id("PED-20260101") == 20260101
+    assert parse_order_id("abc") is None and parse_order_id("0") is None
+
+
+def test_hilo_ids_are_unique_across_allocators_and_threads(factory):
+    store = OrderStore(factory)
+    store._ensure_ready()  # crea las tablas
+    store.close()
+    # dos "procesos" sobre la misma BD, varios hilos cada uno
+    allocators = [HiLoAllocator(factory, "orders", 10), HiLoAllocator(factory, "orders", 10)]
+    ids, lock = [], threading.Lock()
+
+    def worker(alloc):
+        got = [alloc.next_id() for _ in range(50)]
+        with lock:
+            ids.extend(got)
+
+    threads = [threading.Thread(target=worker, args=(a,)) for a in allocators for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(ids) == len(set(ids)) == 400 and min(ids) >= 1
+
+
+def test_write_behind_groups_commits(factory, monkeypatch):
+    monkeypatch.setattr(settings, "ORDERS_FLUSH_INTERVAL_MS", 100)
+    store = OrderStore(factory)
+    calculo = Inventory().calcular_pedido([{"producto_id": "cafe", "cantidad": 2}])
+    orders = [store.create(f"s{i % 5}", calculo) for i in range(60)]
+    first = parse_order_id(orders[0]["pedido_id"])
+    store.set_status(first, "cancelado")
+    assert store.get(first)["estado"] == "cancelado"  # visible antes de escribirse
+    store.flush()
+
+    with factory() as db:
+        assert db.scalar(select(func.count()).select_from(Order)) == 60
+        assert db.scalar(select(func.count()).select_from(OrderItem)) == 60
+        assert db.get(Order, first).status == "cancelado"
+    assert store.status()["commits"] < 10  # lotes, no 61 transacciones
+    store.close()
+
+    # otro proceso (caché vacía) lee de la BD
+    fresh = OrderStore(factory)
+    assert fresh.get(first)["estado"] == "cancelado"
+    assert fresh.latest_for_session("s4")["pedido_id"] == orders[-1]["pedido_id"]
+    assert fresh.get(999999) is None
+    fresh.close()
+
+
+def test_workers_sharing_a_db_see_each_others_changes(factory, monkeypatch):
+    monkeypatch.setattr(settings, "ORDERS_CACHE_TTL_S", 60)  # aun con la caché viva, la BD decide
+    inv = Inventory()
+    a, b = OrderStore(factory), OrderStore(factory)
+    first = parse_order_id(a.create("s1", inv.calcular_pedido([{"producto_id": "cafe", "cantidad": 1}]))["pedido_id"])
+    a.flush()
+    assert a.get(first)["estado"] == "creado" and b.get(first)["estado"] == "creado"
+
+    assert b.set_status(first, "cancelado")[1]
+    pedido, changed = a.set_items(first, inv.calcular_pedido([{"producto_id": "cafe", "cantidad": 5}]))
+    assert not changed and pedido["estado"] == "cancelado" and pedido["total"] == round(1.5 * 1.12, 2)
+    assert not a.set_status(first, "cancelado")[1]
+
+    # el último pedido de la sesión sale del índice aunque lo haya creado otro worker
+    otro = b.create("s1", inv.calcular_pedido([{"producto_id": "brownie", "cantidad": 1}]))
+    b.flush()
+    assert a.latest_for_session("s1")["pedido_id"] == otro["pedido_id"]
+    a.close()
+    b.close()
+
+
+def test_bad_row_does_not_lose_the_rest_of_the_batch(factory, monkeypatch):
+    monkeypatch.setattr(settings, "ORDERS_FLUSH_INTERVAL_MS", 100)
+    store = OrderStore(factory)
+    store._ensure_ready()
+    with factory() as db:  # fila con el id que el allocator dará al segundo pedido
+        db.add(Order(id=2, session_id="otro", status="creado", subtotal=0, iva=0, total=0))
+        db.commit()
+    calculo = Inventory().calcular_pedido([{"producto_id": "cafe", "cantidad": 1}])
+    ids = [parse_order_id(store.create("s", calculo)["pedido_id"]) for _ in range(3)]
+    store.flush()
+
+    assert ids == [1, 2, 3]
+    with factory() as db:
+        assert db.get(Order, 1).session_id == "s" and db.get(Order, 3).session_id == "s"
+    assert store.get(2)["estado"] == "no_registrado" and store.status()["lost"] == ["PED-000002"]
+    store.close()
+
+
+def test_synchronous_mode(factory, monkeypatch):
+    monkeypatch.setattr(settings, "ORDERS_WRITE_BEHIND", False)
+    store = OrderStore(factory)
+    pedido = store.create("s", Inventory().calcular_pedido([{"producto_id": "brownie", "cantidad": 1}]))
+    with factory() as db:
+        assert db.get(Order, parse_order_id(pedido["pedido_id"])) is not None
+
+
+def test_order_tools_lifecycle(order_store):
+    inv = Inventory()
+    call = lambda name, query: tool_registry.call(name, {"query": query, "session_id": "cli-1"}, inv)["data"]
+
+    pedido = call("crear_pedido", "quiero 2 cafés y un brownie")["pedido"]
+    assert pedido["estado"] == "creado" and pedido["total"] == round(4.0 * 1.12, 2)
+    assert call("crear_pedido", "quiero hacer un pedido")["pedido"] is None
+
+    # sin id en la consulta: último pedido de la sesión
+    actualizado = call("actualizar_pedido", "agrega un café más")["pedido"]
+    assert [(i["producto_id"], i["cantidad"]) for i in actualizado["items"]] == [("cafe", 3), ("brownie", 1)]
+
+    assert call("consultar_estado_pedido", "¿cómo va mi pedido?")["estado"] == "creado"
+    assert call("cancelar_pedido", f"cancela el pedido {pedido['pedido_id']}")["estado"] == "cancelado"
+    # sin caché de herramienta: el estado nuevo se ve enseguida
+    assert call("consultar_estado_pedido", "¿cómo va mi pedido?")["estado"] == "cancelado"
+    assert "ya está cancelado" in call("cancelar_pedido", "cancela mi pedido")["mensaje"]
+    assert call("consultar_estado_pedido", "pedido 424242")["error"] == "Pedido no encontrado"
+
+
+def test_orders_are_only_visible_to_their_session(order_store):
+    inv = Inventory()
+    call = lambda session, name, query: tool_registry.call(name, {"query": query, "session_id": session}, inv)["data"]
+
+    pedido = call("alice", "crear_pedido", "quiero 2 cafés")["pedido"]
+    # los ids son correlativos: otra sesión no puede leer ni cancelar el pedido ajeno
+    assert call("bob", "cancelar_pedido", f"cancela el pedido {pedido['pedido_id']}")["error"] == "Pedido no encontrado"
+    assert call("bob", "consultar_estado_pedido", f"pedido {pedido['pedido_id']}")["error"] == "Pedido no encontrado"
+    assert call("bob", "actualizar_pedido", f"agrega un brownie al pedido {pedido['pedido_id']}")["error"]
+    assert call("bob", "consultar_estado_pedido", "¿cómo va mi pedido?")["error"] == "Pedido no encontrado"
+    assert call("alice", "consultar_estado_pedido", f"pedido {pedido['pedido_id']}")["estado"] == "creado"
+    assert order_store.get(parse_order_id(pedido["pedido_id"]))["items"][0]["cantidad"] == 2
+
+    # la sesión compartida de /chat sin session_id no identifica a nadie
+    anonimo = call(settings.DEFAULT_SESSION, "crear_pedido", "quiero un brownie")["pedido"]
+    assert call(settings.DEFAULT_SESSION, "consultar_estado_pedido", f"pedido {anonimo['pedido_id']}")["error"]
+
+
+def test_out_of_stock_lines_stay_out_of_the_order(order_store):
+    inv = Inventory()
+    call = lambda query: tool_registry.call("crear_pedido", {"query": query, "session_id": "cli-2"}, inv)["data"]
+
+    data = call("quiero 2 cafés y 30 brownies")
+    assert [i["producto_id"] for i in data["pedido"]["items"]] == ["cafe"]
+    assert data["sin_stock"] == [{"producto_id": "brownie", "cantidad_solicitada": 30, "stock_actual": 18, "existe": True}]
+
+    data = call("quiero 30 brownies")
+    assert data["pedido"] is None and data["sin_stock"] and data["mensaje"]
+    assert order_store.latest_for_session("cli-2")["items"][0]["producto_id"] == "cafe"  # no se creó otro
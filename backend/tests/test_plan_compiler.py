@@ -0,0 +1,55 @@
+import dataclasses
+
+import pytest
+
+from app.function_graph import FUNCTION_GRAPH, FunctionGraphManager
+
+
+def _graph(nodes, edges):
+    return {
+        "nodes": [{"id": n, "label": n, "tipo": "consulta", **extra} for n, extra in nodes],
+        "edges": [{"from": a, "to": b, "rel": rel} for a, rel, b in edges],
+    }
+
+
+def test_default_graph_plans_match_previous_planner():
+    fg = FunctionGraphManager(graph=FUNCTION_GRAPH)
+    plan = fg.get_plan("crear_pedido").bind("quiero 2 croissants", 0.9)
+    assert [p["tool"] for p in plan] == ["buscar_producto", "calcular_costo_envio", "registrar_cliente", "crear_pedido"]
+    assert plan[-1]["depends_on"] == [1, 2, 3] and plan[-1]["args"] == {"query": "quiero 2 croissants"}
+    assert [p["tool"] for p in fg.get_plan("consultar_precio_promos").bind("q", 1)] == [
+        "buscar_producto", "consultar_precio_promos"]
+    assert [p["tool"] for p in fg.get_plan("consultar_horarios_ubicaciones").bind("q", 1)] == [
+        "consultar_horarios_ubicaciones"]
+    assert fg.get_plan("crear_pedido").graph_context()["dependencies"] == ["calcular_costo_envio", "registrar_cliente"]
+
+
+def test_transitive_requirements_are_ordered_and_deduplicated():
+    graph = _graph(
+        [("pedir", {"pasos_previos": ["buscar"]}), ("buscar", {}), ("cliente", {}), ("direccion", {}), ("envio", {})],
+        [("pedir", "REQUIERE", "envio"), ("pedir", "REQUIERE", "cliente"),
+         ("envio", "REQUIERE", "direccion"), ("cliente", "REQUIERE", "direccion"),
+         ("buscar", "REQUIERE", "cliente"), ("direccion", "REQUIERE", "pedir")],  # ciclo
+    )
+    plan = FunctionGraphManager(graph=graph).get_plan("pedir").bind("q", 0.5)
+    tools = [p["tool"] for p in plan]
+    assert tools == ["direccion", "cliente", "buscar", "envio", "pedir"]
+    step = {p["tool"]: p["step"] for p in plan}
+    assert set(plan[-1]["depends_on"]) == {step["envio"], step["cliente"]}
+    assert plan[1]["depends_on"] == [step["direccion"]]
+    assert all(d < p["step"] for p in plan for d in p["depends_on"])  # DAG pese al ciclo
+
+
+def test_templates_are_immutable_cached_and_recompiled_on_graph_change():
+    fg = FunctionGraphManager(graph=_graph([("a", {}), ("b", {})], []))
+    template = fg.get_plan("a")
+    assert fg.get_plan("a") is template
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        template.steps[0].tool = "b"
+
+    plan = template.bind("uno", 0.1)
+    plan[0]["args"]["query"] = "mutado"
+    assert template.bind("dos", 0.1)[0]["args"] == {"query": "dos"}
+
+    fg.set_graph(_graph([("a", {}), ("b", {})], [("a", "REQUIERE", "b")]))
+    assert [p["tool"] for p in fg.get_plan("a").bind("q", 1)] == ["b", "a"]
@@ -0,0 +1,90 @@
+import time
+
+from app.function_graph import FUNCTION_GRAPH, FunctionGraphManager
+from app.graph import build_graph
+from app.inventory import Inventory
+from app.prefetch import Prefetcher, likely_next_functions, prefetch_tools, prefetcher
+from app.router import build_vector_store, function_documents
+from app.settings import settings
+from app.tools import tool_registry
+
+QUERIES = {
+    "buscar_producto": "¿Tienes pan integral?",
+    "consultar_precio_promos": "¿Cuánto vale el café con leche?",
+    "crear_pedido": "quiero 2 cafés y 4 empanadas para retirar a las 6",
+    "calcular_costo_envio": "cuánto cuesta el envío al centro?",
+}
+
+
+def test_next_steps_are_ranked_by_relation():
+    fg = FunctionGraphManager(graph=FUNCTION_GRAPH)
+    assert likely_next_functions(fg, "consultar_precio_promos", 2) == ["crear_pedido"]
+    # REQUIERE antes que PUEDE_LLEVAR_A
+    assert likely_next_functions(fg, "crear_pedido", 2) == ["calcular_costo_envio", "registrar_cliente"]
+
+
+def test_only_query_independent_work_is_prefetched():
+    fg = FunctionGraphManager(graph=FUNCTION_GRAPH)
+    # buscar_producto y recomendar_productos dependen de la consulta del turno siguiente
+    assert prefetch_tools(fg, "saludar_cortesia", 2) == []
+    assert prefetch_tools(fg, "buscar_producto", 2) == ["consultar_precio_promos"]
+    assert prefetch_tools(fg, "consultar_precio_promos", 2) == ["calcular_costo_envio"]
+    assert prefetch_tools(fg, "crear_pedido", 2) == ["calcular_costo_envio"]
+
+
+def test_prefetched_parts_are_per_session_and_consumed():
+    fg = FunctionGraphManager(graph=FUNCTION_GRAPH)
+    inv = Inventory()
+    pf = Prefetcher()
+
+    pf.schedule("s1", "buscar_producto", fg, inv).result()
+    # el prefetch no llena la caché compartida: el ahorro contado es solo suyo
+    assert not any(k[:2] == ("consultar_precio_promos", inv.uid) for k in tool_registry._cache)
+    assert pf.begin_turn("s2", "consultar_precio_promos") is None  # otra sesión: nada precargado
+
+    transition = pf.begin_turn("s1", "consultar_precio_promos")
+    assert transition == "buscar_producto→consultar_precio_promos"
+    # la parte no depende de la consulta: la de este turno se resuelve sobre ella
+    hit = pf.lookup("s1", transition, "consultar_precio_promos", {"query": "precio de 2 cafés"}, inv)
+    assert hit["data"]["precio"]["producto_id"] == "cafe" and hit["data"]["promociones"] == inv.promociones
+    # se consume; lo que depende de la consulta ni se precarga ni cuenta; las mutantes nunca
+    assert pf.lookup("s1", transition, "consultar_precio_promos", {"query": "x"}, inv) is None
+    assert pf.lookup("s1", transition, "buscar_producto", {"query": "x"}, inv) is None
+    assert pf.lookup("s1", transition, "crear_pedido", {"query": "x"}, inv) is None
+
+    stats = pf.status()["transitions"][transition]
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+    # la sesión por defecto la comparten todos los clientes sin id
+    assert pf.schedule(settings.DEFAULT_SESSION, "buscar_producto", fg, inv) is None
+    assert pf.begin_turn(settings.DEFAULT_SESSION, "consultar_precio_promos") is None
+
+    # inventario modificado: lo precargado ya no vale
+    pf.schedule("s1", "buscar_producto", fg, inv).result()
+    inv.mark_changed()
+    transition = pf.begin_turn("s1", "consultar_precio_promos")
+    assert pf.lookup("s1", transition, "consultar_precio_promos", {"query": "cafe"}, inv) is None
+
+
+def test_graph_hits_prefetch_on_likely_transitions(tfidf_embedder, catalog_rows):
+    prefetcher.reset()
+    tool_registry.clear_cache()
+    graph = build_graph(build_vector_store(function_documents(catalog_rows), tfidf_embedder), llm=None)
+
+    def turn(query, function):
+        out = graph.invoke({"session_id": "pf-1", "user_query": query, "exec_log": []})
+        assert out["route"].function == function
+        deadline = time.monotonic() + 5  # el prefetch corre en segundo plano
+        while prefetch_tools(graph_fg, function, settings.PREFETCH_MAX_NEXT) \
+                and not prefetcher._sessions["pf-1"].results and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return out
+
+    graph_fg = FunctionGraphManager(graph=FUNCTION_GRAPH)
+    turn(QUERIES["buscar_producto"], "buscar_producto")
+    turn(QUERIES["consultar_precio_promos"], "consultar_precio_promos")
+    turn(QUERIES["crear_pedido"], "crear_pedido")
+    turn(QUERIES["calcular_costo_envio"], "calcular_costo_envio")
+    stats = prefetcher.status()["transitions"]
+    for transition in ("buscar_producto→consultar_precio_promos", "consultar_precio_promos→crear_pedido",
+                       "crear_pedido→calcular_costo_envio"):
+        assert stats[transition]["hits"] == 1 and stats[transition]["misses"] == 0, transition
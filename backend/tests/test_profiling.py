@@ -0,0 +1,99 @@
+import pstats
+import sys
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import api
+from app.executor import run_plan
+from app.profiling import profile_request
+from app.router import RouteResult
+from app.settings import settings
+
+ADMIN = {"X-Admin-Token": "secreto"}
+
+
+def busy_graph_node(state):
+    t_end = time.perf_counter() + 0.06
+    while time.perf_counter() < t_end:
+        sum(range(200))
+    return {
+        "route": RouteResult(function="saludar_cortesia", score=0.9, stage="lexical"),
+        "plan": [], "exec_log": [], "final_response": "¡Hola!",
+    }
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    snap = SimpleNamespace(version=1, graph=SimpleNamespace(invoke=busy_graph_node))
+    tenant = SimpleNamespace(tenant_id="default", session_factory=nullcontext,
+                             index_manager=SimpleNamespace(get=lambda db: snap))
+    monkeypatch.setattr(api.tenant_registry, "get", lambda tenant_id: tenant)
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secreto")
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_INTERVAL_MS", 1)
+    return TestClient(api.app)
+
+
+def test_header_capture_and_admin_download(client, tmp_path):
+    assert client.post("/chat", json={"query": "hola"}, headers={"X-Profile": "1"}).status_code == 403
+    assert "X-Profile-Id" not in client.post("/chat", json={"query": "hola"}).headers
+
+    r = client.post("/chat", json={"query": "hola"}, headers={"X-Profile": "1", **ADMIN})
+    assert r.status_code == 200 and r.json()["response"] == "¡Hola!"
+    capture_id = r.headers["X-Profile-Id"]
+
+    captures = client.get("/admin/profiles", headers=ADMIN).json()["captures"]
+    assert captures[0]["id"] == capture_id and captures[0]["trigger"] == "header"
+    assert captures[0]["samples"] > 0
+
+    folded = client.get(f"/admin/profiles/{capture_id}/collapsed", headers=ADMIN).text
+    line = folded.splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert int(count) > 0 and "busy_graph_node (test_profiling.py" in folded
+
+    prof = client.get(f"/admin/profiles/{capture_id}/cprofile.prof", headers=ADMIN)
+    path = tmp_path / "c.prof"
+    path.write_bytes(prof.content)
+    assert any(fn[2] == "busy_graph_node" for fn in pstats.Stats(str(path)).stats)
+    assert "por línea" in client.get(f"/admin/profiles/{capture_id}/alloc.txt", headers=ADMIN).text
+
+    assert client.get(f"/admin/profiles/{capture_id}/../../secreto", headers=ADMIN).status_code == 404
+    assert client.get("/admin/profiles").status_code == 403
+
+
+def test_sampling_and_rotation(client, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "PROFILE_MAX_CAPTURES", 2)
+    monkeypatch.setattr(settings, "PROFILE_TRACEMALLOC", False)
+    ids = [client.post("/chat", json={"query": "hola"}).headers["X-Profile-Id"] for _ in range(3)]
+
+    captures = client.get("/admin/profiles", headers=ADMIN).json()["captures"]
+    assert len(captures) == 2 and {c["trigger"] for c in captures} == {"sample"}
+    assert [c["id"] for c in captures] == ids[:0:-1]  # se conservan las más recientes
+
+
+def busy_plan_step(step):
+    t_end = time.perf_counter() + 0.06
+    while time.perf_counter() < t_end:
+        sum(range(200))
+    return {"function": step["tool"], "success": True, "data": {}}
+
+
+def test_plan_steps_on_executor_threads_are_profiled(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_INTERVAL_MS", 1)
+    monkeypatch.setattr(settings, "PROFILE_TRACEMALLOC", False)
+    plan = [{"step": 1, "tool": "a"}, {"step": 2, "tool": "b"}]
+    with profile_request("/chat", "header") as cap:
+        assert all(o.success for o in run_plan(plan, busy_plan_step).values())
+    run_plan(plan, busy_plan_step)  # fuera del perfil: no suma muestras
+
+    folded = (tmp_path / "profiles" / cap.id / "stacks.folded").read_text(encoding="utf-8")
+    assert "busy_plan_step (test_profiling.py" in folded
+    assert cap.meta["threads"] >= 2  # el hilo de la petición y los del ejecutor
+    stats = pstats.Stats(str(tmp_path / "profiles" / cap.id / "cprofile.prof")).stats
+    assert sys.version_info >= (3, 12) or any(fn[2] == "busy_plan_step" for fn in stats)
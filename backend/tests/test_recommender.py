@@ -0,0 +1,140 @@
+import threading
+import time
+
+import numpy as np
+
+from app.inventory import Inventory
+from app.recommender import get_recommender, parse_preferences, recommend
+from app.tools import tool_registry
+
+
+def test_preferences_from_query():
+    prefs = parse_preferences("algo dulce por menos de 10 dólares")
+    assert prefs.etiquetas == ["dulce"] and prefs.presupuesto == 10.0 and not prefs.categorias
+
+    prefs = parse_preferences("pan sin gluten, hasta $0.75")
+    assert prefs.categorias == ["pan"] and prefs.etiquetas == ["sin_gluten"] and prefs.presupuesto == 0.75
+
+    assert parse_preferences("algo de tomar, tengo diez dolares").presupuesto == 10.0
+    assert parse_preferences("algo parecido al brownie").similares_a == ["brownie"]
+    assert parse_preferences("hola").to_dict() == {"categorias": [], "etiquetas": [], "presupuesto": None,
+                                                   "similares_a": []}
+
+
+def test_filters_by_tags_category_and_budget():
+    inv = Inventory()
+    dulces, _ = recommend("recomiéndame algo dulce", inv)
+    assert len(dulces) == 3
+    assert {r["categoria"] for r in dulces} == {"pasteleria"}
+
+    sin_gluten, _ = recommend("algo sin gluten", inv)
+    assert sin_gluten[0]["id"] == "pan_sin_gluten"
+    assert all("sin_gluten" in inv.etiquetas[r["id"]] for r in sin_gluten)
+
+    baratos, _ = recommend("algo dulce hasta $0.5", inv)
+    assert [r["id"] for r in baratos] == ["galletas"]
+    assert "presupuesto" in baratos[0]["razon"]
+
+    bebidas, _ = recommend("algo de tomar", inv)
+    assert {r["categoria"] for r in bebidas} == {"bebidas"}
+
+
+def test_similar_products_use_precomputed_neighbors():
+    inv = Inventory()
+    recs, prefs = recommend("algo parecido al brownie", inv)
+    assert prefs.similares_a == ["brownie"]
+    assert "brownie" not in [r["id"] for r in recs]
+    neighbors = get_recommender(inv).model
+    allowed = {neighbors.ids[i] for i in neighbors.neighbors[neighbors.index["brownie"]]}
+    assert {r["id"] for r in recs} <= allowed
+    assert recs[0]["razon"].startswith("Parecido a Brownie")
+
+
+def test_stock_and_price_changes_reuse_the_model():
+    productos = {
+        "alfajor": {"nombre": "Alfajor", "precio": 0.9, "stock": 10, "categoria": "pasteleria"},
+        "queque": {"nombre": "Queque de Naranja", "precio": 3.0, "stock": 5, "categoria": "pasteleria"},
+        "tamal": {"nombre": "Tamal", "precio": 1.5, "stock": 8, "categoria": "salado"},
+    }
+    inv = Inventory(productos={k: dict(v) for k, v in productos.items()}, etiquetas={})
+    model = get_recommender(inv).model
+    assert [r["id"] for r in recommend("algo dulce", inv)[0]] and model.neighbors.shape == (3, 2)
+
+    inv.productos["alfajor"]["stock"] = 0
+    inv.productos["queque"]["precio"] = 0.5
+    inv.mark_changed()
+    recs, _ = recommend("algo dulce", inv)
+    assert [(r["id"], r["precio"]) for r in recs] == [("queque", 0.5)]  # sin stock no se recomienda
+    assert get_recommender(inv).model is model
+
+
+def test_neighbors_match_brute_force():
+    rng = np.random.default_rng(0)
+    words = ["pan", "torta", "galleta", "jugo", "cafe", "empanada", "queso", "chocolate", "vainilla", "fresa"]
+    productos = {f"p{i}": {"nombre": " ".join(rng.choice(words, 3)), "precio": 1.0, "stock": 1, "categoria": "x"}
+                 for i in range(300)}
+    model = get_recommender(Inventory(productos=productos, etiquetas={})).model
+    sims = model.matrix @ model.matrix.T
+    np.fill_diagonal(sims, -np.inf)
+    best = np.sort(sims, axis=1)[:, ::-1][:, :model.neighbors.shape[1]]
+    assert np.allclose(model.neighbor_sims, best, atol=1e-5)
+
+
+def test_tool_returns_filters_and_empty_message():
+    out = tool_registry.call("recomendar_productos", {"query": "algo dulce sin gluten"}, Inventory())
+    assert out["data"]["recomendaciones"] == []
+    assert out["data"]["filtros"]["etiquetas"] == ["dulce", "sin_gluten"]
+    assert out["data"]["mensaje"]
+
+
+def test_slow_build_answers_with_filters_and_does_not_block_other_catalogs(monkeypatch):
+    from app import recommender as reco
+    from app.settings import settings
+
+    release = threading.Event()
+    real_model = reco._Model
+
+    def slow_model(ids, *args):
+        if "lento" in ids:
+            release.wait(5)
+        return real_model(ids, *args)
+
+    monkeypatch.setattr(reco, "_Model", slow_model)
+    monkeypatch.setattr(settings, "RECO_BUILD_WAIT_S", 0.05)
+    slow = Inventory(productos={
+        "lento": {"nombre": "Pan Lento", "precio": 1.0, "stock": 3, "categoria": "pan"},
+        "alfajor": {"nombre": "Alfajor", "precio": 0.9, "stock": 10, "categoria": "pasteleria"},
+        "brownie": {"nombre": "Brownie", "precio": 1.2, "stock": 0, "categoria": "pasteleria"},
+    }, etiquetas={})
+    t0 = time.perf_counter()
+    recs, prefs = recommend("algo dulce", slow)
+    assert time.perf_counter() - t0 < 1.0  # no espera al modelo
+    assert get_recommender(slow, wait_s=0) is None
+    assert [r["id"] for r in recs] == ["alfajor"] and recs[0]["score"] is None  # reserva: filtros y stock
+
+    other = Inventory(productos={"tamal": {"nombre": "Tamal", "precio": 1.5, "stock": 8, "categoria": "salado"}},
+                      etiquetas={})
+    assert get_recommender(other) is not None  # otra huella no espera a la construcción en curso
+
+    release.set()
+    assert get_recommender(slow, wait_s=5) is not None
+    assert recommend("algo dulce", slow)[0][0]["score"] is not None
+
+
+def test_model_cache_bounds_inventories_too(monkeypatch):
+    import gc
+    import weakref
+    from app import recommender as reco
+
+    monkeypatch.setattr(reco, "_MAX_MODELS", 2)
+    invs = [Inventory(productos={f"p{i}": {"nombre": f"Pan {i}", "precio": 1.0, "stock": 1, "categoria": "pan"}},
+                      etiquetas={}) for i in range(4)]
+    for inv in invs:
+        assert get_recommender(inv, wait_s=5) is not None
+    # los modelos expulsados se llevan sus recomendadores: no quedan más de _MAX_MODELS
+    assert len(reco._models) == 2 and {uid for uid in reco._by_inventory} <= {invs[2].uid, invs[3].uid}
+
+    ref, uid = weakref.ref(invs[3]), invs[3].uid
+    del invs[3], inv
+    gc.collect()
+    assert ref() is None and uid not in reco._by_inventory
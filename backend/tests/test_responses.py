@@ -0,0 +1,65 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import api
+from app.router import RouteResult
+from app.settings import settings
+
+QUERY = "¿Cuánto cuesta el croissant?"
+
+
+def _out(state):
+    plan = [{"step": i, "tool": f"f{i}", "args": {"query": state["user_query"]}, "depends_on": []} for i in range(1, 4)]
+    return {
+        "route": RouteResult(function="consultar_precio_promos", score=0.87654321, stage="lexical"),
+        "plan": plan,
+        "exec_log": [f"[EXEC] Paso {p['step']}: {p['tool']}() → ✓ Éxito (1 ms)" for p in plan] * 20,
+        "final_response": "El croissant cuesta $0.75 🥐",
+        "usage": {},
+        "graph_context": {"selected_function": "consultar_precio_promos"},
+        "exec_results": {"consultar_precio_promos": {"data": {"precio": 0.75}}},
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    snap = SimpleNamespace(version=7, graph=SimpleNamespace(invoke=_out))
+    tenant = SimpleNamespace(tenant_id="default", session_factory=nullcontext,
+                             index_manager=SimpleNamespace(get=lambda db: snap))
+    monkeypatch.setattr(api.tenant_registry, "get", lambda tenant_id: tenant)
+    return TestClient(api.app)
+
+
+def test_profiles_select_fields(client):
+    full = client.post("/chat", json={"query": QUERY}).json()
+    assert full["plan"] and full["exec_log"] and full["index_version"] == 7
+
+    lite = client.post("/chat?profile=lite", json={"query": QUERY}).json()
+    assert set(lite) == {"session_id", "response", "selected_function"}
+    assert lite["response"] == full["response"] and lite["selected_function"]["name"] == "consultar_precio_promos"
+
+    debug = client.post("/chat", json={"query": QUERY}, headers={"X-Response-Profile": "debug"}).json()
+    assert debug["exec_results"]["consultar_precio_promos"]["data"]["precio"] == 0.75
+
+    # el parámetro tiene prioridad sobre el header
+    r = client.post("/chat?profile=lite", json={"query": QUERY}, headers={"X-Response-Profile": "debug"})
+    assert "exec_results" not in r.json()
+    assert client.post("/chat?profile=xl", json={"query": QUERY}).status_code == 400
+
+
+def test_default_profile_setting(client, monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_PROFILE_DEFAULT", "lite")
+    assert "plan" not in client.post("/chat", json={"query": QUERY}).json()
+
+
+def test_large_payloads_are_compressed(client):
+    r = client.post("/chat", json={"query": QUERY}, headers={"Accept-Encoding": "gzip"})
+    assert r.headers.get("content-encoding") in ("gzip", "br")
+    assert int(r.headers["content-length"]) < len(r.content)  # TestClient ya descomprimió
+    assert r.json()["response"] == "El croissant cuesta $0.75 🥐"
+
+    lite = client.post("/chat?profile=lite", json={"query": QUERY}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in lite.headers  # por debajo de RESPONSE_COMPRESS_MIN_BYTES
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from app import router
+from app.routing_corpus import ROUTING_CASES
+from app.routing_head import RoutingHead, train_routing_head
+from app.seeding import seed_catalog
+from app.settings import settings
+from scripts.seed_functions import make_functions
+
+
+@pytest.fixture(scope="module")
+def trained(tfidf_embedder, catalog_rows):
+    docs = router.function_documents(catalog_rows)
+    vectors = np.asarray(tfidf_embedder.embed_documents([d.page_content for d in docs]), dtype="float32")
+    vs = router.build_vector_store(docs, tfidf_embedder, vectors)
+    labels = [d.metadata["name"] for d in docs]
+    kinds = [d.metadata["kind"] for d in docs]
+    return vs, vectors, labels, kinds
+
+
+def test_head_routes_corpus_and_is_calibrated(trained, tfidf_embedder):
+    _, vectors, labels, kinds = trained
+    head = train_routing_head(vectors, labels, kinds)
+    preds = [head.predict(tfidf_embedder.embed_query(q)) for q, _ in ROUTING_CASES]
+    assert np.mean([fn == e for (fn, _), (_, e) in zip(preds, ROUTING_CASES)]) >= 0.85
+    assert np.isclose(head.predict_proba(vectors[0]).sum(), 1.0)
+
+
+def test_functions_with_few_examples_fall_back_to_knn(trained, monkeypatch):
+    vs, vectors, labels, kinds = trained
+    head = train_routing_head(vectors, labels, kinds, min_examples=7)
+    assert head.excluded and not set(head.excluded) & set(head.classes)
+    assert "cancelar_pedido" in head.excluded and "recomendar_productos" in head.classes
+
+    # umbral por defecto: la cabeza sola mandaría "cancela el pedido 55" a una de sus clases
+    assert head.predict(vs.embedding_function.embed_query("cancela el pedido 55"))[1] >= settings.ROUTER_HEAD_MIN_PROB
+    best = router.select_function_head(vs, head, "cancela el pedido 55")[0]
+    assert best.stage == "embedding" and best.function == "cancelar_pedido"
+    assert router.select_function_head(vs, head, "¿dónde quedan las sucursales?")[0].function == "consultar_horarios_ubicaciones"
+    # las clases de la cabeza siguen resolviéndose con ella
+    best = router.select_function_head(vs, head, "recomiéndame algo dulce")[0]
+    assert best.stage == "head" and best.function == "recomendar_productos"
+
+    monkeypatch.setattr(settings, "ROUTER_HEAD_MIN_PROB", 1.01)  # probabilidad baja: kNN completo
+    best = router.select_function_head(vs, head, "cancela el pedido 55")[0]
+    assert best.stage == "embedding" and best.function == "cancelar_pedido"
+
+
+def test_head_is_published_with_the_index(session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "EMB_BACKEND", "tfidf")
+    monkeypatch.setattr(settings, "ROUTER_HEAD", "logreg")
+    with session_factory() as db:
+        seed_catalog(db, make_functions())
+    head = router.load_routing_head(1)
+    assert isinstance(head, RoutingHead) and "crear_pedido" in head.classes
+    assert router.load_routing_head(2) is None
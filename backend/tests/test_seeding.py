@@ -0,0 +1,56 @@
+import json
+
+from app.models import FunctionDef
+from app.router import read_index_manifest
+from app.seeding import load_catalog, seed_catalog
+from scripts.seed_functions import make_functions
+from tests.conftest import HashEmbeddings
+
+
+def test_seed_then_reseed_only_touches_changes(session_factory):
+    funcs = make_functions()
+    emb = HashEmbeddings()
+
+    with session_factory() as db:
+        first = seed_catalog(db, funcs, embedder=emb)
+        assert len(first.added) == len(funcs)
+        assert emb.batches == [first.embedded_texts]  # una sola llamada batch
+        assert read_index_manifest()["version"] == 1
+
+        funcs[0] = {**funcs[0], "business_desc": "Saludos y cortesía"}
+        emb.batches.clear()
+        second = seed_catalog(db, funcs, embedder=emb, build_index=False)
+        assert second.changed == [funcs[0]["name"]]
+        assert second.unchanged == len(funcs) - 1
+        assert emb.batches == [1]  # solo el perfil cambiado
+        row = db.query(FunctionDef).filter_by(name=funcs[0]["name"]).one()
+        assert row.business_desc == "Saludos y cortesía"
+
+
+def test_unchanged_reseed_keeps_the_published_index(session_factory):
+    funcs = make_functions()
+    emb = HashEmbeddings()
+    with session_factory() as db:
+        seed_catalog(db, funcs, embedder=emb)
+        emb.batches.clear()
+        report = seed_catalog(db, funcs, embedder=emb)
+        assert report.unchanged == len(funcs) and report.index_version is None
+        assert emb.batches == [] and read_index_manifest()["version"] == 1
+
+        assert seed_catalog(db, funcs, embedder=emb, force_index=True).index_version == 2
+
+
+def test_prune_removes_missing_functions(session_factory):
+    funcs = make_functions()
+    with session_factory() as db:
+        seed_catalog(db, funcs, embedder=HashEmbeddings(), build_index=False)
+        report = seed_catalog(db, funcs[:-1], embedder=HashEmbeddings(), prune=True)
+        assert report.removed == [funcs[-1]["name"]]
+        assert db.query(FunctionDef).count() == len(funcs) - 1
+        assert {"diff", "embed", "upsert", "index"} <= set(report.timings_ms)
+
+
+def test_load_catalog_json(tmp_path):
+    path = tmp_path / "catalogo.json"
+    path.write_text(json.dumps({"functions": make_functions()[:2]}), encoding="utf-8")
+    assert [f["name"] for f in load_catalog(str(path))] == [f["name"] for f in make_functions()[:2]]
@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+from sqlalchemy import func, select
+
+from app import tenants as tn
+from app.graph import execute_function
+from app.inventory import Inventory
+from app.metrics import metrics
+from app.models import Order
+from app.seeding import seed_catalog
+from app.settings import settings
+from app.tools import tool_registry
+from scripts.seed_functions import make_functions
+
+
+@pytest.fixture
+def tenants_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TENANTS_DIR", str(tmp_path / "tenants"))
+    monkeypatch.setattr(settings, "EMB_BACKEND", "tfidf")
+    for tenant_id in ("norte", "sur"):
+        root, db_url, faiss_dir = tn.tenant_paths(tenant_id)
+        os.makedirs(root)
+        with tn.make_session_factory(db_url)() as db:
+            seed_catalog(db, make_functions(), faiss_dir=faiss_dir)
+    with open(os.path.join(tn.tenant_paths("sur")[0], "inventory.json"), "w", encoding="utf-8") as f:
+        json.dump({"productos": {"alfajor": {"nombre": "Alfajor", "precio": 0.9, "stock": 10, "categoria": "dulce"}}}, f)
+    metrics.reset()
+    return tmp_path
+
+
+def test_lazy_load_then_hits(tenants_dir):
+    reg = tn.TenantRegistry(budget_mb=100)
+    norte = reg.get("norte")
+    assert reg.get("norte") is norte
+    assert norte.index_manager.version == 1 and norte.size_bytes > 0
+    status = reg.status()["tenants"]["norte"]
+    assert status["hit_rate"] == 0.5 and status["load_ms"] > 0
+
+
+def test_lru_eviction_under_budget(tenants_dir):
+    reg = tn.TenantRegistry(budget_mb=100)
+    size = reg.get("norte").size_bytes
+    reg._budget_mb = 1.5 * size / (1024 * 1024)  # cabe un solo tenant
+    engine = reg.get("norte").session_factory.kw["bind"]
+    disposed = []
+    engine.dispose = lambda *a, **kw: disposed.append(True)
+    reg.get("sur")
+    assert reg.loaded() == ["sur"]
+    assert metrics.get("tenant.evictions") == 1 and disposed
+    # al expulsarlo se olvidan su lock de carga y sus métricas
+    assert "norte" not in reg._load_locks and metrics.get("tenant.norte.miss") == 0
+    reg.get("norte")  # se recarga (miss) y expulsa a sur
+    assert reg.loaded() == ["norte"] and metrics.get("tenant.norte.miss") == 1
+    assert not any(name.startswith("tenant.sur.") for name in metrics.snapshot()["counters"])
+
+
+def test_tenant_uses_its_own_inventory(tenants_dir):
+    sur = tn.TenantRegistry().get("sur")
+    data = execute_function("buscar_producto", "alfajor", sur.inventory)["data"]
+    assert [p["id"] for p in data["productos"]] == ["alfajor"]
+
+
+def test_unknown_and_invalid_tenants(tenants_dir):
+    reg = tn.TenantRegistry()
+    with pytest.raises(tn.UnknownTenantError):
+        reg.get("oeste")
+    assert "oeste" not in reg._load_locks and metrics.get("tenant.oeste.miss") == 0
+    with pytest.raises(ValueError):
+        reg.get("../norte")
+
+
+def test_tenant_orders_stay_in_their_own_db(tenants_dir):
+    reg = tn.TenantRegistry()
+    norte, sur = reg.get("norte"), reg.get("sur")
+    crear = lambda t, query: tool_registry.call("crear_pedido", {"query": query, "session_id": "s1"},
+                                                t.inventory)["data"]["pedido"]
+    pedido = crear(norte, "quiero 2 cafés")
+    assert crear(sur, "quiero 2 alfajores")["pedido_id"] == pedido["pedido_id"]  # cada BD su secuencia
+    reg.close()
+    with norte.session_factory() as db:
+        assert db.scalar(select(func.count()).select_from(Order)) == 1
+    with sur.session_factory() as db:
+        assert db.scalar(select(func.count()).select_from(Order)) == 1
+    consulta = {"query": f"pedido {pedido['pedido_id']}", "session_id": "s1"}
+    assert tool_registry.call("consultar_estado_pedido", consulta, sur.inventory)["data"]["total"] == round(1.8 * 1.12, 2)
+    # el tenant por defecto no los ve
+    assert tool_registry.call("consultar_estado_pedido", consulta, Inventory())["data"]["error"]
+
+
+def test_eviction_releases_outside_the_lock_and_stores_stay_closed(tenants_dir):
+    reg = tn.TenantRegistry(budget_mb=100)
+    norte = reg.get("norte")
+    reg._budget_mb = 1.5 * norte.size_bytes / (1024 * 1024)
+    seen = []
+    close = norte.orders.close
+    def slow_close():  # mientras se vacía la cola de norte el registro sigue atendiendo
+        seen.append(reg.loaded())
+        close()
+    norte.orders.close = slow_close
+    reg.get("sur")
+    assert seen == [["sur"]]
+    # una petición que todavía usa a norte escribe en el acto, sin relanzar el hilo
+    pedido = tool_registry.call("crear_pedido", {"query": "quiero 2 cafés", "session_id": "s1"},
+                                norte.inventory)["data"]["pedido"]
+    assert not norte.orders._writes.active
+    with norte.session_factory() as db:
+        assert db.scalar(select(func.count()).select_from(Order)) == 1
+    assert pedido["pedido_id"]
@@ -0,0 +1,30 @@
+import numpy as np
+
+from app import router
+from app.routing_corpus import ROUTING_CASES
+from app.seeding import seed_catalog
+from app.settings import settings
+from app.tfidf_embedder import TfidfEmbeddings
+from scripts.seed_functions import make_functions
+
+
+def test_tfidf_routes_the_corpus(tfidf_embedder, catalog_rows):
+    vs = router.build_vector_store(router.function_documents(catalog_rows), tfidf_embedder)
+    hits = sum(router.select_function(vs, q)[0].function == expected for q, expected in ROUTING_CASES)
+    assert hits / len(ROUTING_CASES) >= 0.85
+
+
+def test_fit_is_deterministic_and_order_independent():
+    texts = ["pan de molde", "torta de chocolate", "croissant de mantequilla"]
+    a = TfidfEmbeddings(svd_dim=2).fit(texts).embed_documents(texts)
+    b = TfidfEmbeddings(svd_dim=2).fit(texts[::-1]).embed_documents(texts)
+    assert np.allclose(a, b)
+
+
+def test_fitted_state_travels_with_published_index(session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "EMB_BACKEND", "tfidf")
+    with session_factory() as db:
+        seed_catalog(db, make_functions())
+    vs, version, _ = router.load_published_vector_store()
+    assert version == 1
+    assert router.select_function(vs, "cancela el pedido 55")[0].function == "cancelar_pedido"
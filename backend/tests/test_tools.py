@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from app.executor import NO_TIMEOUT, run_plan
+from app.function_graph import FUNCTION_GRAPH
+from app.inventory import Inventory
+from app.metrics import metrics
+from app.settings import settings
+from app.tools import ToolRegistry, tool_registry
+
+
+@pytest.fixture
+def registry():
+    reg = ToolRegistry()
+    calls = []
+
+    @reg.tool("sumar")
+    def sumar(inv: Inventory, a: int, b: int = 1) -> dict:
+        calls.append("sumar")
+        return {"total": a + b}
+
+    @reg.tool("zonas", read_only=True)
+    def zonas(inv: Inventory) -> dict:
+        calls.append("zonas")
+        return {"zonas": sorted(inv.zonas_delivery)}
+
+    reg.calls = calls
+    return reg
+
+
+def test_every_graph_function_has_a_tool():
+    assert {n["id"] for n in FUNCTION_GRAPH["nodes"]} <= set(tool_registry.names())
+    assert tool_registry.call("no_existe", {})["success"] is False
+
+
+def test_typed_arguments(registry):
+    assert registry.call("sumar", {"a": "2", "query": "ignorada"})["data"] == {"total": 3}
+    bad = registry.call("sumar", {"b": 5})
+    assert bad["success"] is False and "Argumentos inválidos" in bad["data"]["error"]
+    assert registry.get("sumar").arg_names() == ["a", "b"]
+
+
+def test_read_only_results_are_cached_until_inventory_changes(registry):
+    metrics.reset()
+    inv = Inventory()
+    first = registry.call("zonas", {"query": "a"}, inv)
+    first["data"]["zonas"].append("mutada")
+    again = registry.call("zonas", {"query": "otra consulta"}, inv)  # no declara query: misma clave
+    assert registry.calls == ["zonas"] and "mutada" not in again["data"]["zonas"]
+
+    registry.call("zonas", {}, Inventory())  # otro inventario (tenant), otra entrada
+    inv.mark_changed()
+    registry.call("zonas", {}, inv)
+    assert registry.calls == ["zonas"] * 3
+
+    # las mutantes nunca se cachean
+    registry.call("sumar", {"a": 1}, inv)
+    registry.call("sumar", {"a": 1}, inv)
+    assert registry.calls.count("sumar") == 2
+
+    status = registry.status()
+    assert status["zonas"]["calls"] == 4 and status["zonas"]["cache_hit_rate"] == 0.25
+    assert status["sumar"]["executed"] == 2 and not status["sumar"]["read_only"]
+
+
+def test_cache_ttl(registry, monkeypatch):
+    monkeypatch.setattr(settings, "TOOL_CACHE_TTL_S", 0.05)
+    inv = Inventory()
+    registry.call("zonas", {}, inv)
+    registry.call("zonas", {}, inv)
+    time.sleep(0.06)
+    registry.call("zonas", {}, inv)
+    assert registry.calls == ["zonas", "zonas"]
+
+
+def test_per_tool_timeout():
+    plan = [{"step": 1, "tool": "lento", "depends_on": []}, {"step": 2, "tool": "rapido", "depends_on": []}]
+
+    def run(step):
+        time.sleep(0.3 if step["tool"] == "lento" else 0.01)
+        return {"function": step["tool"], "success": True, "data": {}}
+
+    t0 = time.perf_counter()
+    outcomes = run_plan(plan, run, timeout_s=5, step_timeout=lambda s: 0.05 if s["tool"] == "lento" else None)
+    assert outcomes[1].status == "timeout" and outcomes[1].elapsed_ms == 50
+    assert outcomes[2].status == "ok"
+    assert time.perf_counter() - t0 < 0.25
+
+
+def test_mutating_tools_are_never_abandoned():
+    for name in ("crear_pedido", "actualizar_pedido", "cancelar_pedido", "registrar_cliente"):
+        assert tool_registry.timeout_for(name) == NO_TIMEOUT
+    assert all(tool_registry.timeout_for(n) is not None for n in tool_registry.names())  # todas lo declaran
+
+    plan = [{"step": 1, "tool": "escribe", "depends_on": []}, {"step": 2, "tool": "lee", "depends_on": []}]
+
+    def run(step):
+        time.sleep(0.2 if step["tool"] == "escribe" else 0.3)
+        return {"function": step["tool"], "success": True, "data": {}}
+
+    timeouts = {"escribe": NO_TIMEOUT, "lee": 0.05}
+    outcomes = run_plan(plan, run, timeout_s=0.05, step_timeout=lambda s: timeouts[s["tool"]])
+    assert outcomes[1].status == "ok"  # se esperó aunque pasó el timeout por defecto
+    assert outcomes[2].status == "timeout"
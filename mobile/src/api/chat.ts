@@ -20,19 +20,20 @@ const getBaseUrl = () => {
   return `http://${LOCAL_PC_IP}:8000`;
 };
 
+// Con el perfil 'lite' el backend solo envía session_id, response y selected_function
 export interface ChatResponse {
   session_id: string;
-  query: string;
+  query?: string;
   selected_function: {
     name: string;
     score: number;
   };
-  plan: Array<{
+  plan?: Array<{
     step: number;
     tool: string;
     args: Record<string, unknown>;
   }>;
-  exec_log: string[];
+  exec_log?: string[];
   response: string;
 }
 
@@ -55,6 +56,7 @@ export async function sendMessage(
     method: 'POST',
     headers: {
       'Content-Type': 'application/json; charset=utf-8',
+      'X-Response-Profile': 'lite',
     },
     body: JSON.stringify({
       session_id: sessionId,